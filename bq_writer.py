@@ -0,0 +1,343 @@
+"""
+IC Origin — BigQuery Storage Write API Writer
+==============================================
+Shared writer for analytics tables, replacing the legacy
+`insert_rows_json` / `DELETE ... WHERE TRUE` path.
+
+  • Committed streams — rows are visible as soon as each append is
+    acknowledged. Every append carries an explicit offset, and failed
+    appends are retried on the same named stream, so an append that
+    already landed is rejected as ALREADY_EXISTS instead of duplicating
+    rows (exactly-once). Passing `stream_name` resumes a stream from an
+    earlier, interrupted write.
+  • Pending streams — rows stay invisible until the stream is finalised
+    and batch-committed, so a load either lands completely or not at all.
+  • Atomic table swaps — `replace_table` writes into a staging table via
+    a pending stream and then copies it over the target with
+    WRITE_TRUNCATE. Readers see the old contents or the new contents,
+    never a half-empty table.
+
+Rows are serialised as protobuf (descriptor built from the BigQuery
+schema) by default, or as Arrow record batches when pyarrow is
+available and serialization="arrow".
+
+Usage:
+    from bq_writer import BigQueryStorageWriter
+
+    writer = BigQueryStorageWriter(client)
+    writer.replace_table(table_id, SCHEMA, rows)
+"""
+
+import datetime
+import uuid
+
+from google.api_core import exceptions as gapi_exceptions
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import BigQueryWriteClient, types, writer
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow serialisation is optional
+    pa = None
+
+DEFAULT_BATCH_ROWS = 500
+APPEND_ATTEMPTS = 3
+# Append failures after which the same stream is reopened and the
+# unacknowledged offsets are sent again
+_RETRYABLE_APPEND = (
+    gapi_exceptions.ServiceUnavailable,
+    gapi_exceptions.InternalServerError,
+    gapi_exceptions.Aborted,
+    gapi_exceptions.DeadlineExceeded,
+    gapi_exceptions.OutOfRange,  # a later offset sent after one that failed
+)
+_EPOCH_DATE = datetime.date(1970, 1, 1)
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+_PROTO_TYPES = {
+    "STRING":    descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    "INTEGER":   descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    "INT64":     descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    "FLOAT":     descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+    "FLOAT64":   descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+    "BOOL":      descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    "BOOLEAN":   descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    "TIMESTAMP": descriptor_pb2.FieldDescriptorProto.TYPE_INT64,   # micros since epoch
+    "DATE":      descriptor_pb2.FieldDescriptorProto.TYPE_INT32,   # days since epoch
+    "NUMERIC":   descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    "JSON":      descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+}
+
+
+def table_path(table_id):
+    """'project.dataset.table' → 'projects/p/datasets/d/tables/t'."""
+    project, dataset, table = table_id.replace(":", ".").split(".")
+    return f"projects/{project}/datasets/{dataset}/tables/{table}"
+
+
+def _timestamp_micros(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return (value - _EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _date_days(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return (value - _EPOCH_DATE).days
+
+
+def _coerce(field_type, value):
+    if field_type == "TIMESTAMP":
+        return _timestamp_micros(value)
+    if field_type == "DATE":
+        return _date_days(value)
+    if field_type in ("NUMERIC", "JSON"):
+        return str(value)
+    return value
+
+
+class ProtoRowSerializer:
+    """Serialises dict rows into protobuf bytes for a given BigQuery schema."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.descriptor = descriptor_pb2.DescriptorProto(name="AnalyticsRow")
+        for number, field in enumerate(schema, start=1):
+            field_type = field.field_type.upper()
+            if field_type not in _PROTO_TYPES:
+                raise ValueError(f"Unsupported column type for {field.name}: {field_type}")
+            self.descriptor.field.add(
+                name=field.name,
+                number=number,
+                type=_PROTO_TYPES[field_type],
+                label=(
+                    descriptor_pb2.FieldDescriptorProto.LABEL_REPEATED
+                    if field.mode == "REPEATED"
+                    else descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+                ),
+            )
+
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name=f"analytics_row_{uuid.uuid4().hex}.proto",
+            package=f"bqwriter_{uuid.uuid4().hex}",
+        )
+        file_proto.message_type.add().CopyFrom(self.descriptor)
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        self.message_cls = message_factory.GetMessageClass(
+            pool.FindMessageTypeByName(f"{file_proto.package}.AnalyticsRow")
+        )
+
+    def writer_schema(self):
+        return types.AppendRowsRequest.ProtoData(
+            writer_schema=types.ProtoSchema(proto_descriptor=self.descriptor)
+        )
+
+    def rows(self, chunk):
+        proto_rows = types.ProtoRows()
+        for row in chunk:
+            message = self.message_cls()
+            for field in self.schema:
+                value = row.get(field.name)
+                if value is None:
+                    continue
+                field_type = field.field_type.upper()
+                if field.mode == "REPEATED":
+                    getattr(message, field.name).extend(_coerce(field_type, v) for v in value)
+                else:
+                    setattr(message, field.name, _coerce(field_type, value))
+            proto_rows.serialized_rows.append(message.SerializeToString())
+        return types.AppendRowsRequest(
+            proto_rows=types.AppendRowsRequest.ProtoData(rows=proto_rows)
+        )
+
+
+class ArrowRowSerializer:
+    """Serialises dict rows into Arrow record batches for a given BigQuery schema."""
+
+    def __init__(self, schema):
+        if pa is None:
+            raise ImportError("pyarrow is required for Arrow serialisation")
+        arrow_types = {
+            "STRING": pa.string(), "NUMERIC": pa.string(), "JSON": pa.string(),
+            "INTEGER": pa.int64(), "INT64": pa.int64(),
+            "FLOAT": pa.float64(), "FLOAT64": pa.float64(),
+            "BOOL": pa.bool_(), "BOOLEAN": pa.bool_(),
+            "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+            "DATE": pa.date32(),
+        }
+        self.schema = schema
+        self.arrow_schema = pa.schema([
+            pa.field(
+                f.name,
+                pa.list_(arrow_types[f.field_type.upper()])
+                if f.mode == "REPEATED" else arrow_types[f.field_type.upper()],
+                nullable=f.mode != "REQUIRED",
+            )
+            for f in schema
+        ])
+
+    def writer_schema(self):
+        return types.AppendRowsRequest.ArrowData(
+            writer_schema=types.ArrowSchema(
+                serialized_schema=self.arrow_schema.serialize().to_pybytes()
+            )
+        )
+
+    def rows(self, chunk):
+        columns = {}
+        for field in self.schema:
+            field_type = field.field_type.upper()
+            values = [row.get(field.name) for row in chunk]
+            if field_type == "TIMESTAMP":
+                values = [None if v is None else _timestamp_micros(v) for v in values]
+            elif field_type == "DATE":
+                values = [None if v is None else _date_days(v) for v in values]
+            columns[field.name] = values
+        batch = pa.RecordBatch.from_pydict(columns, schema=self.arrow_schema)
+        return types.AppendRowsRequest(
+            arrow_rows=types.AppendRowsRequest.ArrowData(
+                rows=types.ArrowRecordBatch(
+                    serialized_record_batch=batch.serialize().to_pybytes(),
+                    row_count=batch.num_rows,
+                )
+            )
+        )
+
+
+class BigQueryStorageWriter:
+    """Writes dict rows to BigQuery through the Storage Write API."""
+
+    def __init__(self, client, write_client=None, serialization="proto",
+                 batch_rows=DEFAULT_BATCH_ROWS):
+        self.client = client
+        self.write_client = write_client or BigQueryWriteClient()
+        self.serialization = serialization
+        self.batch_rows = batch_rows
+
+    def _serializer(self, schema):
+        if self.serialization == "arrow":
+            return ArrowRowSerializer(schema)
+        return ProtoRowSerializer(schema)
+
+    def _open_append_stream(self, stream_name, serializer):
+        template = types.AppendRowsRequest(write_stream=stream_name)
+        if isinstance(serializer, ArrowRowSerializer):
+            template.arrow_rows = serializer.writer_schema()
+        else:
+            template.proto_rows = serializer.writer_schema()
+        return writer.AppendRowsStream(self.write_client, template)
+
+    def _append_all(self, stream_name, serializer, rows):
+        """
+        Append rows at explicit offsets, retrying failed appends on the
+        same stream. Offsets acknowledged by an earlier attempt come back
+        as ALREADY_EXISTS and are skipped.
+        """
+        chunks = [
+            (start, rows[start:start + self.batch_rows])
+            for start in range(0, len(rows), self.batch_rows)
+        ]
+        for attempt in range(APPEND_ATTEMPTS):
+            append_stream = self._open_append_stream(stream_name, serializer)
+            first_failed, error = None, None
+            try:
+                futures = []
+                for offset, chunk in chunks:
+                    request = serializer.rows(chunk)
+                    request.offset = offset
+                    futures.append((offset, append_stream.send(request)))
+                for offset, future in futures:
+                    try:
+                        future.result()
+                    except gapi_exceptions.AlreadyExists:
+                        pass  # Offset already written by an earlier attempt — exactly-once
+                    except _RETRYABLE_APPEND as e:
+                        if first_failed is None:
+                            first_failed, error = offset, e
+            except _RETRYABLE_APPEND as e:
+                # The connection broke while sending; resend everything not yet acked
+                first_failed = chunks[len(futures)][0] if first_failed is None else first_failed
+                error = error or e
+            finally:
+                append_stream.close()
+
+            if first_failed is None:
+                return
+            chunks = [(offset, chunk) for offset, chunk in chunks if offset >= first_failed]
+        raise error
+
+    def _write_stream(self, table_id, schema, rows, stream_type, stream_name=None):
+        """
+        Append all rows to a stream with explicit offsets; returns the stream name.
+
+        A new stream is created unless `stream_name` names one to resume.
+        """
+        serializer = self._serializer(schema)
+        if stream_name is None:
+            stream_name = self.write_client.create_write_stream(
+                parent=table_path(table_id),
+                write_stream=types.WriteStream(type_=stream_type),
+            ).name
+
+        self._append_all(stream_name, serializer, rows)
+        self.write_client.finalize_write_stream(name=stream_name)
+        return stream_name
+
+    def append_committed(self, table_id, schema, rows, stream_name=None):
+        """
+        Append rows via a committed stream; visible as each append is acked.
+
+        Returns the stream name. A caller retrying the same logical batch
+        passes it back as `stream_name`, so rows that already landed are
+        not written twice.
+        """
+        if not rows:
+            return stream_name
+        return self._write_stream(
+            table_id, schema, rows, types.WriteStream.Type.COMMITTED, stream_name
+        )
+
+    def write_pending(self, table_id, schema, rows):
+        """Append rows via a pending stream and commit them atomically."""
+        if not rows:
+            return 0
+        stream_name = self._write_stream(table_id, schema, rows, types.WriteStream.Type.PENDING)
+        response = self.write_client.batch_commit_write_streams(
+            types.BatchCommitWriteStreamsRequest(
+                parent=table_path(table_id),
+                write_streams=[stream_name],
+            )
+        )
+        if response.stream_errors:
+            raise RuntimeError(f"Pending stream commit failed: {list(response.stream_errors)}")
+        return len(rows)
+
+    def replace_table(self, table_id, schema, rows):
+        """
+        Atomically replace the contents of `table_id` with `rows`.
+
+        Rows are committed to a fresh staging table, which is then copied
+        over the target with WRITE_TRUNCATE in a single copy job.
+        """
+        staging_id = f"{table_id}__staging_{uuid.uuid4().hex[:8]}"
+        self.client.create_table(bigquery.Table(staging_id, schema=schema))
+        try:
+            self.write_pending(staging_id, schema, rows)
+            job_config = bigquery.CopyJobConfig(
+                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE
+            )
+            self.client.copy_table(staging_id, table_id, job_config=job_config).result()
+        finally:
+            self.client.delete_table(staging_id, not_found_ok=True)
+        return len(rows)
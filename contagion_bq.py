@@ -14,6 +14,8 @@ import requests
 from google.cloud import bigquery
 from datetime import datetime, timezone
 
+from bq_writer import BigQueryStorageWriter
+
 # ── Config ─────────────────────────────────────────────────────────────────────
 CH_API_KEY  = os.environ.get("CH_API_KEY")
 BQ_PROJECT  = "cofound-agents-os-788e"
@@ -96,14 +98,12 @@ def ensure_table(client, table_id, schema):
         client.create_table(table)
         print(f"   Created table: {table_id}")
 
-def truncate_and_load(client, table_id, rows):
-    """Overwrite table contents with fresh data."""
-    # Delete existing rows
-    client.query(f"DELETE FROM `{table_id}` WHERE TRUE").result()
-    if rows:
-        errors = client.insert_rows_json(table_id, rows)
-        if errors:
-            print(f"   ⚠️  Insert errors: {errors}")
+def truncate_and_load(client, table_id, schema, rows):
+    """Atomically overwrite table contents with fresh data (Storage Write API + table swap)."""
+    try:
+        BigQueryStorageWriter(client).replace_table(table_id, schema, rows)
+    except Exception as e:
+        print(f"   ⚠️  Write failed for {table_id}: {e}")
 
 def run_cross_pollination(client):
     """SQL-based graph traversal — no graph DB needed."""
@@ -220,8 +220,8 @@ def main():
     print(f"\n      Total rows — Directors: {len(all_directors)} | PSCs: {len(all_pscs)}")
 
     print("\n      Writing to BigQuery...")
-    truncate_and_load(client, BQ_TABLE_DIRECTORS, all_directors)
-    truncate_and_load(client, BQ_TABLE_PSCS,      all_pscs)
+    truncate_and_load(client, BQ_TABLE_DIRECTORS, DIRECTORS_SCHEMA, all_directors)
+    truncate_and_load(client, BQ_TABLE_PSCS,      PSCS_SCHEMA,      all_pscs)
     print("      ✅ BigQuery tables updated.")
 
     # ── Step 4: Cross-pollination SQL ─────────────────────────────────
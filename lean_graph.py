@@ -0,0 +1,411 @@
+"""
+IC Origin — Incremental Lean Graph Builder
+==========================================
+Maintains ic_origin_themav2.director_external_links without re-scanning
+every director on every run.
+
+  • Officer-ID lookups and appointment lists are cached in BigQuery
+    (lean_graph_officer_cache) with freshness timestamps, so the cache
+    survives between runs.
+  • Only directors that are new, or whose cached entries have gone
+    stale, hit the Companies House API.
+  • Fetches run concurrently under a shared token-bucket rate limiter
+    (CH allows 600 requests / 5 minutes per key).
+  • Results are written with MERGE from a staging table instead of
+    truncate-and-insert, so readers never see an empty links table.
+
+Used by scoring_engine_init.task2_lean_graph; can also be run directly:
+
+    python lean_graph.py
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from google.cloud import bigquery
+
+# ── Config ─────────────────────────────────────────────────────────────────────
+CH_API_KEY = os.environ.get("CH_API_KEY")
+BQ_PROJECT = "cofound-agents-os-788e"
+DS         = "ic_origin_themav2"
+CH_BASE    = "https://api.company-information.service.gov.uk"
+
+CH_REQUESTS_PER_SECOND  = float(os.environ.get("CH_REQUESTS_PER_SECOND", "2.0"))
+MAX_WORKERS             = int(os.environ.get("LEAN_GRAPH_WORKERS", "8"))
+OFFICER_ID_TTL          = timedelta(days=int(os.environ.get("LEAN_GRAPH_OFFICER_TTL_DAYS", "30")))
+APPOINTMENTS_TTL        = timedelta(days=int(os.environ.get("LEAN_GRAPH_APPOINTMENTS_TTL_DAYS", "7")))
+
+DISTRESSED_STATUSES = {
+    "liquidation", "administration", "receivership",
+    "active-proposal-to-strike-off", "dissolved",
+    "voluntary-arrangement", "insolvency-proceedings",
+}
+
+EXT_LINKS_SCHEMA = [
+    bigquery.SchemaField("portfolio_crn",       "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("portfolio_name",      "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("director_name",       "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("officer_id",          "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("external_crn",        "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("external_company",    "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("external_status",     "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("appointment_type",    "STRING", mode="NULLABLE"),
+    bigquery.SchemaField("is_distressed",       "BOOL",   mode="NULLABLE"),
+    bigquery.SchemaField("scraped_at",          "TIMESTAMP", mode="REQUIRED"),
+]
+
+OFFICER_CACHE_SCHEMA = [
+    bigquery.SchemaField("director_key",            "STRING",    mode="REQUIRED"),  # name|dob_year|dob_month
+    bigquery.SchemaField("officer_id",              "STRING",    mode="NULLABLE"),  # NULL = no CH match
+    bigquery.SchemaField("officer_resolved_at",     "TIMESTAMP", mode="REQUIRED"),
+    bigquery.SchemaField("appointments_json",       "STRING",    mode="NULLABLE"),
+    bigquery.SchemaField("appointments_fetched_at", "TIMESTAMP", mode="NULLABLE"),
+]
+
+
+def bq_table(name):
+    return f"{BQ_PROJECT}.{DS}.{name}"
+
+def director_key(name, dob_year, dob_month):
+    return f"{name}|{dob_year}|{dob_month}"
+
+
+class RateLimiter:
+    """Thread-safe token bucket shared by all fetch workers."""
+
+    def __init__(self, rate_per_sec, burst=None):
+        self.rate     = rate_per_sec
+        self.capacity = burst or max(1.0, rate_per_sec)
+        self.tokens   = self.capacity
+        self.updated  = time.monotonic()
+        self.lock     = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CompaniesHouseError(Exception):
+    """A CH request failed (non-200, exhausted 429 retries or a network error)."""
+
+
+class CompaniesHouseClient:
+    """Pooled, rate-limited Companies House client (one session for all workers)."""
+
+    def __init__(self, api_key, limiter, pool_size=MAX_WORKERS):
+        self.limiter = limiter
+        self.session = requests.Session()
+        self.session.auth = (api_key or "", "")
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, params=None, retries=3):
+        """
+        GET a CH resource. 404 is a real answer (nothing there) and returns {};
+        anything else that isn't a 200 raises CompaniesHouseError so callers
+        never mistake an outage for an empty result.
+        """
+        for attempt in range(retries):
+            self.limiter.acquire()
+            try:
+                r = self.session.get(f"{CH_BASE}{path}", params=params or {}, timeout=10)
+            except requests.RequestException as e:
+                raise CompaniesHouseError(f"{path}: {e}") from e
+            if r.status_code == 429:
+                time.sleep(2 ** attempt)
+                continue
+            if r.status_code == 404:
+                return {}
+            if r.status_code != 200:
+                raise CompaniesHouseError(f"{path}: HTTP {r.status_code}")
+            return r.json()
+        raise CompaniesHouseError(f"{path}: still rate limited after {retries} attempts")
+
+    def officer_id(self, director_name, dob_year, dob_month):
+        """Search CH for officer, match by DOB, return officer_id."""
+        results = self.get("/search/officers", {"q": director_name, "items_per_page": 20})
+        for item in results.get("items", []):
+            dob = item.get("date_of_birth", {})
+            if str(dob.get("year", "")) == str(dob_year) and \
+               str(dob.get("month", "")) == str(dob_month):
+                officer_path = item.get("links", {}).get("self", "")
+                if "/officers/" in officer_path:
+                    return officer_path.split("/officers/")[1].split("/")[0]
+        return None
+
+    def appointments(self, officer_id):
+        """Compact appointment list — only the fields the lean graph needs."""
+        data = self.get(f"/officers/{officer_id}/appointments", {"items_per_page": 50})
+        return [
+            {
+                "company_number": apt.get("appointed_to", {}).get("company_number", ""),
+                "company_name":   apt.get("appointed_to", {}).get("company_name", ""),
+                "company_status": apt.get("appointed_to", {}).get("company_status", ""),
+                "officer_role":   apt.get("officer_role", ""),
+            }
+            for apt in data.get("items", [])
+        ]
+
+
+class LeanGraphBuilder:
+    """
+    Incremental builder for director_external_links.
+
+    A run loads the persistent officer cache, refreshes only missing or
+    stale entries (concurrently, rate limited), rebuilds the link rows
+    from the cache in memory and MERGEs both the cache and the links
+    table from staging tables.
+    """
+
+    def __init__(self, client, ch_client, now=None):
+        self.client    = client
+        self.ch        = ch_client
+        self.now       = now or datetime.now(timezone.utc)
+        self.links_tid = bq_table("director_external_links")
+        self.cache_tid = bq_table("lean_graph_officer_cache")
+
+    # ── Cache ─────────────────────────────────────────────────────────
+
+    def load_cache(self):
+        rows = self.client.query(
+            f"SELECT director_key, officer_id, officer_resolved_at, "
+            f"appointments_json, appointments_fetched_at FROM `{self.cache_tid}`"
+        ).result()
+        return {r.director_key: dict(r.items()) for r in rows}
+
+    def needs_officer_lookup(self, entry):
+        return entry is None or self.now - entry["officer_resolved_at"] > OFFICER_ID_TTL
+
+    def needs_appointments(self, entry):
+        if not entry or not entry.get("officer_id"):
+            return False
+        fetched = entry.get("appointments_fetched_at")
+        return fetched is None or self.now - fetched > APPOINTMENTS_TTL
+
+    def refresh(self, directors, cache):
+        """
+        Refresh cache entries for directors that are new or stale.
+        Returns (refreshed, failed): the director keys that were re-fetched,
+        and those whose fetch failed. Failed keys keep their previous cache
+        entry (if any) and are retried on the next run.
+        """
+        stale = {}
+        for d in directors:
+            key = director_key(d.director_name, d.dob_year, d.dob_month)
+            entry = cache.get(key)
+            if key not in stale and (self.needs_officer_lookup(entry) or self.needs_appointments(entry)):
+                stale[key] = d
+
+        def fetch(item):
+            key, d = item
+            entry = dict(cache.get(key) or {"director_key": key})
+            try:
+                if self.needs_officer_lookup(cache.get(key)):
+                    entry["officer_id"] = self.ch.officer_id(d.director_name, d.dob_year, d.dob_month)
+                    entry["officer_resolved_at"] = self.now
+                    entry["appointments_json"] = None
+                    entry["appointments_fetched_at"] = None
+                if self.needs_appointments(entry):
+                    entry["appointments_json"] = json.dumps(self.ch.appointments(entry["officer_id"]))
+                    entry["appointments_fetched_at"] = self.now
+            except Exception as e:
+                print(f"   ⚠ CH fetch failed for {d.director_name}: {e}")
+                return key, None
+            return key, entry
+
+        refreshed, failed = set(), set()
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for key, entry in pool.map(fetch, stale.items()):
+                if entry is None:
+                    failed.add(key)
+                    continue
+                cache[key] = entry
+                refreshed.add(key)
+
+        return refreshed, failed
+
+    # ── Link rows ─────────────────────────────────────────────────────
+
+    def build_links(self, directors, cache, portfolio_crns):
+        scraped_at = self.now.isoformat()
+        rows = {}
+        for d in directors:
+            entry = cache.get(director_key(d.director_name, d.dob_year, d.dob_month)) or {}
+            oid = entry.get("officer_id")
+            if not oid:
+                continue
+            for apt in json.loads(entry.get("appointments_json") or "[]"):
+                ext_crn    = apt.get("company_number", "")
+                ext_status = apt.get("company_status", "")
+                if not ext_crn or ext_crn in portfolio_crns:
+                    continue
+                if not ext_status or ext_status.lower() not in DISTRESSED_STATUSES:
+                    continue  # Only store distressed external links to keep table lean
+                rows[(d.crn, oid, ext_crn)] = {
+                    "portfolio_crn":    d.crn,
+                    "portfolio_name":   d.canonical_name,
+                    "director_name":    d.director_name,
+                    "officer_id":       oid,
+                    "external_crn":     ext_crn,
+                    "external_company": apt.get("company_name", ""),
+                    "external_status":  ext_status,
+                    "appointment_type": apt.get("officer_role", ""),
+                    "is_distressed":    True,
+                    "scraped_at":       scraped_at,
+                }
+        return list(rows.values())
+
+    # ── MERGE writes ─────────────────────────────────────────────────
+
+    def _stage(self, rows, schema, name):
+        staging = bq_table(f"_staging_{name}")
+        job_config = bigquery.LoadJobConfig(
+            schema=schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        self.client.load_table_from_json(rows, staging, job_config=job_config).result()
+        return staging
+
+    def merge_cache(self, cache, refreshed_keys):
+        rows = []
+        for key in refreshed_keys:
+            e = cache[key]
+            rows.append({
+                "director_key":            key,
+                "officer_id":              e.get("officer_id"),
+                "officer_resolved_at":     e["officer_resolved_at"].isoformat(),
+                "appointments_json":       e.get("appointments_json"),
+                "appointments_fetched_at": (
+                    e["appointments_fetched_at"].isoformat()
+                    if e.get("appointments_fetched_at") else None
+                ),
+            })
+        if not rows:
+            return
+        staging = self._stage(rows, OFFICER_CACHE_SCHEMA, "lean_graph_officer_cache")
+        self.client.query(f"""
+            MERGE `{self.cache_tid}` T
+            USING `{staging}` S
+            ON T.director_key = S.director_key
+            WHEN MATCHED THEN UPDATE SET
+                officer_id = S.officer_id,
+                officer_resolved_at = S.officer_resolved_at,
+                appointments_json = S.appointments_json,
+                appointments_fetched_at = S.appointments_fetched_at
+            WHEN NOT MATCHED THEN INSERT ROW
+        """).result()
+
+    def merge_links(self, rows, protected=()):
+        """
+        Upsert current links and delete ones no longer present — one atomic MERGE.
+
+        protected holds "portfolio_crn|director_name" pairs whose CH fetch
+        failed this run; their existing links are left alone rather than
+        deleted for lack of fresh data.
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter("protected", "STRING", sorted(protected)),
+        ])
+        keep = "CONCAT(T.portfolio_crn, '|', T.director_name) NOT IN UNNEST(@protected)"
+        if not rows:
+            self.client.query(
+                f"DELETE FROM `{self.links_tid}` T WHERE {keep}", job_config=job_config
+            ).result()
+            return
+        staging = self._stage(rows, EXT_LINKS_SCHEMA, "director_external_links")
+        self.client.query(f"""
+            MERGE `{self.links_tid}` T
+            USING `{staging}` S
+            ON  T.portfolio_crn = S.portfolio_crn
+            AND T.officer_id    = S.officer_id
+            AND T.external_crn  = S.external_crn
+            WHEN MATCHED AND (
+                T.external_status  IS DISTINCT FROM S.external_status
+                OR T.external_company IS DISTINCT FROM S.external_company
+                OR T.appointment_type IS DISTINCT FROM S.appointment_type
+                OR T.portfolio_name   IS DISTINCT FROM S.portfolio_name
+            ) THEN UPDATE SET
+                portfolio_name   = S.portfolio_name,
+                director_name    = S.director_name,
+                external_company = S.external_company,
+                external_status  = S.external_status,
+                appointment_type = S.appointment_type,
+                scraped_at       = S.scraped_at
+            WHEN NOT MATCHED THEN INSERT ROW
+            WHEN NOT MATCHED BY SOURCE AND {keep} THEN DELETE
+        """, job_config=job_config).result()
+
+    # ── Run ─────────────────────────────────────────────────────────
+
+    def run(self, portfolio_crns):
+        directors = list(self.client.query(
+            f"SELECT crn, canonical_name, director_name, dob_year, dob_month "
+            f"FROM `{bq_table('directors')}`"
+        ).result())
+
+        cache = self.load_cache()
+        refreshed, failed = self.refresh(directors, cache)
+        self.merge_cache(cache, refreshed)
+
+        rows = self.build_links(directors, cache, portfolio_crns)
+        protected = {
+            f"{d.crn}|{d.director_name}"
+            for d in directors
+            if director_key(d.director_name, d.dob_year, d.dob_month) in failed
+        }
+        self.merge_links(rows, protected)
+
+        return {
+            "directors":   len(directors),
+            "cached":      len(directors) - len(refreshed) - len(failed),
+            "refreshed":   len(refreshed),
+            "failed":      len(failed),
+            "links":       len(rows),
+        }
+
+
+def ensure_tables(client):
+    for tid, schema, description in (
+        (bq_table("director_external_links"), EXT_LINKS_SCHEMA,
+         "Cross-portfolio director → external distressed company links (Lean Graph)"),
+        (bq_table("lean_graph_officer_cache"), OFFICER_CACHE_SCHEMA,
+         "Persistent CH officer-ID + appointments cache for the Lean Graph builder"),
+    ):
+        try:
+            client.get_table(tid)
+        except Exception:
+            t = bigquery.Table(tid, schema=schema)
+            t.description = description
+            client.create_table(t)
+            print(f"   ✓ Created: {tid}")
+
+
+def build_lean_graph(client, portfolio_crns):
+    """Entry point used by scoring_engine_init and the nightly job."""
+    ensure_tables(client)
+    ch_client = CompaniesHouseClient(CH_API_KEY, RateLimiter(CH_REQUESTS_PER_SECOND))
+    return LeanGraphBuilder(client, ch_client).run(portfolio_crns)
+
+
+if __name__ == "__main__":
+    client = bigquery.Client(project=BQ_PROJECT)
+    crns = {
+        r.entity_id
+        for r in client.query(f"SELECT entity_id FROM `{bq_table('auctions_enhanced')}`").result()
+    }
+    start = time.monotonic()
+    stats = build_lean_graph(client, crns)
+    print(f"Lean graph updated in {time.monotonic() - start:.1f}s: {stats}")
@@ -15,6 +15,9 @@ import requests
 from datetime import datetime, timezone, date
 from google.cloud import bigquery
 
+from bq_writer import BigQueryStorageWriter
+from lean_graph import build_lean_graph
+
 # ── Config ─────────────────────────────────────────────────────────────────────
 CH_API_KEY = os.environ.get("CH_API_KEY")
 BQ_PROJECT = "cofound-agents-os-788e"
@@ -42,8 +45,13 @@ def ensure_table(client, table_id, schema, description=""):
         client.create_table(t)
         print(f"   ✓ Created: {table_id}")
 
-def truncate(client, table_id):
-    client.query(f"DELETE FROM `{table_id}` WHERE TRUE").result()
+def replace_rows(client, table_id, schema, rows):
+    """Atomically swap table contents via the Storage Write API. Returns an error or None."""
+    try:
+        BigQueryStorageWriter(client).replace_table(table_id, schema, rows)
+        return None
+    except Exception as e:
+        return str(e)
 
 def run_view_ddl(client, ddl):
     client.query(ddl).result()
@@ -68,7 +76,6 @@ def task1_manual_intel_signals(client, portfolio):
     ensure_table(client, tid, MANUAL_SIGNALS_SCHEMA,
                  "Shadow soft-signal overrides from Grok/Perplexity research")
 
-    truncate(client, tid)
     now = datetime.now(timezone.utc).isoformat()
 
     # Pre-seeded with findings from our April 1 triangulation session
@@ -103,7 +110,7 @@ def task1_manual_intel_signals(client, portfolio):
             "last_updated":     now,
         })
 
-    errors = client.insert_rows_json(tid, rows)
+    errors = replace_rows(client, tid, MANUAL_SIGNALS_SCHEMA, rows)
     if errors:
         print(f"   ⚠️  Insert errors: {errors}")
     else:
@@ -132,7 +139,6 @@ def task1b_profile_cache(client, portfolio):
     tid = bq_table("company_profile_cache")
     ensure_table(client, tid, PROFILE_CACHE_SCHEMA,
                  "Cached hard signals per company: charges, insolvency, overdue accounts")
-    truncate(client, tid)
 
     now_ts  = datetime.now(timezone.utc).isoformat()
     cutoff  = date(2025, 12, 31)  # Anything after = within 90 days of April 1 2026
@@ -185,7 +191,7 @@ def task1b_profile_cache(client, portfolio):
         })
         time.sleep(0.35)
 
-    errors = client.insert_rows_json(tid, rows)
+    errors = replace_rows(client, tid, PROFILE_CACHE_SCHEMA, rows)
     if errors:
         print(f"   ⚠️  Errors: {errors}")
     else:
@@ -196,113 +202,14 @@ def task1b_profile_cache(client, portfolio):
 # TASK 2 — Lean Graph: director_external_links + v_contagion_summary
 # ════════════════════════════════════════════════════════════════════
 
-EXT_LINKS_SCHEMA = [
-    bigquery.SchemaField("portfolio_crn",       "STRING", mode="REQUIRED"),
-    bigquery.SchemaField("portfolio_name",      "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("director_name",       "STRING", mode="REQUIRED"),
-    bigquery.SchemaField("officer_id",          "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("external_crn",        "STRING", mode="REQUIRED"),
-    bigquery.SchemaField("external_company",    "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("external_status",     "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("appointment_type",    "STRING", mode="NULLABLE"),
-    bigquery.SchemaField("is_distressed",       "BOOL",   mode="NULLABLE"),
-    bigquery.SchemaField("scraped_at",          "TIMESTAMP", mode="REQUIRED"),
-]
-
-DISTRESSED_STATUSES = {
-    "liquidation", "administration", "receivership",
-    "active-proposal-to-strike-off", "dissolved",
-    "voluntary-arrangement", "insolvency-proceedings",
-}
-
-def get_officer_id(director_name, dob_year, dob_month):
-    """Search CH for officer, match by DOB, return officer_id."""
-    results = ch("/search/officers", {"q": director_name, "items_per_page": 20})
-    for item in results.get("items", []):
-        dob = item.get("date_of_birth", {})
-        if str(dob.get("year", "")) == str(dob_year) and \
-           str(dob.get("month", "")) == str(dob_month):
-            links = item.get("links", {})
-            officer_path = links.get("self", "")
-            if "/officers/" in officer_path:
-                return officer_path.split("/officers/")[1].split("/")[0]
-    return None
-
 def task2_lean_graph(client, portfolio):
     print("\n── TASK 2: Lean Graph Extension ──────────────────────────")
-    tid = bq_table("director_external_links")
-    ensure_table(client, tid, EXT_LINKS_SCHEMA,
-                 "Cross-portfolio director → external distressed company links (Lean Graph)")
-    truncate(client, tid)
-
-    # Load director table with DOB for matching
-    directors_rows = list(client.query(
-        f"SELECT crn, canonical_name, director_name, dob_year, dob_month "
-        f"FROM `{bq_table('directors')}`"
-    ).result())
-
-    now_ts = datetime.now(timezone.utc).isoformat()
-    ext_rows = []
-    seen_officers = {}  # officer_id → appointments (cache to avoid duplicate API calls)
-
-    print(f"   Scanning {len(directors_rows)} directors for external distressed links...")
-
-    for i, row in enumerate(directors_rows):
-        crn   = row.crn
-        name  = row.canonical_name
-        dname = row.director_name
-
-        # Get officer ID (with cache)
-        cache_key = f"{dname}|{row.dob_year}|{row.dob_month}"
-        if cache_key not in seen_officers:
-            oid = get_officer_id(dname, row.dob_year, row.dob_month)
-            seen_officers[cache_key] = oid
-            time.sleep(0.3)
-        else:
-            oid = seen_officers[cache_key]
-
-        if not oid:
-            continue
-
-        # Get all appointments for this officer
-        apt_cache_key = oid
-        if apt_cache_key not in seen_officers:
-            appointments = ch(f"/officers/{oid}/appointments", {"items_per_page": 50})
-            seen_officers[apt_cache_key] = appointments.get("items", [])
-            time.sleep(0.3)
-        appointments_list = seen_officers.get(apt_cache_key, [])
-
-        for apt in appointments_list:
-            # Skip appointments to our own portfolio companies
-            ext_crn = apt.get("appointed_to", {}).get("company_number", "")
-            if not ext_crn or ext_crn in PORTFOLIO_CRNS:
-                continue
-
-            ext_name   = apt.get("appointed_to", {}).get("company_name", "")
-            ext_status = apt.get("appointed_to", {}).get("company_status", "")
-            apt_role   = apt.get("officer_role", "")
-            is_dist    = ext_status.lower() in DISTRESSED_STATUSES if ext_status else False
-
-            if is_dist:  # Only store distressed external links to keep table lean
-                ext_rows.append({
-                    "portfolio_crn":    crn,
-                    "portfolio_name":   name,
-                    "director_name":    dname,
-                    "officer_id":       oid,
-                    "external_crn":     ext_crn,
-                    "external_company": ext_name,
-                    "external_status":  ext_status,
-                    "appointment_type": apt_role,
-                    "is_distressed":    True,
-                    "scraped_at":       now_ts,
-                })
-
-    if ext_rows:
-        errors = client.insert_rows_json(tid, ext_rows)
-        if errors:
-            print(f"   ⚠️  Errors: {errors}")
-        else:
-            print(f"   ✓ Found {len(ext_rows)} distressed external director links")
+    # Incremental: cached officer lookups, rate-limited concurrent fetches, MERGE writes
+    stats = build_lean_graph(client, PORTFOLIO_CRNS)
+    print(f"   Scanned {stats['directors']} directors "
+          f"({stats['refreshed']} refreshed, {stats['cached']} from cache)")
+    if stats["links"]:
+        print(f"   ✓ Found {stats['links']} distressed external director links")
     else:
         print("   ✓ No distressed external links found — portfolio director network is clean")
 
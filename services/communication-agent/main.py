@@ -3,94 +3,189 @@ Dispatcher Cloud Function.
 
 This function acts as a cron job trigger. It queries Firestore for users
 who are due for an inbox check, and dispatches a task to the Worker function
-via Cloud Tasks for each eligible user.
+via Cloud Tasks for each eligible user. Users with an active push
+subscription (see push_handler.py) are only polled every
+PUSH_FALLBACK_INTERVAL_MINUTES as a safety net.
+
+Due users are streamed in pages of PAGE_SIZE. For each page, tasks are
+created concurrently (DISPATCH_CONCURRENCY at a time) and the
+next_check_time updates for the dispatched users are committed in one
+WriteBatch. Large user bases can be split across several scheduler jobs,
+each passing {"shard": i, "shard_count": n}; each job queries only the
+users whose stored shard_bucket it owns (see src/shared/sharding.py).
+Dispatching stops when the time budget runs out, leaving the remaining
+users due for the next run.
 """
 import os
-import json
+import time
 import functions_framework
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from google.cloud import firestore
 from google.cloud import tasks_v2
 
+from src.shared.push import PUSH_FALLBACK_INTERVAL_MINUTES, push_active
+from src.shared.sharding import IN_FILTER_LIMIT, SHARD_BUCKETS, shard_bucket, shard_buckets
+from src.shared.task_queue import InboxTaskQueue
+
 # Configuration
 PROJECT_ID = os.environ.get('PROJECT_ID')
 LOCATION = os.environ.get('LOCATION', 'us-central1')
 TASK_QUEUE_NAME = os.environ.get('TASK_QUEUE_NAME', 'email-processing-queue')
 WORKER_FUNCTION_URL = os.environ.get('WORKER_FUNCTION_URL')
+DISPATCH_CONCURRENCY = int(os.environ.get('DISPATCH_CONCURRENCY', '32'))
+DISPATCH_TIME_BUDGET_S = int(os.environ.get('DISPATCH_TIME_BUDGET_S', '240'))
 
+# Firestore caps a WriteBatch at 500 writes; one page fills one batch
+PAGE_SIZE = 500
 
-@functions_framework.http
-def handler(request):
-    """
-    Dispatcher entry point.
-    
-    Triggered by Cloud Scheduler (e.g., every 5 minutes).
-    """
-    if not all([PROJECT_ID, WORKER_FUNCTION_URL]):
-        return {'error': 'Missing configuration'}, 500, {'Content-Type': 'application/json'}
+_clients = None
 
-    # Initialize clients
-    firestore_client = firestore.Client(project=PROJECT_ID)
-    tasks_client = tasks_v2.CloudTasksClient()
+
+def _get_clients():
+    """Clients are reused across invocations of a warm instance."""
+    global _clients
+    if _clients is None:
+        _clients = (firestore.Client(project=PROJECT_ID), tasks_v2.CloudTasksClient())
+    return _clients
+
+
+def _next_interval(user_data: dict, now: datetime) -> int:
+    interval = user_data.get('check_interval_minutes', 15)
+    if push_active(user_data, now):
+        interval = max(interval, PUSH_FALLBACK_INTERVAL_MINUTES)
+    return interval
+
+
+def dispatch_due_users(
+    firestore_client: firestore.Client,
+    task_queue: InboxTaskQueue,
+    now: datetime,
+    shard: int = 0,
+    shard_count: int = 1,
+    concurrency: int = DISPATCH_CONCURRENCY,
+    time_budget_s: float = DISPATCH_TIME_BUDGET_S
+) -> dict:
+    """
+    Enqueue an inbox check for every due user in the shard and push
+    their next_check_time forward.
     
-    # Construct queue path
-    parent = tasks_client.queue_path(PROJECT_ID, LOCATION, TASK_QUEUE_NAME)
+    An unsharded run reads every due user, and its updates backfill
+    shard_bucket for users created before sharding existed. Run it once
+    before splitting into shards.
     
-    # Query for users due for check
-    now = datetime.utcnow()
+    Returns:
+        Counts of dispatched/failed users and pages read, whether the
+        time budget cut the run short, and the failures.
+    """
     users_ref = firestore_client.collection('users')
     
-    # Query: is_active == True AND next_check_time <= now
-    # Note: Requires composite index in Firestore
-    query = users_ref.where('is_active', '==', True)\
-                     .where('next_check_time', '<=', now)
+    # Query: is_active == True [AND shard_bucket IN owned] AND next_check_time <= now
+    # Note: Requires composite indexes in Firestore
+    due = users_ref.where('is_active', '==', True)
+    if shard_count == 1:
+        scopes = [due]
+    else:
+        owned = shard_buckets(shard, shard_count)
+        scopes = [
+            due.where('shard_bucket', 'in', owned[i:i + IN_FILTER_LIMIT])
+            for i in range(0, len(owned), IN_FILTER_LIMIT)
+        ]
+    queries = [
+        scope.where('next_check_time', '<=', now)
+             .order_by('next_check_time')
+             .limit(PAGE_SIZE)
+        for scope in scopes
+    ]
     
     results = {
         'dispatched': 0,
         'errors': 0,
+        'pages': 0,
+        'truncated': False,
         'details': []
     }
     
-    try:
-        docs = list(query.stream())
-        
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_id = doc.id
-            
-            try:
-                # 1. Create Cloud Task
-                task = {
-                    'http_request': {
-                        'http_method': tasks_v2.HttpMethod.POST,
-                        'url': WORKER_FUNCTION_URL,
-                        'headers': {'Content-Type': 'application/json'},
-                        'body': json.dumps({'user_id': user_id}).encode()
-                    }
-                }
-                
-                # Add OIDC token for authentication if needed
-                # task['http_request']['oidc_token'] = {'service_account_email': ...}
-                
-                tasks_client.create_task(parent=parent, task=task)
-                
-                # 2. Update next_check_time
-                interval = user_data.get('check_interval_minutes', 15)
-                next_check = now + timedelta(minutes=interval)
+    def _enqueue(doc):
+        try:
+            task_queue.enqueue(doc.id)
+            return None
+        except Exception as e:
+            return e
+    
+    deadline = time.monotonic() + time_budget_s
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for query in queries:
+            last_doc = None
+            while True:
+                if time.monotonic() > deadline:
+                    results['truncated'] = True
+                    return results
                 
-                users_ref.document(user_id).update({
-                    'next_check_time': next_check,
-                    'last_check_dispatched_at': firestore.SERVER_TIMESTAMP
-                })
+                page_query = query.start_after(last_doc) if last_doc is not None else query
+                docs = list(page_query.stream())
+                if not docs:
+                    break
+                results['pages'] += 1
+                last_doc = docs[-1]
                 
-                results['dispatched'] += 1
-                results['details'].append(f"Dispatched user {user_id}")
+                # 1. Create Cloud Tasks concurrently
+                batch = firestore_client.batch()
+                updates = 0
+                for doc, error in zip(docs, pool.map(_enqueue, docs)):
+                    if error is not None:
+                        print(f"Error dispatching user {doc.id}: {error}")
+                        results['errors'] += 1
+                        results['details'].append(f"Failed user {doc.id}: {str(error)}")
+                        continue
+                    
+                    # 2. Update next_check_time (only for users actually dispatched)
+                    next_check = now + timedelta(minutes=_next_interval(doc.to_dict(), now))
+                    batch.update(users_ref.document(doc.id), {
+                        'next_check_time': next_check,
+                        'shard_bucket': shard_bucket(doc.id),
+                        'last_check_dispatched_at': firestore.SERVER_TIMESTAMP
+                    })
+                    updates += 1
                 
-            except Exception as e:
-                print(f"Error dispatching user {user_id}: {e}")
-                results['errors'] += 1
-                results['details'].append(f"Failed user {user_id}: {str(e)}")
+                if updates:
+                    batch.commit()
+                    results['dispatched'] += updates
                 
+                if len(docs) < PAGE_SIZE:
+                    break
+    
+    return results
+
+
+@functions_framework.http
+def handler(request):
+    """
+    Dispatcher entry point.
+    
+    Triggered by Cloud Scheduler (e.g., every 5 minutes), optionally
+    with a JSON body {"shard": i, "shard_count": n}.
+    """
+    if not all([PROJECT_ID, WORKER_FUNCTION_URL]):
+        return {'error': 'Missing configuration'}, 500, {'Content-Type': 'application/json'}
+    
+    params = request.get_json(silent=True) or {}
+    try:
+        shard = int(params.get('shard', request.args.get('shard', 0)))
+        shard_count = int(params.get('shard_count', request.args.get('shard_count', 1)))
+    except (TypeError, ValueError):
+        shard, shard_count = -1, 0
+    if not 1 <= shard_count <= SHARD_BUCKETS or not 0 <= shard < shard_count:
+        return {'error': 'Invalid shard'}, 400, {'Content-Type': 'application/json'}
+    
+    # Initialize clients
+    firestore_client, tasks_client = _get_clients()
+    task_queue = InboxTaskQueue(tasks_client, PROJECT_ID, LOCATION, TASK_QUEUE_NAME, WORKER_FUNCTION_URL)
+    
+    try:
+        results = dispatch_due_users(
+            firestore_client, task_queue, datetime.utcnow(), shard=shard, shard_count=shard_count
+        )
         return results, 200, {'Content-Type': 'application/json'}
         
     except Exception as e:
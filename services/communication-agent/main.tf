@@ -55,6 +55,16 @@ resource "google_firestore_database" "database" {
   depends_on = [google_project_service.project_services]
 }
 
+# Expired email locks (see src/shared/idempotency.py) are deleted by TTL
+resource "google_firestore_field" "email_locks_ttl" {
+  project    = var.project_id
+  database   = google_firestore_database.database.name
+  collection = "email_locks"
+  field      = "expires_at"
+
+  ttl_config {}
+}
+
 resource "google_service_account" "function_sa" {
   account_id   = "gmail-agent-sa"
   display_name = "Gmail Agent Service Account"
@@ -1,28 +1,96 @@
 """
 Worker Cloud Function - Process inbox for a specific user with self-healing token refresh.
+
+Clients (Firestore, token encryption, the Vertex model, the credential
+manager and the idempotency guard) are created once per instance and
+reused by warm invocations. Each fetched batch goes through
+InboxAgent.process_batch.
+Access tokens come from the CredentialManager, which serves decrypted
+tokens from memory and refreshes them before they expire; the 401 retry
+below only covers tokens revoked or expired out of band.
 """
 import os
 import json
 import traceback
+from typing import NamedTuple
+
 import functions_framework
 from google.cloud import firestore
 from googleapiclient.errors import HttpError
 from vertexai.generative_models import GenerativeModel
-from datetime import datetime, timedelta
 
 from src.agents.inbox_reader.logic import InboxAgent
+from src.agents.inbox_reader.triage import EmailTriage
+from src.shared.credentials import CredentialManager
+from src.shared.idempotency import IdempotencyGuard
 from src.shared.schema import UserModel, TokenEncryption, Status
-from src.providers.gmail import GmailProvider
-from src.providers.outlook import OutlookProvider
+from src.shared.push import needs_renewal, subscribe_mailbox
+from src.providers.gmail import GmailProvider, refresh_google_token
+from src.providers.outlook import OutlookProvider, refresh_microsoft_token
+
+_clients = None
+
+# Consecutive runs the sync cursor may be held back for failed emails before
+# it advances anyway, so one email that always fails can't pin the mailbox
+MAX_CURSOR_HOLDS = 5
+
+
+def _refresh_tokens(user: UserModel, refresh_token: str) -> dict:
+    """Exchange a user's refresh token with their provider's token endpoint."""
+    if user.provider == "GMAIL":
+        return refresh_google_token(
+            os.environ.get('GOOGLE_CLIENT_ID'), os.environ.get('GOOGLE_CLIENT_SECRET'), refresh_token
+        )
+    if user.provider == "OUTLOOK":
+        return refresh_microsoft_token(
+            os.environ.get('OUTLOOK_CLIENT_ID') or user.client_id,
+            os.environ.get('OUTLOOK_CLIENT_SECRET'),
+            user.tenant_id or os.environ.get('OUTLOOK_TENANT_ID', 'common'),
+            refresh_token,
+            OutlookProvider.SCOPES
+        )
+    raise ValueError(f"Unknown provider: {user.provider}")
+
 
+class WorkerClients(NamedTuple):
+    """Per-instance clients shared by the worker and the push renewal job."""
+    firestore: firestore.Client
+    credentials: CredentialManager
+    vertex_model: GenerativeModel
+    idempotency_guard: IdempotencyGuard
+    triage: EmailTriage
 
-def _get_mail_provider_for_user(user: UserModel, encryption: TokenEncryption):
+
+def _get_clients() -> WorkerClients:
+    """
+    Per-instance clients, created on first use and kept warm.
+    
+    Callers should read fields by name rather than unpack, so adding a
+    client does not break them.
+    """
+    global _clients
+    if _clients is None:
+        firestore_client = firestore.Client(project=os.environ.get('PROJECT_ID'))
+        encryption = TokenEncryption(os.environ.get('ENCRYPTION_KEY'))
+        credentials = CredentialManager(firestore_client, encryption, refresh_fn=_refresh_tokens)
+        _clients = WorkerClients(
+            firestore=firestore_client,
+            credentials=credentials,
+            vertex_model=GenerativeModel('gemini-3-flash'),
+            idempotency_guard=IdempotencyGuard(firestore_client),
+            # Loaded once per instance, not per request
+            triage=EmailTriage.from_env()
+        )
+    return _clients
+
+
+def _get_mail_provider_for_user(user: UserModel, credentials: CredentialManager):
     """
     Create mail provider for specific user.
     
     Args:
         user: UserModel with encrypted credentials
-        encryption: TokenEncryption instance
+        credentials: CredentialManager supplying a valid access token
         
     Returns:
         MailProvider instance configured for the user
@@ -31,9 +99,9 @@ def _get_mail_provider_for_user(user: UserModel, encryption: TokenEncryption):
         from google.oauth2.credentials import Credentials
         from googleapiclient.discovery import build
         
-        access_token = encryption.decrypt(user.access_token_encrypted)
+        access_token = credentials.get_access_token(user)
         creds = Credentials(token=access_token)
-        gmail_service = build('gmail', 'v1', credentials=creds)
+        gmail_service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
         
         # Pass client credentials for token refresh
         client_id = os.environ.get('GOOGLE_CLIENT_ID')
@@ -42,69 +110,25 @@ def _get_mail_provider_for_user(user: UserModel, encryption: TokenEncryption):
         return GmailProvider(
             gmail_service=gmail_service,
             client_id=client_id,
-            client_secret=client_secret
+            client_secret=client_secret,
+            history_id=user.gmail_history_id
         )
         
     elif user.provider == "OUTLOOK":
         # Decrypt client secret for Outlook
-        client_secret = encryption.decrypt(user.access_token_encrypted)
+        client_secret = credentials.get_access_token(user)
         
         return OutlookProvider(
             client_id=user.client_id,
             client_secret=client_secret,
             tenant_id=user.tenant_id,
-            target_user_email=user.target_email
+            target_user_email=user.target_email,
+            delta_link=user.outlook_delta_link
         )
     
     raise ValueError(f"Unknown provider: {user.provider}")
 
 
-def _handle_token_refresh(
-    provider,
-    user: UserModel,
-    user_id: str,
-    encryption: TokenEncryption,
-    firestore_client: firestore.Client
-):
-    """
-    Handle token refresh and persist new tokens to Firestore.
-    
-    Args:
-        provider: Mail provider instance
-        user: UserModel with current credentials
-        user_id: Firestore document ID
-        encryption: TokenEncryption instance
-        firestore_client: Firestore client
-    """
-    if not user.refresh_token_encrypted:
-        raise RuntimeError(f"No refresh token available for user {user_id}")
-    
-    # Decrypt refresh token
-    refresh_token = encryption.decrypt(user.refresh_token_encrypted)
-    
-    # Refresh the access token
-    token_data = provider.refresh_access_token(refresh_token)
-    
-    # Encrypt new access token
-    new_access_token_encrypted = encryption.encrypt(token_data['access_token'])
-    
-    # Update Firestore with new credentials
-    update_data = {
-        'access_token_encrypted': new_access_token_encrypted,
-        'updated_at': firestore.SERVER_TIMESTAMP
-    }
-    
-    # Update expiry if provided
-    if 'expires_in' in token_data:
-        expires_at = datetime.utcnow() + timedelta(seconds=token_data['expires_in'])
-        update_data['expires_at'] = expires_at
-    
-    # Persist to Firestore
-    firestore_client.collection('users').document(user_id).update(update_data)
-    
-    print(f"✅ Token refreshed and persisted for user {user_id}")
-
-
 @functions_framework.http
 def handler(request):
     """
@@ -119,13 +143,9 @@ def handler(request):
     
     user_id = request_json['user_id']
     
-    # Initialize
-    project_id = os.environ.get('PROJECT_ID')
-    encryption_key = os.environ.get('ENCRYPTION_KEY')
-    
-    firestore_client = firestore.Client(project=project_id)
-    encryption = TokenEncryption(encryption_key)
-    vertex_model = GenerativeModel('gemini-3-flash')
+    # Initialize (reused across warm invocations)
+    clients = _get_clients()
+    firestore_client, credentials = clients.firestore, clients.credentials
     
     try:
         # Fetch user
@@ -138,13 +158,7 @@ def handler(request):
         user = UserModel(**user_data)
         
         # Create provider
-        mail_provider = _get_mail_provider_for_user(user, encryption)
-        
-        # Create agent (simplified - no job_manager for now)
-        # agent = InboxAgent(
-        #     mail_provider=mail_provider,
-        #     vertex_model=vertex_model
-        # )
+        mail_provider = _get_mail_provider_for_user(user, credentials)
         
         results = {
             'user_id': user_id,
@@ -162,26 +176,70 @@ def handler(request):
                 email_tasks = mail_provider.fetch_unread()
                 results['total'] = len(email_tasks)
                 
-                # Process each email
-                for email_task in email_tasks:
-                    try:
-                        # Simplified processing (no actual agent logic for now)
-                        # result = agent.process_email(email_task)
-                        # For now, just count as processed
+                # Triage, lock, draft and mark the whole batch at once
+                agent = InboxAgent(
+                    mail_provider=mail_provider,
+                    vertex_model=clients.vertex_model,
+                    idempotency_guard=clients.idempotency_guard,
+                    triage=clients.triage
+                )
+                outputs = agent.process_batch(email_tasks)
+                for email_task, output in zip(email_tasks, outputs):
+                    if output.status == Status.SUCCESS:
                         results['processed'] += 1
-                        
-                    except Exception as e:
-                        print(f"❌ Error processing email {email_task.email_id}: {e}")
+                    elif output.status == Status.SKIPPED:
+                        results['skipped'] += 1
+                    else:
+                        print(f"❌ Error processing email {email_task.email_id}")
                         results['failed'] += 1
                 
+                # Persist the sync cursor for incremental fetch next run, but
+                # only past a batch with no failures: holding it makes the
+                # next run fetch the failed emails again (handled ones are
+                # skipped by their done locks)
+                cursor_update = {}
+                if results['failed'] and user.cursor_holds < MAX_CURSOR_HOLDS:
+                    cursor_update['cursor_holds'] = user.cursor_holds + 1
+                else:
+                    if results['failed']:
+                        print(f"⚠️ Giving up on {results['failed']} emails for user {user_id} after {user.cursor_holds} retries")
+                    if user.cursor_holds:
+                        cursor_update['cursor_holds'] = 0
+                    if isinstance(mail_provider, GmailProvider):
+                        history_id = mail_provider.get_history_id()
+                        if history_id and history_id != user.gmail_history_id:
+                            cursor_update['gmail_history_id'] = history_id
+                    elif isinstance(mail_provider, OutlookProvider):
+                        delta_link = mail_provider.get_delta_link()
+                        if delta_link and delta_link != user.outlook_delta_link:
+                            cursor_update['outlook_delta_link'] = delta_link
+                
+                # Start/renew push notifications so the next check is
+                # triggered by new mail rather than the schedule
+                if needs_renewal(user):
+                    try:
+                        cursor_update.update(subscribe_mailbox(
+                            mail_provider, user,
+                            os.environ.get('GMAIL_PUSH_TOPIC'),
+                            os.environ.get('GRAPH_NOTIFICATION_URL'),
+                            os.environ.get('GRAPH_CLIENT_STATE')
+                        ))
+                    except Exception as e:
+                        print(f"⚠️ Push subscription failed for user {user_id}: {e}")
+                
+                if cursor_update:
+                    firestore_client.collection('users').document(user_id).update(cursor_update)
+                
                 # Success - break retry loop
                 break
                 
             except (HttpError, Exception) as e:
                 # Check if provider needs token refresh
                 if mail_provider.needs_token_refresh() and attempt < max_retries:
-                    print(f"🔄 Token expired for user {user_id}, refreshing...")
-                    _handle_token_refresh(mail_provider, user, user_id, encryption, firestore_client)
+                    print(f"🔄 Token rejected for user {user_id}, refreshing...")
+                    credentials.invalidate(user_id)
+                    credentials.refresh(user)
+                    mail_provider = _get_mail_provider_for_user(user, credentials)
                     results['token_refreshed'] = True
                     # Retry with refreshed token
                     continue
@@ -0,0 +1,123 @@
+"""
+Push ingestion Cloud Functions.
+
+- gmail_push: Pub/Sub-triggered; receives Gmail users.watch notifications.
+- graph_webhook: HTTP; receives Microsoft Graph change notifications.
+- renew_subscriptions: HTTP; triggered by Cloud Scheduler (e.g. hourly)
+  to renew watches/subscriptions before they expire.
+
+Notifications enqueue a worker task only for the mailbox that changed,
+instead of the dispatcher polling every due user.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timezone
+
+import functions_framework
+from google.cloud import firestore
+from google.cloud import tasks_v2
+
+from src.shared.push import PushRouter, subscribe_mailbox
+from src.shared.schema import UserModel
+from src.shared.task_queue import InboxTaskQueue
+
+# Configuration
+PROJECT_ID = os.environ.get('PROJECT_ID')
+LOCATION = os.environ.get('LOCATION', 'us-central1')
+TASK_QUEUE_NAME = os.environ.get('TASK_QUEUE_NAME', 'email-processing-queue')
+WORKER_FUNCTION_URL = os.environ.get('WORKER_FUNCTION_URL')
+GMAIL_PUSH_TOPIC = os.environ.get('GMAIL_PUSH_TOPIC')
+GRAPH_NOTIFICATION_URL = os.environ.get('GRAPH_NOTIFICATION_URL')
+GRAPH_CLIENT_STATE = os.environ.get('GRAPH_CLIENT_STATE')
+
+_router = None
+
+
+def _get_router() -> PushRouter:
+    """Clients are reused across invocations of a warm instance."""
+    global _router
+    if _router is None:
+        tasks_client = tasks_v2.CloudTasksClient()
+        queue = InboxTaskQueue(tasks_client, PROJECT_ID, LOCATION, TASK_QUEUE_NAME, WORKER_FUNCTION_URL)
+        _router = PushRouter(firestore.Client(project=PROJECT_ID), queue)
+    return _router
+
+
+@functions_framework.cloud_event
+def gmail_push(cloud_event):
+    """
+    Gmail notification entry point.
+
+    The Pub/Sub message data is base64 JSON: {"emailAddress", "historyId"}.
+    Errors propagate so Pub/Sub redelivers the message.
+    """
+    message = cloud_event.data.get('message', {})
+    data = message.get('data')
+    if not data:
+        return
+    notification = json.loads(base64.b64decode(data))
+    user_id = _get_router().handle_gmail_notification(notification)
+    if user_id:
+        print(f"📬 Gmail change for user {user_id}, task enqueued")
+
+
+@functions_framework.http
+def graph_webhook(request):
+    """
+    Microsoft Graph notification entry point.
+
+    Answers the subscription validation handshake by echoing
+    validationToken, otherwise enqueues checks for the notified mailboxes.
+    Graph expects a 2xx within a few seconds and retries otherwise.
+    """
+    validation_token = request.args.get('validationToken')
+    if validation_token:
+        return validation_token, 200, {'Content-Type': 'text/plain'}
+
+    if not GRAPH_CLIENT_STATE:
+        return {'error': 'Missing configuration'}, 500, {'Content-Type': 'application/json'}
+
+    payload = request.get_json(silent=True) or {}
+    try:
+        enqueued = _get_router().handle_graph_notifications(payload.get('value', []), GRAPH_CLIENT_STATE)
+    except Exception as e:
+        print(f"Graph webhook error: {e}")
+        return {'error': str(e)}, 500, {'Content-Type': 'application/json'}
+    return {'enqueued': len(enqueued)}, 202, {'Content-Type': 'application/json'}
+
+
+@functions_framework.http
+def renew_subscriptions(request):
+    """
+    Renew Gmail watches and Graph subscriptions that expire within a day.
+    """
+    from process_user_inbox import _get_clients, _get_mail_provider_for_user
+
+    if not PROJECT_ID:
+        return {'error': 'Missing configuration'}, 500, {'Content-Type': 'application/json'}
+
+    clients = _get_clients()
+    firestore_client, credentials = clients.firestore, clients.credentials
+    router = PushRouter(firestore_client, task_queue=None)
+    now = datetime.now(timezone.utc)
+
+    results = {'renewed': 0, 'errors': 0}
+    for doc in router.due_for_renewal(now):
+        user_data = doc.to_dict()
+        user_data['id'] = doc.id
+        try:
+            user = UserModel(**user_data)
+            provider = _get_mail_provider_for_user(user, credentials)
+            update = subscribe_mailbox(
+                provider, user, GMAIL_PUSH_TOPIC, GRAPH_NOTIFICATION_URL, GRAPH_CLIENT_STATE, now
+            )
+            if update:
+                firestore_client.collection('users').document(doc.id).update(update)
+                results['renewed'] += 1
+        except Exception as e:
+            # The dispatcher's fallback poll covers the user until the next run
+            print(f"Error renewing push for user {doc.id}: {e}")
+            results['errors'] += 1
+
+    return results, 200, {'Content-Type': 'application/json'}
@@ -1,19 +1,26 @@
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from opentelemetry import trace
 
+from src.agents.inbox_reader.triage import EmailTriage
 from src.shared.idempotency import IdempotencyGuard
 from src.shared.interfaces import MailProvider
 from src.shared.schema import AgentOutput, EmailTask, Status
 
 tracer = trace.get_tracer(__name__)
 
+# Concurrent model calls per mailbox batch
+DEFAULT_MAX_CONCURRENCY = 8
+
 class InboxAgent:
     def __init__(
         self,
         mail_provider: MailProvider,
         vertex_model: Any,  # Should be vertexai.generative_models.GenerativeModel
         idempotency_guard: IdempotencyGuard,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        triage: Optional[EmailTriage] = None,
     ):
         """
         Initializes the InboxAgent.
@@ -22,10 +29,15 @@ class InboxAgent:
             mail_provider: An implementation of the MailProvider interface.
             vertex_model: An authenticated Vertex AI model resource.
             idempotency_guard: An instance of IdempotencyGuard.
+            max_concurrency: Maximum model calls in flight in process_batch.
+            triage: Pre-model filter; defaults to EmailTriage.from_env(). Long-lived
+                callers should build it once and pass it in.
         """
         self._mail_provider = mail_provider
         self._vertex_model = vertex_model
         self._idempotency_guard = idempotency_guard
+        self._max_concurrency = max_concurrency
+        self._triage = triage or EmailTriage.from_env()
 
     def process_email(self, email_task: EmailTask) -> AgentOutput:
         """
@@ -43,44 +55,147 @@ class InboxAgent:
             span.set_attribute("email.thread_id", email_task.thread_id)
             span.set_attribute("email.sender", email_task.sender)
 
+            # 0. Local triage: newsletters, notifications and auto-replies
+            # never reach the model
+            if not self._is_reply_worthy(email_task, span):
+                return AgentOutput(status=Status.SKIPPED)
+
             # 1. Idempotency Check
             if not self._idempotency_guard.check_and_lock(email_task.email_id):
                 span.add_event("Idempotency check failed: email already processed.")
                 return AgentOutput(status=Status.SKIPPED)
 
-            try:
-                # 2. Call Vertex AI to summarize and draft a reply
-                with tracer.start_as_current_span("generate_draft_content") as gen_span:
-                    # The prompt is simplified for this example.
-                    prompt = f"Summarize this email and draft a professional reply to the sender:\n\n---\n\n{email_task.body}"
-                    
-                    # NOTE: Per privacy rules, the email body itself is not logged.
-                    # The call to the model is traced, but not the content.
-                    response = self._vertex_model.generate_content(prompt)
-                    draft_content = response.text
-                    gen_span.set_attribute("draft.char_length", len(draft_content))
-
-                # 3. Spam Check
-                if "[SPAM]" in draft_content:
-                    span.add_event("Spam detected; skipping draft creation.")
-                    return AgentOutput(status=Status.SKIPPED)
-
-                # 4. Create a draft using the mail provider
-                with tracer.start_as_current_span("create_draft") as draft_span:
-                    # A more robust implementation would parse the original subject.
-                    subject = "Re: Your recent email"
-                    
-                    draft_id = self._mail_provider.create_draft(
-                        recipient=email_task.sender,
-                        subject=subject,
-                        body=draft_content
-                    )
-                    
-                    draft_span.set_attribute("draft.id", draft_id)
-
-                return AgentOutput(status=Status.SUCCESS, draft_id=draft_id)
-
-            except Exception as e:
-                span.record_exception(e)
-                span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
-                return AgentOutput(status=Status.FAILURE)
+            output, draft = self._generate(email_task, span)
+            if draft is not None:
+                try:
+                    # 4. Create a draft using the mail provider
+                    with tracer.start_as_current_span("create_draft") as draft_span:
+                        draft_id = self._mail_provider.create_draft(**draft)
+                        draft_span.set_attribute("draft.id", draft_id)
+                    output = AgentOutput(status=Status.SUCCESS, draft_id=draft_id)
+                except Exception as e:
+                    span.record_exception(e)
+                    span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+                    output = AgentOutput(status=Status.FAILURE)
+
+            if output.status != Status.FAILURE:
+                self._idempotency_guard.mark_done([email_task.email_id])
+            else:
+                self._idempotency_guard.release([email_task.email_id])
+            return output
+
+    def _is_reply_worthy(self, email_task: EmailTask, span) -> bool:
+        decision = self._triage.assess(email_task)
+        span.set_attribute("triage.reason", decision.reason)
+        if decision.score is not None:
+            span.set_attribute("triage.score", decision.score)
+        if not decision.reply_worthy:
+            span.add_event("Triage: not reply-worthy; skipping model call.")
+        return decision.reply_worthy
+
+    def _generate(self, email_task: EmailTask, span) -> Tuple[AgentOutput, Optional[Dict[str, str]]]:
+        """
+        Calls the model for one email. Returns the output so far and the
+        draft to create (None if the email is skipped or failed).
+        """
+        try:
+            # 2. Call Vertex AI to summarize and draft a reply
+            with tracer.start_as_current_span("generate_draft_content") as gen_span:
+                # The prompt is simplified for this example.
+                prompt = f"Summarize this email and draft a professional reply to the sender:\n\n---\n\n{email_task.body}"
+                
+                # NOTE: Per privacy rules, the email body itself is not logged.
+                # The call to the model is traced, but not the content.
+                response = self._vertex_model.generate_content(prompt)
+                draft_content = response.text
+                gen_span.set_attribute("draft.char_length", len(draft_content))
+
+            # 3. Spam Check
+            if "[SPAM]" in draft_content:
+                span.add_event("Spam detected; skipping draft creation.")
+                return AgentOutput(status=Status.SKIPPED), None
+
+            # A more robust implementation would parse the original subject.
+            subject = "Re: Your recent email"
+            draft = {"recipient": email_task.sender, "subject": subject, "body": draft_content}
+            return AgentOutput(status=Status.SKIPPED), draft
+
+        except Exception as e:
+            span.record_exception(e)
+            span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+            return AgentOutput(status=Status.FAILURE), None
+
+    def _generate_traced(self, email_task: EmailTask) -> Tuple[AgentOutput, Optional[Dict[str, str]]]:
+        with tracer.start_as_current_span("process_email") as span:
+            span.set_attribute("email.id", email_task.email_id)
+            span.set_attribute("email.thread_id", email_task.thread_id)
+            span.set_attribute("email.sender", email_task.sender)
+            return self._generate(email_task, span)
+
+    def process_batch(self, email_tasks: List[EmailTask]) -> List[AgentOutput]:
+        """
+        Processes a fetched batch of emails for one mailbox.
+
+        Emails triaged out locally are skipped without a lock or model
+        call. Locks for the rest are claimed in one bulk write; emails
+        already locked are skipped. Model calls for the claimed emails run
+        concurrently (up to max_concurrency), then all drafts are created
+        with one provider batch call and the handled locks are marked done
+        together. Failed emails have their locks released; the worker keeps
+        the mailbox sync cursor behind a batch with failures, so the next
+        check fetches and retries them.
+
+        Args:
+            email_tasks: The emails to process.
+
+        Returns:
+            An AgentOutput per email, in input order.
+        """
+        with tracer.start_as_current_span("process_batch") as batch_span:
+            batch_span.set_attribute("batch.size", len(email_tasks))
+            outputs = [AgentOutput(status=Status.SKIPPED) for _ in email_tasks]
+
+            # 0. Local triage before any lock or model call
+            candidates = [t for t in email_tasks if self._triage.assess(t).reply_worthy]
+            batch_span.set_attribute("batch.triaged_out", len(email_tasks) - len(candidates))
+
+            # 1. Idempotency: claim every lock in one round trip
+            claimed_ids = self._idempotency_guard.claim_batch(t.email_id for t in candidates)
+            claimed = [i for i, t in enumerate(email_tasks) if t.email_id in claimed_ids]
+            batch_span.set_attribute("batch.claimed", len(claimed))
+            if not claimed:
+                return outputs
+
+            # 2-3. Model calls in parallel; the slowest email bounds the batch
+            with ThreadPoolExecutor(max_workers=min(self._max_concurrency, len(claimed))) as pool:
+                generated = list(pool.map(lambda i: self._generate_traced(email_tasks[i]), claimed))
+
+            pending = []
+            for i, (output, draft) in zip(claimed, generated):
+                outputs[i] = output
+                if draft is not None:
+                    pending.append((i, draft))
+
+            # 4. Create all drafts in one provider batch
+            if pending:
+                with tracer.start_as_current_span("create_drafts") as draft_span:
+                    draft_span.set_attribute("drafts.count", len(pending))
+                    try:
+                        draft_ids = self._mail_provider.create_drafts([d for _, d in pending])
+                    except Exception as e:
+                        draft_span.record_exception(e)
+                        draft_span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+                        draft_ids = [None] * len(pending)
+                for (i, _), draft_id in zip(pending, draft_ids):
+                    if draft_id:
+                        outputs[i] = AgentOutput(status=Status.SUCCESS, draft_id=draft_id)
+                    else:
+                        outputs[i] = AgentOutput(status=Status.FAILURE)
+
+            done = [email_tasks[i].email_id for i in claimed if outputs[i].status != Status.FAILURE]
+            if done:
+                self._idempotency_guard.mark_done(done)
+            failed = [email_tasks[i].email_id for i in claimed if outputs[i].status == Status.FAILURE]
+            if failed:
+                self._idempotency_guard.release(failed)
+            return outputs
@@ -0,0 +1,201 @@
+"""
+Local triage run before any email reaches the model.
+
+Two stages, both on CPU and in-process:
+
+1. Rules that identify mail nobody replies to: mailing-list and bulk
+   headers (List-Unsubscribe, List-Id, Precedence), auto-replies
+   (Auto-Submitted, X-Autoreply, "Out of Office" subjects), no-reply
+   senders and known bulk-sending domains.
+2. Optionally, a logistic regression over hashed features (sender,
+   subject and body tokens, header presence), loaded from
+   TRIAGE_MODEL_PATH. Only mail it scores below the threshold is skipped.
+
+Only the rules run in production today. Nothing in this service records
+whether drafts were kept or discarded, and nothing trains or exports
+the classifier. TRIAGE_MODEL_PATH takes weights saved with
+HashedLogisticRegression.save from labelled examples gathered elsewhere.
+Features are hashed, so such examples can be stored as feature vectors
+without retaining any email text.
+"""
+import json
+import math
+import os
+import re
+import zlib
+from email.utils import parseaddr
+from typing import Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+
+from src.shared.schema import EmailTask
+
+N_FEATURES = 2 ** 18
+# Skip only mail the classifier is fairly sure is not worth a reply
+DEFAULT_THRESHOLD = 0.2
+BODY_CHARS = 2000
+
+NO_REPLY_LOCAL_PARTS = re.compile(
+    r'^(no-?reply|do-?not-?reply|notifications?|alerts?|mailer-daemon|postmaster|bounces?)([+._-].*)?$'
+)
+AUTO_REPLY_SUBJECT = re.compile(
+    r'^\s*(automatic reply|auto(matic)?[- ]?response|auto:|out of (the )?office|undeliverable|delivery status notification)',
+    re.IGNORECASE
+)
+BULK_PRECEDENCE = {'bulk', 'list', 'junk'}
+BULK_SENDER_DOMAINS = frozenset({
+    'mailchimpapp.net', 'mcsv.net', 'mcdlv.net', 'sendgrid.net', 'amazonses.com',
+    'hubspotemail.net', 'mktomail.com', 'exacttarget.com', 'substack.com',
+    'mailgun.org', 'sparkpostmail.com', 'constantcontact.com', 'klaviyomail.com',
+})
+
+_TOKEN = re.compile(r"[a-z0-9']{2,}")
+
+
+class TriageResult(BaseModel):
+    reply_worthy: bool
+    reason: str
+    score: Optional[float] = None
+
+
+def _domain_matches(domain: str, domains: Iterable[str]) -> bool:
+    return any(domain == d or domain.endswith('.' + d) for d in domains)
+
+
+def featurize(email_task: EmailTask, n_features: int = N_FEATURES) -> Dict[int, float]:
+    """Hashed, L2-normalised bag of sender/subject/body/header features."""
+    address = parseaddr(email_task.sender)[1].lower()
+    local, _, domain = address.partition('@')
+
+    tokens = [f"d:{domain}", f"l:{local}"]
+    tokens += [f"h:{name}" for name in email_task.headers]
+    tokens += [f"s:{t}" for t in _TOKEN.findall((email_task.subject or '').lower())]
+    body = email_task.body[:BODY_CHARS].lower()
+    tokens += [f"b:{t}" for t in _TOKEN.findall(body)]
+    tokens.append(f"len:{min(int(math.log2(len(email_task.body) + 1)), 16)}")
+    if '?' in body:
+        tokens.append("q:question")
+    tokens.append(f"links:{min(body.count('http'), 5)}")
+
+    features: Dict[int, float] = {}
+    for token in tokens:
+        h = zlib.crc32(token.encode('utf-8'))
+        index = h % n_features
+        features[index] = features.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {i: v / norm for i, v in features.items() if v}
+
+
+class HashedLogisticRegression:
+    """
+    Sparse logistic regression over hashed features, trained with SGD.
+    Label 1 = reply-worthy (draft kept), 0 = not (draft discarded).
+    """
+
+    def __init__(
+        self,
+        n_features: int = N_FEATURES,
+        weights: Optional[Dict[int, float]] = None,
+        bias: float = 0.0,
+        learning_rate: float = 0.5,
+        l2: float = 1e-5
+    ):
+        self.n_features = n_features
+        self.weights: Dict[int, float] = dict(weights or {})
+        self.bias = bias
+        self.learning_rate = learning_rate
+        self.l2 = l2
+
+    def predict_proba(self, features: Dict[int, float]) -> float:
+        z = self.bias + sum(self.weights.get(i, 0.0) * v for i, v in features.items())
+        z = max(min(z, 35.0), -35.0)
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def partial_fit(self, examples: Iterable[Tuple[Dict[int, float], int]], epochs: int = 1) -> None:
+        examples = list(examples)
+        for _ in range(epochs):
+            for features, label in examples:
+                gradient = self.predict_proba(features) - label
+                step = self.learning_rate * gradient
+                for i, v in features.items():
+                    w = self.weights.get(i, 0.0)
+                    self.weights[i] = w - step * v - self.learning_rate * self.l2 * w
+                self.bias -= step
+
+    def to_dict(self) -> dict:
+        return {
+            'n_features': self.n_features,
+            'bias': self.bias,
+            'weights': {str(i): w for i, w in self.weights.items() if w},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'HashedLogisticRegression':
+        return cls(
+            n_features=data['n_features'],
+            weights={int(i): w for i, w in data['weights'].items()},
+            bias=data['bias'],
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'HashedLogisticRegression':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+class EmailTriage:
+    """Decides, without calling the model, whether an email deserves a draft."""
+
+    def __init__(
+        self,
+        classifier: Optional[HashedLogisticRegression] = None,
+        threshold: float = DEFAULT_THRESHOLD,
+        bulk_domains: Iterable[str] = BULK_SENDER_DOMAINS
+    ):
+        self._classifier = classifier
+        self._threshold = threshold
+        self._bulk_domains = frozenset(bulk_domains)
+
+    @classmethod
+    def from_env(cls) -> 'EmailTriage':
+        """Rules plus the classifier at TRIAGE_MODEL_PATH, if configured."""
+        path = os.environ.get('TRIAGE_MODEL_PATH')
+        classifier = HashedLogisticRegression.load(path) if path else None
+        threshold = float(os.environ.get('TRIAGE_THRESHOLD', DEFAULT_THRESHOLD))
+        return cls(classifier=classifier, threshold=threshold)
+
+    def _rule(self, email_task: EmailTask) -> Optional[str]:
+        headers = email_task.headers
+        if 'list-unsubscribe' in headers or 'list-id' in headers:
+            return "mailing_list"
+        if headers.get('precedence', '').strip().lower() in BULK_PRECEDENCE:
+            return "bulk_precedence"
+        auto_submitted = headers.get('auto-submitted', '').strip().lower()
+        if (auto_submitted and auto_submitted != 'no') or 'x-autoreply' in headers or 'x-autorespond' in headers:
+            return "auto_reply"
+        if email_task.subject and AUTO_REPLY_SUBJECT.match(email_task.subject):
+            return "auto_reply"
+
+        address = parseaddr(email_task.sender)[1].lower()
+        local, _, domain = address.partition('@')
+        if NO_REPLY_LOCAL_PARTS.match(local):
+            return "no_reply_sender"
+        if domain and _domain_matches(domain, self._bulk_domains):
+            return "bulk_sender"
+        return None
+
+    def assess(self, email_task: EmailTask) -> TriageResult:
+        reason = self._rule(email_task)
+        if reason:
+            return TriageResult(reply_worthy=False, reason=reason)
+        if self._classifier is None:
+            return TriageResult(reply_worthy=True, reason="rules_passed")
+
+        score = self._classifier.predict_proba(featurize(email_task, self._classifier.n_features))
+        if score < self._threshold:
+            return TriageResult(reply_worthy=False, reason="classifier", score=score)
+        return TriageResult(reply_worthy=True, reason="classifier", score=score)
@@ -16,6 +16,7 @@ from msal import ConfidentialClientApplication
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 
 from src.shared.schema import TokenEncryption
+from src.shared.sharding import shard_bucket
 
 app = FastAPI(
     title="Communication Agent - User Onboarding",
@@ -246,10 +247,11 @@ async def google_callback(code: str, state: str, request: Request, response: Res
         
         if existing:
             doc_id = existing[0].id
-            users_ref.document(doc_id).update(user_data)
+            users_ref.document(doc_id).update({**user_data, 'shard_bucket': shard_bucket(doc_id)})
         else:
-            doc_ref = users_ref.add(user_data)
-            doc_id = doc_ref[1].id
+            doc_ref = users_ref.document()
+            doc_ref.set({**user_data, 'shard_bucket': shard_bucket(doc_ref.id)})
+            doc_id = doc_ref.id
         
         return {
             "status": "success",
@@ -355,10 +357,11 @@ async def outlook_callback(code: str, state: str, request: Request, response: Re
         
         if existing:
             doc_id = existing[0].id
-            users_ref.document(doc_id).update(user_data)
+            users_ref.document(doc_id).update({**user_data, 'shard_bucket': shard_bucket(doc_id)})
         else:
-            doc_ref = users_ref.add(user_data)
-            doc_id = doc_ref[1].id
+            doc_ref = users_ref.document()
+            doc_ref.set({**user_data, 'shard_bucket': shard_bucket(doc_ref.id)})
+            doc_id = doc_ref.id
         
         return {
             "status": "success",
@@ -12,7 +12,48 @@ from googleapiclient.errors import HttpError
 from googleapiclient.discovery import build, Resource
 
 from src.shared.interfaces import MailProvider
-from src.shared.schema import EmailTask
+from src.shared.schema import EmailTask, TRIAGE_HEADERS
+
+
+# Gmail allows up to 100 sub-requests per batch HTTP call
+BATCH_LIMIT = 100
+LIST_PAGE_SIZE = 500
+DEFAULT_MAX_MESSAGES = 100
+# Draft inserts are rate limited more tightly than reads; Gmail advises
+# keeping batches of writes to 50 or fewer
+DRAFT_BATCH_LIMIT = 50
+
+# Field masks: only the parts of each resource the agent actually uses
+LIST_FIELDS = 'messages(id,threadId),nextPageToken'
+HISTORY_FIELDS = 'history(messagesAdded(message(id,threadId,labelIds))),nextPageToken,historyId'
+_PART_FIELDS = 'mimeType,body/data'
+MESSAGE_FIELDS = (
+    f'id,threadId,historyId,snippet,'
+    f'payload(headers,{_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS})))'
+)
+METADATA_FIELDS = 'id,threadId,historyId,snippet,payload/headers'
+METADATA_HEADERS = ['From', 'Subject', *TRIAGE_HEADERS]
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+
+def refresh_google_token(client_id: str, client_secret: str, refresh_token: str) -> Dict[str, Any]:
+    """
+    Exchange a Google OAuth refresh token for a new access token.
+    
+    Returns:
+        The token response (access_token, expires_in, ...).
+        
+    Raises:
+        requests.HTTPError: If token refresh fails.
+    """
+    response = requests.post(GOOGLE_TOKEN_URL, data={
+        'client_id': client_id,
+        'client_secret': client_secret,
+        'refresh_token': refresh_token,
+        'grant_type': 'refresh_token'
+    })
+    response.raise_for_status()
+    return response.json()
 
 
 class GmailProvider(MailProvider):
@@ -20,9 +61,23 @@ class GmailProvider(MailProvider):
     Gmail implementation of the MailProvider interface.
     
     Uses the Gmail API to fetch unread emails and create draft responses.
+    
+    With a stored historyId an inbox check takes two round trips: one
+    history call returning only messages added since the last sync, then
+    one batch HTTP request fetching up to 100 messages with a field mask.
+    The first sync lists `is:unread` instead. Persist get_history_id() and
+    pass it to the next provider to resume incremental sync.
     """
     
-    def __init__(self, gmail_service: Resource = None, client_id: str = None, client_secret: str = None):
+    def __init__(
+        self,
+        gmail_service: Resource = None,
+        client_id: str = None,
+        client_secret: str = None,
+        history_id: Optional[str] = None,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+        include_body: bool = True,
+    ):
         """
         Initialize the Gmail provider.
         
@@ -30,6 +85,11 @@ class GmailProvider(MailProvider):
             gmail_service: An authenticated Gmail API service resource.
             client_id: Google OAuth client ID (for token refresh).
             client_secret: Google OAuth client secret (for token refresh).
+            history_id: historyId from the previous sync; enables incremental fetch.
+            max_messages: Upper bound on messages returned per fetch.
+            include_body: Fetch plain-text bodies in the batch. If False, only
+                metadata is fetched and EmailTask.body holds the snippet; load
+                bodies on demand with fetch_bodies().
         """
         if gmail_service is None:
             self._gmail_service = build('gmail', 'v1')
@@ -40,55 +100,239 @@ class GmailProvider(MailProvider):
         self._client_secret = client_secret
         self._needs_refresh = False
         self._new_access_token = None
+        self._history_id = history_id
+        self._max_messages = max_messages
+        self._include_body = include_body
+        self._backlog_truncated = False
     
     def fetch_unread(self) -> List[EmailTask]:
         """
         Fetch unread emails from Gmail.
         
+        Uses history-based incremental sync when a historyId is known,
+        falling back to an `is:unread` listing (paginated up to
+        max_messages) on first sync or when the historyId has expired.
+        
         Returns:
             A list of EmailTask objects representing unread emails.
             
         Raises:
             HttpError: If API call fails with 401, sets needs_refresh flag.
         """
+        start_history_id = self._history_id
         try:
-            results = self._gmail_service.users().messages().list(
-                userId='me',
-                q='is:unread',
-                maxResults=10
-            ).execute()
-            
-            messages = results.get('messages', [])
-            email_tasks = []
-            
-            for message in messages:
-                msg_id = message['id']
-                
-                msg = self._gmail_service.users().messages().get(
-                    userId='me',
-                    id=msg_id,
-                    format='full'
+            refs = None
+            if self._history_id:
+                refs = self._list_added_since(self._history_id)
+            incremental = refs is not None
+            if not incremental:
+                # Snapshot the mailbox position before listing, so anything
+                # arriving mid-fetch is picked up by the next history sync
+                profile = self._gmail_service.users().getProfile(
+                    userId='me', fields='historyId'
                 ).execute()
-                
-                headers = msg['payload']['headers']
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), 'unknown')
-                thread_id = msg['threadId']
-                body = self._extract_body(msg['payload'])
-                
-                email_task = EmailTask(
-                    email_id=msg_id,
-                    thread_id=thread_id,
-                    body=body,
-                    sender=sender
+                refs = self._list_unread()
+                # Start incremental sync only once the unread backlog fits in one fetch
+                if not self._backlog_truncated:
+                    self._history_id = profile.get('historyId')
+            
+            if self._include_body:
+                messages = self._batch_get(
+                    [ref['id'] for ref in refs], format='full', fields=MESSAGE_FIELDS
+                )
+            else:
+                messages = self._batch_get(
+                    [ref['id'] for ref in refs], format='metadata',
+                    metadataHeaders=METADATA_HEADERS, fields=METADATA_FIELDS
                 )
-                email_tasks.append(email_task)
+            
+            email_tasks = []
+            for ref in refs:
+                msg = messages.get(ref['id'])
+                if msg is None:
+                    continue
+                if incremental:
+                    self._advance_history_id(msg.get('historyId'))
+                email_tasks.append(self._to_email_task(msg))
             
             return email_tasks
             
+        except HttpError as e:
+            # Don't move the sync cursor past messages that were never returned
+            self._history_id = start_history_id
+            if e.resp.status == 401:
+                self._needs_refresh = True
+            raise
+    
+    def fetch_bodies(self, email_ids: List[str]) -> Dict[str, str]:
+        """
+        Fetch plain-text bodies for the given messages in batch requests.
+        Use with include_body=False to download MIME content only for
+        messages that are going to be processed.
+        """
+        try:
+            messages = self._batch_get(email_ids, format='full', fields=MESSAGE_FIELDS)
+        except HttpError as e:
+            if e.resp.status == 401:
+                self._needs_refresh = True
+            raise
+        return {msg_id: self._extract_body(msg['payload']) for msg_id, msg in messages.items()}
+    
+    def get_history_id(self) -> Optional[str]:
+        """historyId to persist and pass to the next provider for incremental sync."""
+        return self._history_id
+
+    def watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Start (or renew) push notifications for the mailbox via users.watch.
+
+        Gmail publishes {"emailAddress", "historyId"} to the Pub/Sub topic
+        whenever the watched labels change. A watch lasts up to 7 days and
+        calling watch again simply extends it.
+
+        Args:
+            topic_name: Full topic name, e.g. projects/<project>/topics/<topic>.
+            label_ids: Labels to watch (defaults to INBOX).
+
+        Returns:
+            The watch response: historyId and expiration (epoch millis).
+
+        Raises:
+            HttpError: If API call fails with 401, sets needs_refresh flag.
+        """
+        try:
+            return self._gmail_service.users().watch(
+                userId='me',
+                body={
+                    'topicName': topic_name,
+                    'labelIds': label_ids or ['INBOX'],
+                    'labelFilterBehavior': 'INCLUDE',
+                }
+            ).execute()
+        except HttpError as e:
+            if e.resp.status == 401:
+                self._needs_refresh = True
+            raise
+
+    def stop_watch(self) -> None:
+        """Stop push notifications for the mailbox."""
+        try:
+            self._gmail_service.users().stop(userId='me').execute()
         except HttpError as e:
             if e.resp.status == 401:
                 self._needs_refresh = True
             raise
+
+    def _list_unread(self) -> List[dict]:
+        """Page through `is:unread` message IDs up to max_messages."""
+        refs: List[dict] = []
+        page_token = None
+        while len(refs) < self._max_messages:
+            results = self._gmail_service.users().messages().list(
+                userId='me',
+                q='is:unread',
+                maxResults=min(LIST_PAGE_SIZE, self._max_messages - len(refs)),
+                pageToken=page_token,
+                fields=LIST_FIELDS
+            ).execute()
+            refs.extend(results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        self._backlog_truncated = page_token is not None
+        return refs[:self._max_messages]
+    
+    def _list_added_since(self, start_history_id: str) -> Optional[List[dict]]:
+        """
+        Unread inbox messages added since `start_history_id`.
+        Returns None if the historyId is too old (404) and a full list is needed.
+        """
+        refs: List[dict] = []
+        seen = set()
+        page_token = None
+        try:
+            while True:
+                results = self._gmail_service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',
+                    maxResults=LIST_PAGE_SIZE,
+                    pageToken=page_token,
+                    fields=HISTORY_FIELDS
+                ).execute()
+                for record in results.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        message = added['message']
+                        if 'UNREAD' in message.get('labelIds', []) and message['id'] not in seen:
+                            seen.add(message['id'])
+                            refs.append(message)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    # Fully caught up: resume from the mailbox's current historyId
+                    self._advance_history_id(results.get('historyId'))
+                    break
+                if len(refs) >= self._max_messages:
+                    # Capped: resume after the last message actually fetched
+                    break
+        except HttpError as e:
+            if e.resp.status == 404:
+                self._history_id = None
+                return None
+            raise
+        return refs[:self._max_messages]
+    
+    def _batch_get(self, message_ids: List[str], **get_kwargs) -> Dict[str, dict]:
+        """Fetch messages via batch HTTP requests of up to 100 sub-requests."""
+        messages: Dict[str, dict] = {}
+        errors: List[HttpError] = []
+        
+        def _callback(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            else:
+                messages[request_id] = response
+        
+        users = self._gmail_service.users()
+        for start in range(0, len(message_ids), BATCH_LIMIT):
+            batch = self._gmail_service.new_batch_http_request(callback=_callback)
+            for msg_id in message_ids[start:start + BATCH_LIMIT]:
+                batch.add(
+                    users.messages().get(userId='me', id=msg_id, **get_kwargs),
+                    request_id=msg_id
+                )
+            batch.execute()
+        
+        # Messages deleted between list and get (404) are skipped; anything
+        # else, notably an expired token, fails the fetch.
+        for error in errors:
+            if not (isinstance(error, HttpError) and error.resp.status == 404):
+                raise error
+        return messages
+    
+    def _advance_history_id(self, history_id: Optional[str]) -> None:
+        if history_id and (self._history_id is None or int(history_id) > int(self._history_id)):
+            self._history_id = str(history_id)
+    
+    def _to_email_task(self, msg: dict) -> EmailTask:
+        headers = msg['payload'].get('headers', [])
+        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'unknown')
+        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), None)
+        triage_headers = {
+            h['name'].lower(): h['value'] for h in headers if h['name'].lower() in TRIAGE_HEADERS
+        }
+        if self._include_body:
+            body = self._extract_body(msg['payload'])
+        else:
+            body = msg.get('snippet', '')
+        return EmailTask(
+            email_id=msg['id'],
+            thread_id=msg['threadId'],
+            body=body,
+            sender=sender,
+            subject=subject,
+            headers=triage_headers
+        )
     
     def create_draft(self, recipient: str, subject: str, body: str) -> str:
         """
@@ -105,22 +349,10 @@ class GmailProvider(MailProvider):
         Raises:
             HttpError: If API call fails with 401, sets needs_refresh flag.
         """
-        from email.mime.text import MIMEText
-        
         try:
-            message = MIMEText(body)
-            message['to'] = recipient
-            message['subject'] = subject
-            
-            create_message = {
-                'message': {
-                    'raw': base64.urlsafe_b64encode(message.as_bytes()).decode(),
-                }
-            }
-            
             draft = self._gmail_service.users().drafts().create(
                 userId='me',
-                body=create_message
+                body=self._draft_body(recipient, subject, body)
             ).execute()
             
             return draft['id']
@@ -130,6 +362,59 @@ class GmailProvider(MailProvider):
                 self._needs_refresh = True
             raise
     
+    def create_drafts(self, drafts: List[Dict[str, str]]) -> List[Optional[str]]:
+        """
+        Create many drafts through batch HTTP requests (DRAFT_BATCH_LIMIT per call).
+        
+        Args:
+            drafts: Dicts with recipient, subject and body keys.
+            
+        Returns:
+            Draft IDs in input order; None where a sub-request failed.
+            
+        Raises:
+            HttpError: If any sub-request returns 401 (sets needs_refresh flag).
+        """
+        draft_ids: List[Optional[str]] = [None] * len(drafts)
+        errors: List[HttpError] = []
+        
+        def _callback(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            else:
+                draft_ids[int(request_id)] = response['id']
+        
+        users = self._gmail_service.users()
+        for start in range(0, len(drafts), DRAFT_BATCH_LIMIT):
+            batch = self._gmail_service.new_batch_http_request(callback=_callback)
+            for i, d in enumerate(drafts[start:start + DRAFT_BATCH_LIMIT], start):
+                batch.add(
+                    users.drafts().create(
+                        userId='me', body=self._draft_body(d['recipient'], d['subject'], d['body'])
+                    ),
+                    request_id=str(i)
+                )
+            batch.execute()
+        
+        for error in errors:
+            if isinstance(error, HttpError) and error.resp.status == 401:
+                self._needs_refresh = True
+                raise error
+        return draft_ids
+    
+    @staticmethod
+    def _draft_body(recipient: str, subject: str, body: str) -> dict:
+        from email.mime.text import MIMEText
+        
+        message = MIMEText(body)
+        message['to'] = recipient
+        message['subject'] = subject
+        return {
+            'message': {
+                'raw': base64.urlsafe_b64encode(message.as_bytes()).decode(),
+            }
+        }
+    
     def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """
         Refresh the access token using the refresh token.
@@ -143,19 +428,7 @@ class GmailProvider(MailProvider):
         Raises:
             requests.HTTPError: If token refresh fails.
         """
-        token_url = "https://oauth2.googleapis.com/token"
-        
-        data = {
-            'client_id': self._client_id,
-            'client_secret': self._client_secret,
-            'refresh_token': refresh_token,
-            'grant_type': 'refresh_token'
-        }
-        
-        response = requests.post(token_url, data=data)
-        response.raise_for_status()
-        
-        token_data = response.json()
+        token_data = refresh_google_token(self._client_id, self._client_secret, refresh_token)
         
         # Store new access token for worker to persist
         self._new_access_token = token_data['access_token']
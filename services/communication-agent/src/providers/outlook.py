@@ -3,13 +3,103 @@ Outlook/Microsoft 365 provider implementation using the MailProvider interface.
 
 This module implements the Outlook-specific logic for fetching emails
 and creating drafts using the Microsoft Graph API with MSAL authentication.
+
+Inbox checks use Graph delta queries: the first sync pages through the
+inbox (bounded by INITIAL_SYNC_DAYS) and every later check replays the
+persisted deltaLink, so only changes are transferred. Requests share a
+pooled requests.Session, bodies are requested as plain text, and drafts
+can be created 20 at a time through JSON $batch. subscribe() registers a
+Graph change-notification webhook so checks can be triggered by new mail.
 """
+import datetime
+import hashlib
 from typing import List, Optional, Dict, Any
 import requests
 import msal
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from src.shared.interfaces import MailProvider
-from src.shared.schema import EmailTask
+from src.shared.schema import EmailTask, TRIAGE_HEADERS
+
+# Graph JSON batching accepts at most 20 sub-requests per call
+BATCH_LIMIT = 20
+PAGE_SIZE = 50
+INITIAL_SYNC_DAYS = 7
+MESSAGE_SELECT = 'id,conversationId,from,subject,body,isRead,internetMessageHeaders'
+# Longest lifetime Graph allows for message subscriptions (just under 7 days)
+SUBSCRIPTION_MAX_MINUTES = 10070
+
+_session: Optional[requests.Session] = None
+_msal_apps: Dict[tuple, msal.ConfidentialClientApplication] = {}
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide pooled session for Graph calls (keep-alive connections
+    reused across mailboxes). Idempotent requests retry on 429/5xx,
+    honouring Retry-After.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=(429, 502, 503, 504),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+        session.mount('https://', adapter)
+        _session = session
+    return _session
+
+
+def get_msal_app(client_id: str, client_secret: str, authority: str) -> msal.ConfidentialClientApplication:
+    """
+    Process-wide MSAL app per app registration. MSAL caches the client
+    credentials token inside the app, so reusing it lets warm instances
+    skip the token request until shortly before the token expires.
+    """
+    key = (client_id, authority, hashlib.sha256((client_secret or '').encode()).hexdigest())
+    app = _msal_apps.get(key)
+    if app is None:
+        app = _msal_apps[key] = msal.ConfidentialClientApplication(
+            client_id=client_id,
+            client_credential=client_secret,
+            authority=authority
+        )
+    return app
+
+
+def refresh_microsoft_token(
+    client_id: str,
+    client_secret: str,
+    tenant_id: str,
+    refresh_token: str,
+    scopes: List[str]
+) -> Dict[str, Any]:
+    """
+    Exchange a Microsoft identity platform refresh token for a new access token.
+    
+    Returns:
+        The token response (access_token, expires_in, ...).
+        
+    Raises:
+        requests.HTTPError: If token refresh fails.
+    """
+    response = requests.post(
+        f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token",
+        data={
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token',
+            'scope': ' '.join(scopes)
+        }
+    )
+    response.raise_for_status()
+    return response.json()
 
 
 class OutlookProvider(MailProvider):
@@ -18,6 +108,9 @@ class OutlookProvider(MailProvider):
     
     Uses the Microsoft Graph API to fetch unread emails and create draft responses.
     Authenticates using MSAL (Microsoft Authentication Library) with client credentials flow.
+    
+    Pass the deltaLink from get_delta_link() into the next provider for the
+    same mailbox to resume incremental sync.
     """
     
     GRAPH_API_BASE = "https://graph.microsoft.com/v1.0"
@@ -29,7 +122,9 @@ class OutlookProvider(MailProvider):
         client_id: str,
         client_secret: str,
         tenant_id: str,
-        target_user_email: str
+        target_user_email: str,
+        delta_link: Optional[str] = None,
+        session: Optional[requests.Session] = None
     ):
         """
         Initialize the Outlook provider with MSAL authentication.
@@ -39,22 +134,22 @@ class OutlookProvider(MailProvider):
             client_secret: Azure AD application client secret.
             tenant_id: Azure AD tenant ID.
             target_user_email: Email address of the user whose mailbox to access.
+            delta_link: deltaLink from the previous sync; enables incremental fetch.
+            session: HTTP session to use (defaults to the shared pooled session).
         """
         self._client_id = client_id
         self._client_secret = client_secret
         self._tenant_id = tenant_id
         self._target_user_email = target_user_email
         
-        # Initialize MSAL confidential client application
-        authority = f"{self.AUTHORITY_BASE}/{tenant_id}"
-        self._msal_app = msal.ConfidentialClientApplication(
-            client_id=client_id,
-            client_credential=client_secret,
-            authority=authority
-        )
+        # MSAL confidential client application (shared, so its token cache
+        # survives across providers for the same app registration)
+        self._msal_app = get_msal_app(client_id, client_secret, f"{self.AUTHORITY_BASE}/{tenant_id}")
         
         self._needs_refresh = False
         self._new_access_token = None
+        self._delta_link = delta_link
+        self._session = session or get_session()
     
     def _get_headers(self) -> dict:
         """
@@ -83,7 +178,13 @@ class OutlookProvider(MailProvider):
     
     def fetch_unread(self) -> List[EmailTask]:
         """
-        Fetch unread emails from Outlook using Microsoft Graph API.
+        Fetch unread emails from Outlook using a Microsoft Graph delta query.
+        
+        With a stored deltaLink only messages created or changed since the
+        last sync are returned. Otherwise (or when Graph reports the sync
+        state expired) a fresh delta round is started over the last
+        INITIAL_SYNC_DAYS of the inbox. Read messages and deletions in the
+        delta are skipped.
         
         Returns:
             A list of EmailTask objects representing unread emails.
@@ -93,28 +194,143 @@ class OutlookProvider(MailProvider):
             requests.RequestException: If the API request fails (401 sets needs_refresh).
         """
         try:
-            headers = self._get_headers()
-            endpoint = f"{self.GRAPH_API_BASE}/users/{self._target_user_email}/messages"
-            
-            params = {
-                '$filter': 'isRead eq false',
-                '$top': 10,
-                '$select': 'id,conversationId,subject,from,body'
+            headers = {
+                **self._get_headers(),
+                'Prefer': f'outlook.body-content-type="text", odata.maxpagesize={PAGE_SIZE}'
             }
             
-            response = requests.get(endpoint, headers=headers, params=params)
-            response.raise_for_status()
+            messages = None
+            if self._delta_link:
+                messages = self._read_delta(self._delta_link, None, headers)
+            if messages is None:
+                since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=INITIAL_SYNC_DAYS)
+                endpoint = f"{self.GRAPH_API_BASE}/users/{self._target_user_email}/mailFolders/inbox/messages/delta"
+                params = {
+                    '$select': MESSAGE_SELECT,
+                    '$filter': f"receivedDateTime ge {since.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+                }
+                messages = self._read_delta(endpoint, params, headers)
             
-            data = response.json()
-            messages = data.get('value', [])
-            
-            return self._parse_messages(messages)
+            unread = [
+                msg for msg in messages
+                if '@removed' not in msg and msg.get('isRead') is False
+            ]
+            return self._parse_messages(unread)
             
         except requests.HTTPError as e:
             if e.response.status_code == 401:
                 self._needs_refresh = True
             raise
     
+    def _read_delta(self, url: str, params: Optional[dict], headers: dict) -> Optional[List[dict]]:
+        """
+        Follow @odata.nextLink pages to the closing @odata.deltaLink.
+        The new deltaLink is only kept once the round completes. Returns
+        None if the stored deltaLink itself has expired (410) and a full
+        resync is needed; a 410 on any other page is raised.
+        """
+        messages: List[dict] = []
+        while True:
+            response = self._session.get(url, headers=headers, params=params)
+            if response.status_code == 410 and self._delta_link and url == self._delta_link:
+                self._delta_link = None
+                return None
+            response.raise_for_status()
+            
+            data = response.json()
+            messages.extend(data.get('value', []))
+            if '@odata.nextLink' in data:
+                # Continuation links already carry the query
+                url, params = data['@odata.nextLink'], None
+                continue
+            self._delta_link = data.get('@odata.deltaLink', self._delta_link)
+            return messages
+    
+    def get_delta_link(self) -> Optional[str]:
+        """deltaLink to persist and pass to the next provider for incremental sync."""
+        return self._delta_link
+
+    def subscribe(
+        self,
+        notification_url: str,
+        client_state: str,
+        expires_at: datetime.datetime
+    ) -> Dict[str, Any]:
+        """
+        Create a Graph change-notification subscription for new inbox mail.
+
+        Graph POSTs to notification_url whenever a message is created in the
+        inbox, echoing client_state so the webhook can verify the sender.
+        Mail subscriptions last at most SUBSCRIPTION_MAX_MINUTES.
+
+        Args:
+            notification_url: Public HTTPS webhook receiving notifications.
+            client_state: Shared secret echoed back in every notification.
+            expires_at: Requested expiry (UTC).
+
+        Returns:
+            The subscription resource (id, expirationDateTime, ...).
+
+        Raises:
+            requests.RequestException: If the API request fails (401 sets needs_refresh).
+        """
+        payload = {
+            "changeType": "created",
+            "notificationUrl": notification_url,
+            "resource": f"users/{self._target_user_email}/mailFolders('inbox')/messages",
+            "expirationDateTime": self._graph_expiry(expires_at),
+            "clientState": client_state,
+        }
+        try:
+            response = self._session.post(
+                f"{self.GRAPH_API_BASE}/subscriptions", headers=self._get_headers(), json=payload
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 401:
+                self._needs_refresh = True
+            raise
+
+    def renew_subscription(
+        self,
+        subscription_id: str,
+        expires_at: datetime.datetime
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Extend an existing subscription.
+
+        Returns:
+            The updated subscription, or None if Graph no longer knows it
+            (expired or deleted) and a new one must be created.
+
+        Raises:
+            requests.RequestException: If the API request fails (401 sets needs_refresh).
+        """
+        try:
+            response = self._session.patch(
+                f"{self.GRAPH_API_BASE}/subscriptions/{subscription_id}",
+                headers=self._get_headers(),
+                json={"expirationDateTime": self._graph_expiry(expires_at)}
+            )
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 401:
+                self._needs_refresh = True
+            raise
+
+    @staticmethod
+    def _graph_expiry(expires_at: datetime.datetime) -> str:
+        limit = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            minutes=SUBSCRIPTION_MAX_MINUTES
+        )
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+        return min(expires_at, limit).strftime('%Y-%m-%dT%H:%M:%S.0000000Z')
+
     def create_draft(self, recipient: str, subject: str, body: str) -> str:
         """
         Create a draft email in Outlook using Microsoft Graph API.
@@ -135,22 +351,9 @@ class OutlookProvider(MailProvider):
             headers = self._get_headers()
             endpoint = f"{self.GRAPH_API_BASE}/users/{self._target_user_email}/messages"
             
-            draft_payload = {
-                "subject": subject,
-                "body": {
-                    "contentType": "Text",
-                    "content": body
-                },
-                "toRecipients": [
-                    {
-                        "emailAddress": {
-                            "address": recipient
-                        }
-                    }
-                ]
-            }
-            
-            response = requests.post(endpoint, headers=headers, json=draft_payload)
+            response = self._session.post(
+                endpoint, headers=headers, json=self._draft_payload(recipient, subject, body)
+            )
             response.raise_for_status()
             
             data = response.json()
@@ -161,6 +364,76 @@ class OutlookProvider(MailProvider):
                 self._needs_refresh = True
             raise
     
+    def create_drafts(self, drafts: List[Dict[str, str]]) -> List[Optional[str]]:
+        """
+        Create many drafts through Graph JSON batching (20 per $batch call).
+        
+        Args:
+            drafts: Dicts with recipient, subject and body keys.
+            
+        Returns:
+            Draft message IDs in input order; None where a sub-request failed.
+            
+        Raises:
+            requests.RequestException: If a batch call fails, or any
+                sub-request returns 401 (sets needs_refresh).
+        """
+        draft_ids: List[Optional[str]] = [None] * len(drafts)
+        try:
+            headers = self._get_headers()
+            url = f"/users/{self._target_user_email}/messages"
+            
+            for start in range(0, len(drafts), BATCH_LIMIT):
+                chunk = drafts[start:start + BATCH_LIMIT]
+                batch = {
+                    "requests": [
+                        {
+                            "id": str(start + i),
+                            "method": "POST",
+                            "url": url,
+                            "headers": {"Content-Type": "application/json"},
+                            "body": self._draft_payload(d['recipient'], d['subject'], d['body'])
+                        }
+                        for i, d in enumerate(chunk)
+                    ]
+                }
+                response = self._session.post(f"{self.GRAPH_API_BASE}/$batch", headers=headers, json=batch)
+                response.raise_for_status()
+                
+                for sub in response.json().get('responses', []):
+                    status = sub.get('status')
+                    if status == 401:
+                        self._needs_refresh = True
+                        raise requests.HTTPError(
+                            "401 Unauthorized in $batch sub-request", response=response
+                        )
+                    if 200 <= status < 300:
+                        draft_ids[int(sub['id'])] = sub.get('body', {}).get('id')
+            
+            return draft_ids
+            
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 401:
+                self._needs_refresh = True
+            raise
+    
+    @staticmethod
+    def _draft_payload(recipient: str, subject: str, body: str) -> dict:
+        return {
+            "subject": subject,
+            "body": {
+                "contentType": "Text",
+                "content": body
+            },
+            "toRecipients": [
+                {
+                    "emailAddress": {
+                        "address": recipient
+                    }
+                }
+            ]
+        }
+    
     def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """
         Refresh the access token using the refresh token.
@@ -174,20 +447,9 @@ class OutlookProvider(MailProvider):
         Raises:
             requests.HTTPError: If token refresh fails.
         """
-        token_url = f"https://login.microsoftonline.com/{self._tenant_id}/oauth2/v2.0/token"
-        
-        data = {
-            'client_id': self._client_id,
-            'client_secret': self._client_secret,
-            'refresh_token': refresh_token,
-            'grant_type': 'refresh_token',
-            'scope': ' '.join(self.SCOPES)
-        }
-        
-        response = requests.post(token_url, data=data)
-        response.raise_for_status()
-        
-        token_data = response.json()
+        token_data = refresh_microsoft_token(
+            self._client_id, self._client_secret, self._tenant_id, refresh_token, self.SCOPES
+        )
         
         # Store new access token for worker to persist
         self._new_access_token = token_data['access_token']
@@ -235,12 +497,21 @@ class OutlookProvider(MailProvider):
             if 'body' in msg and msg['body']:
                 body_content = msg['body'].get('content', '')
             
+            # Keep the headers used for triage
+            headers = {
+                h.get('name', '').lower(): h.get('value', '')
+                for h in msg.get('internetMessageHeaders') or []
+                if h.get('name', '').lower() in TRIAGE_HEADERS
+            }
+            
             # Create EmailTask
             email_task = EmailTask(
                 email_id=msg.get('id', ''),
                 thread_id=msg.get('conversationId', ''),
                 body=body_content,
-                sender=sender
+                sender=sender,
+                subject=msg.get('subject'),
+                headers=headers
             )
             email_tasks.append(email_task)
         
@@ -0,0 +1,170 @@
+"""
+Per-process cache of decrypted mail credentials.
+
+Worker instances handle many users over their lifetime. CredentialManager
+keeps each user's decrypted access token in memory until shortly before
+it expires, so warm invocations skip Fernet decryption, and refreshes
+tokens before they lapse instead of after a 401:
+
+- within REFRESH_MARGIN of expiry (or past it) the caller waits for a refresh;
+- within PREFETCH_WINDOW a refresh starts in the background and the
+  still-valid token is returned immediately.
+
+Refreshes for the same user are coalesced: concurrent callers share one
+token request. New tokens are encrypted and persisted to the user document.
+"""
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.cloud import firestore
+
+from src.shared.schema import TokenEncryption, UserModel
+
+REFRESH_MARGIN = timedelta(minutes=2)
+PREFETCH_WINDOW = timedelta(minutes=10)
+
+# (user, refresh_token) -> token response with access_token and expires_in
+RefreshFn = Callable[[UserModel, str], Dict[str, Any]]
+
+
+def _utc(value: Any) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _fingerprint(data: Optional[bytes]) -> Optional[str]:
+    return hashlib.sha256(data).hexdigest() if data else None
+
+
+class CredentialManager:
+    """Decrypt-once, refresh-ahead access tokens keyed by user ID."""
+
+    def __init__(
+        self,
+        firestore_client: firestore.Client,
+        encryption: TokenEncryption,
+        refresh_fn: Optional[RefreshFn] = None,
+        refresh_margin: timedelta = REFRESH_MARGIN,
+        prefetch_window: timedelta = PREFETCH_WINDOW
+    ):
+        """
+        Args:
+            firestore_client: Client used to persist refreshed tokens.
+            encryption: TokenEncryption for the stored credentials.
+            refresh_fn: Exchanges a refresh token for a new access token.
+                Users are never refreshed without one (e.g. Outlook app secrets).
+            refresh_margin: Refresh synchronously when this close to expiry.
+            prefetch_window: Refresh in the background when this close to expiry.
+        """
+        self._users = firestore_client.collection('users')
+        self._encryption = encryption
+        self._refresh_fn = refresh_fn
+        self._refresh_margin = refresh_margin
+        self._prefetch_window = prefetch_window
+        self._lock = threading.Lock()
+        # user_id -> (fingerprint of encrypted token, token, expires_at)
+        self._tokens: Dict[str, Tuple[Optional[str], str, Optional[datetime]]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-refresh")
+
+    @property
+    def encryption(self) -> TokenEncryption:
+        return self._encryption
+
+    def _can_refresh(self, user: UserModel) -> bool:
+        return self._refresh_fn is not None and bool(user.refresh_token_encrypted)
+
+    def get_access_token(self, user: UserModel) -> str:
+        """
+        Valid access token for the user, refreshing it first if it is
+        expired or about to expire.
+        """
+        fingerprint = _fingerprint(user.access_token_encrypted)
+        with self._lock:
+            cached = self._tokens.get(user.id)
+        if cached and cached[0] == fingerprint:
+            _, token, expires_at = cached
+        else:
+            token = self._encryption.decrypt(user.access_token_encrypted)
+            expires_at = _utc(user.expires_at)
+            with self._lock:
+                self._tokens[user.id] = (fingerprint, token, expires_at)
+
+        if expires_at is None or not self._can_refresh(user):
+            return token
+
+        remaining = expires_at - datetime.now(timezone.utc)
+        if remaining <= self._refresh_margin:
+            return self.refresh(user)
+        if remaining <= self._prefetch_window:
+            self._background.submit(self._refresh_quietly, user)
+        return token
+
+    def refresh(self, user: UserModel) -> str:
+        """
+        Refresh the user's access token, persist it and return it.
+        Concurrent calls for the same user share a single refresh.
+        """
+        with self._lock:
+            future = self._inflight.get(user.id)
+            owner = future is None
+            if owner:
+                future = self._inflight[user.id] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            token = self._do_refresh(user)
+            future.set_result(token)
+            return token
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(user.id, None)
+
+    def _refresh_quietly(self, user: UserModel) -> None:
+        try:
+            self.refresh(user)
+        except Exception as e:
+            # The synchronous path retries once the token is actually due
+            print(f"⚠️ Background token refresh failed for user {user.id}: {e}")
+
+    def _do_refresh(self, user: UserModel) -> str:
+        if not self._can_refresh(user):
+            raise RuntimeError(f"No refresh token available for user {user.id}")
+
+        refresh_token = self._encryption.decrypt(user.refresh_token_encrypted)
+        token_data = self._refresh_fn(user, refresh_token)
+
+        token = token_data['access_token']
+        encrypted = self._encryption.encrypt(token)
+        update = {
+            'access_token_encrypted': encrypted,
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+        expires_at = None
+        if 'expires_in' in token_data:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=token_data['expires_in'])
+            update['expires_at'] = expires_at
+        self._users.document(user.id).update(update)
+
+        # Later lookups with this user object (or a re-read document) hit the cache
+        user.access_token_encrypted = encrypted
+        user.expires_at = expires_at
+        with self._lock:
+            self._tokens[user.id] = (_fingerprint(encrypted), token, expires_at)
+
+        print(f"✅ Token refreshed and persisted for user {user.id}")
+        return token
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's cached token (e.g. after the provider rejected it)."""
+        with self._lock:
+            self._tokens.pop(user_id, None)
@@ -1,10 +1,71 @@
+"""
+Firestore-backed email locks.
+
+Each email gets a lock document keyed by its (deterministic) email ID.
+A lock is created as "processing" with a short TTL and marked "done" once
+the email has been handled; "done" locks are kept for DONE_RETENTION so
+redelivered messages are skipped. An email that failed has its lock
+released so the next check can retry it. A "processing" lock whose TTL
+has passed is stale (the worker died mid-email) and can be claimed again.
+
+Configure a Firestore TTL policy on `expires_at` for the lock collection
+so expired documents are deleted automatically.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Set
+
 from google.cloud import firestore
-from google.api_core.exceptions import AlreadyExists
+
+LOCK_TTL = timedelta(minutes=15)
+DONE_RETENTION = timedelta(days=30)
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+FIRESTORE_BATCH_LIMIT = 500
+
+# gRPC status code returned for create() on an existing document
+_ALREADY_EXISTS = 6
+_MAX_WRITE_ATTEMPTS = 5
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
 
 class IdempotencyGuard:
-    def __init__(self, firestore_client: firestore.Client, collection_name: str = "email_locks"):
+    def __init__(
+        self,
+        firestore_client: firestore.Client,
+        collection_name: str = "email_locks",
+        lock_ttl: timedelta = LOCK_TTL
+    ):
         self._client = firestore_client
         self._collection = self._client.collection(collection_name)
+        self._lock_ttl = lock_ttl
+
+    @staticmethod
+    def lock_id(email_id: str) -> str:
+        """Document ID for an email's lock ('/' is not allowed in IDs)."""
+        if '/' in email_id:
+            return hashlib.sha256(email_id.encode('utf-8')).hexdigest()
+        return email_id
+
+    def _lock_data(self) -> dict:
+        return {
+            "status": STATUS_PROCESSING,
+            "locked_at": firestore.SERVER_TIMESTAMP,
+            "expires_at": _now() + self._lock_ttl,
+        }
+
+    @staticmethod
+    def _is_stale(data: dict, now: datetime) -> bool:
+        data = data or {}
+        expires_at = data.get("expires_at")
+        return (
+            data.get("status") == STATUS_PROCESSING
+            and isinstance(expires_at, datetime)
+            and expires_at < now
+        )
 
     def check_and_lock(self, email_id: str) -> bool:
         """
@@ -14,18 +75,89 @@ class IdempotencyGuard:
             email_id: The unique identifier for the email.
 
         Returns:
-            True if the lock was acquired, False if it already existed.
+            True if the lock was acquired (or taken over from a stale one),
+            False if it already existed.
         """
-        doc_ref = self._collection.document(email_id)
+        doc_ref = self._collection.document(self.lock_id(email_id))
         transaction = self._client.transaction()
 
         @firestore.transactional
         def _transactional_create(transaction, doc_ref):
             snapshot = doc_ref.get(transaction=transaction)
-            if snapshot.exists:
+            if snapshot.exists and not self._is_stale(snapshot.to_dict(), _now()):
                 return False
             else:
-                transaction.create(doc_ref, {"locked_at": firestore.SERVER_TIMESTAMP})
+                transaction.set(doc_ref, self._lock_data())
                 return True
 
         return _transactional_create(transaction, doc_ref)
+
+    def claim_batch(self, email_ids: Iterable[str]) -> Set[str]:
+        """
+        Claim locks for a whole fetched batch.
+
+        All locks are created with one BulkWriter flush (non-atomic, so one
+        conflict does not fail the rest). Conflicting locks are then read
+        together and stale ones taken over transactionally.
+
+        Args:
+            email_ids: Email IDs to lock.
+
+        Returns:
+            The email IDs whose locks were acquired. Emails whose lock
+            could not be written are left out and retried on a later check.
+        """
+        email_ids = list(dict.fromkeys(email_ids))
+        if not email_ids:
+            return set()
+
+        by_lock_id = {self.lock_id(email_id): email_id for email_id in email_ids}
+        conflicts: List[str] = []
+        failed: List[str] = []
+
+        def _on_error(failure, _writer) -> bool:
+            lock_id = failure.operation.reference.id
+            if failure.code == _ALREADY_EXISTS:
+                conflicts.append(lock_id)
+                return False
+            if failure.attempts < _MAX_WRITE_ATTEMPTS:
+                return True
+            failed.append(lock_id)
+            return False
+
+        writer = self._client.bulk_writer()
+        writer.on_write_error(_on_error)
+        lock_data = self._lock_data()
+        for lock_id in by_lock_id:
+            writer.create(self._collection.document(lock_id), lock_data)
+        writer.close()
+
+        claimed = set(email_ids) - {by_lock_id[lock_id] for lock_id in conflicts + failed}
+        if conflicts:
+            now = _now()
+            refs = [self._collection.document(lock_id) for lock_id in conflicts]
+            for snapshot in self._client.get_all(refs):
+                email_id = by_lock_id[snapshot.id]
+                if not snapshot.exists or self._is_stale(snapshot.to_dict(), now):
+                    if self.check_and_lock(email_id):
+                        claimed.add(email_id)
+        return claimed
+
+    def mark_done(self, email_ids: Iterable[str]) -> None:
+        """Mark handled emails' locks as done, keeping them for DONE_RETENTION."""
+        update = {"status": STATUS_DONE, "expires_at": _now() + DONE_RETENTION}
+        lock_ids = [self.lock_id(email_id) for email_id in email_ids]
+        for start in range(0, len(lock_ids), FIRESTORE_BATCH_LIMIT):
+            batch = self._client.batch()
+            for lock_id in lock_ids[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.set(self._collection.document(lock_id), update, merge=True)
+            batch.commit()
+
+    def release(self, email_ids: Iterable[str]) -> None:
+        """Delete the locks of emails that failed, so the next check can claim them."""
+        lock_ids = [self.lock_id(email_id) for email_id in email_ids]
+        for start in range(0, len(lock_ids), FIRESTORE_BATCH_LIMIT):
+            batch = self._client.batch()
+            for lock_id in lock_ids[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.delete(self._collection.document(lock_id))
+            batch.commit()
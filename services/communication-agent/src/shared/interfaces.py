@@ -5,7 +5,7 @@ This module defines the abstract base classes that enable the Adapter Pattern
 for supporting multiple email providers (Gmail, Outlook, etc.).
 """
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional
 
 from src.shared.schema import EmailTask
 
@@ -49,6 +49,22 @@ class MailProvider(ABC):
         """
         pass
 
+    def create_drafts(self, drafts: List[Dict[str, str]]) -> List[Optional[str]]:
+        """
+        Create several drafts. Providers with a batch API override this;
+        the default creates them one at a time.
+        
+        Args:
+            drafts: Dicts with recipient, subject and body keys.
+            
+        Returns:
+            Draft IDs in input order.
+        """
+        return [
+            self.create_draft(recipient=d['recipient'], subject=d['subject'], body=d['body'])
+            for d in drafts
+        ]
+
     @abstractmethod
     def refresh_access_token(self, refresh_token: str) -> dict:
         """
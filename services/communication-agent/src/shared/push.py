@@ -0,0 +1,195 @@
+"""
+Push ingestion: turn mailbox change notifications into worker tasks.
+
+Gmail mailboxes are watched with users.watch, which publishes
+{"emailAddress", "historyId"} to a Pub/Sub topic; Outlook mailboxes get a
+Graph change-notification subscription that POSTs to a webhook. Either
+way, PushRouter maps the notification back to a user and enqueues an
+inbox check for that mailbox only, so idle inboxes cost nothing.
+
+Watches and subscriptions expire after about 7 days. They are created on
+a user's first successful inbox check and renewed by a scheduled job
+before they lapse; while push is active the dispatcher only polls the
+mailbox every PUSH_FALLBACK_INTERVAL_MINUTES as a safety net.
+"""
+import hmac
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from google.cloud import firestore
+
+from src.shared.schema import UserModel
+from src.shared.task_queue import InboxTaskQueue
+
+SUBSCRIPTION_LIFETIME = timedelta(days=7)
+RENEW_BEFORE = timedelta(hours=24)
+# Notifications for one mailbox within this window share a single task
+DEDUPE_WINDOW_S = 30
+PUSH_FALLBACK_INTERVAL_MINUTES = 360
+
+
+def _utc(value: Any) -> Optional[datetime]:
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def push_active(user_data: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """True if the user's watch/subscription is live at `now`."""
+    expires_at = _utc(user_data.get('push_expires_at'))
+    now = now or datetime.now(timezone.utc)
+    return expires_at is not None and expires_at > _utc(now)
+
+
+def needs_renewal(user: UserModel, now: Optional[datetime] = None) -> bool:
+    """True if push was never set up for the user or lapses within RENEW_BEFORE."""
+    expires_at = _utc(user.push_expires_at)
+    now = _utc(now or datetime.now(timezone.utc))
+    return expires_at is None or expires_at - now <= RENEW_BEFORE
+
+
+def subscribe_mailbox(
+    provider,
+    user: UserModel,
+    gmail_topic: Optional[str],
+    notification_url: Optional[str],
+    client_state: Optional[str],
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Start or extend push notifications for a user's mailbox.
+
+    Args:
+        provider: The user's GmailProvider or OutlookProvider.
+        user: The user being subscribed.
+        gmail_topic: Pub/Sub topic for Gmail watches.
+        notification_url: Webhook URL for Graph subscriptions.
+        client_state: Secret Graph echoes back in each notification.
+        now: Current time (UTC).
+
+    Returns:
+        Fields to persist on the user document; empty if push is not
+        configured for the user's provider.
+    """
+    now = _utc(now or datetime.now(timezone.utc))
+
+    if user.provider == "GMAIL":
+        if not gmail_topic:
+            return {}
+        watch = provider.watch(gmail_topic)
+        expires_at = datetime.fromtimestamp(int(watch['expiration']) / 1000, tz=timezone.utc)
+        return {'push_expires_at': expires_at}
+
+    if user.provider == "OUTLOOK":
+        if not (notification_url and client_state):
+            return {}
+        expires_at = now + SUBSCRIPTION_LIFETIME
+        subscription = None
+        if user.push_subscription_id:
+            subscription = provider.renew_subscription(user.push_subscription_id, expires_at)
+        if subscription is None:
+            subscription = provider.subscribe(notification_url, client_state, expires_at)
+        expires_at = datetime.strptime(
+            subscription['expirationDateTime'][:19], '%Y-%m-%dT%H:%M:%S'
+        ).replace(tzinfo=timezone.utc)
+        return {'push_subscription_id': subscription['id'], 'push_expires_at': expires_at}
+
+    return {}
+
+
+class PushRouter:
+    """
+    Maps Gmail and Graph notifications to users and enqueues inbox checks.
+
+    Notifications for inactive users, unknown mailboxes, changes already
+    synced, or (for Graph) with a wrong clientState are dropped.
+    """
+
+    def __init__(
+        self,
+        firestore_client: firestore.Client,
+        task_queue: InboxTaskQueue,
+        dedupe_window_s: int = DEDUPE_WINDOW_S
+    ):
+        self._users = firestore_client.collection('users')
+        self._queue = task_queue
+        self._dedupe_window_s = dedupe_window_s
+
+    def _first(self, query) -> Optional[Any]:
+        for doc in query.limit(1).stream():
+            return doc
+        return None
+
+    def handle_gmail_notification(self, notification: Dict[str, Any]) -> Optional[str]:
+        """
+        Handle one decoded Gmail Pub/Sub message.
+
+        Returns:
+            The user ID a task was enqueued for, or None if dropped/deduplicated.
+        """
+        email = notification.get('emailAddress')
+        if not email:
+            return None
+
+        doc = self._first(
+            self._users.where('email', '==', email).where('provider', '==', 'GMAIL')
+        )
+        if doc is None:
+            print(f"⚠️ Gmail notification for unknown mailbox {email}")
+            return None
+
+        user_data = doc.to_dict()
+        if not user_data.get('is_active', True):
+            return None
+
+        # Pub/Sub redelivers and Gmail may notify for changes the worker
+        # has already read; nothing to do if the cursor is past this point.
+        history_id = notification.get('historyId')
+        synced = user_data.get('gmail_history_id')
+        if history_id and synced and int(history_id) <= int(synced):
+            return None
+
+        if self._queue.enqueue(doc.id, trigger='gmail_push', dedupe_window_s=self._dedupe_window_s):
+            return doc.id
+        return None
+
+    def handle_graph_notifications(
+        self,
+        notifications: Iterable[Dict[str, Any]],
+        client_state: str
+    ) -> List[str]:
+        """
+        Handle the `value` array of a Graph webhook POST. Several
+        notifications for the same subscription collapse into one task.
+
+        Returns:
+            User IDs tasks were enqueued for.
+        """
+        enqueued: List[str] = []
+        seen = set()
+        for notification in notifications:
+            received_state = str(notification.get('clientState') or '')
+            if not hmac.compare_digest(received_state, client_state):
+                print("⚠️ Dropping Graph notification with invalid clientState")
+                continue
+
+            subscription_id = notification.get('subscriptionId')
+            if not subscription_id or subscription_id in seen:
+                continue
+            seen.add(subscription_id)
+
+            doc = self._first(self._users.where('push_subscription_id', '==', subscription_id))
+            if doc is None or not doc.to_dict().get('is_active', True):
+                continue
+
+            if self._queue.enqueue(doc.id, trigger='graph_push', dedupe_window_s=self._dedupe_window_s):
+                enqueued.append(doc.id)
+        return enqueued
+
+    def due_for_renewal(self, now: Optional[datetime] = None) -> Iterable[Any]:
+        """Active users whose watch/subscription lapses within RENEW_BEFORE."""
+        now = _utc(now or datetime.now(timezone.utc))
+        # Note: Requires composite index (is_active, push_expires_at)
+        return self._users.where('is_active', '==', True)\
+                          .where('push_expires_at', '<=', now + RENEW_BEFORE)\
+                          .stream()
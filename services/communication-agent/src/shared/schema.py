@@ -1,7 +1,13 @@
 from enum import Enum
-from typing import Optional, Any
+from typing import Dict, Optional, Any
 from pydantic import BaseModel
 
+# Headers providers keep on EmailTask (lower-cased) for pre-LLM triage
+TRIAGE_HEADERS = (
+    'list-unsubscribe', 'list-id', 'precedence', 'auto-submitted',
+    'x-autoreply', 'x-autorespond', 'x-auto-response-suppress',
+)
+
 class Status(Enum):
     SUCCESS = "success"
     FAILURE = "failure"
@@ -12,6 +18,8 @@ class EmailTask(BaseModel):
     thread_id: str
     body: str
     sender: str
+    subject: Optional[str] = None
+    headers: Dict[str, str] = {}
 
 class AgentOutput(BaseModel):
     status: Status
@@ -30,6 +38,12 @@ class UserModel(BaseModel):
     target_email: Optional[str] = None
     client_id: Optional[str] = None
     tenant_id: Optional[str] = None
+    gmail_history_id: Optional[str] = None
+    outlook_delta_link: Optional[str] = None
+    cursor_holds: int = 0
+    shard_bucket: Optional[int] = None
+    push_subscription_id: Optional[str] = None
+    push_expires_at: Optional[Any] = None
     created_at: Optional[Any] = None
     updated_at: Optional[Any] = None
 
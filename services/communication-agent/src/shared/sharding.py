@@ -0,0 +1,26 @@
+"""
+Dispatcher sharding.
+
+Every user document stores `shard_bucket`, a stable hash of its ID into
+SHARD_BUCKETS buckets, written when the user connects a mailbox and on
+every dispatch. Dispatcher shard i of n owns the buckets b with
+b % n == i and queries only those, so each scheduler job reads its own
+users from Firestore instead of streaming every due user.
+"""
+import zlib
+from typing import List
+
+# Upper bound on shard_count; fixed so stored buckets never need rewriting
+SHARD_BUCKETS = 64
+# Firestore accepts at most 30 values in an `in` filter
+IN_FILTER_LIMIT = 30
+
+
+def shard_bucket(user_id: str) -> int:
+    """Stable bucket for a user ID."""
+    return zlib.crc32(user_id.encode('utf-8')) % SHARD_BUCKETS
+
+
+def shard_buckets(shard: int, shard_count: int) -> List[int]:
+    """Buckets owned by `shard` of `shard_count`."""
+    return [b for b in range(SHARD_BUCKETS) if b % shard_count == shard]
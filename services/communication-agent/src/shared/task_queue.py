@@ -0,0 +1,82 @@
+"""
+Cloud Tasks queue feeding the inbox worker.
+
+Both the scheduled dispatcher and the push handlers enqueue work through
+InboxTaskQueue so every task carries the same payload. Push-triggered
+tasks are named per user and time bucket: Cloud Tasks rejects a second
+task with the same name, which collapses a burst of notifications for one
+mailbox into a single worker run. That task is scheduled for the end of
+its bucket, so it runs after every notification it absorbed.
+"""
+import json
+import re
+import time
+from typing import Optional
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import tasks_v2
+from google.protobuf import timestamp_pb2
+
+# Task names may only contain letters, digits, hyphens and underscores
+_TASK_NAME_UNSAFE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class InboxTaskQueue:
+    """Creates worker tasks of the form {"user_id": ..., "trigger": ...}."""
+
+    def __init__(
+        self,
+        tasks_client: tasks_v2.CloudTasksClient,
+        project_id: str,
+        location: str,
+        queue_name: str,
+        worker_url: str
+    ):
+        self._client = tasks_client
+        self._parent = tasks_client.queue_path(project_id, location, queue_name)
+        self._worker_url = worker_url
+
+    def enqueue(
+        self,
+        user_id: str,
+        trigger: str = 'schedule',
+        dedupe_window_s: Optional[int] = None
+    ) -> bool:
+        """
+        Enqueue an inbox check for a user.
+
+        Args:
+            user_id: Firestore user document ID.
+            trigger: What caused the check (schedule, gmail_push, graph_push).
+            dedupe_window_s: If set, at most one task per user is created
+                in each window of this many seconds, and it runs when the
+                window closes.
+
+        Returns:
+            True if a task was created, False if an identical one already exists.
+        """
+        task = {
+            'http_request': {
+                'http_method': tasks_v2.HttpMethod.POST,
+                'url': self._worker_url,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'user_id': user_id, 'trigger': trigger}).encode()
+            }
+        }
+        
+        # Add OIDC token for authentication if needed
+        # task['http_request']['oidc_token'] = {'service_account_email': ...}
+        
+        if dedupe_window_s:
+            bucket = int(time.time() // dedupe_window_s)
+            safe_id = _TASK_NAME_UNSAFE.sub('_', user_id)
+            task['name'] = f"{self._parent}/tasks/inbox-{safe_id}-{bucket}"
+            # A notification rejected as a duplicate later in the bucket must
+            # still be covered, so the run waits for the bucket to close
+            task['schedule_time'] = timestamp_pb2.Timestamp(seconds=(bucket + 1) * dedupe_window_s)
+
+        try:
+            self._client.create_task(parent=self._parent, task=task)
+        except AlreadyExists:
+            return False
+        return True
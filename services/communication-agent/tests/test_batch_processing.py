@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, Mock
+
+from src.agents.inbox_reader.logic import InboxAgent
+from src.shared.idempotency import IdempotencyGuard
+from src.shared.interfaces import MailProvider
+from src.shared.schema import EmailTask, Status
+
+
+def _task(i):
+    return EmailTask(email_id=f"m{i}", thread_id=f"t{i}", body=f"Body {i}", sender=f"s{i}@example.com")
+
+
+class FakeBulkWriter:
+    """Applies creates to a dict, reporting ALREADY_EXISTS like Firestore."""
+
+    def __init__(self, store):
+        self._store = store
+        self._on_error = None
+        self._ops = []
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def create(self, ref, data):
+        self._ops.append((ref, data))
+
+    def close(self):
+        for ref, data in self._ops:
+            if ref.id in self._store:
+                operation = Mock(reference=ref, attempts=0)
+                self._on_error(Mock(code=6, operation=operation, attempts=0), self)
+            else:
+                self._store[ref.id] = dict(data)
+
+
+class TestClaimBatch(unittest.TestCase):
+    def setUp(self):
+        self.store = {}
+        self.client = MagicMock()
+        collection = self.client.collection.return_value
+        collection.document.side_effect = lambda doc_id: Mock(id=doc_id)
+        self.client.bulk_writer.side_effect = lambda: FakeBulkWriter(self.store)
+
+        def get_all(refs):
+            return [
+                Mock(id=ref.id, exists=ref.id in self.store, to_dict=Mock(return_value=self.store.get(ref.id)))
+                for ref in refs
+            ]
+
+        self.client.get_all.side_effect = get_all
+        self.guard = IdempotencyGuard(self.client)
+        self.guard.check_and_lock = MagicMock(return_value=True)
+
+    def test_conflicts_collected_from_single_bulk_write(self):
+        self.store["m1"] = {"status": "done"}
+
+        claimed = self.guard.claim_batch(["m0", "m1", "m2"])
+
+        self.assertEqual(claimed, {"m0", "m2"})
+        self.client.bulk_writer.assert_called_once()
+        self.guard.check_and_lock.assert_not_called()
+
+    def test_stale_processing_lock_reclaimed(self):
+        expired = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.store["m1"] = {"status": "processing", "expires_at": expired}
+
+        self.assertEqual(self.guard.claim_batch(["m1"]), {"m1"})
+        self.guard.check_and_lock.assert_called_once_with("m1")
+
+    def test_lock_ids_are_valid_document_ids(self):
+        self.assertEqual(IdempotencyGuard.lock_id("abc"), "abc")
+        self.assertNotIn("/", IdempotencyGuard.lock_id("AAMk/xyz=="))
+
+
+class TestProcessBatch(unittest.TestCase):
+    def setUp(self):
+        self.provider = MagicMock(spec=MailProvider)
+        self.provider.create_drafts.side_effect = lambda drafts: [f"draft-{d['recipient']}" for d in drafts]
+        self.model = MagicMock()
+        self.guard = MagicMock(spec=IdempotencyGuard)
+        self.guard.claim_batch.side_effect = lambda ids: set(ids)
+        self.agent = InboxAgent(self.provider, self.model, self.guard, max_concurrency=10)
+
+    def test_model_calls_run_concurrently(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def generate(prompt):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return Mock(text="Reply")
+
+        self.model.generate_content.side_effect = generate
+        tasks = [_task(i) for i in range(10)]
+
+        outputs = self.agent.process_batch(tasks)
+
+        self.assertGreater(max(peak), 1)
+        self.assertTrue(all(o.status == Status.SUCCESS for o in outputs))
+        self.provider.create_drafts.assert_called_once()
+        self.provider.create_draft.assert_not_called()
+        self.guard.mark_done.assert_called_once()
+        self.assertEqual(len(self.guard.mark_done.call_args.args[0]), 10)
+
+    def test_locked_spam_and_failures(self):
+        self.guard.claim_batch.side_effect = lambda ids: set(ids) - {"m0"}
+
+        def generate(prompt):
+            if "Body 1" in prompt:
+                return Mock(text="[SPAM]")
+            if "Body 2" in prompt:
+                raise RuntimeError("model error")
+            return Mock(text="Reply")
+
+        self.model.generate_content.side_effect = generate
+        self.provider.create_drafts.side_effect = lambda drafts: [None]
+
+        outputs = self.agent.process_batch([_task(i) for i in range(4)])
+
+        self.assertEqual(
+            [o.status for o in outputs],
+            [Status.SKIPPED, Status.SKIPPED, Status.FAILURE, Status.FAILURE],
+        )
+        # Only the spam email is marked done; failures are released for the next check
+        self.guard.mark_done.assert_called_once_with(["m1"])
+        self.guard.release.assert_called_once_with(["m2", "m3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from cryptography.fernet import Fernet
+
+from src.shared.credentials import CredentialManager
+from src.shared.schema import TokenEncryption, UserModel
+
+
+class TestCredentialManager(unittest.TestCase):
+    def setUp(self):
+        self.encryption = TokenEncryption(Fernet.generate_key())
+        self.firestore_client = MagicMock()
+        self.refresh_calls = []
+
+        def refresh_fn(user, refresh_token):
+            self.refresh_calls.append(refresh_token)
+            time.sleep(0.2)
+            return {"access_token": f"new-{len(self.refresh_calls)}", "expires_in": 3600}
+
+        self.manager = CredentialManager(self.firestore_client, self.encryption, refresh_fn=refresh_fn)
+
+    def _user(self, expires_in, refresh=True):
+        return UserModel(
+            id="u1",
+            email="a@example.com",
+            provider="GMAIL",
+            access_token_encrypted=self.encryption.encrypt("old"),
+            refresh_token_encrypted=self.encryption.encrypt("refresh") if refresh else None,
+            expires_at=datetime.now(timezone.utc) + expires_in,
+        )
+
+    def test_warm_lookup_skips_decryption(self):
+        user = self._user(timedelta(hours=1))
+        self.assertEqual(self.manager.get_access_token(user), "old")
+
+        self.manager._encryption = MagicMock()
+        self.assertEqual(self.manager.get_access_token(user), "old")
+        self.manager._encryption.decrypt.assert_not_called()
+
+    def test_expired_token_refreshed_before_use(self):
+        user = self._user(timedelta(seconds=30))
+
+        self.assertEqual(self.manager.get_access_token(user), "new-1")
+        update = self.firestore_client.collection.return_value.document.return_value.update
+        update.assert_called_once()
+        self.assertIn("expires_at", update.call_args.args[0])
+        # The refreshed token is now cached for this user
+        self.assertEqual(self.manager.get_access_token(user), "new-1")
+        self.assertEqual(len(self.refresh_calls), 1)
+
+    def test_token_near_expiry_refreshed_in_background(self):
+        user = self._user(timedelta(minutes=5))
+
+        self.assertEqual(self.manager.get_access_token(user), "old")
+        self.manager._background.shutdown(wait=True)
+        self.assertEqual(self.refresh_calls, ["refresh"])
+
+    def test_concurrent_refreshes_coalesced(self):
+        user = self._user(timedelta(seconds=-1))
+        tokens = []
+        threads = [
+            threading.Thread(target=lambda: tokens.append(self.manager.refresh(user)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(self.refresh_calls), 1)
+        self.assertEqual(set(tokens), {"new-1"})
+
+    def test_without_refresh_token_cached_token_returned(self):
+        user = self._user(timedelta(seconds=-1), refresh=False)
+        self.assertEqual(self.manager.get_access_token(user), "old")
+        self.assertEqual(self.refresh_calls, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
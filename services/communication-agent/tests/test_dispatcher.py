@@ -0,0 +1,149 @@
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import main
+from src.shared.sharding import shard_bucket
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeUsersQuery:
+    """Ordered, paged stand-in for the dispatcher's due-users query."""
+
+    def __init__(self, docs, limit=None, after=None, reads=None):
+        self._docs = docs
+        self._limit = limit
+        self._after = after
+        self.reads = reads if reads is not None else []
+
+    def where(self, field, op, value):
+        if op != 'in':
+            return self
+        docs = [d for d in self._docs if d.to_dict().get(field) in value]
+        return FakeUsersQuery(docs, self._limit, self._after, self.reads)
+
+    def order_by(self, *args):
+        return self
+
+    def limit(self, count):
+        return FakeUsersQuery(self._docs, count, self._after, self.reads)
+
+    def start_after(self, doc):
+        return FakeUsersQuery(self._docs, self._limit, doc, self.reads)
+
+    def stream(self):
+        start = self._docs.index(self._after) + 1 if self._after else 0
+        page = self._docs[start:start + self._limit]
+        self.reads.append(len(page))
+        return page
+
+    def document(self, doc_id):
+        return doc_id
+
+
+class FakeBatch:
+    def __init__(self, commits, writes=None):
+        self._commits = commits
+        self._writes = writes if writes is not None else {}
+        self._updates = []
+
+    def update(self, ref, data):
+        self._updates.append(ref)
+        self._writes[ref] = data
+
+    def commit(self):
+        self._commits.append(self._updates)
+
+
+class FakeQueue:
+    def __init__(self, failing=()):
+        self.enqueued = []
+        self._failing = set(failing)
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id, **kwargs):
+        if user_id in self._failing:
+            raise RuntimeError("queue unavailable")
+        with self._lock:
+            self.enqueued.append(user_id)
+        return True
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.docs = [
+            FakeDoc(f"user-{i}", {"check_interval_minutes": 15, "shard_bucket": shard_bucket(f"user-{i}")})
+            for i in range(1200)
+        ]
+        self.query = FakeUsersQuery(self.docs)
+        self.commits = []
+        self.writes = {}
+        self.firestore_client = MagicMock()
+        self.firestore_client.collection.return_value = self.query
+        self.firestore_client.batch.side_effect = lambda: FakeBatch(self.commits, self.writes)
+        self.now = datetime(2026, 10, 19, 9, 0)
+
+    def test_pages_and_batches_updates(self):
+        queue = FakeQueue()
+        results = main.dispatch_due_users(self.firestore_client, queue, self.now)
+
+        self.assertEqual(results['dispatched'], 1200)
+        self.assertEqual(results['pages'], 3)
+        self.assertEqual(sorted(queue.enqueued), sorted(d.id for d in self.docs))
+        self.assertEqual([len(c) for c in self.commits], [500, 500, 200])
+        self.assertEqual(self.query.reads, [500, 500, 200])
+
+    def test_shards_partition_users(self):
+        seen = []
+        for shard in range(4):
+            queue = FakeQueue()
+            main.dispatch_due_users(self.firestore_client, queue, self.now, shard=shard, shard_count=4)
+            self.assertTrue(0 < len(queue.enqueued) < 1200)
+            seen += queue.enqueued
+
+        self.assertEqual(sorted(seen), sorted(d.id for d in self.docs))
+        # Each shard reads only its own users from the query
+        self.assertEqual(sum(self.query.reads), 1200)
+
+    def test_shard_spanning_several_in_filters(self):
+        # Two shards own 32 buckets each, more than one `in` filter holds
+        queue = FakeQueue()
+        results = main.dispatch_due_users(self.firestore_client, queue, self.now, shard=0, shard_count=2)
+
+        expected = [d.id for d in self.docs if d.to_dict()["shard_bucket"] % 2 == 0]
+        self.assertEqual(sorted(queue.enqueued), sorted(expected))
+        self.assertEqual(sum(self.query.reads), len(expected))
+        self.assertGreaterEqual(results['pages'], 2)
+
+    def test_unsharded_run_backfills_shard_bucket(self):
+        self.docs[:] = [FakeDoc(f"legacy-{i}", {}) for i in range(3)]
+        main.dispatch_due_users(self.firestore_client, FakeQueue(), self.now)
+
+        self.assertEqual(self.writes["legacy-1"]["shard_bucket"], shard_bucket("legacy-1"))
+
+    def test_failed_enqueue_not_rescheduled(self):
+        queue = FakeQueue(failing={"user-3"})
+        results = main.dispatch_due_users(self.firestore_client, queue, self.now)
+
+        self.assertEqual(results['errors'], 1)
+        self.assertEqual(results['dispatched'], 1199)
+        self.assertNotIn("user-3", [ref for commit in self.commits for ref in commit])
+
+    def test_time_budget_stops_paging(self):
+        results = main.dispatch_due_users(self.firestore_client, FakeQueue(), self.now, time_budget_s=-1)
+
+        self.assertTrue(results['truncated'])
+        self.assertEqual(results['dispatched'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
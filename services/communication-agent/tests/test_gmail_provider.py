@@ -0,0 +1,200 @@
+import base64
+import unittest
+from unittest.mock import MagicMock
+
+from googleapiclient.errors import HttpError
+
+from src.providers.gmail import GmailProvider
+
+
+def _http_error(status):
+    resp = MagicMock()
+    resp.status = status
+    return HttpError(resp, b"error")
+
+
+def _message(msg_id, history_id="100", body="Hello"):
+    return {
+        "id": msg_id,
+        "threadId": f"thread-{msg_id}",
+        "historyId": history_id,
+        "snippet": body[:10],
+        "payload": {
+            "headers": [{"name": "From", "value": f"{msg_id}@example.com"}],
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()}},
+            ],
+        },
+    }
+
+
+class FakeBatch:
+    """Stands in for BatchHttpRequest: invokes the callback per sub-request."""
+
+    def __init__(self, store, callback, executed):
+        self._store = store
+        self._callback = callback
+        self._executed = executed
+        self._ids = []
+
+    def add(self, request, request_id):
+        self._ids.append(request_id)
+
+    def execute(self):
+        self._executed.append(list(self._ids))
+        for request_id in self._ids:
+            response = self._store.get(request_id)
+            if isinstance(response, Exception):
+                self._callback(request_id, None, response)
+            else:
+                self._callback(request_id, response, None)
+
+
+class TestGmailProviderFetch(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock()
+        self.store = {}
+        self.batches = []
+        self.service.new_batch_http_request.side_effect = (
+            lambda callback: FakeBatch(self.store, callback, self.batches)
+        )
+        self.users = self.service.users.return_value
+        self.users.getProfile.return_value.execute.return_value = {"historyId": "500"}
+
+    def _provider(self, **kwargs):
+        return GmailProvider(gmail_service=self.service, **kwargs)
+
+    def test_unread_fetched_in_single_batch(self):
+        self.users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "m1", "threadId": "t1"}, {"id": "m2", "threadId": "t2"}]
+        }
+        self.store.update({"m1": _message("m1", body="Body one"), "m2": _message("m2")})
+
+        tasks = self._provider().fetch_unread()
+
+        self.assertEqual([t.email_id for t in tasks], ["m1", "m2"])
+        self.assertEqual(tasks[0].body, "Body one")
+        self.assertEqual(tasks[0].sender, "m1@example.com")
+        self.assertEqual(self.batches, [["m1", "m2"]])
+        list_kwargs = self.users.messages.return_value.list.call_args.kwargs
+        self.assertIn("fields", list_kwargs)
+
+    def test_pagination_and_batch_limit(self):
+        pages = [
+            {"messages": [{"id": f"m{i}"} for i in range(0, 80)], "nextPageToken": "p2"},
+            {"messages": [{"id": f"m{i}"} for i in range(80, 150)]},
+        ]
+        self.users.messages.return_value.list.return_value.execute.side_effect = pages
+        self.store.update({f"m{i}": _message(f"m{i}") for i in range(150)})
+
+        provider = self._provider(max_messages=150)
+        tasks = provider.fetch_unread()
+
+        self.assertEqual(len(tasks), 150)
+        self.assertEqual([len(b) for b in self.batches], [100, 50])
+        self.assertEqual(provider.get_history_id(), "500")
+
+    def test_history_sync_skips_listing(self):
+        self.users.history.return_value.list.return_value.execute.return_value = {
+            "history": [
+                {"messagesAdded": [{"message": {"id": "m1", "labelIds": ["INBOX", "UNREAD"]}}]},
+                {"messagesAdded": [{"message": {"id": "m2", "labelIds": ["INBOX"]}}]},
+            ],
+            "historyId": "900",
+        }
+        self.store["m1"] = _message("m1", history_id="850")
+
+        provider = self._provider(history_id="800")
+        tasks = provider.fetch_unread()
+
+        self.assertEqual([t.email_id for t in tasks], ["m1"])
+        self.users.messages.return_value.list.assert_not_called()
+        self.users.getProfile.assert_not_called()
+        self.assertEqual(provider.get_history_id(), "900")
+
+    def test_expired_history_falls_back_to_listing(self):
+        self.users.history.return_value.list.return_value.execute.side_effect = _http_error(404)
+        self.users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "m1"}]
+        }
+        self.store["m1"] = _message("m1")
+
+        provider = self._provider(history_id="1")
+        tasks = provider.fetch_unread()
+
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(provider.get_history_id(), "500")
+
+    def test_metadata_mode_uses_snippet_and_on_demand_body(self):
+        self.users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "m1"}]
+        }
+        self.store["m1"] = _message("m1", body="Full body text")
+
+        provider = self._provider(include_body=False)
+        tasks = provider.fetch_unread()
+
+        self.assertEqual(tasks[0].body, "Full body ")
+        get_kwargs = self.users.messages.return_value.get.call_args.kwargs
+        self.assertEqual(get_kwargs["format"], "metadata")
+
+        bodies = provider.fetch_bodies(["m1"])
+        self.assertEqual(bodies, {"m1": "Full body text"})
+
+    def test_batch_401_sets_refresh_flag(self):
+        self.users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "m1"}, {"id": "gone"}]
+        }
+        self.store.update({"m1": _http_error(401), "gone": _http_error(404)})
+
+        provider = self._provider()
+        with self.assertRaises(HttpError):
+            provider.fetch_unread()
+        self.assertTrue(provider.needs_token_refresh())
+        self.assertIsNone(provider.get_history_id())
+
+    def test_deleted_message_skipped(self):
+        self.users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "m1"}, {"id": "gone"}]
+        }
+        self.store.update({"m1": _message("m1"), "gone": _http_error(404)})
+
+        tasks = self._provider().fetch_unread()
+        self.assertEqual([t.email_id for t in tasks], ["m1"])
+
+
+class TestGmailProviderDrafts(unittest.TestCase):
+    def setUp(self):
+        self.service = MagicMock()
+        self.batches = []
+        self.service.new_batch_http_request.side_effect = self._batch
+
+    def _batch(self, callback):
+        batch = MagicMock()
+        ids = []
+        batch.add.side_effect = lambda request, request_id: ids.append(request_id)
+
+        def execute():
+            self.batches.append(list(ids))
+            for request_id in ids:
+                if request_id == "1":
+                    callback(request_id, None, _http_error(429))
+                else:
+                    callback(request_id, {"id": f"draft-{request_id}"}, None)
+
+        batch.execute.side_effect = execute
+        return batch
+
+    def test_create_drafts_batches_and_keeps_order(self):
+        drafts = [{"recipient": f"r{i}@example.com", "subject": "Re", "body": "Hi"} for i in range(60)]
+
+        draft_ids = GmailProvider(gmail_service=self.service).create_drafts(drafts)
+
+        self.assertEqual([len(b) for b in self.batches], [50, 10])
+        self.assertEqual(draft_ids[0], "draft-0")
+        self.assertIsNone(draft_ids[1])
+        self.assertEqual(draft_ids[59], "draft-59")
+
+
+if __name__ == "__main__":
+    unittest.main()
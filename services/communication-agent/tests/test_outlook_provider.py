@@ -0,0 +1,159 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from src.providers import outlook
+from src.providers.outlook import OutlookProvider
+
+
+def _response(payload=None, status=200):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = payload or {}
+    if status >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+def _message(msg_id, is_read=False):
+    return {
+        "id": msg_id,
+        "conversationId": f"conv-{msg_id}",
+        "isRead": is_read,
+        "from": {"emailAddress": {"address": f"{msg_id}@example.com"}},
+        "body": {"contentType": "text", "content": f"Body {msg_id}"},
+    }
+
+
+class TestOutlookProvider(unittest.TestCase):
+    def setUp(self):
+        outlook._msal_apps.clear()
+        patcher = patch("src.providers.outlook.msal.ConfidentialClientApplication")
+        self.addCleanup(patcher.stop)
+        msal_app = patcher.start().return_value
+        msal_app.acquire_token_for_client.return_value = {"access_token": "token"}
+        self.session = MagicMock()
+
+    def _provider(self, **kwargs):
+        return OutlookProvider(
+            client_id="client",
+            client_secret="secret",
+            tenant_id="tenant",
+            target_user_email="user@example.com",
+            session=self.session,
+            **kwargs,
+        )
+
+    def test_initial_delta_follows_pages_and_keeps_delta_link(self):
+        self.session.get.side_effect = [
+            _response({"value": [_message("m1"), _message("m2", is_read=True)],
+                       "@odata.nextLink": "https://graph/next"}),
+            _response({"value": [_message("m3")], "@odata.deltaLink": "https://graph/delta?token=1"}),
+        ]
+
+        provider = self._provider()
+        tasks = provider.fetch_unread()
+
+        self.assertEqual([t.email_id for t in tasks], ["m1", "m3"])
+        self.assertEqual(tasks[0].body, "Body m1")
+        self.assertEqual(provider.get_delta_link(), "https://graph/delta?token=1")
+
+        first_call = self.session.get.call_args_list[0]
+        self.assertTrue(first_call.args[0].endswith("/mailFolders/inbox/messages/delta"))
+        self.assertIn('outlook.body-content-type="text"', first_call.kwargs["headers"]["Prefer"])
+        self.assertEqual(self.session.get.call_args_list[1].args[0], "https://graph/next")
+        self.assertIsNone(self.session.get.call_args_list[1].kwargs["params"])
+
+    def test_incremental_sync_uses_stored_delta_link(self):
+        self.session.get.return_value = _response({
+            "value": [_message("m9"), {"id": "gone", "@removed": {"reason": "deleted"}}],
+            "@odata.deltaLink": "https://graph/delta?token=2",
+        })
+
+        provider = self._provider(delta_link="https://graph/delta?token=1")
+        tasks = provider.fetch_unread()
+
+        self.assertEqual([t.email_id for t in tasks], ["m9"])
+        self.session.get.assert_called_once()
+        self.assertEqual(self.session.get.call_args.args[0], "https://graph/delta?token=1")
+        self.assertEqual(provider.get_delta_link(), "https://graph/delta?token=2")
+
+    def test_expired_delta_link_triggers_resync(self):
+        self.session.get.side_effect = [
+            _response(status=410),
+            _response({"value": [_message("m1")], "@odata.deltaLink": "https://graph/delta?token=new"}),
+        ]
+
+        provider = self._provider(delta_link="https://graph/delta?token=old")
+        tasks = provider.fetch_unread()
+
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(provider.get_delta_link(), "https://graph/delta?token=new")
+
+    def test_410_on_continuation_page_is_raised(self):
+        # Only the stored deltaLink expiring means "resync"; a 410 part-way
+        # through paging is an error, not a None page list
+        self.session.get.side_effect = [
+            _response({"value": [_message("m1")], "@odata.nextLink": "https://graph/next"}),
+            _response(status=410),
+        ]
+
+        provider = self._provider()
+        with self.assertRaises(requests.HTTPError):
+            provider.fetch_unread()
+
+        self.session.get.side_effect = [
+            _response({"value": [], "@odata.nextLink": "https://graph/next"}),
+            _response(status=410),
+        ]
+        provider = self._provider(delta_link="https://graph/delta?token=1")
+        with self.assertRaises(requests.HTTPError):
+            provider.fetch_unread()
+        self.assertEqual(self.session.get.call_count, 4)
+
+    def test_401_sets_refresh_flag(self):
+        self.session.get.return_value = _response(status=401)
+
+        provider = self._provider()
+        with self.assertRaises(requests.HTTPError):
+            provider.fetch_unread()
+        self.assertTrue(provider.needs_token_refresh())
+
+    def test_create_drafts_batches_twenty_per_call(self):
+        def batch_reply(url, headers, json):
+            return _response({"responses": [
+                {"id": req["id"], "status": 201, "body": {"id": f"draft-{req['id']}"}}
+                for req in json["requests"]
+            ]})
+
+        self.session.post.side_effect = batch_reply
+        drafts = [{"recipient": f"r{i}@example.com", "subject": "Re", "body": "Hi"} for i in range(45)]
+
+        draft_ids = self._provider().create_drafts(drafts)
+
+        self.assertEqual(self.session.post.call_count, 3)
+        self.assertTrue(self.session.post.call_args.args[0].endswith("/$batch"))
+        self.assertEqual(draft_ids[0], "draft-0")
+        self.assertEqual(draft_ids[44], "draft-44")
+
+    def test_create_drafts_marks_failed_sub_requests(self):
+        self.session.post.return_value = _response({"responses": [
+            {"id": "1", "status": 429, "body": {"error": {}}},
+            {"id": "0", "status": 201, "body": {"id": "draft-0"}},
+        ]})
+        drafts = [{"recipient": "a@example.com", "subject": "Re", "body": "Hi"}] * 2
+
+        self.assertEqual(self._provider().create_drafts(drafts), ["draft-0", None])
+
+    def test_create_drafts_401_sets_refresh_flag(self):
+        self.session.post.return_value = _response({"responses": [{"id": "0", "status": 401}]})
+
+        provider = self._provider()
+        with self.assertRaises(requests.HTTPError):
+            provider.create_drafts([{"recipient": "a@example.com", "subject": "Re", "body": "Hi"}])
+        self.assertTrue(provider.needs_token_refresh())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+import process_user_inbox
+from src.providers.gmail import GmailProvider
+from src.providers.outlook import OutlookProvider
+from src.shared.idempotency import IdempotencyGuard
+from src.shared.schema import EmailTask
+
+
+def _task(i):
+    return EmailTask(email_id=f"m{i}", thread_id=f"t{i}", body=f"Body {i}", sender=f"s{i}@example.com")
+
+
+class TestHandler(unittest.TestCase):
+    def setUp(self):
+        self.firestore = MagicMock()
+        user_doc = self.firestore.collection.return_value.document.return_value.get.return_value
+        user_doc.exists = True
+        user_doc.to_dict.return_value = {
+            "email": "a@example.com", "provider": "GMAIL", "access_token_encrypted": b"",
+            "gmail_history_id": "100",
+        }
+        self.model = MagicMock()
+        self.model.generate_content.return_value = Mock(text="Reply")
+        self.guard = MagicMock(spec=IdempotencyGuard)
+        self.guard.claim_batch.side_effect = lambda ids: set(ids)
+
+        self.provider = MagicMock(spec=GmailProvider)
+        self.provider.fetch_unread.return_value = [_task(i) for i in range(3)]
+        self.provider.create_drafts.side_effect = lambda drafts: [f"d-{d['recipient']}" for d in drafts]
+        self.provider.get_history_id.return_value = "200"
+        self.provider.needs_token_refresh.return_value = False
+
+        clients = process_user_inbox.WorkerClients(
+            self.firestore, MagicMock(), self.model, self.guard, process_user_inbox.EmailTriage()
+        )
+        patches = [
+            patch.object(process_user_inbox, "_get_clients", return_value=clients),
+            patch.object(process_user_inbox, "_get_mail_provider_for_user", return_value=self.provider),
+            patch.object(process_user_inbox, "needs_renewal", return_value=False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _fail_model_for(self, body):
+        def generate(prompt):
+            if body in prompt:
+                raise RuntimeError("model error")
+            return Mock(text="Reply")
+        self.model.generate_content.side_effect = generate
+
+    def _user_update(self):
+        update = self.firestore.collection.return_value.document.return_value.update
+        return update.call_args.args[0] if update.called else {}
+
+    def _run(self):
+        request = MagicMock()
+        request.get_json.return_value = {"user_id": "u1"}
+        return process_user_inbox.handler(request)
+
+    def test_batch_goes_through_process_batch(self):
+        body, status, _ = self._run()
+
+        self.assertEqual(status, 200)
+        self.assertEqual((body["processed"], body["skipped"], body["failed"]), (3, 0, 0))
+        self.guard.claim_batch.assert_called_once()
+        self.provider.create_drafts.assert_called_once()
+        self.guard.mark_done.assert_called_once()
+
+        self.assertEqual(self._user_update(), {"gmail_history_id": "200"})
+
+    def test_shared_triage_used_without_reloading(self):
+        with patch.object(process_user_inbox.EmailTriage, "from_env", side_effect=AssertionError("reloaded")):
+            body, status, _ = self._run()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body["processed"], 3)
+
+    def test_failed_email_holds_history_id(self):
+        self._fail_model_for("Body 1")
+
+        body, _, _ = self._run()
+
+        self.assertEqual(body["failed"], 1)
+        self.guard.release.assert_called_once_with(["m1"])
+        self.assertEqual(self._user_update(), {"cursor_holds": 1})
+
+    def test_failed_email_holds_delta_link(self):
+        provider = MagicMock(spec=OutlookProvider)
+        provider.fetch_unread.return_value = [_task(0)]
+        provider.get_delta_link.return_value = "https://graph/delta?token=new"
+        provider.needs_token_refresh.return_value = False
+        self._fail_model_for("Body 0")
+
+        with patch.object(process_user_inbox, "_get_mail_provider_for_user", return_value=provider):
+            self._run()
+
+        self.assertEqual(self._user_update(), {"cursor_holds": 1})
+
+    def test_cursor_advances_after_max_holds(self):
+        user_doc = self.firestore.collection.return_value.document.return_value.get.return_value
+        user_doc.to_dict.return_value["cursor_holds"] = process_user_inbox.MAX_CURSOR_HOLDS
+        self._fail_model_for("Body 1")
+
+        self._run()
+
+        self.assertEqual(self._user_update(), {"cursor_holds": 0, "gmail_history_id": "200"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,269 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from google.api_core.exceptions import AlreadyExists
+
+from src.shared.push import PushRouter, needs_renewal, push_active, subscribe_mailbox
+from src.shared.schema import UserModel
+from src.shared.task_queue import InboxTaskQueue
+
+CLIENT_STATE = "secret-state"
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """Equality-only stand-in for a Firestore query over the users collection."""
+
+    def __init__(self, users, filters=()):
+        self._users = users
+        self._filters = filters
+        self._limit = None
+
+    def where(self, field, op, value):
+        return FakeQuery(self._users, self._filters + ((field, value),))
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def stream(self):
+        docs = [
+            FakeDoc(doc_id, data) for doc_id, data in self._users.items()
+            if all(data.get(field) == value for field, value in self._filters)
+        ]
+        return docs[:self._limit] if self._limit else docs
+
+
+class FakeTasksClient:
+    """Records tasks and rejects duplicate names like Cloud Tasks does."""
+
+    def __init__(self):
+        self.tasks = []
+
+    def queue_path(self, project, location, queue):
+        return f"projects/{project}/locations/{location}/queues/{queue}"
+
+    def create_task(self, parent, task):
+        if 'name' in task and any(t.get('name') == task['name'] for t in self.tasks):
+            raise AlreadyExists("task exists")
+        self.tasks.append(task)
+
+
+class FakeNotifier:
+    """
+    Local stand-in for Gmail Pub/Sub and Graph webhooks: remembers which
+    mailboxes are subscribed and emits the notification each service
+    would send when new mail arrives.
+    """
+
+    def __init__(self):
+        self.gmail_watches = {}
+        self.graph_subscriptions = {}
+
+    def gmail_provider(self, email):
+        provider = MagicMock()
+
+        def watch(topic_name):
+            self.gmail_watches[email] = topic_name
+            expires = datetime.now(timezone.utc) + timedelta(days=7)
+            return {"historyId": "100", "expiration": str(int(expires.timestamp() * 1000))}
+
+        provider.watch.side_effect = watch
+        return provider
+
+    def outlook_provider(self, email):
+        provider = MagicMock()
+
+        def subscribe(notification_url, client_state, expires_at):
+            sub_id = f"sub-{len(self.graph_subscriptions) + 1}"
+            self.graph_subscriptions[sub_id] = (email, client_state)
+            return {"id": sub_id, "expirationDateTime": expires_at.strftime('%Y-%m-%dT%H:%M:%S.0000000Z')}
+
+        provider.subscribe.side_effect = subscribe
+        provider.renew_subscription.return_value = None
+        return provider
+
+    def gmail_message(self, email, history_id):
+        return {"emailAddress": email, "historyId": history_id}
+
+    def graph_payload(self, email, count=1, client_state=None):
+        value = []
+        for sub_id, (sub_email, state) in self.graph_subscriptions.items():
+            if sub_email == email:
+                value += [{
+                    "subscriptionId": sub_id,
+                    "clientState": client_state or state,
+                    "changeType": "created",
+                    "resource": f"Users/{email}/Messages/m{i}",
+                } for i in range(count)]
+        return {"value": value}
+
+
+class TestPushRouter(unittest.TestCase):
+    def setUp(self):
+        self.users = {
+            "u1": {"email": "a@example.com", "provider": "GMAIL", "is_active": True, "gmail_history_id": "500"},
+            "u2": {"email": "b@example.com", "provider": "GMAIL", "is_active": True},
+            "u3": {"email": "c@example.com", "provider": "OUTLOOK", "is_active": True},
+            "u4": {"email": "d@example.com", "provider": "GMAIL", "is_active": False},
+        }
+        firestore_client = MagicMock()
+        firestore_client.collection.return_value = FakeQuery(self.users)
+        self.tasks_client = FakeTasksClient()
+        queue = InboxTaskQueue(self.tasks_client, "proj", "loc", "queue", "https://worker")
+        self.router = PushRouter(firestore_client, queue, dedupe_window_s=3600)
+        self.notifier = FakeNotifier()
+
+    def _task_users(self):
+        return [t['http_request']['body'] for t in self.tasks_client.tasks]
+
+    def test_gmail_change_enqueues_only_that_mailbox(self):
+        user_id = self.router.handle_gmail_notification(self.notifier.gmail_message("b@example.com", 42))
+
+        self.assertEqual(user_id, "u2")
+        self.assertEqual(len(self.tasks_client.tasks), 1)
+        self.assertIn(b'"user_id": "u2"', self._task_users()[0])
+        self.assertIn("/tasks/inbox-u2-", self.tasks_client.tasks[0]['name'])
+
+    def test_gmail_burst_collapses_into_one_task(self):
+        for history_id in (501, 502, 503):
+            self.router.handle_gmail_notification(self.notifier.gmail_message("a@example.com", history_id))
+        self.assertEqual(len(self.tasks_client.tasks), 1)
+
+    def test_task_runs_after_later_notifications_in_its_bucket(self):
+        # Two notifications 20 minutes apart in one hour-long bucket: the
+        # second is rejected as a duplicate, so the task must not run before it
+        with patch("src.shared.task_queue.time.time", return_value=7200 + 60):
+            self.router.handle_gmail_notification(self.notifier.gmail_message("a@example.com", 501))
+        with patch("src.shared.task_queue.time.time", return_value=7200 + 1260):
+            self.router.handle_gmail_notification(self.notifier.gmail_message("a@example.com", 502))
+
+        self.assertEqual(len(self.tasks_client.tasks), 1)
+        self.assertEqual(self.tasks_client.tasks[0]['schedule_time'].seconds, 7200 + 3600)
+
+    def test_gmail_already_synced_or_inactive_dropped(self):
+        self.assertIsNone(self.router.handle_gmail_notification(self.notifier.gmail_message("a@example.com", 500)))
+        self.assertIsNone(self.router.handle_gmail_notification(self.notifier.gmail_message("d@example.com", 9)))
+        self.assertIsNone(self.router.handle_gmail_notification(self.notifier.gmail_message("x@example.com", 9)))
+        self.assertEqual(self.tasks_client.tasks, [])
+
+    def test_graph_notifications_grouped_per_subscription(self):
+        user = UserModel(id="u3", access_token_encrypted=b"", **self.users["u3"])
+        update = subscribe_mailbox(
+            self.notifier.outlook_provider("c@example.com"), user, None, "https://hook", CLIENT_STATE
+        )
+        self.users["u3"].update(update)
+
+        payload = self.notifier.graph_payload("c@example.com", count=5)
+        enqueued = self.router.handle_graph_notifications(payload["value"], CLIENT_STATE)
+
+        self.assertEqual(enqueued, ["u3"])
+        self.assertEqual(len(self.tasks_client.tasks), 1)
+
+    def test_graph_invalid_client_state_dropped(self):
+        self.users["u3"]["push_subscription_id"] = "sub-1"
+        self.notifier.graph_subscriptions["sub-1"] = ("c@example.com", CLIENT_STATE)
+
+        payload = self.notifier.graph_payload("c@example.com", client_state="forged")
+        self.assertEqual(self.router.handle_graph_notifications(payload["value"], CLIENT_STATE), [])
+        self.assertEqual(self.tasks_client.tasks, [])
+
+
+class TestSubscriptions(unittest.TestCase):
+    def setUp(self):
+        self.notifier = FakeNotifier()
+
+    def test_gmail_watch_persists_expiry(self):
+        user = UserModel(email="a@example.com", provider="GMAIL", access_token_encrypted=b"")
+        update = subscribe_mailbox(
+            self.notifier.gmail_provider("a@example.com"), user, "projects/p/topics/gmail", None, None
+        )
+
+        self.assertEqual(self.notifier.gmail_watches, {"a@example.com": "projects/p/topics/gmail"})
+        self.assertTrue(push_active(update))
+        self.assertNotIn('gmail_history_id', update)
+
+    def test_graph_renewal_recreates_missing_subscription(self):
+        provider = self.notifier.outlook_provider("c@example.com")
+        user = UserModel(
+            email="c@example.com", provider="OUTLOOK", access_token_encrypted=b"",
+            push_subscription_id="expired-sub",
+        )
+        update = subscribe_mailbox(provider, user, None, "https://hook", CLIENT_STATE)
+
+        provider.renew_subscription.assert_called_once()
+        self.assertEqual(update['push_subscription_id'], "sub-1")
+        self.assertTrue(push_active(update))
+
+    def test_push_not_configured_returns_no_update(self):
+        user = UserModel(email="a@example.com", provider="GMAIL", access_token_encrypted=b"")
+        self.assertEqual(subscribe_mailbox(MagicMock(), user, None, None, None), {})
+
+    def test_needs_renewal_window(self):
+        now = datetime.now(timezone.utc)
+        user = UserModel(email="a@example.com", provider="GMAIL", access_token_encrypted=b"")
+        self.assertTrue(needs_renewal(user, now))
+        user.push_expires_at = now + timedelta(hours=2)
+        self.assertTrue(needs_renewal(user, now))
+        user.push_expires_at = now + timedelta(days=3)
+        self.assertFalse(needs_renewal(user, now))
+        self.assertFalse(push_active({"push_expires_at": now - timedelta(minutes=1)}, now))
+
+
+class TestGraphWebhook(unittest.TestCase):
+    def test_validation_token_echoed(self):
+        import push_handler
+
+        request = MagicMock()
+        request.args = {"validationToken": "token-123"}
+        body, status, headers = push_handler.graph_webhook(request)
+
+        self.assertEqual((body, status), ("token-123", 200))
+        self.assertEqual(headers["Content-Type"], "text/plain")
+
+
+class TestRenewSubscriptions(unittest.TestCase):
+    def test_renews_due_mailboxes_with_worker_clients(self):
+        import process_user_inbox
+        import push_handler
+
+        firestore_client = MagicMock()
+        clients = process_user_inbox.WorkerClients(
+            firestore_client, MagicMock(), MagicMock(), MagicMock(), MagicMock()
+        )
+        due = [
+            FakeDoc("u1", {"email": "a@example.com", "provider": "GMAIL", "access_token_encrypted": b""}),
+            FakeDoc("u2", {"email": "b@example.com", "provider": "GMAIL", "access_token_encrypted": b""}),
+        ]
+        renewal = {"push_expires_at": datetime.now(timezone.utc) + timedelta(days=7)}
+
+        def subscribe(provider, user, *args):
+            if user.id == "u2":
+                raise RuntimeError("watch failed")
+            return renewal
+
+        with patch.object(process_user_inbox, "_get_clients", return_value=clients), \
+                patch.object(process_user_inbox, "_get_mail_provider_for_user", return_value=MagicMock()), \
+                patch.object(push_handler, "PROJECT_ID", "project"), \
+                patch.object(push_handler, "PushRouter") as router, \
+                patch.object(push_handler, "subscribe_mailbox", side_effect=subscribe):
+            router.return_value.due_for_renewal.return_value = due
+            body, status, _ = push_handler.renew_subscriptions(MagicMock())
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {'renewed': 1, 'errors': 1})
+        firestore_client.collection.return_value.document.assert_called_once_with("u1")
+        firestore_client.collection.return_value.document.return_value.update.assert_called_once_with(renewal)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from src.agents.inbox_reader.logic import InboxAgent
+from src.agents.inbox_reader.triage import EmailTriage, HashedLogisticRegression, featurize
+from src.shared.idempotency import IdempotencyGuard
+from src.shared.interfaces import MailProvider
+from src.shared.schema import EmailTask, Status
+
+
+def _email(sender="Jane <jane@client.com>", subject="Contract question", body="Can we meet Tuesday?", **headers):
+    return EmailTask(
+        email_id="m1", thread_id="t1", sender=sender, subject=subject, body=body,
+        headers={k.replace('_', '-'): v for k, v in headers.items()},
+    )
+
+
+class TestTriageRules(unittest.TestCase):
+    def setUp(self):
+        self.triage = EmailTriage()
+
+    def test_personal_mail_passes(self):
+        self.assertTrue(self.triage.assess(_email()).reply_worthy)
+
+    def test_bulk_and_automated_mail_filtered(self):
+        cases = {
+            "mailing_list": _email(list_unsubscribe="<mailto:unsub@news.com>"),
+            "bulk_precedence": _email(precedence="bulk"),
+            "auto_reply": _email(auto_submitted="auto-replied"),
+            "no_reply_sender": _email(sender="GitHub <noreply@github.com>"),
+            "bulk_sender": _email(sender="news@bounce.mailchimpapp.net"),
+        }
+        for reason, email in cases.items():
+            result = self.triage.assess(email)
+            self.assertFalse(result.reply_worthy, reason)
+            self.assertEqual(result.reason, reason)
+
+        self.assertEqual(self.triage.assess(_email(subject="Out of Office: back Monday")).reason, "auto_reply")
+        self.assertTrue(self.triage.assess(_email(auto_submitted="no")).reply_worthy)
+
+
+class TestTriageClassifier(unittest.TestCase):
+    def _train(self):
+        kept = [_email(body=f"Could you send the revised proposal {i}? Thanks") for i in range(20)]
+        discarded = [
+            _email(sender=f"deals@shop{i}.com", subject="Weekly deals", body="Huge sale this week http://shop.com")
+            for i in range(20)
+        ]
+        model = HashedLogisticRegression(n_features=2 ** 12)
+        examples = [(featurize(e, 2 ** 12), 1) for e in kept] + [(featurize(e, 2 ** 12), 0) for e in discarded]
+        model.partial_fit(examples, epochs=20)
+        return model
+
+    def test_classifier_skips_low_scoring_mail(self):
+        triage = EmailTriage(classifier=self._train(), threshold=0.5)
+
+        promo = _email(sender="deals@shop99.com", subject="Weekly deals", body="Huge sale this week http://shop.com")
+        result = triage.assess(promo)
+        self.assertFalse(result.reply_worthy)
+        self.assertEqual(result.reason, "classifier")
+        self.assertTrue(triage.assess(_email(body="Could you send the revised proposal? Thanks")).reply_worthy)
+
+    def test_model_round_trips_through_file(self):
+        model = self._train()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "triage.json")
+            model.save(path)
+            loaded = HashedLogisticRegression.load(path)
+
+        features = featurize(_email(), 2 ** 12)
+        self.assertAlmostEqual(loaded.predict_proba(features), model.predict_proba(features))
+
+
+class TestAgentTriage(unittest.TestCase):
+    def test_filtered_mail_never_reaches_model_or_locks(self):
+        model = MagicMock()
+        guard = MagicMock(spec=IdempotencyGuard)
+        guard.claim_batch.side_effect = lambda ids: set(ids)
+        agent = InboxAgent(MagicMock(spec=MailProvider), model, guard, triage=EmailTriage())
+
+        newsletter = _email(list_id="<news.example.com>")
+        self.assertEqual(agent.process_email(newsletter).status, Status.SKIPPED)
+        outputs = agent.process_batch([newsletter])
+
+        self.assertEqual(outputs[0].status, Status.SKIPPED)
+        model.generate_content.assert_not_called()
+        guard.check_and_lock.assert_not_called()
+        self.assertEqual(list(guard.claim_batch.call_args.args[0]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
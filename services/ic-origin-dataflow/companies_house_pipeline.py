@@ -1,20 +1,379 @@
-import apache_beam as beam
-from apache_beam.options.pipeline_options import PipelineOptions
+"""
+IC Origin — Companies House Bulk Ingestion Pipeline (Apache Beam / Dataflow)
+
+Batch pipeline over the Companies House bulk snapshots:
+
+    • BasicCompanyData CSV (one or more part files)
+    • Persons with Significant Control (PSC) JSONL
+
+Both inputs are read with ReadFromText, which splits every file into byte
+ranges, so the ~5M-company register is parsed in parallel across workers.
+Records are normalised and keyed by company number, PSCs are joined onto
+their company, and each entity is fingerprinted. The fingerprints are
+diffed against the previous snapshot so only NEW / CHANGED / REMOVED
+entities are written to BigQuery; the new fingerprints are written to the
+snapshot store for the next run.
+
+Usage — Local (DirectRunner, sample files):
+    python companies_house_pipeline.py \\
+        --company_data samples/BasicCompanyData-sample.csv \\
+        --psc_data samples/psc-sample.jsonl \\
+        --snapshot_store /tmp/ch_snapshots \\
+        --snapshot_date 2026-10-01 \\
+        --output_table "" \\
+        --changes_path /tmp/ch_changes
+
+Usage — GCP Dataflow (full register; ~20 n2-standard-4 workers finish well
+inside an hour since every stage is embarrassingly parallel apart from a
+single CoGroupByKey):
+    python companies_house_pipeline.py \\
+        --company_data "gs://ic-origin-ch-bulk/2026-10-01/BasicCompanyData-*.csv" \\
+        --psc_data "gs://ic-origin-ch-bulk/2026-10-01/psc-snapshot-*.txt" \\
+        --snapshot_store gs://ic-origin-ch-bulk/snapshots \\
+        --previous_snapshot_date 2026-09-01 \\
+        --snapshot_date 2026-10-01 \\
+        --project ic-origin \\
+        --region europe-west2 \\
+        --runner DataflowRunner \\
+        --temp_location gs://ic-origin-dataflow-temp/tmp \\
+        --max_num_workers 20 \\
+        --setup_file ./setup.py
+"""
+
 import argparse
+import csv
+import datetime
+import hashlib
+import json
 import logging
 
+import apache_beam as beam
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.metrics import Metrics
+from apache_beam.options.pipeline_options import PipelineOptions
+
+logger = logging.getLogger(__name__)
+
+COMPANY_CHANGES_TABLE = "ic-origin:ic_origin.companies_house_changes"
+
+COMPANY_CHANGES_SCHEMA = {
+    "fields": [
+        {"name": "company_number", "type": "STRING", "mode": "REQUIRED"},
+        {"name": "change_type", "type": "STRING", "mode": "REQUIRED"},
+        {"name": "company_name", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "company_status", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "company_category", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "incorporation_date", "type": "DATE", "mode": "NULLABLE"},
+        {"name": "postcode", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "sic_codes", "type": "STRING", "mode": "REPEATED"},
+        {"name": "accounts_next_due_date", "type": "DATE", "mode": "NULLABLE"},
+        {"name": "accounts_last_made_up_date", "type": "DATE", "mode": "NULLABLE"},
+        {"name": "psc_count", "type": "INT64", "mode": "NULLABLE"},
+        {"name": "pscs_json", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "fingerprint", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "snapshot_date", "type": "DATE", "mode": "REQUIRED"},
+    ]
+}
+
+# BasicCompanyData headers (stripped — the official file pads some with spaces)
+_CSV_FIELDS = {
+    "company_name": "CompanyName",
+    "company_number": "CompanyNumber",
+    "company_category": "CompanyCategory",
+    "company_status": "CompanyStatus",
+    "incorporation_date": "IncorporationDate",
+    "postcode": "RegAddress.PostCode",
+    "accounts_next_due_date": "Accounts.NextDueDate",
+    "accounts_last_made_up_date": "Accounts.LastMadeUpDate",
+}
+_SIC_COLUMNS = tuple(f"SICCode.SicText_{i}" for i in range(1, 5))
+
+
+# ── Normalisation helpers ──────────────────────────────────────────
+
+def normalise_company_number(value: str) -> str:
+    """Upper-case and zero-pad numeric company numbers to 8 characters."""
+    value = (value or "").strip().upper()
+    return value.zfill(8) if value.isdigit() else value
+
+
+def parse_ch_date(value: str) -> str | None:
+    """Companies House dd/mm/yyyy → ISO date; None for blanks or bad values."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return None
+
+
+def read_csv_header(pattern: str) -> list[str]:
+    """Read the header row from the first file matching `pattern`."""
+    matches = FileSystems.match([pattern])[0].metadata_list
+    if not matches:
+        raise ValueError(f"No company data files match {pattern}")
+    with FileSystems.open(matches[0].path) as fh:
+        first_line = fh.readline().decode("utf-8-sig")
+    return [h.strip() for h in next(csv.reader([first_line]))]
+
+
+def parse_company_line(line: str, header: list[str]) -> tuple[str, dict] | None:
+    """Parse one BasicCompanyData CSV line into (company_number, record)."""
+    try:
+        values = next(csv.reader([line]))
+    except (csv.Error, StopIteration):
+        return None
+    if len(values) < len(header):
+        return None
+    raw = dict(zip(header, values))
+
+    company_number = normalise_company_number(raw.get(_CSV_FIELDS["company_number"], ""))
+    if not company_number:
+        return None
+
+    sic_codes = []
+    for column in _SIC_COLUMNS:
+        code = (raw.get(column) or "").split(" - ", 1)[0].strip()
+        if code and code != "None Supplied":
+            sic_codes.append(code)
+
+    return company_number, {
+        "company_number": company_number,
+        "company_name": raw.get(_CSV_FIELDS["company_name"], "").strip(),
+        "company_status": raw.get(_CSV_FIELDS["company_status"], "").strip(),
+        "company_category": raw.get(_CSV_FIELDS["company_category"], "").strip(),
+        "incorporation_date": parse_ch_date(raw.get(_CSV_FIELDS["incorporation_date"], "")),
+        "postcode": raw.get(_CSV_FIELDS["postcode"], "").strip().upper(),
+        "sic_codes": sic_codes,
+        "accounts_next_due_date": parse_ch_date(raw.get(_CSV_FIELDS["accounts_next_due_date"], "")),
+        "accounts_last_made_up_date": parse_ch_date(
+            raw.get(_CSV_FIELDS["accounts_last_made_up_date"], "")
+        ),
+    }
+
+
+def parse_psc_line(line: str) -> tuple[str, dict] | None:
+    """Parse one PSC snapshot JSONL line into (company_number, psc)."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    data = record.get("data") or {}
+    company_number = normalise_company_number(record.get("company_number", ""))
+    # Skip the trailing totals record and PSC statements
+    if not company_number or "person-with-significant-control" not in data.get("kind", ""):
+        return None
+    return company_number, {
+        "kind": data.get("kind", ""),
+        "name": data.get("name", ""),
+        "natures_of_control": sorted(data.get("natures_of_control") or []),
+        "notified_on": data.get("notified_on"),
+        "ceased_on": data.get("ceased_on"),
+    }
+
+
+def fingerprint(entity: dict) -> str:
+    """Stable content hash of a normalised entity."""
+    canonical = json.dumps(entity, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+# ── DoFns ──────────────────────────────────────────────────────────
+
+class ParseCompanyDoFn(beam.DoFn):
+    def __init__(self, header: list[str]):
+        self.header = header
+        self.malformed = Metrics.counter("companies_house", "malformed_company_rows")
+
+    def process(self, line):
+        parsed = parse_company_line(line, self.header)
+        if parsed is None:
+            self.malformed.inc()
+            return
+        yield parsed
+
+
+class BuildEntityDoFn(beam.DoFn):
+    """Join a company with its PSCs and attach the entity fingerprint."""
+
+    def process(self, element):
+        company_number, grouped = element
+        companies = grouped["company"]
+        if not companies:
+            return  # PSCs for a company missing from this snapshot
+        entity = dict(companies[0])
+        entity["pscs"] = sorted(
+            grouped["psc"],
+            key=lambda p: (p["kind"], p["name"], p["notified_on"] or ""),
+        )
+        yield company_number, (fingerprint(entity), entity)
+
+
+class DiffSnapshotDoFn(beam.DoFn):
+    """Emit NEW / CHANGED / REMOVED entities against the previous snapshot."""
+
+    def __init__(self, snapshot_date: str):
+        self.snapshot_date = snapshot_date
+        self.counters = {
+            change: Metrics.counter("companies_house", change.lower())
+            for change in ("NEW", "CHANGED", "REMOVED", "UNCHANGED")
+        }
+
+    def process(self, element):
+        company_number, grouped = element
+        current = grouped["current"]
+        previous = grouped["previous"]
+
+        if not current:
+            self.counters["REMOVED"].inc()
+            yield {
+                "company_number": company_number,
+                "change_type": "REMOVED",
+                "sic_codes": [],
+                "snapshot_date": self.snapshot_date,
+            }
+            return
+
+        digest, entity = current[0]
+        if previous and previous[0] == digest:
+            self.counters["UNCHANGED"].inc()
+            return
+
+        change_type = "CHANGED" if previous else "NEW"
+        self.counters[change_type].inc()
+        pscs = entity["pscs"]
+        yield {
+            "company_number": company_number,
+            "change_type": change_type,
+            "company_name": entity["company_name"],
+            "company_status": entity["company_status"],
+            "company_category": entity["company_category"],
+            "incorporation_date": entity["incorporation_date"],
+            "postcode": entity["postcode"],
+            "sic_codes": entity["sic_codes"],
+            "accounts_next_due_date": entity["accounts_next_due_date"],
+            "accounts_last_made_up_date": entity["accounts_last_made_up_date"],
+            "psc_count": sum(1 for p in pscs if not p["ceased_on"]),
+            "pscs_json": json.dumps(pscs),
+            "fingerprint": digest,
+            "snapshot_date": self.snapshot_date,
+        }
+
+
+def parse_snapshot_line(line: str) -> tuple[str, str] | None:
+    try:
+        record = json.loads(line)
+        return record["company_number"], record["fingerprint"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+
+def snapshot_prefix(store: str, snapshot_date: str) -> str:
+    return FileSystems.join(store, snapshot_date, "fingerprints")
+
+
+# ── Pipeline definition ───────────────────────────────────────────
+
 def run(argv=None):
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--input', dest='input', help='Input for processing')
-    parser.add_argument('--output', dest='output', help='Output for results')
-    args, beam_args = parser.parse_known_args(argv)
-
-    options = PipelineOptions(beam_args)
-    with beam.Pipeline(options=options) as p:
-        (p | 'ReadFromSource' >> beam.Create(['Companies House Data Stub'])
-           | 'ProcessSignals' >> beam.Map(lambda x: f"Processed: {x}")
-           | 'WriteToBigQuery' >> beam.Map(logging.info))
-
-if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="IC Origin Companies House bulk ingestion — snapshot diff → BigQuery"
+    )
+    parser.add_argument("--company_data", required=True,
+                        help="BasicCompanyData CSV file or glob.")
+    parser.add_argument("--psc_data", default="",
+                        help="PSC snapshot JSONL file or glob (optional).")
+    parser.add_argument("--snapshot_store", required=True,
+                        help="Local path or gs:// prefix holding per-date fingerprint snapshots.")
+    parser.add_argument("--snapshot_date", default=datetime.date.today().isoformat(),
+                        help="Date of the snapshot being ingested (YYYY-MM-DD).")
+    parser.add_argument("--previous_snapshot_date", default="",
+                        help="Snapshot to diff against; omit on the first run.")
+    parser.add_argument("--output_table", default=COMPANY_CHANGES_TABLE,
+                        help="BigQuery table for changed entities; empty to skip.")
+    parser.add_argument("--changes_path", default="",
+                        help="Optional JSONL output prefix for changed entities.")
+    known_args, pipeline_args = parser.parse_known_args(argv)
+
+    header = read_csv_header(known_args.company_data)
+    pipeline_options = PipelineOptions(pipeline_args)
+
+    with beam.Pipeline(options=pipeline_options) as p:
+        # ── Step 1: Parallel reads (split by file and byte range) ──
+        companies = (
+            p
+            | "ReadCompanyData" >> beam.io.ReadFromText(
+                known_args.company_data, skip_header_lines=1
+            )
+            | "ParseCompanies" >> beam.ParDo(ParseCompanyDoFn(header))
+        )
+        if known_args.psc_data:
+            pscs = (
+                p
+                | "ReadPSCData" >> beam.io.ReadFromText(known_args.psc_data)
+                | "ParsePSCs" >> beam.Map(parse_psc_line)
+                | "DropNonPSC" >> beam.Filter(lambda x: x is not None)
+            )
+        else:
+            pscs = p | "NoPSCData" >> beam.Create([])
+
+        # ── Step 2: Key by company number and build fingerprinted entities ──
+        current = (
+            {"company": companies, "psc": pscs}
+            | "JoinPSCs" >> beam.CoGroupByKey()
+            | "BuildEntities" >> beam.ParDo(BuildEntityDoFn())
+        )
+
+        # ── Step 3: Diff against the previous snapshot ──
+        if known_args.previous_snapshot_date:
+            previous = (
+                p
+                | "ReadPreviousSnapshot" >> beam.io.ReadFromText(
+                    snapshot_prefix(known_args.snapshot_store,
+                                    known_args.previous_snapshot_date) + "*"
+                )
+                | "ParsePreviousSnapshot" >> beam.Map(parse_snapshot_line)
+                | "DropBadSnapshotRows" >> beam.Filter(lambda x: x is not None)
+            )
+        else:
+            previous = p | "NoPreviousSnapshot" >> beam.Create([])
+
+        changes = (
+            {"current": current, "previous": previous}
+            | "JoinPrevious" >> beam.CoGroupByKey()
+            | "DiffSnapshot" >> beam.ParDo(DiffSnapshotDoFn(known_args.snapshot_date))
+        )
+
+        # ── Step 4: Sinks ──
+        if known_args.output_table:
+            changes | "WriteChangesToBigQuery" >> beam.io.WriteToBigQuery(
+                table=known_args.output_table,
+                schema=COMPANY_CHANGES_SCHEMA,
+                write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+                create_disposition=beam.io.BigQueryDisposition.CREATE_IF_NEEDED,
+                method=beam.io.WriteToBigQuery.Method.FILE_LOADS,
+            )
+        if known_args.changes_path:
+            (
+                changes
+                | "ChangesToJson" >> beam.Map(json.dumps)
+                | "WriteChangesJsonl" >> beam.io.WriteToText(
+                    known_args.changes_path, file_name_suffix=".jsonl"
+                )
+            )
+
+        (
+            current
+            | "SnapshotRows" >> beam.Map(
+                lambda kv: json.dumps({"company_number": kv[0], "fingerprint": kv[1][0]})
+            )
+            | "WriteSnapshot" >> beam.io.WriteToText(
+                snapshot_prefix(known_args.snapshot_store, known_args.snapshot_date),
+                file_name_suffix=".jsonl",
+            )
+        )
+
+
+if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
     run()
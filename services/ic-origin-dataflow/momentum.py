@@ -0,0 +1,224 @@
+"""
+IC Origin — Rolling Company Momentum (Apache Beam)
+
+Maintains per-company rolling aggregates over the signal stream with a
+stateful DoFn, so dossier and feed endpoints read momentum with a single
+key lookup instead of running ad-hoc queries per request.
+
+For every signal on a company the DoFn updates a pruned 90-day event
+history held in state and emits one compact momentum row, and a daily
+event-time timer re-emits the row as the windows roll forward, so a
+company that goes quiet decays to zero instead of keeping its last
+momentum:
+
+    signal_count_{7,30,90}d          signals in the trailing window
+    mean_conviction_{7,30,90}d       mean conviction_score in the window
+    elevated_transitions_{7,30,90}d  moves into ELEVATED_RISK from another tier
+    momentum_7_90                    7-day signal rate / 90-day signal rate
+
+Rows are appended to BigQuery `ic_origin.company_momentum` (history) and
+the latest row per company is upserted to Firestore
+`company_momentum/{company_number}` (point lookups from sentinel-growth).
+"""
+
+import datetime
+import logging
+
+import apache_beam as beam
+from apache_beam.coders import PickleCoder, StrUtf8Coder
+from apache_beam.metrics import Metrics
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import (
+    ReadModifyWriteStateSpec,
+    TimerSpec,
+    on_timer,
+)
+from apache_beam.transforms.window import GlobalWindows
+from apache_beam.utils.timestamp import Duration
+
+logger = logging.getLogger(__name__)
+
+MOMENTUM_WINDOWS_DAYS = (7, 30, 90)
+_DAY_SECONDS = 86400
+_HORIZON_SECONDS = max(MOMENTUM_WINDOWS_DAYS) * _DAY_SECONDS
+# How often a quiet company's momentum is recomputed and re-emitted
+MOMENTUM_REFRESH_SECONDS = _DAY_SECONDS
+
+COMPANY_MOMENTUM_TABLE = "ic-origin:ic_origin.company_momentum"
+COMPANY_MOMENTUM_COLLECTION = "company_momentum"
+
+COMPANY_MOMENTUM_SCHEMA = ",".join(
+    ["company_number:STRING", "company_name:STRING", "risk_tier:STRING"]
+    + [f"signal_count_{d}d:INT64" for d in MOMENTUM_WINDOWS_DAYS]
+    + [f"mean_conviction_{d}d:FLOAT64" for d in MOMENTUM_WINDOWS_DAYS]
+    + [f"elevated_transitions_{d}d:INT64" for d in MOMENTUM_WINDOWS_DAYS]
+    + ["momentum_7_90:FLOAT64", "last_signal_at:TIMESTAMP", "updated_at:TIMESTAMP"]
+)
+
+FIRESTORE_BATCH_SIZE = 500
+
+
+def compute_momentum(events: list[tuple], now: float) -> dict:
+    """
+    Aggregate `(timestamp, conviction, risk_tier)` events (oldest first)
+    into the momentum fields for each trailing window ending at `now`.
+    """
+    result = {}
+    for days in MOMENTUM_WINDOWS_DAYS:
+        cutoff = now - days * _DAY_SECONDS
+        count = 0
+        conviction_total = 0
+        transitions = 0
+        previous_tier = None
+        for ts, conviction, tier in events:
+            if ts >= cutoff:
+                count += 1
+                conviction_total += conviction
+                if tier == "ELEVATED_RISK" and previous_tier not in (None, "ELEVATED_RISK"):
+                    transitions += 1
+            previous_tier = tier
+        result[f"signal_count_{days}d"] = count
+        result[f"mean_conviction_{days}d"] = round(conviction_total / count, 2) if count else 0.0
+        result[f"elevated_transitions_{days}d"] = transitions
+
+    rate_90 = result["signal_count_90d"] / 90
+    rate_7 = result["signal_count_7d"] / 7
+    result["momentum_7_90"] = round(rate_7 / rate_90, 3) if rate_90 else 0.0
+    return result
+
+
+def _prune(events: list[tuple], now: float) -> list[tuple]:
+    """Events inside the horizon ending at `now`, plus the last one before it."""
+    cutoff = now - _HORIZON_SECONDS
+    in_horizon = [e for e in events if e[0] >= cutoff]
+    before = [e for e in events if e[0] < cutoff][-1:]
+    return before + in_horizon
+
+
+def _momentum_row(company_number: str, company_name: str, events: list[tuple], now: float) -> dict:
+    return {
+        "company_number": company_number,
+        "company_name": company_name,
+        "risk_tier": events[-1][2],
+        **compute_momentum(events, now),
+        "last_signal_at": datetime.datetime.fromtimestamp(
+            events[-1][0], datetime.timezone.utc
+        ).isoformat(),
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+class CompanyMomentumDoFn(beam.DoFn):
+    """
+    Stateful per-company aggregator. State holds a time-ordered event list
+    pruned to the 90-day horizon (plus the tier just before it, so a
+    transition at the window edge is still detected).
+
+    An event-time timer fires MOMENTUM_REFRESH_SECONDS after the latest
+    event, and then every MOMENTUM_REFRESH_SECONDS, re-emitting the row
+    computed at the timer's time. Once no event is left in the horizon
+    the final, all-zero row is emitted and the state is cleared.
+    """
+
+    EVENTS = ReadModifyWriteStateSpec("events", PickleCoder())
+    COMPANY_NAME = ReadModifyWriteStateSpec("company_name", StrUtf8Coder())
+    REFRESH = TimerSpec("refresh", TimeDomain.WATERMARK)
+
+    def __init__(self):
+        self.updates = Metrics.counter("company_momentum", "updates")
+        self.decays = Metrics.counter("company_momentum", "decays")
+        self.expired = Metrics.counter("company_momentum", "expired")
+
+    def process(
+        self,
+        element,
+        timestamp=beam.DoFn.TimestampParam,
+        events_state=beam.DoFn.StateParam(EVENTS),
+        name_state=beam.DoFn.StateParam(COMPANY_NAME),
+        refresh=beam.DoFn.TimerParam(REFRESH),
+    ):
+        company_number, row = element
+        now = float(timestamp)
+        events = events_state.read() or []
+
+        events.append((now, int(row.get("conviction_score") or 0), row.get("risk_tier", "UNSCORED")))
+        events.sort(key=lambda e: e[0])
+        events = _prune(events, now)
+        events_state.write(events)
+        company_name = row.get("company_name", "")
+        name_state.write(company_name)
+        refresh.set(timestamp + Duration(seconds=MOMENTUM_REFRESH_SECONDS))
+
+        self.updates.inc()
+        yield _momentum_row(company_number, company_name, events, now)
+
+    @on_timer(REFRESH)
+    def decay(
+        self,
+        key=beam.DoFn.KeyParam,
+        fire_timestamp=beam.DoFn.TimestampParam,
+        events_state=beam.DoFn.StateParam(EVENTS),
+        name_state=beam.DoFn.StateParam(COMPANY_NAME),
+        refresh=beam.DoFn.TimerParam(REFRESH),
+    ):
+        events = events_state.read()
+        if not events:
+            return
+        now = float(fire_timestamp)
+        events = _prune(events, now)
+        row = _momentum_row(key, name_state.read() or "", events, now)
+
+        if row[f"signal_count_{max(MOMENTUM_WINDOWS_DAYS)}d"]:
+            events_state.write(events)
+            refresh.set(fire_timestamp + Duration(seconds=MOMENTUM_REFRESH_SECONDS))
+            self.decays.inc()
+        else:
+            events_state.clear()
+            name_state.clear()
+            self.expired.inc()
+        yield row
+
+
+class WriteMomentumToFirestoreDoFn(beam.DoFn):
+    """
+    Upsert the latest momentum row per company, batching writes per bundle
+    (last row per company wins; commits in chunks of 500).
+    """
+
+    def __init__(self, project: str, database: str = "(default)"):
+        self.project = project
+        self.database = database
+
+    def setup(self):
+        from google.cloud import firestore
+
+        self._db = firestore.Client(project=self.project, database=self.database)
+
+    def start_bundle(self):
+        self._latest = {}
+
+    def process(self, row):
+        self._latest[row["company_number"]] = row
+
+    def finish_bundle(self):
+        rows = list(self._latest.values())
+        collection = self._db.collection(COMPANY_MOMENTUM_COLLECTION)
+        for start in range(0, len(rows), FIRESTORE_BATCH_SIZE):
+            batch = self._db.batch()
+            for row in rows[start:start + FIRESTORE_BATCH_SIZE]:
+                batch.set(collection.document(row["company_number"]), row)
+            batch.commit()
+        self._latest = {}
+
+
+class CompanyMomentum(beam.PTransform):
+    """fact_signals rows → per-company rolling momentum rows."""
+
+    def expand(self, rows):
+        return (
+            rows
+            | "GlobalWindow" >> beam.WindowInto(GlobalWindows())
+            | "HasCompany" >> beam.Filter(lambda row: bool(row.get("company_number")))
+            | "KeyByCompany" >> beam.Map(lambda row: (row["company_number"], row))
+            | "RollingAggregates" >> beam.ParDo(CompanyMomentumDoFn())
+        )
@@ -1,20 +1,344 @@
-import apache_beam as beam
-from apache_beam.options.pipeline_options import PipelineOptions
+"""
+IC Origin — Regional RSS Pipeline (Apache Beam / Dataflow, streaming)
+
+Moves RSS polling out of the request-serving sentinel-growth container
+into a horizontally scaling streaming pipeline:
+
+    1. Feed URLs are read from a JSON config (local path or gs://).
+    2. A splittable DoFn polls each feed forever, deferring itself between
+       polls with exponential backoff on errors and unchanged feeds
+       (conditional GET via ETag / Last-Modified).
+    3. Entries are deduplicated by canonical link and by content hash
+       against per-key seen state, so a feed that goes quiet for hours and
+       then republishes old entries does not re-emit them.
+    4. Entries are classified GROWTH vs RESCUE with the same title rule as
+       the sentinel-growth market sweep, then written to
+       `ic_origin.fact_signals` (Storage Write API).
+
+Usage — Local (DirectRunner, bounded number of polls):
+    python regional_rss_pipeline.py \\
+        --feeds_config regional_feeds.json \\
+        --max_polls 1 \\
+        --output_table ""
+
+Usage — GCP Dataflow:
+    python regional_rss_pipeline.py \\
+        --feeds_config gs://ic-origin-config/regional_feeds.json \\
+        --project ic-origin \\
+        --region europe-west2 \\
+        --runner DataflowRunner \\
+        --streaming \\
+        --temp_location gs://ic-origin-dataflow-temp/tmp \\
+        --setup_file ./setup.py
+"""
+
 import argparse
+import datetime
+import hashlib
+import json
 import logging
+import re
+import sys
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import apache_beam as beam
+import feedparser
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.io.restriction_trackers import OffsetRange, OffsetRestrictionTracker
+from apache_beam.io.watermark_estimators import WalltimeWatermarkEstimator
+from apache_beam.metrics import Metrics
+from apache_beam.coders import BooleanCoder
+from apache_beam.options.pipeline_options import PipelineOptions
+from apache_beam.transforms.core import RestrictionProvider
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import ReadModifyWriteStateSpec, TimerSpec, on_timer
+from apache_beam.transforms.window import TimestampedValue
+from apache_beam.utils.timestamp import Duration
+
+from signal_pipeline import FACT_SIGNALS_SCHEMA, FACT_SIGNALS_TABLE
+
+logger = logging.getLogger(__name__)
+
+# ── Classification (exactly sentinel-growth market_sweep's title rule) ──
+GROWTH_TITLE_TERMS = ("acquisition", "investment")
+
+DEFAULT_POLL_SECONDS = 300
+MAX_BACKOFF_SECONDS = 3600
+DEFAULT_CONVICTION = 75
+DEFAULT_DEDUP_RETENTION_SECONDS = 30 * 86400
+
+_TRACKING_PARAMS = re.compile(r"^(utm_|fbclid$|gclid$|oc$)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ── Helpers ────────────────────────────────────────────────────────
+
+def load_feeds(path: str) -> list[dict]:
+    """Load feed definitions: [{name, url, signal_type, region, poll_seconds?}]."""
+    with FileSystems.open(path) as fh:
+        feeds = json.loads(fh.read().decode("utf-8"))
+    return [f for f in feeds if f.get("url") and f.get("active", True)]
+
+
+def canonical_link(link: str) -> str:
+    """Lower-case scheme/host, drop fragments, tracking params and trailing slashes."""
+    parts = urlsplit((link or "").strip())
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)
+    ))
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), query, ""
+    ))
+
+
+def content_hash(title: str, summary: str) -> str:
+    """Hash of normalised title + summary; catches syndicated copies under new links."""
+    text = _WHITESPACE.sub(" ", f"{title} {summary}".lower()).strip()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def classify_signal(title: str, default: str = "RESCUE") -> str:
+    """
+    GROWTH if the title mentions an acquisition or investment, otherwise the
+    feed's configured type. Title only, as in MarketSweepService's watchlist
+    sweep; the summary is deliberately ignored.
+    """
+    lowered = title.lower()
+    if any(term in lowered for term in GROWTH_TITLE_TERMS):
+        return "GROWTH"
+    return default
+
+
+def published_date(published: str, fallback: str) -> str:
+    try:
+        return parsedate_to_datetime(published).date().isoformat()
+    except (TypeError, ValueError, IndexError):
+        return fallback
+
+
+# ── Polling (splittable DoFn) ──────────────────────────────────────
+
+class PollFeedDoFn(beam.DoFn, RestrictionProvider):
+    """
+    Poll one feed per element, then defer the remainder of the restriction
+    until the next poll. The delay doubles (up to MAX_BACKOFF_SECONDS) on
+    fetch errors and unchanged feeds and resets once new entries arrive.
+
+    The DoFn is its own restriction provider: one offset per poll round,
+    unbounded unless `max_polls` is set.
+    """
+
+    def __init__(self, max_polls: int | None = None):
+        self.max_polls = max_polls
+        self.fetched = Metrics.counter("regional_rss", "entries_fetched")
+        self.errors = Metrics.counter("regional_rss", "fetch_errors")
+
+    # ── RestrictionProvider ──
+    def initial_restriction(self, feed):
+        return OffsetRange(0, self.max_polls or sys.maxsize)
+
+    def create_tracker(self, restriction):
+        return OffsetRestrictionTracker(restriction)
+
+    def split(self, feed, restriction):
+        yield restriction  # Poll rounds of one feed are inherently sequential
+
+    def restriction_size(self, feed, restriction):
+        return 1
+
+    # ── Polling ──
+    def setup(self):
+        # Best-effort per-worker state; lost state just means one full fetch.
+        self._validators = {}
+        self._delays = {}
+
+    def _poll(self, feed: dict) -> tuple[list, bool]:
+        url = feed["url"]
+        etag, modified = self._validators.get(url, (None, None))
+        try:
+            parsed = feedparser.parse(url, etag=etag, modified=modified)
+        except Exception as e:
+            logger.warning("Feed fetch failed for %s: %s", url, str(e))
+            return [], False
+        if parsed.get("bozo") and not parsed.entries:
+            logger.warning("Feed unreadable for %s: %s", url, parsed.get("bozo_exception"))
+            return [], False
+        self._validators[url] = (parsed.get("etag"), parsed.get("modified"))
+        return parsed.entries, True
+
+    def _next_delay(self, feed: dict, ok: bool, has_entries: bool) -> int:
+        base = int(feed.get("poll_seconds", DEFAULT_POLL_SECONDS))
+        if ok and has_entries:
+            delay = base
+        else:
+            delay = min(self._delays.get(feed["url"], base) * 2, MAX_BACKOFF_SECONDS)
+        self._delays[feed["url"]] = delay
+        return delay
+
+    @beam.DoFn.unbounded_per_element()
+    def process(
+        self,
+        feed,
+        tracker=beam.DoFn.RestrictionParam(),
+        watermark_estimator=beam.DoFn.WatermarkEstimatorParam(
+            WalltimeWatermarkEstimator.default_provider()
+        ),
+    ):
+        poll = tracker.current_restriction().start
+        if not tracker.try_claim(poll):
+            return
+
+        entries, ok = self._poll(feed)
+        if not ok:
+            self.errors.inc()
+        now = time.time()
+        today = datetime.date.today().isoformat()
+        for entry in entries:
+            link = entry.get("link", "")
+            if not link:
+                continue
+            self.fetched.inc()
+            title = entry.get("title", "")
+            summary = entry.get("summary", "")
+            yield TimestampedValue({
+                "link": canonical_link(link),
+                "content_hash": content_hash(title, summary),
+                "title": title,
+                "summary": summary,
+                "published": entry.get("published", ""),
+                "event_date": published_date(entry.get("published", ""), today),
+                "first_seen": now,
+                "feed_name": feed.get("name", ""),
+                "feed_signal_type": feed.get("signal_type", "RESCUE"),
+                "region": feed.get("region", ""),
+            }, now)
+
+        tracker.defer_remainder(Duration(seconds=self._next_delay(feed, ok, bool(entries))))
+
+
+# ── Stateful dedup ─────────────────────────────────────────────────
+
+class SeenOnceDoFn(beam.DoFn):
+    """
+    Emit the first entry seen for each key and drop the rest. The seen flag
+    lives in per-key state and is cleared by an event-time timer once the
+    key has not been sighted for `retention_seconds`; every sighting pushes
+    the expiry out, so an entry a feed keeps serving is never re-emitted.
+    """
+
+    SEEN = ReadModifyWriteStateSpec("seen", BooleanCoder())
+    EXPIRY = TimerSpec("expiry", TimeDomain.WATERMARK)
+
+    def __init__(self, retention_seconds: int):
+        self.retention_seconds = retention_seconds
+        self.duplicates = Metrics.counter("regional_rss", "duplicates_dropped")
+
+    def process(
+        self,
+        element,
+        timestamp=beam.DoFn.TimestampParam,
+        seen=beam.DoFn.StateParam(SEEN),
+        expiry=beam.DoFn.TimerParam(EXPIRY),
+    ):
+        expiry.set(timestamp + Duration(seconds=self.retention_seconds))
+        if seen.read():
+            self.duplicates.inc()
+            return
+        seen.write(True)
+        yield element[1]
+
+    @on_timer(EXPIRY)
+    def expire(self, seen=beam.DoFn.StateParam(SEEN)):
+        seen.clear()
+
+
+class DedupByKey(beam.PTransform):
+    """Keep the first entry per `key`, remembering keys for `retention_seconds`."""
+
+    def __init__(self, key: str, retention_seconds: int):
+        super().__init__()
+        self.key = key
+        self.retention_seconds = retention_seconds
+
+    def expand(self, entries):
+        return (
+            entries
+            | "KeyBy" >> beam.Map(lambda e, k=self.key: (e[k], e))
+            | "SeenOnce" >> beam.ParDo(SeenOnceDoFn(self.retention_seconds))
+        )
+
+
+def map_entry_to_row(entry: dict) -> dict:
+    """Map a deduplicated RSS entry to the fact_signals schema."""
+    title = entry["title"]
+    return {
+        # Deterministic id so replays collapse onto the same signal
+        "signal_id": hashlib.sha1(entry["link"].encode("utf-8")).hexdigest(),
+        "company_number": "",
+        "company_name": title.split("-")[0].strip() if "-" in title else title[:50],
+        "portfolio_id": "",
+        "risk_tier": "UNSCORED",
+        "conviction_score": DEFAULT_CONVICTION,
+        "signal_type": classify_signal(title, entry["feed_signal_type"]),
+        "source_family": "RSS_NEWS",
+        "region": entry["region"],
+        "ingested_at": datetime.datetime.fromtimestamp(
+            entry["first_seen"], datetime.timezone.utc
+        ).isoformat(),
+        "event_date": entry["event_date"],
+    }
+
+
+# ── Pipeline definition ───────────────────────────────────────────
 
 def run(argv=None):
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--input', dest='input', help='Input for processing')
-    parser.add_argument('--output', dest='output', help='Output for results')
-    args, beam_args = parser.parse_known_args(argv)
-
-    options = PipelineOptions(beam_args)
-    with beam.Pipeline(options=options) as p:
-        (p | 'ReadFromRSS' >> beam.Create(['Regional RSS Feed Stub'])
-           | 'ProcessGrowthSignals' >> beam.Map(lambda x: f"Growth Signal: {x}")
-           | 'WriteToBigQuery' >> beam.Map(logging.info))
-
-if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="IC Origin Regional RSS Pipeline — feeds → fact_signals"
+    )
+    parser.add_argument("--feeds_config", default="regional_feeds.json",
+                        help="JSON list of feeds (local path or gs://).")
+    parser.add_argument("--output_table", default=FACT_SIGNALS_TABLE,
+                        help="BigQuery output table; empty to log rows instead.")
+    parser.add_argument("--dedup_retention_seconds", type=int,
+                        default=DEFAULT_DEDUP_RETENTION_SECONDS,
+                        help="How long a link / content hash is remembered after its last sighting.")
+    parser.add_argument("--max_polls", type=int, default=0,
+                        help="Polls per feed before stopping (0 = poll forever).")
+    parser.add_argument("--triggering_frequency_seconds", type=int, default=5,
+                        help="How often the Storage Write API sink commits appended rows.")
+    known_args, pipeline_args = parser.parse_known_args(argv)
+
+    feeds = load_feeds(known_args.feeds_config)
+    logger.info("Loaded %d regional feeds", len(feeds))
+
+    pipeline_options = PipelineOptions(pipeline_args)
+
+    with beam.Pipeline(options=pipeline_options) as p:
+        rows = (
+            p
+            | "Feeds" >> beam.Create(feeds)
+            | "PollFeeds" >> beam.ParDo(PollFeedDoFn(known_args.max_polls or None))
+            | "DedupByLink" >> DedupByKey("link", known_args.dedup_retention_seconds)
+            | "DedupByContent" >> DedupByKey("content_hash", known_args.dedup_retention_seconds)
+            | "MapToBQRow" >> beam.Map(map_entry_to_row)
+        )
+
+        if known_args.output_table:
+            rows | "WriteToBigQuery" >> beam.io.WriteToBigQuery(
+                table=known_args.output_table,
+                schema=FACT_SIGNALS_SCHEMA,
+                write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+                create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
+                method=beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API,
+                triggering_frequency=known_args.triggering_frequency_seconds,
+                use_at_least_once=True,
+            )
+        else:
+            rows | "LogRows" >> beam.Map(lambda row: logger.info("RSS signal: %s", json.dumps(row)))
+
+
+if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
     run()
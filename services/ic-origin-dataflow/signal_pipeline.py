@@ -1,8 +1,17 @@
 """
 IC Origin — Signal Pipeline (Apache Beam / Dataflow)
 
-Reads signal events from Pub/Sub, applies schema validation and
-windowing, and writes to BigQuery `ic_origin.fact_signals`.
+Reads signal events (JSON or Avro) from Pub/Sub, applies schema validation and
+windowing, and writes to BigQuery `ic_origin.fact_signals` through the
+Storage Write API (replacing legacy streaming inserts).
+
+Malformed payloads are routed to a dead-letter table via a tagged output.
+Rows are deduplicated on signal_id within each window by a stateful DoFn
+before the at-least-once Storage Write API sink, which batches appends
+itself.
+Rolling per-company momentum (momentum.py) is maintained from the same rows.
+
+Throughput can be measured locally with benchmark_pipeline.py.
 
 Usage — Local (DirectRunner):
     python signal_pipeline.py \\
@@ -26,12 +35,19 @@ import logging
 import uuid
 
 import apache_beam as beam
+from apache_beam.coders import BooleanCoder
+from apache_beam.metrics import Metrics
 from apache_beam.options.pipeline_options import PipelineOptions, StandardOptions
+from apache_beam.pvalue import TaggedOutput
+from apache_beam.transforms.userstate import ReadModifyWriteStateSpec
 from apache_beam.transforms.window import FixedWindows
-from apache_beam.transforms.trigger import (
-    AfterWatermark,
-    AfterProcessingTime,
-    AccumulationMode,
+
+import signal_codec
+from momentum import (
+    COMPANY_MOMENTUM_SCHEMA,
+    COMPANY_MOMENTUM_TABLE,
+    CompanyMomentum,
+    WriteMomentumToFirestoreDoFn,
 )
 
 logger = logging.getLogger(__name__)
@@ -53,10 +69,19 @@ FACT_SIGNALS_SCHEMA = (
 
 FACT_SIGNALS_TABLE = "ic-origin:ic_origin.fact_signals"
 
+# Malformed messages are kept for replay rather than dropped.
+DEAD_LETTER_SCHEMA = (
+    "raw_payload:STRING,"
+    "encoding:STRING,"
+    "error:STRING,"
+    "failed_at:TIMESTAMP"
+)
+
+DEAD_LETTER_TABLE = "ic-origin:ic_origin.fact_signals_dead_letter"
+
 VALID_RISK_TIERS = {"ELEVATED_RISK", "STABLE", "IMPROVED", "UNSCORED"}
 VALID_SOURCE_FAMILIES = {"GOV_REGISTRY", "RSS_NEWS", "TALENT_FEED"}
 
-
 # ── Transform functions ────────────────────────────────────────────
 
 def parse_signal_json(message_bytes: bytes) -> dict | None:
@@ -75,13 +100,44 @@ def parse_signal_json(message_bytes: bytes) -> dict | None:
         return None
 
 
-def map_to_bigquery_row(signal: dict) -> dict:
+def decode_signal_avro(message_bytes: bytes) -> dict | None:
+    """
+    Decode an Avro binary SignalEvent datum.
+    Returns None for truncated or malformed datums.
+    """
+    try:
+        return signal_codec.decode_signal_avro(message_bytes)
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.error("Failed to decode Avro signal: %s", str(e))
+        return None
+
+
+def parse_signal_message(message) -> dict | None:
+    """
+    Parse a Pub/Sub message using its `encoding` attribute (json | avro).
+    Accepts raw bytes for messages read without attributes.
+    """
+    if isinstance(message, (bytes, bytearray)):
+        return parse_signal_json(message)
+    encoding = (message.attributes or {}).get("encoding", "json")
+    if encoding == "avro":
+        return decode_signal_avro(message.data)
+    return parse_signal_json(message.data)
+
+
+def map_to_bigquery_row(signal: dict, now_iso: str | None = None,
+                        today_iso: str | None = None) -> dict:
     """
     Map a parsed signal dict to the BigQuery fact_signals schema.
     Applies defaults and type coercion for missing/invalid fields.
+
+    `now_iso` / `today_iso` let callers read the clock once per bundle
+    instead of once per element.
     """
-    now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    today_iso = datetime.date.today().isoformat()
+    if now_iso is None:
+        now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    if today_iso is None:
+        today_iso = datetime.date.today().isoformat()
 
     risk_tier = signal.get("risk_tier", "UNSCORED")
     if risk_tier not in VALID_RISK_TIERS:
@@ -97,7 +153,7 @@ def map_to_bigquery_row(signal: dict) -> dict:
         conviction = 0
 
     return {
-        "signal_id": signal.get("signal_id", str(uuid.uuid4())),
+        "signal_id": signal.get("signal_id") or str(uuid.uuid4()),
         "company_number": signal.get("company_number", ""),
         "company_name": signal.get("company_name", ""),
         "portfolio_id": signal.get("portfolio_id", ""),
@@ -106,11 +162,123 @@ def map_to_bigquery_row(signal: dict) -> dict:
         "signal_type": signal.get("signal_type", "UNKNOWN"),
         "source_family": source_family,
         "region": signal.get("region", ""),
-        "ingested_at": signal.get("ingested_at", now_iso),
-        "event_date": signal.get("event_date", today_iso),
+        "ingested_at": signal.get("ingested_at") or now_iso,
+        "event_date": signal.get("event_date") or today_iso,
     }
 
 
+# ── DoFns ──────────────────────────────────────────────────────────
+
+class ParseSignalDoFn(beam.DoFn):
+    """
+    Parse Pub/Sub messages; malformed payloads go to the dead-letter output
+    instead of being silently dropped.
+    """
+
+    DEAD_LETTER = "dead_letter"
+
+    def __init__(self):
+        self.parsed = Metrics.counter("signal_pipeline", "parsed")
+        self.dead_letters = Metrics.counter("signal_pipeline", "dead_letters")
+
+    def process(self, message):
+        signal = parse_signal_message(message)
+        if signal is not None:
+            self.parsed.inc()
+            yield signal
+            return
+
+        self.dead_letters.inc()
+        if isinstance(message, (bytes, bytearray)):
+            data, attributes = bytes(message), {}
+        else:
+            data, attributes = message.data, dict(message.attributes or {})
+        yield TaggedOutput(self.DEAD_LETTER, {
+            "raw_payload": data.decode("utf-8", errors="replace"),
+            "encoding": attributes.get("encoding", "json"),
+            "error": "Malformed signal payload",
+            "failed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+
+
+class MapToRowsDoFn(beam.DoFn):
+    """
+    Map signals to fact_signals rows.
+
+    The clock is read once per bundle, and repeated signal_ids within a
+    bundle are dropped before the stateful dedup so redelivered messages
+    cost as little as possible.
+    """
+
+    def __init__(self):
+        self.bundle_duplicates = Metrics.counter("signal_pipeline", "bundle_duplicates")
+
+    def start_bundle(self):
+        self._now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self._today_iso = datetime.date.today().isoformat()
+        self._seen = set()
+
+    def process(self, signal):
+        row = map_to_bigquery_row(signal, self._now_iso, self._today_iso)
+        if row["signal_id"] in self._seen:
+            self.bundle_duplicates.inc()
+            return
+        self._seen.add(row["signal_id"])
+        yield row
+
+
+class DedupBySignalIdDoFn(beam.DoFn):
+    """
+    Emit the first row seen for each signal_id and drop the rest.
+
+    Input is keyed by signal_id. State is per key and window, so it is
+    released when the window expires, and rows are emitted as they
+    arrive: there are no panes for a duplicate to slip through between.
+    """
+
+    SEEN = ReadModifyWriteStateSpec("seen", BooleanCoder())
+
+    def __init__(self):
+        self.duplicates = Metrics.counter("signal_pipeline", "duplicates")
+
+    def process(self, element, seen=beam.DoFn.StateParam(SEEN)):
+        _, row = element
+        if seen.read():
+            self.duplicates.inc()
+            return
+        seen.write(True)
+        yield row
+
+
+# ── Composite transform ───────────────────────────────────────────
+
+class SignalsToRows(beam.PTransform):
+    """
+    Pub/Sub messages → deduplicated fact_signals rows.
+
+    Returns a (rows, dead_letters) pair of PCollections. Dedup on
+    signal_id is per window: Pub/Sub redeliveries that land in the same
+    window collapse to one row; the sink itself is at-least-once.
+    """
+
+    def __init__(self, window_size_seconds: int = 60):
+        super().__init__()
+        self.window_size_seconds = window_size_seconds
+
+    def expand(self, messages):
+        parsed = messages | "Parse" >> beam.ParDo(ParseSignalDoFn()).with_outputs(
+            ParseSignalDoFn.DEAD_LETTER, main="signals"
+        )
+        rows = (
+            parsed.signals
+            | "Window" >> beam.WindowInto(FixedWindows(self.window_size_seconds))
+            | "MapToRows" >> beam.ParDo(MapToRowsDoFn())
+            | "KeyBySignalId" >> beam.Map(lambda row: (row["signal_id"], row))
+            | "DedupBySignalId" >> beam.ParDo(DedupBySignalIdDoFn())
+        )
+        return rows, parsed[ParseSignalDoFn.DEAD_LETTER]
+
+
 # ── Pipeline definition ───────────────────────────────────────────
 
 def run(argv=None):
@@ -127,12 +295,39 @@ def run(argv=None):
         default=FACT_SIGNALS_TABLE,
         help="BigQuery output table (project:dataset.table).",
     )
+    parser.add_argument(
+        "--dead_letter_table",
+        default=DEAD_LETTER_TABLE,
+        help="BigQuery table receiving malformed messages.",
+    )
+    parser.add_argument(
+        "--triggering_frequency_seconds",
+        type=int,
+        default=5,
+        help="How often the Storage Write API sink commits appended rows.",
+    )
     parser.add_argument(
         "--window_size_seconds",
         type=int,
         default=60,
         help="Fixed window size in seconds.",
     )
+    parser.add_argument(
+        "--momentum_table",
+        default=COMPANY_MOMENTUM_TABLE,
+        help="BigQuery table for rolling company momentum rows.",
+    )
+    parser.add_argument(
+        "--firestore_project",
+        default="",
+        help="Project whose Firestore receives the latest momentum per company "
+             "(empty to skip).",
+    )
+    parser.add_argument(
+        "--firestore_database",
+        default="(default)",
+        help="Firestore database for company momentum documents.",
+    )
 
     known_args, pipeline_args = parser.parse_known_args(argv)
 
@@ -140,39 +335,57 @@ def run(argv=None):
     pipeline_options.view_as(StandardOptions).streaming = True
 
     with beam.Pipeline(options=pipeline_options) as p:
-        (
-            p
-            # ── Step 1: Read from Pub/Sub ──
-            | "ReadFromPubSub"
-            >> beam.io.ReadFromPubSub(
-                subscription=known_args.input_subscription,
-            )
-            # ── Step 2: Parse JSON payload ──
-            | "ParseJSON" >> beam.Map(parse_signal_json)
-            # ── Step 3: Filter dead-letter (malformed) messages ──
-            | "FilterInvalid" >> beam.Filter(lambda x: x is not None)
-            # ── Step 4: Apply Fixed Windowing with late-data handling ──
-            | "Window"
-            >> beam.WindowInto(
-                FixedWindows(known_args.window_size_seconds),
-                trigger=AfterWatermark(
-                    early=AfterProcessingTime(30),
-                ),
-                accumulation_mode=AccumulationMode.DISCARDING,
-            )
-            # ── Step 5: Map to BigQuery row schema ──
-            | "MapToBQRow" >> beam.Map(map_to_bigquery_row)
-            # ── Step 6: Write to BigQuery ──
-            | "WriteToBigQuery"
-            >> beam.io.WriteToBigQuery(
-                table=known_args.output_table,
-                schema=FACT_SIGNALS_SCHEMA,
-                write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
-                create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
-                method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS,
-            )
+        # ── Step 1: Read from Pub/Sub ──
+        messages = p | "ReadFromPubSub" >> beam.io.ReadFromPubSub(
+            subscription=known_args.input_subscription,
+            with_attributes=True,
         )
 
+        # ── Step 2: Parse, window and dedup (bad payloads → dead letter) ──
+        rows, dead_letters = messages | "SignalsToRows" >> SignalsToRows(
+            window_size_seconds=known_args.window_size_seconds,
+        )
+
+        # ── Step 3: Write to BigQuery (Storage Write API, at-least-once) ──
+        rows | "WriteToBigQuery" >> beam.io.WriteToBigQuery(
+            table=known_args.output_table,
+            schema=FACT_SIGNALS_SCHEMA,
+            write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+            create_disposition=beam.io.BigQueryDisposition.CREATE_NEVER,
+            method=beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API,
+            triggering_frequency=known_args.triggering_frequency_seconds,
+            use_at_least_once=True,
+        )
+
+        # ── Step 4: Dead-letter sink ──
+        dead_letters | "WriteDeadLetters" >> beam.io.WriteToBigQuery(
+            table=known_args.dead_letter_table,
+            schema=DEAD_LETTER_SCHEMA,
+            write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+            create_disposition=beam.io.BigQueryDisposition.CREATE_IF_NEEDED,
+            method=beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API,
+            triggering_frequency=known_args.triggering_frequency_seconds,
+            use_at_least_once=True,
+        )
+
+        # ── Step 5: Rolling per-company momentum (7 / 30 / 90 days) ──
+        momentum = rows | "CompanyMomentum" >> CompanyMomentum()
+        momentum | "WriteMomentum" >> beam.io.WriteToBigQuery(
+            table=known_args.momentum_table,
+            schema=COMPANY_MOMENTUM_SCHEMA,
+            write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
+            create_disposition=beam.io.BigQueryDisposition.CREATE_IF_NEEDED,
+            method=beam.io.WriteToBigQuery.Method.STORAGE_WRITE_API,
+            triggering_frequency=known_args.triggering_frequency_seconds,
+            use_at_least_once=True,
+        )
+        if known_args.firestore_project:
+            momentum | "UpsertMomentumDocs" >> beam.ParDo(
+                WriteMomentumToFirestoreDoFn(
+                    known_args.firestore_project, known_args.firestore_database
+                )
+            )
+
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.INFO)
@@ -0,0 +1,82 @@
+"""
+Companies House pipeline tests — runs the bulk pipeline on the sample
+snapshot files (DirectRunner) and checks the emitted change rows.
+"""
+import glob
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from companies_house_pipeline import parse_company_line, read_csv_header, run
+
+SAMPLES = os.path.join(os.path.dirname(__file__), "..", "samples")
+COMPANY_DATA = os.path.join(SAMPLES, "BasicCompanyData-sample.csv")
+PSC_DATA = os.path.join(SAMPLES, "psc-sample.jsonl")
+
+
+def _run(tmp_path, snapshot_date, previous="", company_data=COMPANY_DATA):
+    changes = tmp_path / f"changes-{snapshot_date}"
+    run([
+        "--company_data", str(company_data),
+        "--psc_data", PSC_DATA,
+        "--snapshot_store", str(tmp_path / "snapshots"),
+        "--snapshot_date", snapshot_date,
+        "--previous_snapshot_date", previous,
+        "--output_table", "",
+        "--changes_path", str(changes),
+    ])
+    rows = []
+    for path in glob.glob(f"{changes}*.jsonl"):
+        with open(path) as f:
+            rows += [json.loads(line) for line in f]
+    return {row["company_number"]: row for row in rows}
+
+
+def test_parse_company_line_normalises_fields():
+    header = read_csv_header(COMPANY_DATA)
+    with open(COMPANY_DATA) as f:
+        lines = f.read().splitlines()[1:]
+
+    number, record = parse_company_line(lines[2], header)
+
+    assert number == "01234567"
+    assert record["incorporation_date"] == "2009-09-12"
+    assert record["sic_codes"] == []
+    assert parse_company_line(lines[1], header)[1]["postcode"] == "EH1 1AA"
+
+
+def test_first_run_then_unchanged_then_diff(tmp_path):
+    first = _run(tmp_path, "2026-09-01")
+
+    assert set(first) == {"00445790", "SC123456", "01234567"}
+    assert {row["change_type"] for row in first.values()} == {"NEW"}
+    # PSCs joined by company; the ceased PSC doesn't count
+    assert first["SC123456"]["psc_count"] == 1
+    assert first["01234567"]["psc_count"] == 0
+    assert json.loads(first["01234567"]["pscs_json"])[0]["name"] == "Mr John Example"
+    snapshot = glob.glob(str(tmp_path / "snapshots" / "2026-09-01" / "fingerprints*.jsonl"))
+    assert len(snapshot) == 1
+
+    # Same files against the first snapshot: nothing changed
+    assert _run(tmp_path, "2026-09-15", previous="2026-09-01") == {}
+
+    # Tesco renamed, Northern Fabrication gone, a new company added
+    with open(COMPANY_DATA) as f:
+        lines = f.read().splitlines()
+    lines[1] = lines[1].replace("TESCO PLC", "TESCO STORES PLC")
+    del lines[3]
+    lines.append(lines[2].replace("SC123456", "SC654321"))
+    changed_data = tmp_path / "BasicCompanyData-changed.csv"
+    changed_data.write_text("\n".join(lines) + "\n")
+
+    diff = _run(tmp_path, "2026-10-01", previous="2026-09-15", company_data=changed_data)
+
+    assert {number: row["change_type"] for number, row in diff.items()} == {
+        "00445790": "CHANGED",
+        "01234567": "REMOVED",
+        "SC654321": "NEW",
+    }
+    assert diff["00445790"]["company_name"] == "TESCO STORES PLC"
+    assert diff["00445790"]["snapshot_date"] == "2026-10-01"
@@ -0,0 +1,112 @@
+"""
+Company momentum tests — the stateful DoFn, including decay from the timer.
+"""
+import os
+import sys
+
+import apache_beam as beam
+from apache_beam.options.pipeline_options import PipelineOptions, StandardOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.test_stream import TestStream
+from apache_beam.testing.util import BeamAssertException, assert_that
+from apache_beam.transforms.window import TimestampedValue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from momentum import CompanyMomentum, MOMENTUM_WINDOWS_DAYS, compute_momentum
+
+DAY = 86400
+
+
+def _row(conviction, tier="ELEVATED_RISK"):
+    return {
+        "company_number": "00445790",
+        "company_name": "TESCO PLC",
+        "conviction_score": conviction,
+        "risk_tier": tier,
+    }
+
+
+def _run(stream, check):
+    options = PipelineOptions()
+    options.view_as(StandardOptions).streaming = True
+    with TestPipeline(options=options) as p:
+        momentum = p | stream | CompanyMomentum()
+        assert_that(momentum, check)
+
+
+def test_quiet_company_decays_to_zero():
+    stream = (
+        TestStream()
+        .advance_watermark_to(0)
+        .add_elements([TimestampedValue(_row(60, "STABLE"), 0), TimestampedValue(_row(80), DAY)])
+        .advance_watermark_to(100 * DAY)
+    )
+
+    def check(rows):
+        counts = sorted(
+            (row["signal_count_7d"], row["signal_count_90d"], row["elevated_transitions_90d"])
+            for row in rows
+        )
+        # Two rows from the events, then one per quiet day: both signals in the
+        # 7-day window until day 7, one until day 8, then only the 90-day window
+        # until it expires with a final all-zero row.
+        if (0, 0, 0) not in counts:
+            raise BeamAssertException(f"no expiry row in {counts}")
+        zero = [row for row in rows if row["signal_count_90d"] == 0]
+        if len(zero) != 1:
+            raise BeamAssertException(f"expected one expiry row, got {len(zero)}")
+        final = zero[0]
+        for days in MOMENTUM_WINDOWS_DAYS:
+            if final[f"signal_count_{days}d"] or final[f"mean_conviction_{days}d"]:
+                raise BeamAssertException(f"expiry row not zero: {final}")
+        if final["momentum_7_90"] != 0.0 or final["company_name"] != "TESCO PLC":
+            raise BeamAssertException(f"bad expiry row: {final}")
+        decayed = [c for c in counts if c[0] == 0 and c[1] == 2]
+        if not decayed or decayed[0][2] != 1:
+            raise BeamAssertException(f"no decayed 7-day row in {counts}")
+        if counts.count((2, 2, 1)) < 2:
+            raise BeamAssertException(f"expected event and refresh rows in {counts}")
+
+    _run(stream, check)
+
+
+def test_new_signal_resets_refresh():
+    stream = (
+        TestStream()
+        .advance_watermark_to(0)
+        .add_elements([TimestampedValue(_row(50), 0)])
+        .advance_watermark_to(int(DAY * 1.5))
+        .add_elements([TimestampedValue(_row(70), int(DAY * 1.5))])
+        .advance_watermark_to(int(DAY * 2))
+    )
+
+    def check(rows):
+        counts = sorted(row["signal_count_7d"] for row in rows)
+        # Event at 0, refresh at day 1, event at day 1.5; the next refresh is
+        # day 2.5, which the watermark never reaches.
+        if counts != [1, 1, 2]:
+            raise BeamAssertException(f"unexpected rows {counts}")
+
+    _run(stream, check)
+
+
+def test_window_counts_and_mean_conviction():
+    events = [(0, 50, "STABLE"), (60 * DAY, 80, "STABLE"), (88 * DAY, 90, "STABLE")]
+    m = compute_momentum(events, 89 * DAY)
+    assert (m["signal_count_7d"], m["signal_count_30d"], m["signal_count_90d"]) == (1, 2, 3)
+    assert m["mean_conviction_30d"] == 85.0
+
+
+def test_elevated_transition_at_window_edge_counts():
+    """A move into ELEVATED_RISK is detected even if the prior tier is outside the window."""
+    events = [(0, 50, "STABLE"), (85 * DAY, 80, "ELEVATED_RISK"), (86 * DAY, 80, "ELEVATED_RISK")]
+    m = compute_momentum(events, 89 * DAY)
+    assert m["elevated_transitions_7d"] == 1
+    assert m["elevated_transitions_90d"] == 1
+
+
+def test_no_events_yields_zero_momentum():
+    m = compute_momentum([], 0)
+    assert m["signal_count_90d"] == 0
+    assert m["momentum_7_90"] == 0.0
@@ -0,0 +1,215 @@
+"""
+Regional RSS pipeline tests — feed config, backoff, stateful dedup and
+classification.
+"""
+import json
+import os
+import sys
+
+import apache_beam as beam
+import feedparser
+from apache_beam.options.pipeline_options import PipelineOptions, StandardOptions
+from apache_beam.testing.test_pipeline import TestPipeline
+from apache_beam.testing.test_stream import TestStream
+from apache_beam.testing.util import assert_that, equal_to
+from apache_beam.transforms.window import TimestampedValue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import regional_rss_pipeline
+from regional_rss_pipeline import (
+    DEFAULT_POLL_SECONDS,
+    MAX_BACKOFF_SECONDS,
+    DedupByKey,
+    PollFeedDoFn,
+    canonical_link,
+    classify_signal,
+    content_hash,
+    load_feeds,
+    map_entry_to_row,
+)
+
+HOUR = 3600
+DAY = 86400
+
+FEED = {"name": "Scotland", "url": "https://feeds.example/scotland", "signal_type": "RESCUE",
+        "region": "Scotland", "poll_seconds": 60}
+
+
+def _entry(link, title, summary="", first_seen=0.0):
+    return {
+        "link": canonical_link(link),
+        "content_hash": content_hash(title, summary),
+        "title": title,
+        "summary": summary,
+        "published": "",
+        "event_date": "2026-01-01",
+        "first_seen": first_seen,
+        "feed_name": FEED["name"],
+        "feed_signal_type": FEED["signal_type"],
+        "region": FEED["region"],
+    }
+
+
+def _dedup(stream):
+    options = PipelineOptions()
+    options.view_as(StandardOptions).streaming = True
+    p = TestPipeline(options=options)
+    titles = (
+        p
+        | stream
+        | "DedupByLink" >> DedupByKey("link", 30 * DAY)
+        | "DedupByContent" >> DedupByKey("content_hash", 30 * DAY)
+        | beam.Map(lambda e: e["title"])
+    )
+    return p, titles
+
+
+# ── Feed config ──
+
+def test_load_feeds_skips_inactive_and_urlless(tmp_path):
+    path = tmp_path / "feeds.json"
+    path.write_text(json.dumps([
+        FEED,
+        {"name": "Off", "url": "https://feeds.example/off", "active": False},
+        {"name": "No URL"},
+    ]))
+
+    assert [f["name"] for f in load_feeds(str(path))] == ["Scotland"]
+
+
+def test_shipped_feed_config_is_valid():
+    feeds = load_feeds(os.path.join(os.path.dirname(__file__), "..", "regional_feeds.json"))
+
+    assert feeds
+    for feed in feeds:
+        assert feed["signal_type"] in ("GROWTH", "RESCUE")
+        assert feed["region"]
+
+
+# ── Polling and backoff ──
+
+def test_backoff_doubles_until_capped_and_resets_on_entries():
+    fn = PollFeedDoFn()
+    fn.setup()
+    feed = {"url": "https://feeds.example/a"}
+
+    delays = [fn._next_delay(feed, ok=False, has_entries=False) for _ in range(6)]
+    assert delays == [2 * DEFAULT_POLL_SECONDS, 4 * DEFAULT_POLL_SECONDS, 8 * DEFAULT_POLL_SECONDS,
+                      MAX_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS]
+    assert fn._next_delay(feed, ok=True, has_entries=True) == DEFAULT_POLL_SECONDS
+    # An unchanged (304) feed backs off like an error
+    assert fn._next_delay(feed, ok=True, has_entries=False) == 2 * DEFAULT_POLL_SECONDS
+
+
+def test_poll_sends_stored_validators(monkeypatch):
+    calls = []
+
+    def fake_parse(url, etag=None, modified=None):
+        calls.append((etag, modified))
+        return feedparser.FeedParserDict(entries=[], etag='"v2"', modified="Mon, 01 Jan 2026")
+
+    monkeypatch.setattr(regional_rss_pipeline.feedparser, "parse", fake_parse)
+    fn = PollFeedDoFn()
+    fn.setup()
+
+    assert fn._poll(FEED) == ([], True)
+    fn._poll(FEED)
+
+    assert calls == [(None, None), ('"v2"', "Mon, 01 Jan 2026")]
+
+
+def test_single_poll_emits_canonical_entries(monkeypatch):
+    entries = [
+        {"link": "HTTPS://News.Example/a/?utm_source=x", "title": "Acme - Investment round"},
+        {"link": "", "title": "No link"},
+    ]
+    monkeypatch.setattr(
+        regional_rss_pipeline.feedparser, "parse",
+        lambda url, etag=None, modified=None: feedparser.FeedParserDict(entries=entries),
+    )
+
+    with TestPipeline() as p:
+        polled = (
+            p
+            | beam.Create([FEED])
+            | beam.ParDo(PollFeedDoFn(max_polls=1))
+            | beam.Map(lambda e: (e["link"], e["feed_signal_type"], e["region"]))
+        )
+        assert_that(polled, equal_to([("https://news.example/a", "RESCUE", "Scotland")]))
+
+
+# ── Dedup ──
+
+def test_dedup_by_link_and_content_hash():
+    stream = (
+        TestStream()
+        .advance_watermark_to(0)
+        .add_elements([
+            TimestampedValue(_entry("https://a.example/1", "First"), 0),
+            TimestampedValue(_entry("https://a.example/1/?utm_medium=rss", "First again"), 10),
+            TimestampedValue(_entry("https://b.example/syndicated", "  FIRST "), 20),
+            TimestampedValue(_entry("https://a.example/2", "Second"), 30),
+        ])
+        .advance_watermark_to(HOUR)
+    )
+    p, titles = _dedup(stream)
+    assert_that(titles, equal_to(["First", "Second"]))
+    p.run()
+
+
+def test_dedup_survives_long_quiet_feed():
+    # The feed returns 304 for two days, then changes and republishes the
+    # old entry alongside a new one; only the new one is emitted.
+    stream = (
+        TestStream()
+        .advance_watermark_to(0)
+        .add_elements([TimestampedValue(_entry("https://a.example/1", "Old"), 0)])
+        .advance_watermark_to(2 * DAY)
+        .add_elements([
+            TimestampedValue(_entry("https://a.example/1", "Old"), 2 * DAY),
+            TimestampedValue(_entry("https://a.example/2", "New"), 2 * DAY),
+        ])
+        .advance_watermark_to(3 * DAY)
+    )
+    p, titles = _dedup(stream)
+    assert_that(titles, equal_to(["Old", "New"]))
+    p.run()
+
+
+def test_dedup_forgets_keys_after_retention():
+    stream = (
+        TestStream()
+        .advance_watermark_to(0)
+        .add_elements([TimestampedValue(_entry("https://a.example/1", "Old"), 0)])
+        .advance_watermark_to(31 * DAY)
+        .add_elements([TimestampedValue(_entry("https://a.example/1", "Old"), 31 * DAY)])
+        .advance_watermark_to(32 * DAY)
+    )
+    p, titles = _dedup(stream)
+    assert_that(titles, equal_to(["Old", "Old"]))
+    p.run()
+
+
+# ── Classification ──
+
+def test_classify_matches_market_sweep_title_rule():
+    assert classify_signal("Acme completes ACQUISITION of Widgets", "RESCUE") == "GROWTH"
+    assert classify_signal("Investment for Scottish brewer", "RESCUE") == "GROWTH"
+    # Other deal words and the summary do not count; the feed's type wins
+    assert classify_signal("Acme acquires Widgets", "RESCUE") == "RESCUE"
+    assert classify_signal("Acme enters administration", "GROWTH") == "GROWTH"
+
+
+def test_map_entry_to_row_classifies_on_title_only():
+    entry = _entry("https://a.example/1", "Acme Ltd - enters administration",
+                   summary="Follows a failed investment round", first_seen=0.0)
+    entry["feed_signal_type"] = "RESCUE"
+
+    row = map_entry_to_row(entry)
+
+    assert row["signal_type"] == "RESCUE"
+    assert row["company_name"] == "Acme Ltd"
+    assert row["source_family"] == "RSS_NEWS"
+    assert row["region"] == "Scotland"
+    assert row["ingested_at"] == "1970-01-01T00:00:00+00:00"
@@ -0,0 +1,27 @@
+"""
+Signal codec tests — the vendored copy must match sentinel-growth's.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from signal_codec import decode_signal_avro, encode_signal_avro
+
+HERE = os.path.dirname(__file__)
+PUBLISHER_COPY = os.path.join(HERE, "..", "..", "sentinel-growth", "src", "services", "signal_codec.py")
+
+
+@pytest.mark.skipif(not os.path.exists(PUBLISHER_COPY), reason="sentinel-growth not in this checkout")
+def test_vendored_codec_matches_publisher():
+    with open(os.path.join(HERE, "..", "signal_codec.py"), "rb") as vendored, open(PUBLISHER_COPY, "rb") as publisher:
+        assert vendored.read() == publisher.read(), "copy sentinel-growth/src/services/signal_codec.py here"
+
+
+def test_avro_round_trip():
+    event = {"signal_id": "sig-1", "company_number": "00445790", "conviction_score": 70}
+    decoded = decode_signal_avro(encode_signal_avro(event))
+    assert decoded["signal_id"] == "sig-1"
+    assert decoded["conviction_score"] == 70
@@ -0,0 +1,319 @@
+"""
+IC Origin — Companies House Name Index
+
+Precomputed, in-memory name index used by `/resolve-entities` to map
+free-text company names onto Companies House company numbers without
+calling the Companies House search API.
+
+Resolution is two-stage:
+    1. Candidate generation — normalised names are split into padded
+       character trigrams held in an inverted index. The rarest query
+       trigrams are probed first and candidates are ranked by trigram
+       Jaccard overlap.
+    2. Re-ranking — the best candidates are re-scored with Jaro-Winkler
+       similarity on the normalised name.
+
+The index is built from a local Companies House snapshot (the
+BasicCompanyData CSV) and can be pickled so that workers load a
+prebuilt index instead of re-tokenising millions of names on boot.
+
+Usage — build a prebuilt index from a snapshot:
+    python entity_index.py \\
+        --snapshot BasicCompanyDataAsOneFile.csv \\
+        --output ch_name_index.pkl
+"""
+
+import argparse
+import csv
+import heapq
+import logging
+import os
+import pickle
+import re
+from array import array
+from collections import Counter
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Legal-form and filler tokens that carry no identifying signal.
+_STOP_TOKENS = frozenset({
+    "LIMITED", "LTD", "PLC", "LLP", "LP", "CIC", "CO", "COMPANY",
+    "THE", "UK", "GROUP", "HOLDINGS",
+})
+_NON_ALNUM = re.compile(r"[^A-Z0-9 ]+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Candidate-generation tuning
+MAX_PROBE_GRAMS = 12          # Rarest trigrams probed per query
+MAX_POSTINGS_TOUCHED = 20_000  # Stop probing once this many postings are scanned
+CANDIDATE_POOL = 64           # Candidates passed to the Jaro-Winkler re-ranker
+INDEX_FORMAT_VERSION = 1
+
+
+def normalise_name(name: str) -> str:
+    """
+    Normalise a company name for matching.
+
+    Upper-cases, expands '&', strips punctuation and drops legal-form
+    tokens (LTD, PLC, ...). Falls back to the un-filtered tokens if the
+    name consists only of stop tokens.
+    """
+    text = (name or "").upper().replace("&", " AND ")
+    text = _NON_ALNUM.sub(" ", text)
+    tokens = _WHITESPACE.sub(" ", text).strip().split(" ")
+    kept = [t for t in tokens if t and t not in _STOP_TOKENS]
+    return " ".join(kept or [t for t in tokens if t])
+
+
+def trigrams(normalised: str) -> set[str]:
+    """Padded character trigrams of a normalised name."""
+    padded = f"  {normalised} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def jaro_winkler(s1: str, s2: str, prefix_weight: float = 0.1) -> float:
+    """Jaro-Winkler similarity in [0, 1]."""
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+
+    match_distance = max(max(len1, len2) // 2 - 1, 0)
+    s1_matches = [False] * len1
+    s2_matches = [False] * len2
+
+    matches = 0
+    for i, ch in enumerate(s1):
+        start = max(0, i - match_distance)
+        end = min(i + match_distance + 1, len2)
+        for j in range(start, end):
+            if not s2_matches[j] and s2[j] == ch:
+                s1_matches[i] = s2_matches[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    k = 0
+    for i in range(len1):
+        if s1_matches[i]:
+            while not s2_matches[k]:
+                k += 1
+            if s1[i] != s2[k]:
+                transpositions += 1
+            k += 1
+
+    jaro = (
+        matches / len1
+        + matches / len2
+        + (matches - transpositions / 2) / matches
+    ) / 3.0
+
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_weight * (1.0 - jaro)
+
+
+class CompanyNameIndex:
+    """
+    Trigram inverted index over Companies House company names with a
+    Jaro-Winkler re-ranker.
+
+    Records are stored column-wise (parallel lists) and postings as
+    compact `array('I')` row-id lists to keep a full-register index
+    within a Cloud Run instance's memory.
+    """
+
+    def __init__(self):
+        self._numbers: list[str] = []
+        self._names: list[str] = []
+        self._normalised: list[str] = []
+        self._gram_counts = array("H")
+        self._postings: dict[str, array] = {}
+        self._exact: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    # ── Build ──────────────────────────────────────────────────────
+
+    def add(self, company_number: str, company_name: str) -> None:
+        """Add a single company to the index."""
+        company_number = (company_number or "").strip().upper()
+        normalised = normalise_name(company_name)
+        if not company_number or not normalised:
+            return
+
+        row_id = len(self._numbers)
+        self._numbers.append(company_number)
+        self._names.append(company_name.strip())
+        self._normalised.append(normalised)
+
+        grams = trigrams(normalised)
+        self._gram_counts.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array("I")
+            posting.append(row_id)
+        # First registration wins for exact matches (oldest number in a CH snapshot)
+        self._exact.setdefault(normalised, row_id)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "CompanyNameIndex":
+        """Build an index from dicts with `company_number` and `company_name`."""
+        index = cls()
+        for record in records:
+            index.add(record.get("company_number", ""), record.get("company_name", ""))
+        return index
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "CompanyNameIndex":
+        """
+        Build an index from a Companies House BasicCompanyData CSV.
+
+        The official file has padded headers (e.g. ' CompanyNumber'), so
+        headers are stripped before lookup. Snake-case headers are also
+        accepted for hand-built fixtures.
+        """
+        index = cls()
+        with open(path, newline="", encoding="utf-8-sig") as fh:
+            reader = csv.reader(fh)
+            header = [h.strip() for h in next(reader, [])]
+            name_col = _column(header, "CompanyName", "company_name")
+            number_col = _column(header, "CompanyNumber", "company_number")
+            for row in reader:
+                if len(row) > max(name_col, number_col):
+                    index.add(row[number_col], row[name_col])
+        logger.info("Built name index from %s: %d companies", path, len(index))
+        return index
+
+    # ── Persistence ────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        """Pickle the prebuilt index to disk."""
+        with open(path, "wb") as fh:
+            pickle.dump(
+                {"version": INDEX_FORMAT_VERSION, "state": self.__dict__},
+                fh,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "CompanyNameIndex":
+        """Load an index previously written with `save`."""
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported name index version: {payload.get('version')}")
+        index = cls()
+        index.__dict__.update(payload["state"])
+        logger.info("Loaded name index from %s: %d companies", path, len(index))
+        return index
+
+    @classmethod
+    def from_env(cls) -> "CompanyNameIndex":
+        """
+        Load the index configured for this process.
+
+        Prefers a prebuilt pickle at CH_NAME_INDEX_PATH, falls back to
+        building from the CSV at CH_SNAPSHOT_PATH, and returns an empty
+        index (every lookup unresolved) when neither is configured.
+        """
+        index_path = os.environ.get("CH_NAME_INDEX_PATH", "")
+        snapshot_path = os.environ.get("CH_SNAPSHOT_PATH", "")
+        try:
+            if index_path and os.path.exists(index_path):
+                return cls.load(index_path)
+            if snapshot_path and os.path.exists(snapshot_path):
+                return cls.from_snapshot(snapshot_path)
+        except Exception as e:
+            logger.error("Failed to load Companies House name index: %s", str(e))
+        logger.warning("No Companies House name index configured — resolution disabled")
+        return cls()
+
+    # ── Query ──────────────────────────────────────────────────────
+
+    def resolve(self, name: str, top_k: int = 5) -> list[dict]:
+        """
+        Return up to `top_k` candidates for `name`, best first.
+
+        Each candidate is a dict with `company_number`, `company_name`
+        and `confidence` (Jaro-Winkler similarity of normalised names).
+        """
+        normalised = normalise_name(name)
+        if not normalised or not self._numbers:
+            return []
+
+        exact_row = self._exact.get(normalised)
+        query_grams = trigrams(normalised)
+
+        # Probe the rarest trigrams first; very common grams add cost but little signal.
+        probe = sorted(
+            (g for g in query_grams if g in self._postings),
+            key=lambda g: len(self._postings[g]),
+        )[:MAX_PROBE_GRAMS]
+
+        overlap: Counter = Counter()
+        touched = 0
+        for gram in probe:
+            posting = self._postings[gram]
+            if touched and touched + len(posting) > MAX_POSTINGS_TOUCHED:
+                break
+            overlap.update(posting)
+            touched += len(posting)
+
+        n_query = len(query_grams)
+        gram_counts = self._gram_counts
+        pool = heapq.nlargest(
+            CANDIDATE_POOL,
+            overlap.items(),
+            key=lambda item: item[1] / (n_query + gram_counts[item[0]] - item[1]),
+        )
+
+        row_ids = {row_id for row_id, _ in pool}
+        if exact_row is not None:
+            row_ids.add(exact_row)
+
+        scored = sorted(
+            ((jaro_winkler(normalised, self._normalised[r]), r) for r in row_ids),
+            key=lambda item: (-item[0], item[1]),
+        )[:top_k]
+
+        return [
+            {
+                "company_number": self._numbers[row_id],
+                "company_name": self._names[row_id],
+                "confidence": round(score, 4),
+            }
+            for score, row_id in scored
+        ]
+
+    def resolve_many(self, names: Iterable[str], top_k: int = 5) -> list[list[dict]]:
+        """Resolve a batch of names; results are returned in input order."""
+        return [self.resolve(name, top_k=top_k) for name in names]
+
+
+def _column(header: list[str], *candidates: str) -> int:
+    for candidate in candidates:
+        if candidate in header:
+            return header.index(candidate)
+    raise ValueError(f"Snapshot is missing a {candidates[0]} column")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Build a prebuilt Companies House name index"
+    )
+    parser.add_argument("--snapshot", required=True, help="BasicCompanyData CSV path.")
+    parser.add_argument("--output", required=True, help="Output pickle path.")
+    args = parser.parse_args()
+
+    CompanyNameIndex.from_snapshot(args.snapshot).save(args.output)
@@ -1,17 +1,65 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, BackgroundTasks, HTTPException
+from pydantic import BaseModel, Field
 import os
 import json
+import logging
 import uuid
-import random
 from datetime import datetime
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.publisher.exceptions import FlowControlLimitError
+from google.cloud.pubsub_v1.types import (
+    BatchSettings,
+    LimitExceededBehavior,
+    PublisherOptions,
+    PublishFlowControl,
+)
+
+from entity_index import CompanyNameIndex
 
 app = FastAPI(title="IC Origin Ingest API (V2 status: LIVE)")
+logger = logging.getLogger(__name__)
 
 # Initialize Pub/Sub Publisher Client
-publisher = pubsub_v1.PublisherClient()
+# Messages are batched client-side (up to 1,000 msgs / 4 MB / 50 ms) and
+# ordered per company. When the topic falls behind, flow control rejects
+# new messages instead of blocking publish() on the event loop, and
+# /ingest answers 503 so the caller backs off and retries.
+publisher = pubsub_v1.PublisherClient(
+    batch_settings=BatchSettings(
+        max_messages=int(os.environ.get("PUBSUB_BATCH_MAX_MESSAGES", "1000")),
+        max_bytes=int(os.environ.get("PUBSUB_BATCH_MAX_BYTES", str(4 * 1024 * 1024))),
+        max_latency=float(os.environ.get("PUBSUB_BATCH_MAX_LATENCY_S", "0.05")),
+    ),
+    publisher_options=PublisherOptions(
+        enable_message_ordering=True,
+        flow_control=PublishFlowControl(
+            message_limit=int(os.environ.get("PUBSUB_FLOW_CONTROL_MAX_MESSAGES", "20000")),
+            byte_limit=int(os.environ.get("PUBSUB_FLOW_CONTROL_MAX_BYTES", str(64 * 1024 * 1024))),
+            limit_exceeded_behavior=LimitExceededBehavior.ERROR,
+        ),
+    ),
+)
 topic_path = publisher.topic_path(os.environ.get("PROJECT_ID", "cofound-agents-os-788e"), "signals-ingest-topic")
 
+# Companies House name index (prebuilt pickle or local snapshot CSV)
+name_index = CompanyNameIndex.from_env()
+MAX_BATCH_NAMES = 1000
+
+
+class ResolveBatchRequest(BaseModel):
+    names: list[str] = Field(..., min_length=1, max_length=MAX_BATCH_NAMES)
+    top_k: int = Field(5, ge=1, le=25)
+
+
+def _resolution(entity_name: str, candidates: list[dict]) -> dict:
+    best = candidates[0] if candidates else None
+    return {
+        "entity_name": entity_name,
+        "entity_id": best["company_number"] if best else None,
+        "confidence": best["confidence"] if best else 0.0,
+        "candidates": candidates,
+    }
+
 @app.post("/ingest")
 async def ingest_signals(source: str, payload: dict):
     """Scale-to-zero ingest endpoint publishing directly to Google Pub/Sub topic."""
@@ -25,35 +73,66 @@ async def ingest_signals(source: str, payload: dict):
         "timestamp": datetime.utcnow().isoformat()
     }
     
-    # Publish to Pub/Sub Topic
-    future = publisher.publish(topic_path, json.dumps(message_data).encode("utf-8"))
-    future.result() # Wait for publish confirmation
-    
+    # Publish to Pub/Sub Topic — acknowledged asynchronously by the batcher
+    ordering_key = str(payload.get("company_number") or "")
+    future = publisher.publish(
+        topic_path,
+        json.dumps(message_data).encode("utf-8"),
+        ordering_key=ordering_key,
+    )
+    # Over the flow-control limit, publish() returns an already-failed future
+    if future.done() and isinstance(future.exception(), FlowControlLimitError):
+        raise HTTPException(
+            status_code=503,
+            detail="Publish backlog full, retry later",
+            headers={"Retry-After": "1"},
+        )
+    future.add_done_callback(lambda f: _on_publish(f, signal_id, ordering_key))
+
     return {
-        "status": "published",
+        "status": "accepted",
         "signal_id": signal_id,
         "source": source,
-        "message": "Signal published for processing successfully."
+        "message": "Signal queued for publishing."
     }
 
+
+def _on_publish(future, signal_id: str, ordering_key: str) -> None:
+    try:
+        future.result()
+    except Exception as e:
+        logger.error("Pub/Sub publish failed for signal %s: %s", signal_id, str(e))
+        # A failed ordered publish pauses its key until explicitly resumed
+        if ordering_key:
+            publisher.resume_publish(topic_path, ordering_key)
+
 @app.post("/resolve-entities")
-async def resolve_entities(entity_name: str):
-    """High-accuracy entity resolution with adjacency scoring"""
-    entity_id = f"CH-{random.randint(10000000, 99999999)}"
+def resolve_entities(entity_name: str, top_k: int = 5):
+    """
+    Resolve a company name to Companies House numbers via the local name index.
+    Declared sync so the CPU-bound lookup runs off the event loop.
+    """
+    candidates = name_index.resolve(entity_name, top_k=max(1, min(top_k, 25)))
+    return _resolution(entity_name, candidates)
+
+@app.post("/resolve-entities/batch")
+def resolve_entities_batch(request: ResolveBatchRequest):
+    """
+    Resolve up to 1,000 company names in one call; results keep input order.
+    Declared sync so the CPU-bound lookups run off the event loop.
+    """
+    results = name_index.resolve_many(request.names, top_k=request.top_k)
     return {
-        "entity_id": entity_id,
-        "confidence": 0.94,
-        "relations": [
-            {"type": "debenture", "target_id": str(uuid.uuid4()), "strength": 0.85},
-            {"type": "growth_signal", "target_id": str(uuid.uuid4()), "strength": 0.92},
-            {"type": "psc_change", "target_id": str(uuid.uuid4()), "strength": 0.78}
+        "results": [
+            _resolution(name, candidates)
+            for name, candidates in zip(request.names, results)
         ],
-        "message": "Adjacency scores generated for Thema Analysis."
+        "index_size": len(name_index),
     }
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "mode": "dormant"}
+    return {"status": "ok", "mode": "dormant", "name_index_size": len(name_index)}
 
 if __name__ == "__main__":
     import uvicorn
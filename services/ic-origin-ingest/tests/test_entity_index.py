@@ -0,0 +1,90 @@
+"""
+Entity resolution tests — Companies House name index and Jaro-Winkler re-ranker.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from entity_index import CompanyNameIndex, jaro_winkler, normalise_name
+
+
+RECORDS = [
+    {"company_number": "00445790", "company_name": "TESCO PLC"},
+    {"company_number": "SC123456", "company_name": "Acme Widgets & Co Limited"},
+    {"company_number": "09876543", "company_name": "ACME WIDGET SUPPLIES LTD"},
+    {"company_number": "01234567", "company_name": "Northern Fabrication Holdings Ltd"},
+]
+
+
+@pytest.fixture
+def index():
+    return CompanyNameIndex.from_records(RECORDS)
+
+
+class TestNormalisation:
+    def test_strips_legal_forms_and_punctuation(self):
+        assert normalise_name("Acme Widgets & Co. Limited") == "ACME WIDGETS AND"
+
+    def test_stop_token_only_name_is_kept(self):
+        assert normalise_name("The Company Ltd") == "THE COMPANY LTD"
+
+    def test_empty_name(self):
+        assert normalise_name("") == ""
+
+
+class TestJaroWinkler:
+    def test_identical(self):
+        assert jaro_winkler("ACME", "ACME") == 1.0
+
+    def test_reference_value(self):
+        assert jaro_winkler("MARTHA", "MARHTA") == pytest.approx(0.9611, abs=1e-4)
+
+    def test_disjoint(self):
+        assert jaro_winkler("ABC", "XYZ") == 0.0
+
+
+class TestCompanyNameIndex:
+    def test_exact_match_after_normalisation(self, index):
+        results = index.resolve("acme widgets and company ltd")
+        assert results[0]["company_number"] == "SC123456"
+        assert results[0]["confidence"] == 1.0
+
+    def test_fuzzy_match_ranks_closest_first(self, index):
+        results = index.resolve("Northern Fabrications Holdings")
+        assert results[0]["company_number"] == "01234567"
+        assert results[0]["confidence"] > 0.9
+
+    def test_top_k_limits_candidates(self, index):
+        assert len(index.resolve("Acme Widget", top_k=1)) == 1
+
+    def test_unknown_name_returns_low_confidence(self, index):
+        results = index.resolve("Zebra Quantum")
+        assert all(r["confidence"] < 0.8 for r in results)
+
+    def test_empty_index_resolves_nothing(self):
+        assert CompanyNameIndex().resolve("Tesco") == []
+
+    def test_resolve_many_preserves_order(self, index):
+        results = index.resolve_many(["Tesco", "Acme Widgets"], top_k=1)
+        assert [r[0]["company_number"] for r in results] == ["00445790", "SC123456"]
+
+    def test_snapshot_csv_with_padded_headers(self, tmp_path):
+        snapshot = tmp_path / "BasicCompanyData.csv"
+        snapshot.write_text(
+            "CompanyName, CompanyNumber,RegAddress.CareOf\n"
+            "TESCO PLC,00445790,\n"
+            "\"ACME WIDGETS, LIMITED\",SC123456,\n"
+        )
+        index = CompanyNameIndex.from_snapshot(str(snapshot))
+        assert len(index) == 2
+        assert index.resolve("Acme Widgets")[0]["company_number"] == "SC123456"
+
+    def test_save_and_load_round_trip(self, index, tmp_path):
+        path = str(tmp_path / "index.pkl")
+        index.save(path)
+        loaded = CompanyNameIndex.load(path)
+        assert len(loaded) == len(index)
+        assert loaded.resolve("Tesco")[0]["company_number"] == "00445790"
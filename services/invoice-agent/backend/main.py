@@ -1,8 +1,13 @@
 import os
 import json
+import hashlib
 import datetime
+import threading
+from typing import Dict, Optional
 from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import firestore
 from google.cloud import tasks_v2
 import stripe
@@ -16,6 +21,13 @@ PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT", "default-project")
 LOCATION = os.environ.get("QUEUE_LOCATION", "us-central1")
 QUEUE_NAME = os.environ.get("QUEUE_NAME", "invoice-processing-queue")
 SERVICE_URL = os.environ.get("SERVICE_URL", "http://localhost:8080")
+# Invoices billed at once per instance
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 8))
+
+# Share one keep-alive session to api.stripe.com instead of reconnecting per call.
+# Retries are safe because every create call carries an idempotency key.
+stripe.default_http_client = stripe.RequestsClient()
+stripe.max_network_retries = 2
 
 # Initialize Clients
 # Note: Clients are initialized lazily or globally depending on the framework pattern.
@@ -33,13 +45,130 @@ class InvoiceRequest(BaseModel):
     client_name: str
     amount: float
     email: str
-    description: str
+    description: Optional[str] = None
+    # Set for rows of a batch upload (row may be omitted when batch_id
+    # already names a single invoice); they key the document and Stripe requests
+    batch_id: Optional[str] = None
+    row: Optional[int] = None
 
 
 class TaskPayload(BaseModel):
     doc_id: str
 
 
+class CustomerIndex:
+    """
+    Stripe customer IDs keyed by email.
+
+    Looks in the local index first, then asks Stripe for an existing
+    customer with that email, and only then creates one. Lookups for the
+    same email are serialised so concurrent invoices for one client
+    never create two customers.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, email: str, name: str) -> str:
+        key = email.strip().lower()
+        with self._lock:
+            if key in self._ids:
+                return self._ids[key]
+            email_lock = self._locks.setdefault(key, threading.Lock())
+
+        with email_lock:
+            with self._lock:
+                if key in self._ids:
+                    return self._ids[key]
+
+            existing = stripe.Customer.list(email=email, limit=1)
+            if existing.data:
+                customer_id = existing.data[0].id
+            else:
+                # Keyed by email so a racing instance (or a retry) gets the same customer back
+                digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+                customer = stripe.Customer.create(
+                    email=email,
+                    name=name,
+                    idempotency_key=f"customer-{digest}"
+                )
+                customer_id = customer.id
+
+            with self._lock:
+                self._ids[key] = customer_id
+            return customer_id
+
+
+customer_index = CustomerIndex()
+_billing_slots = threading.BoundedSemaphore(WORKER_CONCURRENCY)
+
+
+def batch_key(batch_id: str, row: Optional[int]) -> str:
+    """Identity of a batch upload row, or of a batch_id that names one invoice."""
+    return batch_id if row is None else f"{batch_id}-row-{row}"
+
+
+def invoice_doc_id(batch_id: str, row: Optional[int]) -> str:
+    """Document ID for a batch upload row ('/' is not allowed in IDs)."""
+    return batch_key(batch_id, row).replace("/", "_")
+
+
+def idempotency_prefix(doc_id: str, data: dict) -> str:
+    """
+    Base for Stripe idempotency keys. Rows from a batch upload are keyed
+    by batch and row, so a retried task or a re-enqueued row replays the
+    same Stripe requests instead of billing twice.
+    """
+    if data.get("batch_id"):
+        return batch_key(data["batch_id"], data.get("row"))
+    return f"invoice-{doc_id}"
+
+
+def bill_invoice(doc_ref, data: dict) -> dict:
+    """Create, finalize and record the Stripe invoice for one Firestore document."""
+    prefix = idempotency_prefix(doc_ref.id, data)
+
+    with _billing_slots:
+        customer_id = customer_index.get_or_create(data["email"], data["client_name"])
+
+        # Create the invoice first and attach the item to it explicitly, so
+        # concurrent invoices for the same customer never pick up each other's items
+        invoice = stripe.Invoice.create(
+            customer=customer_id,
+            auto_advance=True, # Auto-finalize
+            pending_invoice_items_behavior="exclude",
+            idempotency_key=f"{prefix}-invoice"
+        )
+
+        # Stripe expects amount in cents
+        item = {
+            "customer": customer_id,
+            "invoice": invoice.id,
+            "amount": int(round(data["amount"] * 100)),
+            "currency": "usd",
+        }
+        if data.get("description"):
+            item["description"] = data["description"]
+        stripe.InvoiceItem.create(**item, idempotency_key=f"{prefix}-item")
+
+        finalized_invoice = stripe.Invoice.finalize_invoice(
+            invoice.id,
+            idempotency_key=f"{prefix}-finalize"
+        )
+
+    doc_ref.update({
+        "status": "SENT",
+        "stripe_customer_id": customer_id,
+        "stripe_payment_link": finalized_invoice.hosted_invoice_url,
+        "stripe_invoice_id": finalized_invoice.id,
+        "processed_at": datetime.datetime.now(datetime.timezone.utc)
+    })
+
+    return {"status": "success", "invoice_url": finalized_invoice.hosted_invoice_url}
+
+
 @app.post("/process_worker")
 async def process_invoice(payload: TaskPayload):
     if not firestore_client:
@@ -59,45 +188,12 @@ async def process_invoice(payload: TaskPayload):
     data = doc.to_dict()
     
     # Idempotency check: if already processed, skip
-    if data.get("status") == "SENT":
+    if data.get("status") in ("SENT", "PAID"):
         return {"status": "already_processed"}
 
     try:
-        # 2. Create Stripe Customer
-        # In a real app we might search for existing customer by email
-        customer = stripe.Customer.create(
-            email=data["email"],
-            name=data["client_name"]
-        )
-        
-        # 3. Create Invoice Item
-        # Stripe expects amount in cents
-        amount_cents = int(round(data["amount"] * 100))
-        stripe.InvoiceItem.create(
-            customer=customer.id,
-            amount=amount_cents,
-            currency="usd",
-            description=data["description"]
-        )
-        
-        # 4. Create and Finalize Invoice
-        invoice = stripe.Invoice.create(
-            customer=customer.id,
-            auto_advance=True # Auto-finalize
-        )
-        
-        finalized_invoice = stripe.Invoice.finalize_invoice(invoice.id)
-        
-        # 5. Update Firestore
-        doc_ref.update({
-            "status": "SENT",
-            "stripe_payment_link": finalized_invoice.hosted_invoice_url,
-            "stripe_invoice_id": finalized_invoice.id,
-            "processed_at": datetime.datetime.now(datetime.timezone.utc)
-        })
-        
-        return {"status": "success", "invoice_url": finalized_invoice.hosted_invoice_url}
-
+        # Stripe calls block, so keep them off the event loop
+        return await run_in_threadpool(bill_invoice, doc_ref, data)
     except Exception as e:
         print(f"Error processing invoice: {e}")
         # Return 500 to trigger Cloud Tasks retry
@@ -109,13 +205,25 @@ async def enqueue_invoice(invoice: InvoiceRequest):
     if not firestore_client or not tasks_client:
         raise HTTPException(status_code=500, detail="GCP services not available")
 
-    # 1. Write the request data to a new Firestore document
-    doc_ref = firestore_client.collection("invoices").document()
-    invoice_data = invoice.model_dump()
+    # 1. Write the request data to a Firestore document
+    invoices = firestore_client.collection("invoices")
+    invoice_data = invoice.model_dump(exclude_none=True)
     invoice_data["status"] = "QUEUED"
     invoice_data["created_at"] = datetime.datetime.now(datetime.timezone.utc)
-    
-    doc_ref.set(invoice_data)
+
+    if invoice.batch_id:
+        # A batch row always maps to the same document, so enqueuing it
+        # again re-queues that invoice instead of creating a second one
+        doc_ref = invoices.document(invoice_doc_id(invoice.batch_id, invoice.row))
+        try:
+            doc_ref.create(invoice_data)
+        except AlreadyExists:
+            existing = doc_ref.get().to_dict() or {}
+            if existing.get("status") in ("SENT", "PAID"):
+                return {"doc_id": doc_ref.id}
+    else:
+        doc_ref = invoices.document()
+        doc_ref.set(invoice_data)
     doc_id = doc_ref.id
 
     # 2. Create a task in the 'invoice-processing-queue'
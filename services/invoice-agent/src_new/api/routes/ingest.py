@@ -1,108 +1,199 @@
 from fastapi import APIRouter, UploadFile, HTTPException, File
 from fastapi.concurrency import run_in_threadpool
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import pandas as pd
 import io
 import re
-import time
+import uuid
 from src.services.queue import enqueue_invoice_task
 
 router = APIRouter()
 
+# Simple regex for email validation, compiled once and applied per column
+EMAIL_PATTERN = re.compile(r"^[\w\.-]+@[\w\.-]+\.\w+$")
+
+# CSV files are read and validated this many rows at a time
+CHUNK_ROWS = 50_000
+# Concurrent Cloud Tasks create_task calls per upload
+ENQUEUE_CONCURRENCY = 32
+# Cap on rows listed individually in the response; "errors" is always the full count
+MAX_ERROR_ROWS = 1000
+
+COLUMN_MAPPING = {
+    "Bill To": "client_name",
+    "Client": "client_name",
+    "Customer": "client_name",
+    "Name": "client_name",
+    "Amount": "amount",
+    "Email": "email",
+    "Description": "description"
+}
+REQUIRED_COLUMNS = ["client_name", "amount", "email"]
+# Passed through to the invoice when the sheet has them
+OPTIONAL_COLUMNS = ["description"]
+
+# Spreadsheet row of a DataFrame index: 1-based, plus the header row
+HEADER_ROWS = 2
+
+
 def validate_email(email: str) -> bool:
     """Basic email validation regex."""
     if not isinstance(email, str):
         return False
-    # Simple regex for email validation
-    pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
+
 
-def process_file(contents: bytes, filename: str) -> Dict:
+def read_chunks(contents: bytes, filename: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield the upload as DataFrames. CSV is streamed in chunks of
+    chunk_rows so large files are never parsed in one go; Excel has no
+    streaming reader and is yielded whole. Chunk indexes continue across
+    chunks, so row numbers stay absolute.
+    """
     try:
         if filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
+            yield from pd.read_csv(io.BytesIO(contents), chunksize=chunk_rows)
         else:
-            df = pd.read_excel(io.BytesIO(contents))
+            yield pd.read_excel(io.BytesIO(contents))
     except Exception as e:
-        # We can't raise HTTPException easily from here if we want to catch it in the main route, 
-        # but we can return an error dict or raise a custom exception.
-        # For simplicity, let's raise and catch in the route.
+        # Raised as ValueError so the route answers 400
         raise ValueError(f"Error reading file: {str(e)}")
-    
-    # Normalization
-    column_mapping = {
-        "Bill To": "client_name",
-        "Client": "client_name",
-        "Customer": "client_name",
-        "Amount": "amount",
-        "Email": "email"
-    }
-    
-    # Normalize column names
-    df.columns = df.columns.str.strip()
-    df.rename(columns=column_mapping, inplace=True)
-    
-    required_columns = ["client_name", "amount", "email"]
-    
-    processed_count = 0
-    error_count = 0
-    
-    for index, row in df.iterrows():
-        if row.isna().all():
-            continue
-            
+
+
+def validate_chunk(df: pd.DataFrame) -> Tuple[List[Tuple[int, Dict]], Dict[int, List[str]]]:
+    """
+    Validate a chunk with column operations instead of a per-row loop.
+
+    Returns (valid, error_rows): valid is a list of (row, invoice_data)
+    ready to enqueue, error_rows maps spreadsheet row number to the
+    reasons it was rejected. Entirely blank rows are ignored.
+    """
+    df = df.copy()
+    df.columns = df.columns.astype(str).str.strip()
+    df.rename(columns=COLUMN_MAPPING, inplace=True)
+    # Tolerate sheets with the same header twice (e.g. both "Client" and "Customer")
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    df = df[~df.isna().all(axis=1)]
+    for column in REQUIRED_COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.NA
+
+    amounts = pd.to_numeric(df["amount"], errors="coerce")
+    emails = df["email"]
+    email_is_str = emails.map(type).eq(str)
+    email_matches = emails.where(email_is_str, "").astype(str).str.match(EMAIL_PATTERN)
+
+    checks = pd.DataFrame({
+        "missing_client_name": df["client_name"].isna(),
+        "missing_amount": df["amount"].isna(),
+        "invalid_amount": df["amount"].notna() & amounts.isna(),
+        "missing_email": emails.isna(),
+        "invalid_email": emails.notna() & ~email_matches,
+    }, index=df.index)
+    rejected = checks.any(axis=1)
+
+    error_rows: Dict[int, List[str]] = {}
+    for reason in checks.columns:
+        for index in checks.index[checks[reason]]:
+            error_rows.setdefault(int(index) + HEADER_ROWS, []).append(reason)
+
+    optional = [column for column in OPTIONAL_COLUMNS if column in df.columns]
+    valid = df.loc[~rejected, ["client_name", "email"] + optional].assign(amount=amounts[~rejected])
+    valid = valid[REQUIRED_COLUMNS + optional].astype(object).where(valid.notna(), None)
+    rows = (valid.index + HEADER_ROWS).tolist()
+    records = valid.to_dict("records")
+    return list(zip(rows, records)), error_rows
+
+
+def enqueue_invoices(
+    invoices: Iterable[Tuple[int, Dict]],
+    executor: ThreadPoolExecutor,
+    enqueue: Callable[[Dict], object] = enqueue_invoice_task
+) -> Tuple[int, Dict[int, List[str]]]:
+    """
+    Submit one Cloud Task per invoice, running up to the executor's
+    worker count create_task calls at once instead of one after another.
+
+    Returns (enqueued, error_rows) where error_rows lists rows whose task
+    could not be created.
+    """
+    def submit(item: Tuple[int, Dict]) -> Tuple[int, Optional[str]]:
+        row, invoice_data = item
         try:
-            client_name = row.get("client_name")
-            amount = row.get("amount")
-            email = row.get("email")
-            
-            if pd.isna(client_name) or pd.isna(amount) or pd.isna(email):
-                error_count += 1
-                continue
-
-            try:
-                amount = float(amount)
-            except (ValueError, TypeError):
-                error_count += 1
-                continue
-                
-            if not validate_email(email):
-                error_count += 1
-                continue
-            
-            invoice_data = {
-                "client_name": client_name,
-                "amount": amount,
-                "email": email,
-            }
-            
-            # Note: calling enqueue_invoice_task here.
-            # If enqueue_invoice_task is blocking (network call), this is still running in a threadpool, so it's fine.
-            # If it's async, we can't await it here easily without making this async.
-            # Instructions: "Use the existing enqueue_invoice_task(invoice_data) function".
-            # Usually queueing is fast (fire and forget) or async. 
-            # If it's a sync function, we are good.
-            enqueue_invoice_task(invoice_data)
-            processed_count += 1
-            
-        except Exception:
-            error_count += 1
-            
+            enqueue(invoice_data)
+            return row, None
+        except Exception as e:
+            print(f"Failed to enqueue row {row}: {e}")
+            return row, "enqueue_failed"
+
+    enqueued = 0
+    error_rows: Dict[int, List[str]] = {}
+    for row, error in executor.map(submit, invoices):
+        if error:
+            error_rows[row] = [error]
+        else:
+            enqueued += 1
+    return enqueued, error_rows
+
+
+def process_file(
+    contents: bytes,
+    filename: str,
+    enqueue: Callable[[Dict], object] = enqueue_invoice_task,
+    chunk_rows: int = CHUNK_ROWS
+) -> Dict:
+    """
+    Validate the whole upload, then enqueue its valid rows.
+
+    Nothing is enqueued until every chunk has been read, so a file that
+    fails to parse part way through is rejected (ValueError) without
+    having billed its first chunks. Rows whose task could not be created
+    are reported as "enqueue_failed" under the returned batch_id.
+    """
+    # Unique per upload: the worker derives idempotency keys from batch_id and row
+    batch_id = f"batch_{uuid.uuid4().hex}"
+    error_count = 0
+    error_rows: List[Dict] = []
+
+    def report(errors: Dict[int, List[str]]) -> None:
+        nonlocal error_count
+        error_count += len(errors)
+        for row in sorted(errors):
+            if len(error_rows) >= MAX_ERROR_ROWS:
+                break
+            error_rows.append({"row": row, "errors": errors[row]})
+
+    invoices: List[Tuple[int, Dict]] = []
+    for chunk in read_chunks(contents, filename, chunk_rows):
+        valid, invalid = validate_chunk(chunk)
+        report(invalid)
+        invoices.extend(
+            (row, {**invoice_data, "batch_id": batch_id, "row": row})
+            for row, invoice_data in valid
+        )
+
+    with ThreadPoolExecutor(max_workers=ENQUEUE_CONCURRENCY) as executor:
+        processed_count, failed = enqueue_invoices(invoices, executor, enqueue)
+    report(failed)
+
     return {
-        "processed": processed_count, 
-        "errors": error_count, 
-        "batch_id": f"batch_{int(time.time())}"
+        "processed": processed_count,
+        "errors": error_count,
+        "error_rows": error_rows,
+        "batch_id": batch_id
     }
 
 @router.post("/finance/ingest-batch")
 async def ingest_batch(file: UploadFile = File(...)):
     filename = file.filename
-    
+
     if not (filename.endswith('.csv') or filename.endswith('.xlsx')):
         raise HTTPException(status_code=400, detail="Invalid file type. Only .csv and .xlsx are supported.")
-    
+
     contents = await file.read()
-    
+
     try:
         # Offload CPU-bound work to threadpool
         result = await run_in_threadpool(process_file, contents, filename)
@@ -1,13 +1,288 @@
+"""
+Change feed for the invoice Google Sheet.
+
+Each poll is as cheap as the sheet allows:
+
+1. The Drive file version is checked first; an unchanged version means
+   no request to the Sheets API at all.
+2. Values are fetched with If-None-Match, so edits that don't touch the
+   cells (formatting, comments) come back as 304 Not Modified.
+3. Rows are keyed and hashed, and only rows whose invoice key has never
+   been emitted are passed on to the batch pipeline.
+
+A row's invoice key comes from its ID column when the sheet has one
+(SHEET_ID_COLUMN), otherwise from its content, never from its position:
+inserting, deleting or sorting rows does not re-emit the rows around
+them. The key is also the invoice's batch_id downstream.
+
+Edits are never billed. With an ID column, a row whose key was already
+emitted but whose content changed is logged and skipped; the invoice
+has to be corrected by hand. Without one, an edit shows up as a new
+content key, so a new key that takes the place of a vanished key at the
+same row number is treated as an edit too: logged, remembered, not
+emitted. New invoices therefore belong in new rows, or the sheet needs
+an ID column.
+
+Rows that could not be enqueued are forgotten and emitted again on the
+next poll.
+"""
+import hashlib
+import json
+import os
 import time
-import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SHEETS_API = "https://sheets.googleapis.com/v4"
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+POLL_INTERVAL_S = 10
+# Spreadsheet row number of the first data row
+FIRST_DATA_ROW = 2
+
+# (spreadsheet row number, invoice key, cell values)
+SheetRow = Tuple[int, str, List]
+# (header, new rows) -> row numbers that failed and should be retried
+EmitFn = Callable[[List[str], List[SheetRow]], Iterable[int]]
+
+
+def row_hash(values: List) -> str:
+    """Content hash of a row, ignoring trailing blank cells."""
+    values = list(values)
+    while values and values[-1] in ("", None):
+        values.pop()
+    encoded = json.dumps(values, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+class MemoryStateStore:
+    """Watcher state held in process; lost on restart."""
+
+    def __init__(self):
+        self._state: Dict = {}
+
+    def load(self) -> Dict:
+        return dict(self._state)
+
+    def save(self, state: Dict) -> None:
+        self._state = dict(state)
+
+
+class FileStateStore:
+    """Watcher state persisted as JSON, so a restart doesn't re-emit the sheet."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state: Dict) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+
+def enqueue_rows(header: List[str], rows: List[SheetRow]) -> List[int]:
+    """
+    Default emit: validate the new rows and enqueue them through the
+    batch ingestion pipeline, each under its invoice key as batch_id.
+    """
+    import pandas as pd
+    from src.api.routes.ingest import ENQUEUE_CONCURRENCY, HEADER_ROWS, enqueue_invoices, validate_chunk
+
+    width = len(header)
+    df = pd.DataFrame(
+        [[None if cell == "" else cell for cell in (values + [None] * width)[:width]] for _, _, values in rows],
+        columns=header,
+        index=[row - HEADER_ROWS for row, _, _ in rows]
+    )
+    keys = {row: key for row, key, _ in rows}
+    valid, invalid = validate_chunk(df)
+    for row, reasons in invalid.items():
+        # Rejected rows are not retried until they are edited
+        print(f"Row {row} rejected: {', '.join(reasons)}")
+
+    # No "row": the spreadsheet position moves, the key does not
+    invoices = [(row, {**data, "batch_id": keys[row]}) for row, data in valid]
+    with ThreadPoolExecutor(max_workers=ENQUEUE_CONCURRENCY) as executor:
+        _, failed = enqueue_invoices(invoices, executor)
+    return list(failed)
+
+
+class SheetWatcher:
+    """Polls one sheet range and emits rows whose invoice key is new since the last poll."""
+
+    def __init__(
+        self,
+        session,
+        spreadsheet_id: str,
+        sheet_range: str = "Sheet1",
+        emit: EmitFn = enqueue_rows,
+        state_store=None,
+        sheets_api: str = SHEETS_API,
+        drive_api: Optional[str] = DRIVE_API,
+        id_column: Optional[str] = None
+    ):
+        """
+        Args:
+            session: requests.Session-compatible HTTP client, e.g. an
+                google.auth.transport.requests.AuthorizedSession. Reused
+                across polls so connections stay open.
+            spreadsheet_id: ID of the spreadsheet to watch.
+            sheet_range: A1 range whose first row is the header.
+            emit: Receives each batch of new rows.
+            state_store: Where the etag, version, row hashes and row keys are kept.
+            drive_api: Drive API base URL, or None to skip the version check.
+            id_column: Header of a column holding a stable invoice ID.
+                Rows without one are keyed by content.
+        """
+        self.session = session
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_range = sheet_range
+        self.emit = emit
+        self.state_store = state_store or MemoryStateStore()
+        self.sheets_api = sheets_api.rstrip("/")
+        self.drive_api = drive_api.rstrip("/") if drive_api else None
+        self.id_column = id_column
+
+    def _file_version(self) -> Optional[str]:
+        if not self.drive_api:
+            return None
+        response = self.session.get(
+            f"{self.drive_api}/files/{self.spreadsheet_id}",
+            params={"fields": "version", "supportsAllDrives": "true"}
+        )
+        response.raise_for_status()
+        return str(response.json()["version"])
+
+    def _fetch_values(self, etag: Optional[str]):
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.session.get(
+            f"{self.sheets_api}/spreadsheets/{self.spreadsheet_id}/values/{self.sheet_range}",
+            params={"majorDimension": "ROWS", "valueRenderOption": "UNFORMATTED_VALUE"},
+            headers=headers
+        )
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json().get("values", []), response.headers.get("ETag")
+
+    def poll(self) -> List[int]:
+        """Check the sheet once. Returns the row numbers that were emitted."""
+        state = self.state_store.load()
+
+        version = self._file_version()
+        if version is not None and version == state.get("version"):
+            return []
+
+        values, etag = self._fetch_values(state.get("etag"))
+        if values is None:
+            state["version"] = version
+            self.state_store.save(state)
+            return []
+
+        header = [str(h) for h in values[0]] if values else []
+        header_hash = row_hash(header)
+        # A new header changes what every row means, so all rows count as new
+        same_header = state.get("header") == header_hash
+        known = state.get("rows", {}) if same_header else {}
+        known_at = state.get("positions", {}) if same_header else {}
+        id_index = header.index(self.id_column) if self.id_column in header else None
+
+        rows: Dict[str, str] = {}
+        positions: Dict[str, str] = {}
+        keyed: List[Tuple[int, str, str, List]] = []
+        for offset, cells in enumerate(values[1:]):
+            if not any(cell not in ("", None) for cell in cells):
+                continue
+            digest = row_hash(cells)
+            key = self._invoice_key(cells, digest, id_index, rows)
+            rows[key] = digest
+            positions[str(offset + FIRST_DATA_ROW)] = key
+            keyed.append((offset + FIRST_DATA_ROW, key, digest, cells))
+
+        new: List[SheetRow] = []
+        for row, key, digest, cells in keyed:
+            if key in known:
+                if known[key] != digest:
+                    print(f"Row {row} ({key}) was edited after it was enqueued; not billed again")
+                continue
+            replaced = known_at.get(str(row))
+            if id_index is None and replaced is not None and replaced not in rows:
+                print(f"Row {row} replaces {replaced} in place; treated as an edit and not billed. "
+                      f"Add new invoices as new rows or set SHEET_ID_COLUMN")
+                continue
+            new.append((row, key, cells))
+
+        emitted: List[int] = []
+        if new:
+            failed = set(self.emit(header, new))
+            for row, key, _ in new:
+                if row in failed:
+                    # Forget the row so it is emitted again next poll
+                    rows.pop(key)
+                    positions.pop(str(row))
+                else:
+                    emitted.append(row)
+
+        # Without a complete emit the etag would hide the failed rows from the next poll
+        complete = len(emitted) == len(new)
+        self.state_store.save({
+            "version": version if complete else None,
+            "etag": etag if complete else None,
+            "header": header_hash,
+            "rows": rows,
+            "positions": positions,
+        })
+        return emitted
+
+    def _invoice_key(self, cells: List, digest: str, id_index: Optional[int], seen: Dict[str, str]) -> str:
+        """
+        Key for a row: its ID cell if it has one, else its content hash.
+        Identical rows are numbered in sheet order so each stays a separate
+        invoice.
+        """
+        prefix = f"sheet_{self.spreadsheet_id}"
+        if id_index is not None and id_index < len(cells) and cells[id_index] not in ("", None):
+            return f"{prefix}_id_{row_hash([cells[id_index]])}"
+        key = f"{prefix}_{digest}"
+        occurrence = 1
+        while key in seen:
+            occurrence += 1
+            key = f"{prefix}_{digest}_{occurrence}"
+        return key
+
+    def run(self, interval_s: float = POLL_INTERVAL_S, should_stop: Callable[[], bool] = lambda: False) -> None:
+        while not should_stop():
+            try:
+                emitted = self.poll()
+                if emitted:
+                    print(f"Enqueued {len(emitted)} new rows")
+            except Exception as e:
+                print(f"Sheet poll failed: {e}")
+            time.sleep(interval_s)
+
 
 def watch_sheets():
-    # Deprecation warning to prevent "Ghost Invoices"
-    warnings.warn(
-        "Pull-based sheet watching is deprecated. Use the Push API (/api/v1/finance/ingest-batch) instead.",
-        DeprecationWarning,
-        stacklevel=2
+    """Watch the sheet configured by SHEET_ID / SHEET_RANGE / SHEET_ID_COLUMN until the process exits."""
+    import google.auth
+    from google.auth.transport.requests import AuthorizedSession
+
+    credentials, _ = google.auth.default(scopes=[
+        "https://www.googleapis.com/auth/spreadsheets.readonly",
+        "https://www.googleapis.com/auth/drive.metadata.readonly",
+    ])
+    state_path = os.environ.get("SHEET_STATE_PATH")
+    watcher = SheetWatcher(
+        AuthorizedSession(credentials),
+        os.environ["SHEET_ID"],
+        os.environ.get("SHEET_RANGE", "Sheet1"),
+        state_store=FileStateStore(state_path) if state_path else None,
+        id_column=os.environ.get("SHEET_ID_COLUMN")
     )
     print("Watching Google Sheets...")
-    while True:
-        time.sleep(10)
+    watcher.run(float(os.environ.get("SHEET_POLL_INTERVAL_S", POLL_INTERVAL_S)))
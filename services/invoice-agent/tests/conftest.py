@@ -0,0 +1,26 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture
+def enqueued():
+    """Invoices passed to the stubbed Cloud Tasks queue."""
+    return []
+
+
+@pytest.fixture
+def ingest(monkeypatch, enqueued):
+    """The ingest routes, with the Cloud Tasks queue module stubbed out."""
+    queue = types.ModuleType("src.services.queue")
+    queue.enqueue_invoice_task = enqueued.append
+    monkeypatch.setitem(sys.modules, "src", types.ModuleType("src"))
+    monkeypatch.setitem(sys.modules, "src.services", types.ModuleType("src.services"))
+    monkeypatch.setitem(sys.modules, "src.services.queue", queue)
+    monkeypatch.delitem(sys.modules, "src_new.api.routes.ingest", raising=False)
+    return importlib.import_module("src_new.api.routes.ingest")
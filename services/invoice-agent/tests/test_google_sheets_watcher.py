@@ -0,0 +1,216 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src_new.google_sheets_watcher import FileStateStore, SheetWatcher, enqueue_rows
+
+HEADER = ["Name", "Email", "Amount", "Description"]
+ANN = ["Ann", "ann@example.com", 10, "Design"]
+BOB = ["Bob", "bob@example.com", 20, "Build"]
+
+
+class FakeSheets:
+    """Local stand-in for the Drive files.get and Sheets values.get endpoints."""
+
+    def __init__(self, values):
+        self.values = values
+        self.version = 1
+        self.requests = []
+
+    def set_values(self, values):
+        self.values = values
+        self.version += 1
+
+    def etag(self):
+        return '"' + str(abs(hash(json.dumps(self.values)))) + '"'
+
+
+@pytest.fixture
+def sheets():
+    fake = FakeSheets([HEADER, ANN, BOB])
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/drive/v3/files/sheet1"):
+                fake.requests.append("drive")
+                body = {"version": str(fake.version)}
+            elif self.path.startswith("/v4/spreadsheets/sheet1/values/Sheet1"):
+                fake.requests.append("values")
+                if self.headers.get("If-None-Match") == fake.etag():
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = {"range": "Sheet1!A1:D3", "majorDimension": "ROWS", "values": fake.values}
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if body.get("values"):
+                self.send_header("ETag", fake.etag())
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{server.server_port}"
+    yield fake
+    server.shutdown()
+
+
+def _watcher(sheets, emitted, failing=(), **kwargs):
+    def emit(header, rows):
+        emitted.append((header, rows))
+        return [row for row, _, _ in rows if row in failing]
+
+    return SheetWatcher(
+        requests.Session(), "sheet1", emit=emit,
+        sheets_api=f"{sheets.url}/v4", drive_api=f"{sheets.url}/drive/v3", **kwargs
+    )
+
+
+def test_only_new_rows_are_emitted(sheets, capsys):
+    emitted = []
+    watcher = _watcher(sheets, emitted)
+
+    assert watcher.poll() == [2, 3]
+    assert emitted[0][0] == HEADER
+
+    # Bob's amount is edited in place: without an ID column that is an
+    # edit of a billed row, not a new invoice
+    sheets.set_values([
+        HEADER,
+        ANN,
+        ["Bob", "bob@example.com", 25, "Build"],
+        ["Cat", "cat@example.com", 30],
+    ])
+    assert watcher.poll() == [4]
+    assert [(row, cells) for row, _, cells in emitted[1][1]] == [(4, ["Cat", "cat@example.com", 30])]
+    assert "Row 3" in capsys.readouterr().out
+
+    # The edit is remembered, so it is neither billed nor logged again
+    sheets.set_values(sheets.values + [["Dan", "dan@example.com", 40]])
+    assert watcher.poll() == [5]
+    assert "Row 3" not in capsys.readouterr().out
+
+
+def test_inserting_a_row_emits_only_that_row(sheets):
+    emitted = []
+    watcher = _watcher(sheets, emitted)
+    watcher.poll()
+    keys = {cells[0]: key for _, key, cells in emitted[0][1]}
+
+    sheets.set_values([HEADER, ANN, ["Cat", "cat@example.com", 30], BOB])
+    assert watcher.poll() == [3]
+    assert len(emitted) == 2 and emitted[1][1][0][2][0] == "Cat"
+
+    # Sorting and deleting rows moves them but changes no content
+    sheets.set_values([HEADER, BOB, ["Cat", "cat@example.com", 30]])
+    assert watcher.poll() == []
+    assert len(emitted) == 2
+    assert keys["Ann"] != keys["Bob"]
+
+
+def test_identical_rows_are_separate_invoices(sheets):
+    emitted = []
+    watcher = _watcher(sheets, emitted)
+    watcher.poll()
+
+    sheets.set_values([HEADER, ANN, BOB, ANN])
+    assert watcher.poll() == [4]
+    assert emitted[1][1][0][1] not in {key for _, key, _ in emitted[0][1]}
+
+
+def test_id_column_edits_are_logged_not_billed(sheets, capsys):
+    sheets.set_values([HEADER + ["Invoice"], ANN + ["INV-1"], BOB + ["INV-2"]])
+    emitted = []
+    watcher = _watcher(sheets, emitted, id_column="Invoice")
+    watcher.poll()
+    bob_key = emitted[0][1][1][1]
+
+    sheets.set_values([HEADER + ["Invoice"], ANN + ["INV-1"], ["Bob", "bob@example.com", 25, "Build", "INV-2"]])
+    assert watcher.poll() == []
+    assert len(emitted) == 1
+    assert bob_key in capsys.readouterr().out
+
+    # A row replaced in place under a new ID is a new invoice
+    sheets.set_values([HEADER + ["Invoice"], ANN + ["INV-1"], ["Cat", "cat@example.com", 30, "", "INV-3"]])
+    assert watcher.poll() == [3]
+
+
+def test_unchanged_sheet_is_not_refetched(sheets):
+    emitted = []
+    watcher = _watcher(sheets, emitted)
+    watcher.poll()
+    sheets.requests.clear()
+
+    # Same Drive version: the values endpoint is never called
+    assert watcher.poll() == []
+    assert sheets.requests == ["drive"]
+
+    # New version without cell changes (e.g. formatting): values answer 304
+    sheets.version += 1
+    assert watcher.poll() == []
+    assert sheets.requests == ["drive", "drive", "values"]
+    assert len(emitted) == 1
+
+
+def test_failed_rows_are_retried_with_the_same_key(sheets):
+    emitted = []
+    watcher = _watcher(sheets, emitted, failing={3})
+    assert watcher.poll() == [2]
+
+    watcher.emit = lambda header, rows: emitted.append((header, rows)) or []
+    assert watcher.poll() == [3]
+    assert emitted[1][1] == [emitted[0][1][1]]
+    assert watcher.poll() == []
+
+
+def test_state_survives_restart(sheets, tmp_path):
+    store = FileStateStore(str(tmp_path / "state.json"))
+    emitted = []
+    _watcher(sheets, emitted, state_store=store).poll()
+
+    assert _watcher(sheets, emitted, state_store=store).poll() == []
+    assert len(emitted) == 1
+
+
+def test_enqueue_rows_validates_and_keys_by_invoice(ingest, enqueued, monkeypatch):
+    monkeypatch.setitem(sys.modules, "src.api.routes.ingest", ingest)
+    rows = [
+        (2, "sheet_s_a", ANN),
+        (3, "sheet_s_b", ["Bob", "not-an-email", 20]),
+        (4, "sheet_s_c", ["Cat", "cat@example.com", "", ""]),
+    ]
+
+    assert enqueue_rows(HEADER, rows) == []
+
+    assert enqueued == [{
+        "client_name": "Ann", "amount": 10, "email": "ann@example.com",
+        "description": "Design", "batch_id": "sheet_s_a",
+    }]
+
+
+def test_enqueue_rows_reports_failed_rows(ingest, monkeypatch):
+    def enqueue(invoice):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(ingest, "enqueue_invoices", _with_enqueue(ingest.enqueue_invoices, enqueue))
+    monkeypatch.setitem(sys.modules, "src.api.routes.ingest", ingest)
+
+    assert enqueue_rows(HEADER, [(2, "sheet_s_a", ANN)]) == [2]
+
+
+def _with_enqueue(enqueue_invoices, enqueue):
+    return lambda invoices, executor: enqueue_invoices(invoices, executor, enqueue)
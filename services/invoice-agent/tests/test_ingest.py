@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+
+def _csv(rows):
+    lines = ["Client,Email,Amount"] + [",".join(str(cell) for cell in row) for row in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_validate_chunk_reports_each_reason(ingest):
+    df = pd.DataFrame({
+        "Client": ["Ann", None, "Cat", "Dan", None],
+        "Email": ["ann@example.com", "bob@example.com", "not-an-email", None, None],
+        "Amount": [10, 20, "ten", None, None],
+    })
+
+    valid, errors = ingest.validate_chunk(df)
+
+    assert valid == [(2, {"client_name": "Ann", "amount": 10, "email": "ann@example.com"})]
+    assert errors == {
+        3: ["missing_client_name"],
+        4: ["invalid_amount", "invalid_email"],
+        5: ["missing_amount", "missing_email"],
+    }
+
+
+def test_csv_chunks_keep_spreadsheet_row_numbers(ingest):
+    enqueued = []
+    contents = _csv([
+        ("Ann", "ann@example.com", 10),
+        ("Bob", "bob@example.com", 20),
+        ("Cat", "bad-email", 30),
+        ("Dan", "dan@example.com", 40),
+        ("Eve", "eve@example.com", 50),
+    ])
+
+    result = ingest.process_file(contents, "invoices.csv", enqueue=enqueued.append, chunk_rows=2)
+
+    assert sorted(invoice["row"] for invoice in enqueued) == [2, 3, 5, 6]
+    assert {invoice["batch_id"] for invoice in enqueued} == {result["batch_id"]}
+    assert result["processed"] == 4
+    assert result["error_rows"] == [{"row": 4, "errors": ["invalid_email"]}]
+
+
+def test_enqueue_failures_reported_with_batch_id(ingest):
+    def enqueue(invoice):
+        if invoice["client_name"] == "Bob":
+            raise RuntimeError("queue unavailable")
+
+    contents = _csv([("Ann", "ann@example.com", 10), ("Bob", "bob@example.com", 20)])
+
+    result = ingest.process_file(contents, "invoices.csv", enqueue=enqueue)
+
+    assert result["processed"] == 1
+    assert result["errors"] == 1
+    assert result["error_rows"] == [{"row": 3, "errors": ["enqueue_failed"]}]
+    assert result["batch_id"].startswith("batch_")
+
+
+def test_parse_error_in_later_chunk_enqueues_nothing(ingest):
+    enqueued = []
+    contents = _csv([("Ann", "ann@example.com", 10), ("Bob", "bob@example.com", 20)])
+    contents += b'"Cat,cat@example.com,30\n'
+
+    with pytest.raises(ValueError):
+        ingest.process_file(contents, "invoices.csv", enqueue=enqueued.append, chunk_rows=1)
+    assert enqueued == []
+
+
+def test_batch_ids_unique_per_upload(ingest):
+    contents = _csv([("Ann", "ann@example.com", 10)])
+    first = ingest.process_file(contents, "invoices.csv", enqueue=lambda invoice: None)
+    second = ingest.process_file(contents, "invoices.csv", enqueue=lambda invoice: None)
+    assert first["batch_id"] != second["batch_id"]
@@ -3,6 +3,10 @@ from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
 import os
 import sys
+import threading
+from types import SimpleNamespace
+
+from google.api_core.exceptions import AlreadyExists
 
 # Ensure backend is in path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -123,3 +127,197 @@ def test_stripe_webhook(mock_firestore, mock_stripe):
     
     # Verify event recording
     mock_event_ref.set.assert_called_once()
+
+
+class FakeStripe:
+    """In-memory stand-in for the Stripe API that honours idempotency keys."""
+
+    def __init__(self):
+        self.customers = []
+        self.invoices = {}
+        self.items = []
+        self.requests = []
+        self._replays = {}
+        self._lock = threading.Lock()
+        fake = self
+
+        class Customer:
+            @staticmethod
+            def list(email, limit):
+                return SimpleNamespace(data=[c for c in fake.customers if c.email == email][:limit])
+
+            @staticmethod
+            def create(idempotency_key, **params):
+                def create():
+                    customer = SimpleNamespace(id=f"cus_{len(fake.customers)}", **params)
+                    fake.customers.append(customer)
+                    return customer
+                return fake._once(idempotency_key, create)
+
+        class Invoice:
+            @staticmethod
+            def create(idempotency_key, **params):
+                def create():
+                    invoice_id = f"in_{len(fake.invoices)}"
+                    fake.invoices[invoice_id] = SimpleNamespace(
+                        id=invoice_id, hosted_invoice_url=f"https://pay/{invoice_id}", **params
+                    )
+                    return fake.invoices[invoice_id]
+                return fake._once(idempotency_key, create)
+
+            @staticmethod
+            def finalize_invoice(invoice_id, idempotency_key):
+                return fake._once(idempotency_key, lambda: fake.invoices[invoice_id])
+
+        class InvoiceItem:
+            @staticmethod
+            def create(idempotency_key, **params):
+                return fake._once(idempotency_key, lambda: fake.items.append(params) or params)
+
+        self.Customer, self.Invoice, self.InvoiceItem = Customer, Invoice, InvoiceItem
+
+    def _once(self, idempotency_key, create):
+        with self._lock:
+            return self._replay(idempotency_key, create)
+
+    def _replay(self, idempotency_key, create):
+        self.requests.append(idempotency_key)
+        if idempotency_key not in self._replays:
+            self._replays[idempotency_key] = create()
+        return self._replays[idempotency_key]
+
+
+class FakeFirestore:
+    """Dict-backed invoices collection: document(), get, set, create and update."""
+
+    def __init__(self):
+        self.docs = {}
+        self.fail_updates = 0
+        self._ids = iter(range(1_000_000))
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        return FakeDocRef(self, doc_id or f"auto-{next(self._ids)}")
+
+
+class FakeDocRef:
+    def __init__(self, store, doc_id):
+        self._store = store
+        self.id = doc_id
+
+    def get(self):
+        data = self._store.docs.get(self.id)
+        return SimpleNamespace(id=self.id, exists=data is not None, to_dict=lambda: dict(data or {}))
+
+    def set(self, data):
+        self._store.docs[self.id] = dict(data)
+
+    def create(self, data):
+        if self.id in self._store.docs:
+            raise AlreadyExists("document exists")
+        self.set(data)
+
+    def update(self, data):
+        if self._store.fail_updates:
+            self._store.fail_updates -= 1
+            raise Exception("unavailable")
+        self._store.docs[self.id].update(data)
+
+
+@pytest.fixture
+def fake_firestore(mock_tasks):
+    store = FakeFirestore()
+    with patch("backend.main.firestore_client", store):
+        yield store
+
+
+@pytest.fixture
+def fake_stripe():
+    from backend import main
+    fake = FakeStripe()
+    with patch("backend.main.stripe", fake), patch.object(main, "customer_index", main.CustomerIndex()):
+        yield fake
+
+
+def _enqueue(**invoice):
+    payload = {"client_name": "Client", "amount": 10.0, "email": "ann@example.com", **invoice}
+    response = client.post("/enqueue", json=payload)
+    assert response.status_code == 200
+    return response.json()["doc_id"]
+
+
+def test_enqueued_batch_rows_key_stripe_by_row(fake_firestore, fake_stripe):
+    doc_ids = [
+        _enqueue(batch_id="batch_1", row=2),
+        _enqueue(email="bob@example.com", batch_id="batch_1", row=3),
+        _enqueue(amount=12.5, batch_id="batch_1", row=4),
+        _enqueue(email="carl@example.com", description="Consulting"),
+    ]
+
+    assert doc_ids[:3] == ["batch_1-row-2", "batch_1-row-3", "batch_1-row-4"]
+    assert fake_firestore.docs["batch_1-row-4"]["row"] == 4
+    for doc_id in doc_ids:
+        response = client.post("/process_worker", json={"doc_id": doc_id})
+        assert response.json()["status"] == "success"
+
+    assert sorted(c.email for c in fake_stripe.customers) == ["ann@example.com", "bob@example.com", "carl@example.com"]
+    assert len(fake_stripe.invoices) == 4
+    assert {item["invoice"] for item in fake_stripe.items} == set(fake_stripe.invoices)
+    assert "batch_1-row-4-invoice" in fake_stripe.requests
+    assert f"invoice-{doc_ids[3]}-item" in fake_stripe.requests
+    assert fake_firestore.docs["batch_1-row-4"]["status"] == "SENT"
+
+
+def test_batch_id_alone_names_one_invoice(fake_firestore, fake_stripe):
+    # Sheet rows are keyed by invoice, not position, and carry no row number
+    doc_id = _enqueue(batch_id="sheet_s1_id_abc")
+    client.post("/process_worker", json={"doc_id": doc_id})
+
+    assert doc_id == "sheet_s1_id_abc"
+    assert _enqueue(batch_id="sheet_s1_id_abc", amount=12.0) == doc_id
+    assert "sheet_s1_id_abc-invoice" in fake_stripe.requests
+    assert len(fake_stripe.invoices) == 1
+
+
+def test_reenqueued_row_is_not_billed_twice(fake_firestore, fake_stripe, mock_tasks):
+    doc_id = _enqueue(batch_id="batch_1", row=2)
+    client.post("/process_worker", json={"doc_id": doc_id})
+
+    assert _enqueue(batch_id="batch_1", row=2) == doc_id
+    assert len(fake_firestore.docs) == 1
+    assert fake_firestore.docs[doc_id]["status"] == "SENT"
+    # The first enqueue created a task; the replay of a billed row doesn't
+    assert mock_tasks.create_task.call_count == 1
+    assert len(fake_stripe.invoices) == 1
+
+
+def test_retry_after_failure_does_not_duplicate(fake_firestore, fake_stripe):
+    from backend import main
+    doc_id = _enqueue(batch_id="batch_1", row=2)
+
+    # Firestore write fails after Stripe billed the invoice
+    fake_firestore.fail_updates = 1
+    response = client.post("/process_worker", json={"doc_id": doc_id})
+    assert response.status_code == 500
+
+    # The retry lands on another instance with a cold customer index
+    with patch.object(main, "customer_index", main.CustomerIndex()):
+        response = client.post("/process_worker", json={"doc_id": doc_id})
+
+    assert response.status_code == 200
+    assert len(fake_stripe.customers) == 1
+    assert len(fake_stripe.invoices) == 1
+    assert len(fake_stripe.items) == 1
+
+
+def test_process_worker_skips_sent_invoice(mock_firestore, fake_stripe):
+    doc_ref = mock_firestore.collection.return_value.document.return_value
+    doc_ref.get.return_value.exists = True
+    doc_ref.get.return_value.to_dict.return_value = {"status": "SENT"}
+
+    response = client.post("/process_worker", json={"doc_id": "a"})
+
+    assert response.json() == {"status": "already_processed"}
+    assert fake_stripe.requests == []
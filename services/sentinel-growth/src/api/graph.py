@@ -8,7 +8,7 @@ RBAC-protected via get_current_user.
 import structlog
 from fastapi import APIRouter, Depends, HTTPException
 
-from src.core.auth import AuthenticatedUser, get_current_user
+from src.core.auth import AuthenticatedUser, get_current_user, require_admin
 from src.services.graph_service import graph_service
 from src.services.systemic_risk import systemic_risk_service
 
@@ -36,14 +36,32 @@ async def get_contagion_network(
     return network
 
 
+@router.get("/systemic")
+def list_systemic_exposures(
+    user: AuthenticatedUser = Depends(require_admin),
+):
+    """
+    Admin-only: systemic flags for every ELEVATED_RISK entity, computed
+    in one pass over the cross-tenant exposure index. Declared sync so a
+    cold index build runs in the threadpool, not on the event loop.
+    """
+    results = systemic_risk_service.compute_systemic_exposures()
+    return {
+        "count": len(results),
+        "systemic_count": sum(1 for r in results if r["is_systemic"]),
+        "entities": results,
+    }
+
+
 @router.get("/systemic/{ch_number}")
-async def get_systemic_exposure(
+def get_systemic_exposure(
     ch_number: str,
     user: AuthenticatedUser = Depends(get_current_user),
 ):
     """
     Check if an entity is a systemic risk (appears in ≥2 tenant portfolios
-    with degraded risk tier).
+    with degraded risk tier). Queried live so writes from other instances
+    are seen; declared sync to keep the Firestore call off the event loop.
     """
     result = systemic_risk_service.evaluate_systemic_exposure(ch_number)
 
@@ -7,12 +7,14 @@ import datetime
 import structlog
 from src.services.pdf_factory import render_pdf
 from src.services.memo_service import memo_service
+from src.services.pulse_engine import pulse_engine
 
 router = APIRouter()
 logger = structlog.get_logger()
 
 # Constants
 AUCTIONS_COL = "auctions"
+MOMENTUM_COL = "company_momentum"  # Maintained by ic-origin-dataflow (momentum.py)
 
 class DossierRequest(BaseModel):
     signal_id: str
@@ -38,12 +40,63 @@ class SignalResponse(BaseModel):
     deal_date: Optional[str] = None
     source_link: Optional[str] = None
     source_family: Optional[str] = "RSS_NEWS"
+    company_number: Optional[str] = None
+    momentum: Optional[Dict[str, Any]] = None
 
 # DB Helper
 def get_db():
     from src.core.config import settings
     return firestore.Client(database=settings.FIRESTORE_DB_NAME)
 
+
+def get_momentum(db, company_numbers: List[str]) -> Dict[str, dict]:
+    """
+    Fetch precomputed rolling momentum for many companies in one batched read.
+    Companies without a momentum document are simply absent from the result.
+    """
+    unique = sorted({cn for cn in company_numbers if cn})
+    if not unique:
+        return {}
+    refs = [db.collection(MOMENTUM_COL).document(cn) for cn in unique]
+    try:
+        return {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+    except Exception as e:
+        logger.warning("Momentum lookup failed", error=str(e))
+        return {}
+
+def momentum_timeline(momentum: Optional[dict]) -> List[dict]:
+    """
+    Dossier timeline entries derived from a `company_momentum` document:
+    the latest signal, then one entry per trailing window, newest first.
+    """
+    if not momentum:
+        return []
+    timeline = []
+    last_signal = momentum.get("last_signal_at")
+    if last_signal:
+        try:
+            date_str = datetime.datetime.fromisoformat(str(last_signal)).strftime("%d %b %Y")
+        except ValueError:
+            date_str = "Recent"
+        timeline.append({
+            "date": date_str,
+            "headline": f"Latest signal: {momentum.get('risk_tier', 'UNSCORED')}",
+            "analysis": f"7-day vs 90-day signal rate: {momentum.get('momentum_7_90', 0.0)}x",
+        })
+    for days in (7, 30, 90):
+        count = momentum.get(f"signal_count_{days}d", 0)
+        if not count:
+            continue
+        timeline.append({
+            "date": f"Last {days} days",
+            "headline": f"{count} signal{'s' if count != 1 else ''}",
+            "analysis": (
+                f"Mean conviction {momentum.get(f'mean_conviction_{days}d', 0.0)}; "
+                f"{momentum.get(f'elevated_transitions_{days}d', 0)} move(s) into elevated risk"
+            ),
+        })
+    return timeline
+
 @router.get("/signals", response_model=List[SignalResponse])
 async def get_signals(
     industry_id: Optional[str] = Query(None),
@@ -158,9 +211,15 @@ async def get_signals(
                 advisor_url=data.get("advisor_url"),
                 deal_date=data.get("deal_date"),
                 source_link=data.get("source_link"),
-                source_family=data.get("source_family", "RSS_NEWS")
+                source_family=data.get("source_family", "RSS_NEWS"),
+                company_number=data.get("company_number"),
             )
             results.append(signal)
+
+        # Attach rolling momentum with a single batched lookup
+        momentum = get_momentum(db, [r.company_number for r in results])
+        for signal in results:
+            signal.momentum = momentum.get(signal.company_number)
             
         # In-memory Sort: Prioritize 'timestamp' (ingested_at) to ensure the LATEST sweep results appear top of feed.
         # Fallback to 'deal_date' only if useful, but for a "Pulse", recency of discovery is king.
@@ -191,25 +250,9 @@ async def generate_dossier(request: DossierRequest, user: dict = Depends(get_cur
         data = doc.to_dict()
         company_name = data.get("company_name", "Unknown Asset")
         
-        # 1. Fetch historical momentum (12 months)
-        cutoff_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=365)
-        momentum_query = db.collection(AUCTIONS_COL)\
-            .where("company_name", "==", company_name)\
-            .where("ingested_at", ">=", cutoff_date)\
-            .order_by("ingested_at", direction=firestore.Query.DESCENDING)\
-            .limit(10)
-        
-        momentum_docs = momentum_query.stream()
-        momentum_timeline = []
-        for mdoc in momentum_docs:
-            mdata = mdoc.to_dict()
-            ts = mdata.get("ingested_at")
-            date_str = ts.strftime("%b %Y") if hasattr(ts, 'strftime') else "Recent"
-            momentum_timeline.append({
-                "date": date_str,
-                "headline": mdata.get("headline", "Signal Detected"),
-                "analysis": mdata.get("analysis", "Market sweep detection.")[:200] + "..."
-            })
+        # 1. Rolling momentum: one key lookup on the pipeline-maintained document
+        company_number = data.get("company_number")
+        momentum = get_momentum(db, [company_number]).get(company_number) if company_number else None
 
         # 2. Prepare data contract
         dossier_data = {
@@ -231,7 +274,7 @@ async def generate_dossier(request: DossierRequest, user: dict = Depends(get_cur
                 "ev": "Market cap weighted",
                 "leverage": "High risk > 4.0x"
             },
-            "momentum_timeline": momentum_timeline,
+            "momentum_timeline": momentum_timeline(momentum),
             "sector": data.get("industry_id", "General Mid-Market"),
             "sector_context": "The target operates within a high-sensitivity sector currently experiencing significant consolidation pressure.",
             "theme": request.theme.upper() if request.theme else "INSTITUTIONAL"
@@ -286,47 +329,36 @@ async def ignore_signal(signal_id: str, user: dict = Depends(get_current_user)):
         logger.error("Failed to ignore signal", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+def _latest_pulse_for(user) -> Optional[dict]:
+    if pulse_engine is None:
+        raise HTTPException(status_code=503, detail="Pulse engine unavailable")
+    return pulse_engine.get_latest_pulse(user.tenant_id)
+
 @router.get("/pulses/latest")
 async def get_latest_pulse(user: dict = Depends(get_current_user)):
     """
-    Retrieves the most recent Morning Pulse.
+    Retrieves the most recent Morning Pulse for the user's tenant
+    (served from the pulse engine's cache).
     """
     try:
-        db = get_db()
-        # Get pulse for today, or most recent.
-        pulses = db.collection("morning_pulses")\
-            .order_by("generated_at", direction=firestore.Query.DESCENDING)\
-            .limit(1)\
-            .stream()
-        
-        for p in pulses:
-            return p.to_dict()
-            
-        raise HTTPException(status_code=404, detail="No pulse available")
+        pulse = _latest_pulse_for(user)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Failed to fetch latest pulse", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+    if not pulse:
+        raise HTTPException(status_code=404, detail="No pulse available")
+    return pulse
+
 @router.post("/pulses/generate-briefing")
 async def generate_briefing(user: dict = Depends(get_current_user)):
     """
     Generates a PDF briefing for the latest Morning Pulse.
     """
     try:
-        # Re-use get_latest_pulse logic (or extract it)
-        # For now, just duplicate fetch logic slightly or call it if it was a function returning dict
-        # But get_latest_pulse is an async route handler.
-        
-        db = get_db()
-        pulses = db.collection("morning_pulses")\
-            .order_by("generated_at", direction=firestore.Query.DESCENDING)\
-            .limit(1)\
-            .stream()
-            
-        pulse_data = None
-        for p in pulses:
-            pulse_data = p.to_dict()
-            
+        pulse_data = _latest_pulse_for(user)
         if not pulse_data:
             raise HTTPException(status_code=404, detail="No pulse available to generate briefing")
             
@@ -3,13 +3,20 @@ IC Origin — Telemetry API
 
 Provides the /api/v1/telemetry/status endpoint for the customer-facing
 Portfolio Status dashboard. RBAC-protected via get_current_user.
+
+/api/v1/telemetry/metrics exposes the per-tenant counters in Prometheus /
+OpenMetrics text format for scraping, guarded by METRICS_SCRAPE_TOKEN.
 """
 
 import datetime
+import hmac
 import structlog
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 
+from src.core.audit import audit_buffer
 from src.core.auth import AuthenticatedUser, get_current_user
+from src.core.config import settings
 from src.services.telemetry_service import telemetry_service
 
 logger = structlog.get_logger()
@@ -50,3 +57,41 @@ async def get_telemetry_status(
         "user_role": user.role.value,
         "user_email": user.email,
     }
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# Cumulative audit buffer stats, exported as counters; the rest are gauges
+AUDIT_BUFFER_COUNTERS = ("enqueued", "dropped", "flushed", "flush_failures")
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(
+    authorization: str = Header(default=""),
+    accept: str = Header(default=""),
+):
+    """
+    Prometheus scrape endpoint. Disabled (404) unless METRICS_SCRAPE_TOKEN
+    is configured; the scraper must send it as a Bearer token.
+    """
+    token = settings.METRICS_SCRAPE_TOKEN
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(authorization, f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid scrape token")
+
+    audit = audit_buffer.stats()
+    extra_gauges, extra_counters = {}, {}
+    for name, value in audit.items():
+        if not isinstance(value, (int, float)):
+            continue
+        target = extra_counters if name in AUDIT_BUFFER_COUNTERS else extra_gauges
+        target[f"sentinel_audit_buffer_{name}"] = (f"Audit buffer {name.replace('_', ' ')}.", value)
+    openmetrics = "application/openmetrics-text" in accept
+    body = telemetry_service.render_metrics(
+        openmetrics=openmetrics, extra_gauges=extra_gauges, extra_counters=extra_counters
+    )
+    return PlainTextResponse(
+        body,
+        media_type=OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+    )
@@ -5,17 +5,34 @@ Intercepts all state-changing requests (POST, PUT, DELETE, PATCH),
 extracts authentication context, redacts sensitive fields, and
 publishes audit events asynchronously to avoid blocking API responses.
 
+The middleware is pure ASGI (no BaseHTTPMiddleware task/stream overhead).
+On the request path it only:
+  - tees a bounded prefix of the request body as it streams to the app
+    (large uploads are never buffered),
+  - records the response status,
+  - appends a raw event to an in-memory ring buffer.
+
+Parsing, redaction and delivery happen off the request path in
+`AuditEventBuffer.run()`, a background task that flushes batches to the
+configured sink (structured log, Pub/Sub or BigQuery). When the buffer
+is full the oldest events are dropped and counted (backpressure metrics
+via `audit_buffer.stats()`).
+
 Audit events are structured for BigQuery `audit_logs` table ingestion.
 """
 
+import asyncio
+import collections
 import datetime
 import json
 import hashlib
+import re
+import time
 import structlog
 from typing import Optional
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from urllib.parse import parse_qsl
+
+from src.core.config import settings
 
 logger = structlog.get_logger()
 
@@ -35,111 +52,270 @@ SKIP_PATHS = frozenset({
 # Only audit state-changing methods
 AUDITABLE_METHODS = frozenset({"POST", "PUT", "DELETE", "PATCH"})
 
+# Precompiled redaction for body prefixes that are not complete JSON
+# (truncated uploads): masks the value of any sensitive key in raw text.
+_REDACT_RAW = re.compile(
+    r'("(?:' + "|".join(sorted(REDACTED_FIELDS)) + r')"\s*:\s*)'
+    r'("(?:[^"\\]|\\.)*"?|[^,}\]\s]+)',
+    re.IGNORECASE,
+)
+
 
-class AuditLogMiddleware(BaseHTTPMiddleware):
+class AuditLogMiddleware:
     """
-    SOC 2 compliant audit logging middleware.
+    SOC 2 compliant audit logging middleware (pure ASGI).
 
     For every state-changing request, captures:
       - tenant_id & user_id (from JWT or API key)
       - action (HTTP method + endpoint path)
       - timestamp (ISO 8601 UTC)
       - ip_address (client IP, X-Forwarded-For aware)
-      - request_body (with PII/secrets redacted)
+      - request_body (bounded prefix, PII/secrets redacted)
       - response_status
       - user_agent
 
-    Events are published asynchronously (fire-and-forget).
+    Events are buffered and published in batches by a background task.
     """
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        # Skip non-auditable methods and excluded paths
+    def __init__(self, app, buffer: Optional["AuditEventBuffer"] = None,
+                 max_body_bytes: Optional[int] = None):
+        self.app = app
+        self.buffer = buffer if buffer is not None else audit_buffer
+        self.max_body_bytes = (
+            settings.AUDIT_BODY_PREFIX_BYTES if max_body_bytes is None else max_body_bytes
+        )
+
+    async def __call__(self, scope, receive, send):
+        # Skip non-HTTP traffic, non-auditable methods and excluded paths
         if (
-            request.method not in AUDITABLE_METHODS
-            or request.url.path in SKIP_PATHS
+            scope["type"] != "http"
+            or scope["method"] not in AUDITABLE_METHODS
+            or scope["path"] in SKIP_PATHS
         ):
-            return await call_next(request)
-
-        # Capture request context before processing
-        audit_event = await self._build_audit_event(request)
-
-        # Process the request
-        response = await call_next(request)
-
-        # Complete the audit event with response data
-        audit_event["response_status"] = response.status_code
-        audit_event["completed_at"] = datetime.datetime.now(
-            datetime.timezone.utc
-        ).isoformat()
-
-        # Fire-and-forget: publish asynchronously
-        self._publish_audit_event(audit_event)
-
-        return response
-
-    async def _build_audit_event(self, request: Request) -> dict:
-        """Extract and structure the audit event from the request."""
-        # Extract auth context from request state (set by auth middleware)
-        tenant_id = ""
-        user_id = ""
-        user_email = ""
-
-        # Try to extract from Authorization header (JWT decode)
-        auth_header = request.headers.get("authorization", "")
-        if auth_header.startswith("Bearer "):
-            token = auth_header[7:]
-            # Generate a non-reversible request fingerprint
-            token_hash = hashlib.sha256(token.encode()).hexdigest()[:12]
-        else:
-            token_hash = "no_token"
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        body_prefix = bytearray()
+        body_size = 0
+        status = [None]
+        limit = self.max_body_bytes
+
+        async def receive_wrapper():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                remaining = limit - len(body_prefix)
+                if remaining > 0 and chunk:
+                    body_prefix.extend(chunk[:remaining])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
 
-        # Read and redact request body
-        body_redacted = {}
         try:
-            body_bytes = await request.body()
-            if body_bytes:
-                try:
-                    body_json = json.loads(body_bytes)
-                    body_redacted = _redact_dict(body_json)
-                except (json.JSONDecodeError, UnicodeDecodeError):
-                    body_redacted = {"_raw_size_bytes": len(body_bytes)}
-        except Exception:
-            body_redacted = {"_error": "could_not_read_body"}
-
-        # Extract client IP (X-Forwarded-For aware for Cloud Run)
-        ip_address = request.headers.get(
-            "x-forwarded-for", request.client.host if request.client else "unknown"
-        )
-        if "," in ip_address:
-            ip_address = ip_address.split(",")[0].strip()
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            self.buffer.append(_raw_event(scope, started, bytes(body_prefix), body_size, status[0]))
+
+
+def _raw_event(scope, started: float, body_prefix: bytes, body_size: int,
+               status: Optional[int]) -> tuple:
+    """Cheap request-path capture; everything else is deferred to the flusher."""
+    auth = user_agent = forwarded = b""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            auth = value
+        elif name == b"user-agent":
+            user_agent = value
+        elif name == b"x-forwarded-for":
+            forwarded = value
+
+    # Hash immediately so raw bearer tokens never sit in the buffer
+    if auth.startswith(b"Bearer "):
+        token_hash = hashlib.sha256(auth[7:]).hexdigest()[:12]
+    else:
+        token_hash = "no_token"
+
+    client = scope.get("client")
+    return (
+        started, time.time(), scope["method"], scope["path"],
+        scope.get("query_string", b""), forwarded, client[0] if client else "unknown",
+        user_agent, token_hash, body_prefix, body_size, status,
+    )
+
+
+def build_audit_event(raw: tuple) -> dict:
+    """Expand a raw buffered capture into a redacted audit event."""
+    (started, completed, method, path, query_string, forwarded, client_host,
+     user_agent, token_hash, body_prefix, body_size, status) = raw
+
+    # Extract client IP (X-Forwarded-For aware for Cloud Run)
+    ip_address = forwarded.decode("latin-1") or client_host
+    if "," in ip_address:
+        ip_address = ip_address.split(",")[0].strip()
+
+    return {
+        "event_type": "api_request",
+        "timestamp": _iso(started),
+        "tenant_id": "",
+        "user_id": "",
+        "user_email": "",
+        "action": f"{method} {path}",
+        "method": method,
+        "path": path,
+        "query_params": dict(parse_qsl(query_string.decode("latin-1"))),
+        "ip_address": ip_address,
+        "user_agent": user_agent.decode("latin-1") or "unknown",
+        "token_fingerprint": token_hash,
+        "request_body_redacted": _redact_body(body_prefix, body_size),
+        "response_status": status,
+        "completed_at": _iso(completed),
+    }
+
+
+def _iso(ts: float) -> str:
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def _redact_body(body_prefix: bytes, body_size: int) -> dict:
+    if not body_prefix:
+        return {}
+    if len(body_prefix) == body_size:
+        try:
+            body_json = json.loads(body_prefix)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            body_json = None
+        if isinstance(body_json, dict):
+            return _redact_dict(body_json)
+    text = body_prefix.decode("utf-8", errors="replace")
+    if not text.lstrip().startswith(("{", "[")):
+        return {"_raw_size_bytes": body_size}
+    # Truncated JSON: keep a redacted text prefix
+    return {
+        "_prefix": _REDACT_RAW.sub(r'\1"[REDACTED]"', text)[:500],
+        "_raw_size_bytes": body_size,
+        "_truncated": len(body_prefix) < body_size,
+    }
+
+
+# ── Ring buffer & background flusher ─────────────────────────────────
+
+class AuditEventBuffer:
+    """
+    Bounded in-memory ring buffer of raw audit captures.
+
+    `append` is O(1) and never blocks; when full, the oldest event is
+    dropped and counted. `run()` drains the buffer in batches on an
+    interval (or sooner once a full batch is waiting).
+    """
+
+    def __init__(self, capacity: int = 10_000, batch_size: int = 500,
+                 flush_interval: float = 1.0, sink=None):
+        self._events = collections.deque(maxlen=capacity)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sink = sink
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+
+    def append(self, raw: tuple) -> None:
+        if len(self._events) == self.capacity:
+            self.dropped += 1
+        self._events.append(raw)
+        self.enqueued += 1
+        if self._wakeup is not None and len(self._events) >= self.batch_size:
+            self._wakeup.set()
 
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def stats(self) -> dict:
+        """Backpressure metrics for dashboards and health checks."""
         return {
-            "event_type": "api_request",
-            "timestamp": datetime.datetime.now(
-                datetime.timezone.utc
-            ).isoformat(),
-            "tenant_id": tenant_id,
-            "user_id": user_id,
-            "user_email": user_email,
-            "action": f"{request.method} {request.url.path}",
-            "method": request.method,
-            "path": request.url.path,
-            "query_params": dict(request.query_params),
-            "ip_address": ip_address,
-            "user_agent": request.headers.get("user-agent", "unknown"),
-            "token_fingerprint": token_hash,
-            "request_body_redacted": body_redacted,
-            "response_status": None,
-            "completed_at": None,
+            "depth": len(self._events),
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flush_failures": self.flush_failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
         }
 
-    def _publish_audit_event(self, event: dict):
-        """
-        Publish audit event asynchronously.
-        In production, this pushes to BigQuery `audit_logs` table
-        or Pub/Sub topic. For now, structured logging captures it.
-        """
-        try:
+    def _take_batch(self) -> list:
+        batch = []
+        while self._events and len(batch) < self.batch_size:
+            batch.append(self._events.popleft())
+        return batch
+
+    async def flush(self) -> int:
+        """Drain everything currently buffered; returns events delivered."""
+        delivered = 0
+        sink = self.sink or get_audit_sink()
+        while self._events:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            try:
+                # Redaction and delivery both run off the event loop
+                await asyncio.to_thread(_deliver, sink, batch)
+                self.flushed += len(batch)
+                delivered += len(batch)
+            except Exception as e:
+                # Audit logging must never crash the application
+                self.flush_failures += 1
+                logger.error("Audit flush failed (non-blocking)", error=str(e), batch=len(batch))
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+        return delivered
+
+    async def run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and deliver anything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wakeup = None
+        await self.flush()
+
+
+def _deliver(sink, batch: list) -> None:
+    sink.write([build_audit_event(raw) for raw in batch])
+
+
+# ── Sinks ────────────────────────────────────────────────────────────
+
+class LogAuditSink:
+    """Structured-log sink (default; picked up by Cloud Logging)."""
+
+    def write(self, events: list) -> None:
+        for event in events:
             logger.info(
                 "AUDIT_LOG",
                 event_type=event["event_type"],
@@ -150,9 +326,69 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
                 response_status=event["response_status"],
                 timestamp=event["timestamp"],
             )
+
+
+class PubSubAuditSink:
+    """Publishes each event to the audit topic; the client batches on the wire."""
+
+    def __init__(self):
+        from google.cloud import pubsub_v1
+
+        self.publisher = pubsub_v1.PublisherClient()
+        self.topic_path = self.publisher.topic_path(
+            settings.GCP_PROJECT_ID, settings.AUDIT_PUBSUB_TOPIC_ID
+        )
+
+    def write(self, events: list) -> None:
+        futures = [
+            self.publisher.publish(self.topic_path, data=json.dumps(event).encode("utf-8"))
+            for event in events
+        ]
+        for future in futures:
+            future.result(timeout=30)
+
+
+class BigQueryAuditSink:
+    """Streams batches into the BigQuery `audit_logs` table."""
+
+    def __init__(self):
+        from google.cloud import bigquery
+
+        self.client = bigquery.Client(project=settings.GCP_PROJECT_ID)
+        self.table_id = (
+            f"{settings.GCP_PROJECT_ID}.{settings.BQ_DATASET}.{settings.AUDIT_BQ_TABLE}"
+        )
+
+    def write(self, events: list) -> None:
+        rows = [
+            {**event,
+             "query_params": json.dumps(event["query_params"]),
+             "request_body_redacted": json.dumps(event["request_body_redacted"])}
+            for event in events
+        ]
+        errors = self.client.insert_rows_json(self.table_id, rows)
+        if errors:
+            raise RuntimeError(f"BigQuery audit insert errors: {errors[:3]}")
+
+
+_sink = None
+
+
+def get_audit_sink():
+    """Lazily build the sink selected by settings.AUDIT_SINK (log | pubsub | bigquery)."""
+    global _sink
+    if _sink is None:
+        try:
+            if settings.AUDIT_SINK == "pubsub":
+                _sink = PubSubAuditSink()
+            elif settings.AUDIT_SINK == "bigquery":
+                _sink = BigQueryAuditSink()
+            else:
+                _sink = LogAuditSink()
         except Exception as e:
-            # Audit logging must never crash the application
-            logger.error("Audit publish failed (non-blocking)", error=str(e))
+            logger.error("Audit sink init failed, falling back to log sink", error=str(e))
+            _sink = LogAuditSink()
+    return _sink
 
 
 def _redact_dict(data: dict, depth: int = 0) -> dict:
@@ -189,3 +425,10 @@ def _redact_value(value: str) -> str:
     if len(value) <= 4:
         return "[REDACTED]"
     return value[:2] + "*" * (len(value) - 2)
+
+
+audit_buffer = AuditEventBuffer(
+    capacity=settings.AUDIT_BUFFER_CAPACITY,
+    batch_size=settings.AUDIT_FLUSH_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_INTERVAL_S,
+)
@@ -12,6 +12,13 @@ class Settings(BaseSettings):
     GCP_PROJECT_ID: str = "cofound-agents-os-788e"
     GCS_BUCKET_NAME: str = "sentinel-growth-artifacts-788e"
     FIRESTORE_DB_NAME: str = "(default)"
+    GCS_UPLOAD_CHUNK_MB: int = 8            # Resumable upload chunk (multiple of 256 KiB)
+
+    # ── PDF rendering ─────────────────────────────────────────────────
+    PDF_RENDER_WORKERS: int = 0             # Process pool size (0 = one per available CPU, <0 = N threads)
+    PDF_RESULT_CACHE_MB: int = 64           # Rendered PDFs cached by HTML content hash
+    RISK_REPORT_CHUNK_SIZE: int = 1000      # Table rows per risk-report PDF section
+    RISK_REPORT_PART_SECTIONS: int = 20     # Sections merged into each uploaded report part
 
     # ── BigQuery ──────────────────────────────────────────────────────
     BQ_DATASET: str = "ic_origin_themav2"   # Production dataset
@@ -33,6 +40,32 @@ class Settings(BaseSettings):
 
     # ── Pub/Sub ───────────────────────────────────────────────────────
     PUBSUB_TOPIC_ID: str = "ic-origin-signals"
+    PUBSUB_ENCODING: str = "json"           # json | avro (see services/signal_codec.py)
+    PUBSUB_BATCH_MAX_MESSAGES: int = 1000
+    PUBSUB_BATCH_MAX_BYTES: int = 4 * 1024 * 1024
+    PUBSUB_BATCH_MAX_LATENCY_S: float = 0.05
+    PUBSUB_FLOW_CONTROL_MAX_MESSAGES: int = 20000
+    PUBSUB_FLOW_CONTROL_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # ── Audit logging ─────────────────────────────────────────────────
+    AUDIT_SINK: str = "log"                 # log | pubsub | bigquery
+    AUDIT_PUBSUB_TOPIC_ID: str = "ic-origin-audit-logs"
+    AUDIT_BQ_TABLE: str = "audit_logs"
+    AUDIT_BUFFER_CAPACITY: int = 10000      # Ring buffer size; oldest dropped when full
+    AUDIT_FLUSH_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_S: float = 1.0
+    AUDIT_BODY_PREFIX_BYTES: int = 4096     # Request body bytes captured per event
+
+    # ── Morning Pulse ─────────────────────────────────────────────────
+    PULSE_TOP_K: int = 5                    # Signals per pulse
+    PULSE_CANDIDATES: int = 200             # Heap capacity per tenant (rolling 24h)
+    PULSE_CACHE_TTL_S: float = 300.0        # Latest-pulse cache lifetime per tenant
+
+    # ── Telemetry ─────────────────────────────────────────────────────
+    TELEMETRY_FLUSH_INTERVAL_S: int = 10
+    TELEMETRY_COUNTER_SHARDS: int = 10      # Shard docs per tenant-month counter
+    TELEMETRY_CACHE_TTL_S: float = 30.0     # Per-tenant usage/entity-count read cache
+    METRICS_SCRAPE_TOKEN: str = ""          # Bearer token for /metrics; endpoint disabled if empty
 
     # ── Neo4j (deprecated — replaced by Lean Graph SQL in BigQuery) ───
     NEO4J_URI: str = ""              # No longer used in production
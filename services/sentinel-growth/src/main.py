@@ -3,6 +3,7 @@ from fastapi import FastAPI, BackgroundTasks
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from src.core.config import settings
 from src.core.logging import configure_logging
 from src.core.auth import initialize_firebase
@@ -20,6 +21,9 @@ from src.api.user_data import router as user_data_router
 from src.services.dispatch_alerts import router as scoring_router
 
 from src.services.market_sweep import sweep_service
+from src.services.systemic_risk import systemic_risk_service
+from src.services.telemetry_service import telemetry_service
+from src.services.pdf_factory import pdf_renderer
 import uuid
 import datetime
 from google.cloud import firestore
@@ -51,6 +55,13 @@ async def lifespan(app: FastAPI):
             id="morning_pulse",
             replace_existing=True
         )
+        # Seed the pulse top-K heaps once at startup
+        scheduler.add_job(
+            pulse_engine.warm,
+            id="pulse_warm",
+            next_run_time=datetime.datetime.now(datetime.timezone.utc),
+            replace_existing=True
+        )
     else:
         structlog.get_logger().error("PulseEngine not initialized, skipping schedule.")
     
@@ -61,13 +72,44 @@ async def lifespan(app: FastAPI):
         id="daily_market_sweep",
         replace_existing=True
     )
+
+    # Keep the cross-tenant exposure index warm (first build runs at startup)
+    scheduler.add_job(
+        systemic_risk_service.build_exposure_index,
+        IntervalTrigger(minutes=30),
+        id="systemic_index_refresh",
+        next_run_time=datetime.datetime.now(datetime.timezone.utc),
+        replace_existing=True
+    )
+
+    # Publish the full systemic-exposure table nightly at 02:00
+    scheduler.add_job(
+        systemic_risk_service.publish_systemic_exposure_table,
+        CronTrigger(hour=2, minute=0),
+        id="nightly_systemic_exposure",
+        replace_existing=True
+    )
+
+    # Flush buffered telemetry counters to their Firestore shards
+    scheduler.add_job(
+        telemetry_service.flush,
+        IntervalTrigger(seconds=settings.TELEMETRY_FLUSH_INTERVAL_S),
+        id="telemetry_flush",
+        replace_existing=True
+    )
     scheduler.start()
-    structlog.get_logger().info("Sentinel Scheduler Started", jobs=["morning_pulse", "daily_market_sweep"], times=["07:30", "08:00"])
+
+    # Background flusher for buffered audit events
+    audit_buffer.start()
+    structlog.get_logger().info("Sentinel Scheduler Started", jobs=["morning_pulse", "daily_market_sweep", "systemic_index_refresh", "nightly_systemic_exposure", "telemetry_flush"], times=["07:30", "08:00", "every 30m", "02:00", f"every {settings.TELEMETRY_FLUSH_INTERVAL_S}s"])
     
     yield
     
     # Shutdown
     scheduler.shutdown()
+    await audit_buffer.stop()
+    telemetry_service.flush()
+    pdf_renderer.shutdown()
 
 app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
@@ -92,7 +134,7 @@ app.add_middleware(
 )
 
 # SOC 2 Audit Logging (Sprint 9)
-from src.core.audit import AuditLogMiddleware
+from src.core.audit import AuditLogMiddleware, audit_buffer
 app.add_middleware(AuditLogMiddleware)
 
 app.include_router(content_router)
@@ -18,6 +18,9 @@ class CompanyEnrichmentService:
         self.api_key = os.getenv("COMPANIES_HOUSE_API_KEY", "")
         self.base_url = "https://api.company-information.service.gov.uk"
         self.cache = {}  # Simple in-memory cache
+        # ic-origin-ingest name index; avoids a Companies House search call per name
+        self.resolver_url = os.getenv("ENTITY_RESOLVER_URL", "").rstrip("/")
+        self.resolver_min_confidence = float(os.getenv("ENTITY_RESOLVER_MIN_CONFIDENCE", "0.92"))
         
     async def enrich_company_data(self, company_name: str) -> Optional[CompanyProfile]:
         """
@@ -68,8 +71,34 @@ class CompanyEnrichmentService:
             log.error("Error enriching company data", error=str(e))
             return None
     
+    async def _resolve_company_number(self, company_name: str) -> Optional[str]:
+        """Look up a company number in the ic-origin-ingest name index"""
+        if not self.resolver_url:
+            return None
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    f"{self.resolver_url}/resolve-entities",
+                    params={"entity_name": company_name, "top_k": 1},
+                    timeout=2.0
+                )
+            if response.status_code != 200:
+                logger.warning("Entity resolver lookup failed",
+                             status_code=response.status_code)
+                return None
+            data = response.json()
+            if data.get("entity_id") and data.get("confidence", 0.0) >= self.resolver_min_confidence:
+                return data["entity_id"]
+        except Exception as e:
+            logger.warning("Entity resolver unavailable", error=str(e))
+        return None
+
     async def _search_company(self, company_name: str) -> Optional[str]:
         """Search for company and return company number"""
+        company_number = await self._resolve_company_number(company_name)
+        if company_number:
+            return company_number
+
         async with httpx.AsyncClient() as client:
             response = await client.get(
                 f"{self.base_url}/search/companies",
@@ -3,10 +3,12 @@ import asyncio
 import feedparser
 import datetime
 import urllib.parse
+import uuid
 from google.cloud import firestore
 from src.services.ingest import auction_ingestor
 from src.services.enrichment import enrichment_service
 from src.services.shadow_market import shadow_market
+from src.services.pulse_engine import pulse_engine
 
 logger = structlog.get_logger()
 
@@ -157,7 +159,7 @@ class MarketSweepService:
                     # Check for duplicate by link
                     existing = list(self.collection.where("source_link", "==", link).limit(1).stream())
                     if not existing:
-                        self.collection.add(doc_data)
+                        self._add_signal(doc_data)
                         new_deals += 1
                         logger.info("Saved RSS entry", title=title[:30], signal_type=source_signal_type)
                     else:
@@ -318,7 +320,7 @@ class MarketSweepService:
                                       .where("company_name", "==", company_name).limit(1).stream())
                         
                         if not existing:
-                            self.collection.add(signal_doc)
+                            self._add_signal(signal_doc)
                             count += 1
                             logger.info("Shadow Market Signal Found!", company=company_name, type=normalized["signal_type"])
                             
@@ -349,6 +351,14 @@ class MarketSweepService:
             
         return count
 
+    def _add_signal(self, doc_data: dict) -> str:
+        """Persist a signal to `auctions` and offer it to the Morning Pulse top-K."""
+        signal_id = uuid.uuid4().hex
+        self.collection.add(doc_data, document_id=signal_id)
+        if pulse_engine:
+            pulse_engine.record_signal(signal_id, doc_data)
+        return signal_id
+
     def _save_auction_if_new(self, auction_data, link, published, source_type, extra_data=None, skip_dupe_check=False):
         """Helper to check dupe and save"""
         if not skip_dupe_check:
@@ -379,7 +389,7 @@ class MarketSweepService:
         if extra_data:
             doc_data.update(extra_data)
         
-        self.collection.add(doc_data)
+        self._add_signal(doc_data)
         logger.info("New deal saved", company=auction_data.company_name, signal_type=doc_data["signal_type"])
         return True
 
@@ -474,7 +484,7 @@ class MarketSweepService:
                         # Persist if DB available
                         if self.db:
                             try:
-                                self.collection.add(signal_doc)
+                                self._add_signal(signal_doc)
                             except Exception as db_err:
                                 entity_log.warning("Failed to persist signal", error=str(db_err))
 
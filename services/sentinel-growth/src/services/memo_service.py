@@ -1,10 +1,17 @@
 
 import structlog
-import datetime
 import asyncio
-from typing import Dict, Any, Optional, List
+import csv
+import datetime
+import io
+import itertools
+import os
+import tempfile
+from collections import Counter
+from typing import Dict, Any, Optional, List, BinaryIO, Callable
+from src.core.config import settings
 from src.services.content import ContentGenerator
-from src.services.pdf_factory import render_pdf, render_pdf_sync
+from src.services.pdf_factory import compile_template, pdf_renderer, render_pdf
 from src.services.storage import storage_service
 
 logger = structlog.get_logger()
@@ -87,9 +94,11 @@ RISK_REPORT_TEMPLATE = """\
             Portfolio: <strong>{{ portfolio_id }}</strong> |
             Generated: {{ generated_at }} |
             Entities: {{ entity_count }}
+            {% if section_label %}| {{ section_label }}{% endif %}
         </div>
     </div>
 
+    {% if show_table | default(true) %}
     <table>
         <thead>
             <tr>
@@ -104,7 +113,7 @@ RISK_REPORT_TEMPLATE = """\
         <tbody>
             {% for entity in entities %}
             <tr>
-                <td>{{ loop.index }}</td>
+                <td>{{ loop.index + row_offset | default(0) }}</td>
                 <td>{{ entity.company_name or 'Unknown' }}</td>
                 <td>{{ entity.company_number or '—' }}</td>
                 <td>{{ entity.counterparty_type or '—' }}</td>
@@ -124,17 +133,26 @@ RISK_REPORT_TEMPLATE = """\
             {% endfor %}
         </tbody>
     </table>
+    {% endif %}
 
+    {% if show_summary | default(true) %}
     <div class="summary">
+        {% if tier_counts is defined %}
+        {% set elevated_count = tier_counts.get('ELEVATED_RISK', 0) %}
+        {% set improved_count = tier_counts.get('IMPROVED', 0) %}
+        {% set stable_count   = tier_counts.get('STABLE', 0) %}
+        {% else %}
         {% set elevated_count = entities | selectattr('risk_tier', 'eq', 'ELEVATED_RISK') | list | length %}
         {% set improved_count = entities | selectattr('risk_tier', 'eq', 'IMPROVED') | list | length %}
         {% set stable_count   = entities | selectattr('risk_tier', 'eq', 'STABLE') | list | length %}
+        {% endif %}
         <strong>Summary:</strong>
         {{ elevated_count }} elevated risk,
         {{ stable_count }} stable,
         {{ improved_count }} improved
         out of {{ entity_count }} monitored counterparties.
     </div>
+    {% endif %}
 
     <div class="footer">
         IC Origin Counterparty Risk Intelligence — Confidential
@@ -144,6 +162,19 @@ RISK_REPORT_TEMPLATE = """\
 """
 
 
+ENTITY_TABLE_COLUMNS = [
+    "company_name",
+    "company_number",
+    "counterparty_type",
+    "risk_tier",
+    "max_conviction_score",
+]
+ENTITY_TABLE_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
 class MemoService:
     def __init__(self):
         # We might inject db if needed, but for now we accept data
@@ -207,6 +238,10 @@ class MemoService:
         and converts it to PDF using WeasyPrint. Falls back to a dummy PDF if
         WeasyPrint/GTK is unavailable (dev/CI environments).
 
+        Only books up to RISK_REPORT_CHUNK_SIZE entities are returned in
+        memory; larger books must go through export_portfolio_risk_report,
+        which streams the report to storage in parts.
+
         Args:
             portfolio_id: The portfolio being reported on.
             entities: List of entity dicts, each expected to contain:
@@ -218,26 +253,30 @@ class MemoService:
 
         Returns:
             PDF file content as bytes.
-        """
-        from jinja2 import Environment
 
+        Raises:
+            ValueError: if the book is larger than RISK_REPORT_CHUNK_SIZE.
+        """
         log = logger.bind(portfolio_id=portfolio_id)
         log.info("Generating portfolio risk PDF", entity_count=len(entities))
 
-        try:
-            # 1. Render HTML from inline template
-            jinja_env = Environment(autoescape=True)
-            template = jinja_env.from_string(RISK_REPORT_TEMPLATE)
+        if len(entities) > settings.RISK_REPORT_CHUNK_SIZE:
+            raise ValueError(
+                f"{len(entities)} entities is too large for an in-memory report "
+                f"(limit {settings.RISK_REPORT_CHUNK_SIZE}); use export_portfolio_risk_report"
+            )
 
-            html_content = template.render(
+        try:
+            # 1. Render HTML from the precompiled inline template
+            html_content = compile_template(RISK_REPORT_TEMPLATE).render(
                 portfolio_id=portfolio_id,
                 entities=entities,
                 entity_count=len(entities),
                 generated_at=datetime.datetime.now().strftime("%H:%M %d %b %Y"),
             )
 
-            # 2. Convert to PDF (runs in thread pool to avoid blocking)
-            pdf_bytes = await asyncio.to_thread(render_pdf_sync, html_content)
+            # 2. Convert to PDF in the dedicated render pool
+            pdf_bytes = await pdf_renderer.render_html(html_content)
 
             log.info(
                 "Portfolio risk PDF generated",
@@ -249,6 +288,206 @@ class MemoService:
             log.error("Failed to generate portfolio risk PDF", error=str(e))
             raise
 
+    async def write_portfolio_risk_pdf(
+        self,
+        portfolio_id: str,
+        entities: List[Dict[str, Any]],
+        emit_part: Callable[[BinaryIO], Any],
+        chunk_size: Optional[int] = None,
+        include_table: bool = True,
+        part_sections: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Render the Portfolio Risk Report in sections and merge them into
+        page-bounded parts, returning the page count of each part.
+
+        The first section is the header and tier summary. Each following
+        section holds `chunk_size` table rows (RISK_REPORT_CHUNK_SIZE by
+        default), and every `part_sections` sections (RISK_REPORT_PART_SECTIONS)
+        are merged with pypdf into one part. Sections of a part render in
+        parallel, only as many at once as the PDF pool has workers, and are
+        spooled to disk. Each finished part is handed to `emit_part` as an
+        open temp file (called in a worker thread) and then deleted, so
+        memory and disk are bounded by the part size, not the portfolio size.
+        """
+        chunk_size = chunk_size or settings.RISK_REPORT_CHUNK_SIZE
+        part_sections = part_sections or settings.RISK_REPORT_PART_SECTIONS
+        template = compile_template(RISK_REPORT_TEMPLATE)
+        common = {
+            "portfolio_id": portfolio_id,
+            "entity_count": len(entities),
+            "generated_at": datetime.datetime.now().strftime("%H:%M %d %b %Y"),
+            "tier_counts": _tier_counts(entities),
+        }
+
+        sections = [{"entities": [], "show_table": False, "section_label": "Summary"}]
+        if include_table:
+            total = len(entities)
+            for offset in range(0, total, chunk_size):
+                sections.append({
+                    "entities": entities[offset:offset + chunk_size],
+                    "row_offset": offset,
+                    "show_summary": False,
+                    "section_label": f"Rows {offset + 1}–{min(offset + chunk_size, total)}",
+                })
+
+        semaphore = asyncio.Semaphore(pdf_renderer.parallelism)
+        part_pages = []
+        with tempfile.TemporaryDirectory() as workdir:
+
+            async def render_section(index: int, section: dict) -> str:
+                async with semaphore:
+                    html_content = template.render(**common, **section)
+                    pdf_bytes = await pdf_renderer.render_html(html_content, cache=False)
+                path = os.path.join(workdir, f"section_{index:05d}.pdf")
+                with open(path, "wb") as fh:
+                    fh.write(pdf_bytes)
+                return path
+
+            for start in range(0, len(sections), part_sections):
+                paths = await asyncio.gather(*(
+                    render_section(i, sections[i])
+                    for i in range(start, min(start + part_sections, len(sections)))
+                ))
+                part_pages.append(await asyncio.to_thread(_emit_merged_part, paths, emit_part))
+
+        logger.info(
+            "Portfolio risk PDF written",
+            portfolio_id=portfolio_id,
+            sections=len(sections),
+            parts=len(part_pages),
+            pages=sum(part_pages),
+        )
+        return part_pages
+
+    async def export_portfolio_risk_report(
+        self,
+        portfolio_id: str,
+        entities: List[Dict[str, Any]],
+        table_format: str = "csv",
+        full_report: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Export a large book as a summary PDF plus the full entity table
+        (CSV or Parquet), and optionally the full sectioned report as
+        page-bounded PDF parts. Everything is written to temp files and
+        streamed to storage, so no artefact is held in memory as a whole.
+        Returns signed URLs for all artefacts.
+        """
+        if table_format not in ENTITY_TABLE_FORMATS:
+            raise ValueError(f"Unsupported table format: {table_format}")
+
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+        base = f"risk_reports/{portfolio_id}/{stamp}"
+
+        def pdf_uploader(urls: List[str], name: Callable[[int], str]) -> Callable[[BinaryIO], None]:
+            def upload(fh: BinaryIO) -> None:
+                urls.append(storage_service.upload_stream_and_sign(
+                    fh, name(len(urls) + 1), "application/pdf"
+                ))
+            return upload
+
+        summary_urls = []
+        summary_pages = await self.write_portfolio_risk_pdf(
+            portfolio_id, entities,
+            pdf_uploader(summary_urls, lambda _: f"{base}/summary.pdf"),
+            include_table=False,
+        )
+
+        with tempfile.TemporaryFile() as table_file:
+            await asyncio.to_thread(write_entity_table, entities, table_file, table_format)
+            table_url = await asyncio.to_thread(
+                storage_service.upload_stream_and_sign,
+                table_file, f"{base}/entities.{table_format}",
+                ENTITY_TABLE_FORMATS[table_format],
+            )
+
+        result = {
+            "portfolio_id": portfolio_id,
+            "entity_count": len(entities),
+            "summary_pdf_url": summary_urls[0],
+            "summary_pdf_pages": sum(summary_pages),
+            "table_url": table_url,
+            "table_format": table_format,
+        }
+
+        if full_report:
+            part_urls = []
+            part_pages = await self.write_portfolio_risk_pdf(
+                portfolio_id, entities,
+                pdf_uploader(part_urls, lambda n: f"{base}/report_part_{n:03d}.pdf"),
+            )
+            result["report_part_urls"] = part_urls
+            result["report_pages"] = sum(part_pages)
+
+        return result
+
+
+def _tier_counts(entities: List[Dict[str, Any]]) -> Dict[str, int]:
+    return dict(Counter(e.get("risk_tier") or "UNSCORED" for e in entities))
+
+
+def _merge_pdfs(paths: List[str], target: BinaryIO) -> int:
+    """Append section PDFs in order and write the merged document to `target`."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    writer.write(target)
+    pages = len(writer.pages)
+    writer.close()
+    return pages
+
+
+def _emit_merged_part(paths: List[str], emit_part: Callable[[BinaryIO], Any]) -> int:
+    """Merge one part's sections into a temp file, hand it on, then drop the sections."""
+    with tempfile.TemporaryFile() as part:
+        pages = _merge_pdfs(paths, part)
+        part.seek(0)
+        emit_part(part)
+    for path in paths:
+        os.remove(path)
+    return pages
+
+
+def write_entity_table(
+    entities: List[Dict[str, Any]],
+    target: BinaryIO,
+    table_format: str = "csv",
+    row_group_size: int = 10_000,
+) -> None:
+    """
+    Write the risk report's entity table to a binary file object.
+    Parquet output is written one row group at a time.
+    """
+    rows = (
+        {col: entity.get(col) for col in ENTITY_TABLE_COLUMNS}
+        for entity in entities
+    )
+    if table_format == "csv":
+        text = io.TextIOWrapper(target, encoding="utf-8", newline="")
+        writer = csv.DictWriter(text, fieldnames=ENTITY_TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+        text.flush()
+        text.detach()
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("company_name", pa.string()),
+        ("company_number", pa.string()),
+        ("counterparty_type", pa.string()),
+        ("risk_tier", pa.string()),
+        ("max_conviction_score", pa.int64()),
+    ])
+    with pq.ParquetWriter(target, schema) as writer:
+        while chunk := list(itertools.islice(rows, row_group_size)):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+
 
 memo_service = MemoService()
 
@@ -1,19 +1,87 @@
+"""
+IC Origin — PDF Rendering
+
+Jinja2 → HTML → WeasyPrint PDF, off the event loop.
+
+WeasyPrint layout is CPU-bound and holds the GIL, so renders run in a
+dedicated process pool (PDF_RENDER_WORKERS, default one per available
+core) rather than the shared default thread executor. Workers are started
+with forkserver (spawn where unavailable), never fork: forking a process
+that already runs gRPC client threads can deadlock the child. Each worker
+keeps a single
+FontConfiguration and WeasyPrint resource cache for its lifetime, so
+fonts and stylesheet assets are loaded once per process, not per report.
+
+Templates are compiled once: file templates through the shared
+Environment's cache (auto_reload off), inline template strings through
+`compile_template`. Rendered PDFs are cached by SHA-256 of their HTML,
+and identical concurrent renders share a single job.
+"""
 
 import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+
 import structlog
 from jinja2 import Environment, FileSystemLoader
-import os
+
+from src.core.config import settings
 
 logger = structlog.get_logger()
 
-# Templates directory
-# Assuming templates are in parent directory compared to services? 
-# In original file it was "src/templates" in argument default.
-# Let's try to determine absolute path relative to this file.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
-env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
+# Compiled templates stay cached for the process lifetime (no mtime checks)
+env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), auto_reload=False, cache_size=-1)
+_string_env = Environment(autoescape=True, cache_size=-1)
+
+_FALLBACK_TEMPLATE = "<html><body><h1>{{ headline }}</h1><p>{{ analysis }}</p></body></html>"
+
+# Start method for render workers; fork is unsafe once gRPC threads exist
+_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Per-process WeasyPrint state, created lazily in each worker
+_font_config = None
+_resource_cache: dict = {}
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: the scheduler affinity mask,
+    capped by a cgroup v2 CPU quota (the Cloud Run / container CPU limit)
+    when one is set. os.cpu_count() reports the host's cores instead.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def _init_worker() -> None:
+    """Process-pool initializer: import WeasyPrint and build shared caches once."""
+    global _font_config
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    except (ImportError, OSError):
+        _font_config = None
+
 
 def render_pdf_sync(html_content: str) -> bytes:
     """
@@ -21,7 +89,9 @@ def render_pdf_sync(html_content: str) -> bytes:
     """
     try:
         from weasyprint import HTML
-        return HTML(string=html_content).write_pdf()
+        return HTML(string=html_content).write_pdf(
+            font_config=_font_config, cache=_resource_cache
+        )
     except OSError:
         logger.warning("WeasyPrint / GTK not available. Returning dummy PDF.")
         return b"%PDF-1.4 ... Dummy PDF (GTK Missing) ... %%EOF"
@@ -29,30 +99,141 @@ def render_pdf_sync(html_content: str) -> bytes:
         logger.warning("WeasyPrint module not found. Returning dummy PDF.")
         return b"%PDF-1.4 ... Dummy PDF (WeasyPrint Missing) ... %%EOF"
 
+
+@functools.lru_cache(maxsize=32)
+def compile_template(source: str):
+    """Compile an inline (autoescaped) template string once per process."""
+    return _string_env.from_string(source)
+
+
+def get_template(template_name: str):
+    try:
+        return env.get_template(template_name)
+    except Exception:
+        # Fallback for tests if template missing
+        logger.warning(f"Template {template_name} not found. Using string template.")
+        return compile_template(_FALLBACK_TEMPLATE)
+
+
+class PdfRenderer:
+    """
+    Dedicated PDF render pool with a content-hash result cache.
+
+    PDF_RENDER_WORKERS > 0 sizes a process pool (0 = one per available CPU);
+    a negative value renders in a small dedicated thread pool instead,
+    for environments where worker processes are unavailable.
+    """
+
+    def __init__(self, workers: int = None, cache_bytes: int = None):
+        self.workers = settings.PDF_RENDER_WORKERS if workers is None else workers
+        self.cache_bytes = (
+            settings.PDF_RESULT_CACHE_MB * 1024 * 1024 if cache_bytes is None else cache_bytes
+        )
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._results: OrderedDict = OrderedDict()
+        self._results_size = 0
+        self._inflight: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        with self._executor_lock:
+            if self._executor is None:
+                if self.workers < 0:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=-self.workers, thread_name_prefix="pdf-render"
+                    )
+                else:
+                    self._executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.parallelism,
+                        mp_context=multiprocessing.get_context(_START_METHOD),
+                        initializer=_init_worker,
+                    )
+                logger.info("PDF render pool started", workers=self.parallelism)
+            return self._executor
+
+    def _cache_get(self, key: str):
+        pdf = self._results.get(key)
+        if pdf is not None:
+            self._results.move_to_end(key)
+        return pdf
+
+    def _cache_put(self, key: str, pdf) -> None:
+        size = len(pdf) if isinstance(pdf, (bytes, bytearray)) else 0
+        if not size or size > self.cache_bytes:
+            return
+        self._results[key] = pdf
+        self._results_size += size
+        while self._results_size > self.cache_bytes:
+            _, evicted = self._results.popitem(last=False)
+            self._results_size -= len(evicted)
+
+    @property
+    def parallelism(self) -> int:
+        """Number of renders the pool can run at once."""
+        return abs(self.workers) or available_cpus()
+
+    async def render_html(self, html_content: str, cache: bool = True) -> bytes:
+        """
+        Render HTML to PDF in the pool, reusing cached or in-flight results.
+        Pass cache=False for one-off output (e.g. report sections) that should
+        not displace reusable PDFs.
+        """
+        if not cache:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), render_pdf_sync, html_content)
+
+        key = hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), render_pdf_sync, html_content)
+        self._inflight[key] = future
+        try:
+            pdf_bytes = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+        self._cache_put(key, pdf_bytes)
+        return pdf_bytes
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.parallelism,
+            "cached_results": len(self._results),
+            "cached_bytes": self._results_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+pdf_renderer = PdfRenderer()
+
+
 async def render_pdf(data: dict, template_name: str) -> bytes:
     """
     Renders a PDF from a Jinja2 template and data.
-    Uses asyncio.to_thread to avoid blocking the event loop during PDF generation.
+    HTML is rendered in-process; the PDF is produced in the render pool.
     """
     try:
         logger.info("Rendering PDF", template=template_name)
-        
-        # Setup Jinja2 environment
-        # Check if template exists
-        try:
-             template = env.get_template(template_name)
-        except Exception:
-             # Fallback for tests if template missing
-             logger.warning(f"Template {template_name} not found. Using string template.")
-             template = env.from_string("<html><body><h1>{{ headline }}</h1><p>{{ analysis }}</p></body></html>")
-
-        # Render HTML
-        html_content = template.render(**data)
-        
-        # Generate PDF in a separate thread
-        pdf_bytes = await asyncio.to_thread(render_pdf_sync, html_content)
-        
-        return pdf_bytes
+        html_content = get_template(template_name).render(**data)
+        return await pdf_renderer.render_html(html_content)
     except Exception as e:
         logger.error("PDF generation failed", error=str(e))
         raise e
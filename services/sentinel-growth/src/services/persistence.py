@@ -1,11 +1,20 @@
 import structlog
 import datetime
-import json
 import uuid
 from typing import Optional
 from google.cloud import firestore
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.publisher.exceptions import FlowControlLimitError
+from google.cloud.pubsub_v1.types import (
+    BatchSettings,
+    LimitExceededBehavior,
+    PublisherOptions,
+    PublishFlowControl,
+)
 from src.core.config import settings
+from src.services.signal_codec import build_signal_payload, encode_signal
+from src.services.systemic_risk import systemic_risk_service
+from src.services.telemetry_service import telemetry_service
 
 logger = structlog.get_logger()
 
@@ -27,9 +36,25 @@ class PersistenceService:
     def __init__(self):
         self.db = firestore.Client(database=settings.FIRESTORE_DB_NAME)
 
-        # --- Pub/Sub Publisher (lazy, fire-and-forget) ---
+        # --- Pub/Sub Publisher (batched, ordered per company, fire-and-forget) ---
+        self.encoding = settings.PUBSUB_ENCODING
         try:
-            self.publisher = pubsub_v1.PublisherClient()
+            self.publisher = pubsub_v1.PublisherClient(
+                batch_settings=BatchSettings(
+                    max_messages=settings.PUBSUB_BATCH_MAX_MESSAGES,
+                    max_bytes=settings.PUBSUB_BATCH_MAX_BYTES,
+                    max_latency=settings.PUBSUB_BATCH_MAX_LATENCY_S,
+                ),
+                publisher_options=PublisherOptions(
+                    enable_message_ordering=True,
+                    flow_control=PublishFlowControl(
+                        message_limit=settings.PUBSUB_FLOW_CONTROL_MAX_MESSAGES,
+                        byte_limit=settings.PUBSUB_FLOW_CONTROL_MAX_BYTES,
+                        # Callers run on the event loop, so never block in publish()
+                        limit_exceeded_behavior=LimitExceededBehavior.ERROR,
+                    ),
+                ),
+            )
             self.topic_path = self.publisher.topic_path(
                 settings.GCP_PROJECT_ID, settings.PUBSUB_TOPIC_ID
             )
@@ -67,6 +92,7 @@ class PersistenceService:
     def publish_signal_event(self, signal_data: dict) -> None:
         """
         Non-blocking publish of a signal event to Pub/Sub.
+        Messages are batched by the client and ordered per company_number.
         Graceful failure: logs errors but NEVER raises.
         """
         if self.publisher is None:
@@ -74,25 +100,17 @@ class PersistenceService:
             return
 
         try:
-            payload = {
-                "signal_id": signal_data.get("signal_id", str(uuid.uuid4())),
-                "company_number": signal_data.get("company_number", ""),
-                "company_name": signal_data.get("company_name", ""),
-                "portfolio_id": signal_data.get("portfolio_id", ""),
-                "risk_tier": signal_data.get("risk_tier", "UNSCORED"),
-                "conviction_score": signal_data.get("conviction_score", 0),
-                "signal_type": signal_data.get("signal_type", "UNKNOWN"),
-                "source_family": signal_data.get("source_family", "GOV_REGISTRY"),
-                "region": signal_data.get("region", ""),
-                "tenant_id": signal_data.get("tenant_id", ""),
-                "ingested_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-                "event_date": signal_data.get(
-                    "event_date",
-                    datetime.date.today().isoformat(),
-                ),
-            }
-            data_bytes = json.dumps(payload).encode("utf-8")
-            future = self.publisher.publish(self.topic_path, data=data_bytes)
+            payload = build_signal_payload(signal_data)
+            data_bytes = encode_signal(payload, self.encoding)
+            # Ordering key keeps each company's events in publish order;
+            # different companies still publish in parallel batches.
+            ordering_key = payload["company_number"]
+            future = self.publisher.publish(
+                self.topic_path,
+                data=data_bytes,
+                ordering_key=ordering_key,
+                encoding=self.encoding,
+            )
 
             # Non-blocking callback for observability
             def _on_publish(fut):
@@ -103,12 +121,21 @@ class PersistenceService:
                         message_id=message_id,
                         signal_id=payload["signal_id"],
                     )
+                except FlowControlLimitError:
+                    # The Firestore write already landed; only the event is dropped
+                    logger.warning(
+                        "Pub/Sub backlog full — signal event dropped",
+                        signal_id=payload["signal_id"],
+                    )
                 except Exception as cb_err:
                     logger.error(
                         "Pub/Sub publish callback failed",
                         error=str(cb_err),
                         signal_id=payload["signal_id"],
                     )
+                    # A failed ordered publish pauses its key until resumed
+                    if ordering_key:
+                        self.publisher.resume_publish(self.topic_path, ordering_key)
 
             future.add_done_callback(_on_publish)
 
@@ -224,6 +251,10 @@ class PersistenceService:
                 "risk_tier": entity_data.get("risk_tier", "UNSCORED"),
             }
             self._entities_col(tenant_id).document(entity_id).set(doc_data)
+            systemic_risk_service.record_entity(
+                tenant_id, doc_data.get("company_number", entity_id), doc_data["risk_tier"]
+            )
+            telemetry_service.invalidate(tenant_id, "entity_count")
             logger.info("Entity added", tenant_id=tenant_id, entity_id=entity_id)
             return entity_id
         except Exception as e:
@@ -234,6 +265,8 @@ class PersistenceService:
         """Remove an entity from the tenant's monitored set."""
         try:
             self._entities_col(tenant_id).document(entity_id).delete()
+            systemic_risk_service.forget_entity(tenant_id, entity_id)
+            telemetry_service.invalidate(tenant_id, "entity_count")
             logger.info("Entity removed", tenant_id=tenant_id, entity_id=entity_id)
         except Exception as e:
             logger.error("Failed to remove entity", tenant_id=tenant_id, entity_id=entity_id, error=str(e))
@@ -266,6 +299,10 @@ class PersistenceService:
                     "current_score": 0.0,
                     "risk_tier": entity.get("risk_tier", "UNSCORED"),
                 }, merge=True)
+                systemic_risk_service.record_entity(
+                    tenant_id, entity_id, entity.get("risk_tier", "UNSCORED")
+                )
+            telemetry_service.invalidate(tenant_id, "entity_count")
 
             logger.info(
                 "Portfolio created",
@@ -1,4 +1,8 @@
 import datetime
+import heapq
+import itertools
+import threading
+import time
 import structlog
 from google.cloud import firestore
 from src.core.config import settings
@@ -6,65 +10,258 @@ from src.services.slack_notifier import slack_notifier
 
 logger = structlog.get_logger()
 
+ALL_TENANTS = "*"          # Heap key for the cross-tenant (legacy global) pulse
+GLOBAL_TENANT = "global"   # Signals visible to every tenant (RSS news)
+PULSE_WINDOW = datetime.timedelta(hours=24)
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def _epoch(value) -> float:
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    return time.time()
+
+
+class TopSignals:
+    """
+    Bounded min-heap of the highest-conviction signals in a rolling window.
+
+    Holds up to `capacity` candidates ordered by (conviction_score,
+    ingested_at); pushing past capacity evicts the weakest. Expired
+    candidates are dropped lazily, so `capacity` should comfortably
+    exceed the K served from it.
+    """
+
+    def __init__(self, capacity: int, window: datetime.timedelta = PULSE_WINDOW):
+        self.capacity = capacity
+        self.window_s = window.total_seconds()
+        self._heap: list = []
+        self._ids: set = set()
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, signal_id: str, signal: dict) -> None:
+        if signal_id in self._ids:
+            return
+        ingested = _epoch(signal.get("ingested_at"))
+        entry = (int(signal.get("conviction_score") or 0), ingested, next(self._seq), signal_id, signal)
+        if len(self._heap) >= self.capacity:
+            self._prune(time.time())
+        if len(self._heap) < self.capacity:
+            heapq.heappush(self._heap, entry)
+            self._ids.add(signal_id)
+        elif entry[:2] > self._heap[0][:2]:
+            evicted = heapq.heapreplace(self._heap, entry)
+            self._ids.discard(evicted[3])
+            self._ids.add(signal_id)
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_s
+        live = [e for e in self._heap if e[1] >= cutoff]
+        if len(live) != len(self._heap):
+            heapq.heapify(live)
+            self._heap = live
+            self._ids = {e[3] for e in live}
+
+    def top(self, k: int, now: float = None) -> list[dict]:
+        """The k strongest unexpired signals, strongest (then newest) first."""
+        cutoff = (now or time.time()) - self.window_s
+        best = heapq.nlargest(k, (e for e in self._heap if e[1] >= cutoff), key=lambda e: e[:2])
+        return [{**e[4], "id": e[3]} for e in best]
+
+
 class PulseEngine:
     """
     Orchestrates the Morning Pulse generation by identifying high-conviction signals.
+
+    Signals are fed in as they are written (`record_signal`) to per-tenant
+    top-K heaps. Other instances, batch ingestion and the pipelines write
+    signals this process never sees, so right before each pulse is generated
+    the heaps are topped up from bounded queries (`warm`): one across all
+    tenants for the cross-tenant pulse, then one per tenant, so a tenant's
+    pulse never depends on its signals ranking in the global top. Pulses are stored per tenant
+    at tenants/{tenant_id}/morning_pulses/{date} (tenant signals merged
+    with global ones), plus the cross-tenant pulse at morning_pulses/{date}.
+    The latest pulse per tenant is served from an in-memory cache that is
+    refreshed on write and expires after PULSE_CACHE_TTL_S.
     """
     def __init__(self):
         self.db = firestore.Client(database=settings.FIRESTORE_DB_NAME)
         self.signals_col = "auctions"
         self.pulses_col = "morning_pulses"
+        self.top_k = settings.PULSE_TOP_K
+        self._lock = threading.Lock()
+        self._heaps: dict[str, TopSignals] = {}
+        self._latest: dict[str, tuple[float, dict]] = {}
+
+    # ── Signal intake ─────────────────────────────────────────────
+
+    def _heap(self, key: str) -> TopSignals:
+        heap = self._heaps.get(key)
+        if heap is None:
+            heap = self._heaps[key] = TopSignals(settings.PULSE_CANDIDATES)
+        return heap
+
+    def record_signal(self, signal_id: str, signal: dict) -> None:
+        """Offer a newly written signal to its tenant's and the global top-K."""
+        tenant_id = signal.get("tenant_id") or GLOBAL_TENANT
+        with self._lock:
+            self._heap(tenant_id).push(signal_id, signal)
+            self._heap(ALL_TENANTS).push(signal_id, signal)
+
+    def warm(self, tenant_id: str = ALL_TENANTS) -> int:
+        """
+        Top up the heaps with the strongest signals of the last 24 hours:
+        the PULSE_CANDIDATES strongest across all tenants, or a single
+        tenant's top-K when `tenant_id` is given. Run at startup and before
+        every pulse; signals already held are skipped. Returns the number
+        of signals read.
+        """
+        cutoff_date = datetime.datetime.now(datetime.timezone.utc) - PULSE_WINDOW
+        query = self.db.collection(self.signals_col)
+        limit = settings.PULSE_CANDIDATES
+        if tenant_id != ALL_TENANTS:
+            query = query.where("tenant_id", "==", tenant_id)
+            limit = self.top_k
+        query = query\
+            .where("ingested_at", ">=", cutoff_date)\
+            .order_by("conviction_score", direction=firestore.Query.DESCENDING)\
+            .order_by("ingested_at", direction=firestore.Query.DESCENDING)\
+            .limit(limit)
+
+        loaded = 0
+        for doc in query.stream():
+            self.record_signal(doc.id, doc.to_dict())
+            loaded += 1
+        logger.info("Pulse heaps warmed", tenant_id=tenant_id, signals=loaded)
+        return loaded
+
+    def _tenant_ids(self) -> list[str]:
+        """Every known tenant: registered ones plus any seen in the heaps."""
+        tenants = {ref.id for ref in self.db.collection("tenants").list_documents()}
+        with self._lock:
+            tenants.update(self._heaps)
+        tenants.difference_update((ALL_TENANTS, GLOBAL_TENANT))
+        return sorted(tenants)
+
+    def top_signals(self, tenant_id: str = ALL_TENANTS) -> list[dict]:
+        """Current top-K for a tenant (its own signals plus global ones)."""
+        now = time.time()
+        with self._lock:
+            if tenant_id == ALL_TENANTS:
+                return self._heap(ALL_TENANTS).top(self.top_k, now)
+            candidates = self._heap(tenant_id).top(self.top_k, now)
+            if tenant_id != GLOBAL_TENANT:
+                candidates += self._heap(GLOBAL_TENANT).top(self.top_k, now)
+        candidates.sort(
+            key=lambda s: (int(s.get("conviction_score") or 0), _epoch(s.get("ingested_at"))),
+            reverse=True,
+        )
+        return candidates[:self.top_k]
+
+    # ── Pulse generation ──────────────────────────────────────────
+
+    def _build_pulse(self, pulse_id: str, tenant_id: str, signals: list[dict]) -> dict:
+        return {
+            "date": pulse_id,
+            "tenant_id": tenant_id,
+            "generated_at": datetime.datetime.now(datetime.timezone.utc),
+            "signals": signals,
+            "status": "READY",
+            "summary": f"Morning Pulse for {pulse_id} identifies {len(signals)} high-conviction targets."
+        }
 
     async def generate_morning_pulse(self):
         """
         Compiles the top 5 signals by conviction score and recency.
-        Saves the pulse document for the day.
+        Saves the pulse document for the day, globally and per tenant.
         """
         try:
             logger.info("Generating Morning Pulse...")
-            
-            # 1. Fetch top 5 signals from the last 24 hours
-            cutoff_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=24)
-            
-            query = self.db.collection(self.signals_col)\
-                .where("ingested_at", ">=", cutoff_date)\
-                .order_by("conviction_score", direction=firestore.Query.DESCENDING)\
-                .order_by("ingested_at", direction=firestore.Query.DESCENDING)\
-                .limit(5)
-            
-            docs = query.stream()
-            top_signals = []
-            for doc in docs:
-                data = doc.to_dict()
-                data["id"] = doc.id
-                top_signals.append(data)
-            
+            # Pick up signals written outside this process since the last pulse
+            self.warm()
+            self.warm(GLOBAL_TENANT)
+
+            # 1. Read the top signals from the heaps
+            top_signals = self.top_signals(ALL_TENANTS)
             if not top_signals:
                 logger.info("No new high-conviction signals found for the Morning Pulse.")
                 return None
 
-            # 2. Create the Pulse Document
+            # 2. Create the Pulse Documents (global + one per tenant)
             pulse_id = datetime.datetime.now().strftime("%Y-%m-%d")
-            pulse_data = {
-                "date": pulse_id,
-                "generated_at": datetime.datetime.now(datetime.timezone.utc),
-                "signals": top_signals,
-                "status": "READY",
-                "summary": f"Morning Pulse for {pulse_id} identifies {len(top_signals)} high-conviction targets."
-            }
-            
-            self.db.collection(self.pulses_col).document(pulse_id).set(pulse_data)
-            
+            pulses = {ALL_TENANTS: self._build_pulse(pulse_id, GLOBAL_TENANT, top_signals)}
+            for tenant_id in self._tenant_ids():
+                self.warm(tenant_id)
+                signals = self.top_signals(tenant_id)
+                if signals:
+                    pulses[tenant_id] = self._build_pulse(pulse_id, tenant_id, signals)
+
+            writes = list(pulses.items())
+            for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+                batch = self.db.batch()
+                for tenant_id, pulse in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                    batch.set(self._pulses_ref(tenant_id).document(pulse_id), pulse)
+                batch.commit()
+
+            # Write-through: dashboards read the new pulses without a query.
+            # Replacing the map also drops stale entries for tenants without
+            # a pulse today, so they fall back to the new global pulse.
+            expires = time.monotonic() + settings.PULSE_CACHE_TTL_S
+            with self._lock:
+                self._latest = {tenant_id: (expires, pulse) for tenant_id, pulse in pulses.items()}
+
             # 3. Trigger Slack Alert (Push Intelligence)
-            await slack_notifier.send_pulse_alert(pulse_data)
-            
-            logger.info("Morning Pulse generated and alert sent", pulse_id=pulse_id, count=len(top_signals))
+            await slack_notifier.send_pulse_alert(pulses[ALL_TENANTS])
+
+            logger.info(
+                "Morning Pulse generated and alert sent",
+                pulse_id=pulse_id, count=len(top_signals), tenants=len(pulses) - 1,
+            )
             return pulse_id
 
         except Exception as e:
             logger.error("Failed to generate Morning Pulse", error=str(e))
             raise e
 
+    # ── Pulse reads ───────────────────────────────────────────────
+
+    def _pulses_ref(self, tenant_id: str):
+        if tenant_id == ALL_TENANTS:
+            return self.db.collection(self.pulses_col)
+        return self.db.collection("tenants").document(tenant_id).collection(self.pulses_col)
+
+    def _read_latest(self, tenant_id: str):
+        pulses = self._pulses_ref(tenant_id)\
+            .order_by("generated_at", direction=firestore.Query.DESCENDING)\
+            .limit(1)\
+            .stream()
+        for p in pulses:
+            return p.to_dict()
+        return None
+
+    def get_latest_pulse(self, tenant_id: str = ALL_TENANTS):
+        """
+        Latest pulse for a tenant, falling back to the global pulse.
+        Served from cache; Firestore is read at most once per TTL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._latest.get(tenant_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        pulse = self._read_latest(tenant_id)
+        if pulse is None and tenant_id != ALL_TENANTS:
+            pulse = self.get_latest_pulse(ALL_TENANTS)
+        with self._lock:
+            self._latest[tenant_id] = (now + settings.PULSE_CACHE_TTL_S, pulse)
+        return pulse
+
 try:
     pulse_engine = PulseEngine()
 except Exception as e:
@@ -73,4 +270,4 @@ except Exception as e:
     # Better to leave it distinct or raise logged error?
     # If we silence it, the route using it will crash.
     # But checking if app starts is priority.
-    pulse_engine = None 
+    pulse_engine = None
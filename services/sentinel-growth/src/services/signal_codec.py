@@ -0,0 +1,142 @@
+"""
+IC Origin — Signal Event Codec
+
+Builds and encodes the signal event payload published to Pub/Sub.
+
+Two wire encodings are supported, selected by settings.PUBSUB_ENCODING
+and advertised to consumers via the `encoding` message attribute:
+
+    json  — UTF-8 JSON object (default, human readable)
+    avro  — Avro binary datum for SIGNAL_EVENT_AVRO_SCHEMA. Roughly a
+            third of the JSON size; compatible with a Pub/Sub topic
+            schema of the same definition.
+
+The Avro codec is hand-rolled for this fixed, flat schema (strings and
+one long) so neither side pulls in an Avro dependency. ic-origin-dataflow
+vendors an identical copy (its own signal_codec.py) to decode events and
+build benchmark input, because Dataflow staging and Windows checkouts
+can't follow a symlink; its tests fail if the copies drift. Keep it
+standard-library only.
+"""
+
+import datetime
+import json
+import uuid
+
+# Field order mirrors ic_origin.fact_signals (FACT_SIGNALS_SCHEMA) plus tenant_id.
+SIGNAL_EVENT_AVRO_SCHEMA = {
+    "type": "record",
+    "name": "SignalEvent",
+    "namespace": "ai.icorigin.signals",
+    "fields": [
+        {"name": "signal_id", "type": "string"},
+        {"name": "company_number", "type": "string"},
+        {"name": "company_name", "type": "string"},
+        {"name": "portfolio_id", "type": "string"},
+        {"name": "risk_tier", "type": "string"},
+        {"name": "conviction_score", "type": "long"},
+        {"name": "signal_type", "type": "string"},
+        {"name": "source_family", "type": "string"},
+        {"name": "region", "type": "string"},
+        {"name": "ingested_at", "type": "string"},
+        {"name": "event_date", "type": "string"},
+        {"name": "tenant_id", "type": "string", "default": ""},
+    ],
+}
+
+SUPPORTED_ENCODINGS = ("json", "avro")
+
+
+def build_signal_payload(signal_data: dict) -> dict:
+    """Normalise a signal dict into the fact_signals event payload with defaults."""
+    try:
+        conviction = int(signal_data.get("conviction_score", 0))
+    except (TypeError, ValueError):
+        conviction = 0
+
+    return {
+        "signal_id": signal_data.get("signal_id", str(uuid.uuid4())),
+        "company_number": signal_data.get("company_number", ""),
+        "company_name": signal_data.get("company_name", ""),
+        "portfolio_id": signal_data.get("portfolio_id", ""),
+        "risk_tier": signal_data.get("risk_tier", "UNSCORED"),
+        "conviction_score": conviction,
+        "signal_type": signal_data.get("signal_type", "UNKNOWN"),
+        "source_family": signal_data.get("source_family", "GOV_REGISTRY"),
+        "region": signal_data.get("region", ""),
+        "tenant_id": signal_data.get("tenant_id", ""),
+        "ingested_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "event_date": signal_data.get(
+            "event_date",
+            datetime.date.today().isoformat(),
+        ),
+    }
+
+
+def _avro_long(value: int) -> bytes:
+    """Zig-zag varint encoding of a 64-bit signed integer."""
+    value = (value << 1) ^ (value >> 63)
+    out = bytearray()
+    while value & ~0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _avro_string(value: str) -> bytes:
+    data = (value or "").encode("utf-8")
+    return _avro_long(len(data)) + data
+
+
+def encode_signal_avro(payload: dict) -> bytes:
+    """Encode a payload as an Avro binary datum of SIGNAL_EVENT_AVRO_SCHEMA."""
+    parts = []
+    for field in SIGNAL_EVENT_AVRO_SCHEMA["fields"]:
+        value = payload.get(field["name"])
+        if field["type"] == "long":
+            parts.append(_avro_long(int(value or 0)))
+        else:
+            parts.append(_avro_string(str(value) if value is not None else ""))
+    return b"".join(parts)
+
+
+def _read_avro_long(data: bytes, pos: int) -> tuple[int, int]:
+    shift = 0
+    result = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated long")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), pos
+
+
+def decode_signal_avro(data: bytes) -> dict:
+    """
+    Decode an Avro binary datum of SIGNAL_EVENT_AVRO_SCHEMA.
+    Raises ValueError (or UnicodeDecodeError) for truncated or malformed datums.
+    """
+    payload = {}
+    pos = 0
+    for field in SIGNAL_EVENT_AVRO_SCHEMA["fields"]:
+        value, pos = _read_avro_long(data, pos)
+        if field["type"] == "string":
+            if value < 0 or pos + value > len(data):
+                raise ValueError("truncated string")
+            raw = data[pos:pos + value]
+            pos += value
+            value = raw.decode("utf-8")
+        payload[field["name"]] = value
+    return payload
+
+
+def encode_signal(payload: dict, encoding: str = "json") -> bytes:
+    """Encode a payload for Pub/Sub in the requested wire encoding."""
+    if encoding == "avro":
+        return encode_signal_avro(payload)
+    return json.dumps(payload).encode("utf-8")
@@ -1,4 +1,5 @@
 import datetime
+import io
 import structlog
 from google.cloud import storage
 from src.core.config import settings
@@ -21,17 +22,24 @@ class StorageService:
         Uploads a file to GCS and returns a V4 signed URL valid for 15 minutes.
         Uses IAM signBlob API to work with Cloud Run's workload identity.
         """
+        return self.upload_stream_and_sign(io.BytesIO(file_bytes), filename, content_type)
+
+    def upload_stream_and_sign(self, file_obj, filename: str, content_type: str) -> str:
+        """
+        Streams a file-like object to GCS as a chunked resumable upload
+        (GCS_UPLOAD_CHUNK_MB per request) and returns a V4 signed URL.
+        """
         if not self.client:
             raise RuntimeError("StorageService is not initialized properly")
 
         try:
             bucket = self.client.bucket(self.bucket_name)
-            blob = bucket.blob(filename)
-            
+            blob = bucket.blob(filename, chunk_size=settings.GCS_UPLOAD_CHUNK_MB * 1024 * 1024)
+
             # Upload file
             logger.info("Uploading file", filename=filename, content_type=content_type)
-            blob.upload_from_string(file_bytes, content_type=content_type)
-            
+            blob.upload_from_file(file_obj, content_type=content_type, rewind=True)
+
             # Generate Signed URL manually using IAM signBlob
             import google.auth
             from google.auth.transport import requests as auth_requests
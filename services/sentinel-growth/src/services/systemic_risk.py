@@ -7,14 +7,30 @@ and exists in ≥2 different tenant portfolios, it represents a
 systemic risk that no single tenant can see.
 
 Uses the admin SDK to query across tenant boundaries (server-side only).
+
+Batch mode keeps an in-memory inverted index of company_number →
+{tenant_id: risk_tier}, built in a single collection-group pass and
+maintained incrementally as entities are added or removed, so a whole
+book can be checked without one Firestore query per company. The index
+is per instance and can lag writes made elsewhere, so single-entity
+lookups always query Firestore live.
 """
 
+import datetime
+import threading
+import time
+
 import structlog
 from google.cloud import firestore
 from src.core.config import settings
 
 logger = structlog.get_logger()
 
+# Index older than this is rebuilt before batch evaluation
+EXPOSURE_INDEX_MAX_AGE_SECONDS = 3600
+SYSTEMIC_EXPOSURE_COLLECTION = "systemic_exposure"
+FIRESTORE_BATCH_LIMIT = 500
+
 
 class SystemicRiskService:
     """
@@ -29,6 +45,11 @@ class SystemicRiskService:
     """
 
     def __init__(self):
+        # company_number -> {tenant_id: risk_tier}
+        self._exposure_index: dict[str, dict[str, str]] = {}
+        self._index_built_at: float | None = None
+        self._index_lock = threading.Lock()
+
         try:
             self.db = firestore.Client(database=settings.FIRESTORE_DB_NAME)
             logger.info("SystemicRiskService initialised")
@@ -38,10 +59,175 @@ class SystemicRiskService:
                 "SystemicRiskService: Firestore unavailable", error=str(e)
             )
 
+    # ── Exposure index (batch mode) ────────────────────────────────
+
+    @property
+    def index_ready(self) -> bool:
+        """True when the exposure index is built and younger than the max age."""
+        return (
+            self._index_built_at is not None
+            and time.monotonic() - self._index_built_at < EXPOSURE_INDEX_MAX_AGE_SECONDS
+        )
+
+    def build_exposure_index(self) -> int:
+        """
+        Rebuild the company_number → tenant exposure index in one
+        collection-group pass over every tenant's monitored_entities.
+
+        Returns the number of distinct companies indexed (0 on failure,
+        leaving any previous index in place).
+        """
+        if not self.db:
+            return 0
+
+        try:
+            docs = (
+                self.db.collection_group("monitored_entities")
+                .select(["company_number", "risk_tier"])
+                .stream()
+            )
+            index: dict[str, dict[str, str]] = {}
+            for doc in docs:
+                tenant_id = self._tenant_from_path(doc.reference.path)
+                if not tenant_id:
+                    continue
+                data = doc.to_dict() or {}
+                ch_number = data.get("company_number") or doc.id
+                index.setdefault(ch_number, {})[tenant_id] = data.get(
+                    "risk_tier", "UNSCORED"
+                )
+        except Exception as e:
+            logger.error("SystemicRisk: exposure index build failed", error=str(e))
+            return 0
+
+        with self._index_lock:
+            self._exposure_index = index
+            self._index_built_at = time.monotonic()
+
+        logger.info("SystemicRisk: exposure index built", companies=len(index))
+        return len(index)
+
+    def record_entity(self, tenant_id: str, ch_number: str, risk_tier: str = "UNSCORED") -> None:
+        """Incrementally add or update one tenant's holding of a company."""
+        if not ch_number:
+            return
+        with self._index_lock:
+            self._exposure_index.setdefault(ch_number, {})[tenant_id] = risk_tier
+
+    def forget_entity(self, tenant_id: str, ch_number: str) -> None:
+        """Incrementally drop one tenant's holding of a company."""
+        with self._index_lock:
+            tenants = self._exposure_index.get(ch_number)
+            if tenants is None:
+                return
+            tenants.pop(tenant_id, None)
+            if not tenants:
+                del self._exposure_index[ch_number]
+
+    def compute_systemic_exposures(self) -> list[dict]:
+        """
+        Evaluate every ELEVATED_RISK company in the index in one pass.
+
+        Returns one result dict (same shape as evaluate_systemic_exposure)
+        per company held at ELEVATED_RISK by at least one tenant.
+        """
+        if not self.index_ready:
+            self.build_exposure_index()
+
+        with self._index_lock:
+            snapshot = [
+                (ch_number, dict(tenants))
+                for ch_number, tenants in self._exposure_index.items()
+                if "ELEVATED_RISK" in tenants.values()
+            ]
+        return [self._result_from_tenants(ch, tenants) for ch, tenants in snapshot]
+
+    def publish_systemic_exposure_table(self) -> int:
+        """
+        Nightly job: rebuild the index and publish the full systemic
+        exposure table to the admin-only `systemic_exposure` collection.
+        Once every row is written, rows left over from earlier snapshots
+        (companies no longer ELEVATED_RISK or no longer held) are deleted.
+
+        Returns the number of rows written.
+        """
+        if not self.db:
+            return 0
+
+        self.build_exposure_index()
+        results = self.compute_systemic_exposures()
+        snapshot_date = datetime.date.today().isoformat()
+        published_at = datetime.datetime.now(datetime.timezone.utc)
+
+        written = 0
+        try:
+            collection = self.db.collection(SYSTEMIC_EXPOSURE_COLLECTION)
+            batch = self.db.batch()
+            pending = 0
+            for result in results:
+                batch.set(
+                    collection.document(result["ch_number"]),
+                    {
+                        **result,
+                        "snapshot_date": snapshot_date,
+                        "published_at": published_at,
+                    },
+                )
+                pending += 1
+                if pending >= FIRESTORE_BATCH_LIMIT:
+                    batch.commit()
+                    written += pending
+                    batch = self.db.batch()
+                    pending = 0
+            if pending:
+                batch.commit()
+                written += pending
+        except Exception as e:
+            logger.error(
+                "SystemicRisk: failed to publish exposure table",
+                written=written,
+                error=str(e),
+            )
+            return written
+
+        try:
+            deleted = self._delete_stale_rows(collection, snapshot_date)
+        except Exception as e:
+            deleted = 0
+            logger.error("SystemicRisk: failed to delete stale exposure rows", error=str(e))
+
+        logger.info(
+            "SystemicRisk: exposure table published",
+            rows=written,
+            deleted=deleted,
+            systemic=sum(1 for r in results if r["is_systemic"]),
+        )
+        return written
+
+    def _delete_stale_rows(self, collection, snapshot_date: str) -> int:
+        """Delete rows whose snapshot_date predates the current run."""
+        stale = collection.where("snapshot_date", "<", snapshot_date).stream()
+        deleted = 0
+        batch = self.db.batch()
+        pending = 0
+        for doc in stale:
+            batch.delete(doc.reference)
+            pending += 1
+            if pending >= FIRESTORE_BATCH_LIMIT:
+                batch.commit()
+                deleted += pending
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+            deleted += pending
+        return deleted
+
     def evaluate_systemic_exposure(self, ch_number: str) -> dict:
         """
         Check if a company (by CH number) exists across ≥2 tenant portfolios
-        and is in a degraded state.
+        and is in a degraded state. Always answered by a live
+        collection-group query, never from the per-instance index.
 
         Returns:
             {
@@ -81,24 +267,28 @@ class SystemicRiskService:
         if not docs:
             return self._empty_result(ch_number)
 
-        tenant_ids = set()
-        risk_tier = None
-
+        tenants: dict[str, str] = {}
         for doc in docs:
             data = doc.to_dict()
             # Extract tenant_id from document path: tenants/{tenant_id}/monitored_entities/{id}
-            path_parts = doc.reference.path.split("/")
-            if len(path_parts) >= 2 and path_parts[0] == "tenants":
-                tenant_ids.add(path_parts[1])
+            tenant_id = self._tenant_from_path(doc.reference.path)
+            if tenant_id:
+                tenants[tenant_id] = data.get("risk_tier", "UNSCORED")
 
-            # Use the most severe risk_tier found
-            doc_tier = data.get("risk_tier", "UNSCORED")
-            if doc_tier == "ELEVATED_RISK":
+        return self._result_from_tenants(ch_number, tenants)
+
+    def _result_from_tenants(self, ch_number: str, tenants: dict[str, str]) -> dict:
+        """Build the systemic-exposure result from a tenant → risk_tier map."""
+        # Use the most severe risk_tier found
+        risk_tier = None
+        for tier in tenants.values():
+            if tier == "ELEVATED_RISK":
                 risk_tier = "ELEVATED_RISK"
-            elif risk_tier is None:
-                risk_tier = doc_tier
+                break
+            if risk_tier is None:
+                risk_tier = tier
 
-        tenant_list = sorted(tenant_ids)
+        tenant_list = sorted(tenants)
         is_systemic = len(tenant_list) >= 2 and risk_tier == "ELEVATED_RISK"
 
         result = {
@@ -118,6 +308,13 @@ class SystemicRiskService:
 
         return result
 
+    @staticmethod
+    def _tenant_from_path(path: str) -> str | None:
+        path_parts = path.split("/")
+        if len(path_parts) >= 2 and path_parts[0] == "tenants":
+            return path_parts[1]
+        return None
+
     def _empty_result(self, ch_number: str) -> dict:
         return {
             "ch_number": ch_number,
@@ -1,27 +1,62 @@
 """
 IC Origin — Tenant-Aware Telemetry Service
 
-Tracks per-tenant usage metrics using atomic Firestore increments.
-Stores counters under: tenants/{tenant_id}/telemetry/current_month
+Tracks per-tenant usage metrics with buffered, sharded Firestore counters.
+
+`track_*` calls only bump in-process counters. `flush()` (scheduled every
+TELEMETRY_FLUSH_INTERVAL_S and run at shutdown) writes the accumulated
+deltas as `Increment(n)` to one of TELEMETRY_COUNTER_SHARDS shard
+documents per tenant-month, so no single document takes more than a
+fraction of the write rate:
+
+    tenants/{tenant_id}/telemetry/{YYYY-MM}/shards/{n}
+
+Reads sum the shards (plus any legacy totals on the month document and
+this process's unflushed deltas) and, like entity counts (a server-side
+count() aggregation), are cached per tenant for TELEMETRY_CACHE_TTL_S. The same counters are exposed in
+Prometheus / OpenMetrics text format via `render_metrics()`.
 """
 
 import datetime
+import random
+import threading
+import time
+from collections import defaultdict
+
 import structlog
 from google.cloud import firestore
 from src.core.config import settings
 
 logger = structlog.get_logger()
 
+COUNTER_FIELDS = ("sweeps_executed", "alerts_sent", "reports_generated")
+FIRESTORE_BATCH_LIMIT = 500
+
+_METRIC_HELP = {
+    "sweeps_executed": "Market sweeps executed per tenant.",
+    "alerts_sent": "Alerts dispatched per tenant.",
+    "reports_generated": "Reports generated per tenant.",
+}
+
 
 class TelemetryService:
     """
-    Tracks tenant-scoped usage telemetry with atomic Firestore increments.
+    Tracks tenant-scoped usage telemetry with buffered, sharded counters.
 
     Counters are stored per calendar month to support billing and audit.
-    Path: tenants/{tenant_id}/telemetry/{YYYY-MM}
+    Path: tenants/{tenant_id}/telemetry/{YYYY-MM}/shards/{n}
     """
 
     def __init__(self):
+        self.num_shards = max(1, settings.TELEMETRY_COUNTER_SHARDS)
+        self._lock = threading.Lock()
+        # (tenant_id, month) -> {metric: delta}, plus "last_sweep_at"
+        self._pending: dict = defaultdict(dict)
+        # (tenant_id, metric) -> cumulative count since process start
+        self._totals: dict = defaultdict(int)
+        self.flush_failures = 0
+        # (kind, tenant_id) -> (expires_at_monotonic, value)
+        self._cache: dict = {}
         try:
             self.db = firestore.Client(database=settings.FIRESTORE_DB_NAME)
             logger.info("TelemetryService initialised")
@@ -33,71 +68,123 @@ class TelemetryService:
         """Returns the current month key, e.g. '2026-02'."""
         return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m")
 
-    def _telemetry_ref(self, tenant_id: str):
+    def _telemetry_ref(self, tenant_id: str, month: str = None):
         """
-        Reference to the tenant's current-month telemetry document.
+        Reference to the tenant's telemetry document for a month.
         Path: tenants/{tenant_id}/telemetry/{YYYY-MM}
         """
         return (
             self.db.collection("tenants")
             .document(tenant_id)
             .collection("telemetry")
-            .document(self._current_month_key())
+            .document(month or self._current_month_key())
         )
 
-    # ── Atomic Increment Methods ───────────────────────────────────
+    # ── Buffered Increment Methods ─────────────────────────────────
+
+    def _increment(self, tenant_id: str, metric: str, amount: int = 1, **extra) -> None:
+        key = (tenant_id, self._current_month_key())
+        with self._lock:
+            pending = self._pending[key]
+            pending[metric] = pending.get(metric, 0) + amount
+            pending.update(extra)
+            self._totals[(tenant_id, metric)] += amount
 
     def track_sweep_executed(self, tenant_id: str) -> None:
-        """Atomically increment the sweep counter for this tenant."""
-        if not self.db:
-            return
-        try:
-            self._telemetry_ref(tenant_id).set(
-                {
-                    "sweeps_executed": firestore.Increment(1),
-                    "last_sweep_at": datetime.datetime.now(datetime.timezone.utc),
-                    "updated_at": datetime.datetime.now(datetime.timezone.utc),
-                },
-                merge=True,
-            )
-            logger.debug("Telemetry: sweep tracked", tenant_id=tenant_id)
-        except Exception as e:
-            logger.error("Telemetry: failed to track sweep", error=str(e))
+        """Buffer a sweep increment for this tenant."""
+        self._increment(
+            tenant_id, "sweeps_executed",
+            last_sweep_at=datetime.datetime.now(datetime.timezone.utc),
+        )
 
     def track_alert_sent(self, tenant_id: str) -> None:
-        """Atomically increment the alert counter for this tenant."""
-        if not self.db:
-            return
-        try:
-            self._telemetry_ref(tenant_id).set(
-                {
-                    "alerts_sent": firestore.Increment(1),
-                    "updated_at": datetime.datetime.now(datetime.timezone.utc),
-                },
-                merge=True,
-            )
-            logger.debug("Telemetry: alert tracked", tenant_id=tenant_id)
-        except Exception as e:
-            logger.error("Telemetry: failed to track alert", error=str(e))
+        """Buffer an alert increment for this tenant."""
+        self._increment(tenant_id, "alerts_sent")
 
     def track_report_generated(self, tenant_id: str) -> None:
-        """Atomically increment the report counter for this tenant."""
-        if not self.db:
-            return
-        try:
-            self._telemetry_ref(tenant_id).set(
-                {
-                    "reports_generated": firestore.Increment(1),
-                    "updated_at": datetime.datetime.now(datetime.timezone.utc),
-                },
-                merge=True,
+        """Buffer a report increment for this tenant."""
+        self._increment(tenant_id, "reports_generated")
+
+    def flush(self) -> int:
+        """
+        Write buffered deltas to random counter shards in batched commits.
+        Returns the number of shard documents written. Deltas from a failed
+        commit are merged back into the buffer for the next flush.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(dict)
+        if not pending or not self.db:
+            return 0
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        items = list(pending.items())
+        written = 0
+        for start in range(0, len(items), FIRESTORE_BATCH_LIMIT):
+            chunk = items[start:start + FIRESTORE_BATCH_LIMIT]
+            try:
+                batch = self.db.batch()
+                for (tenant_id, month), deltas in chunk:
+                    shard_ref = (
+                        self._telemetry_ref(tenant_id, month)
+                        .collection("shards")
+                        .document(str(random.randrange(self.num_shards)))
+                    )
+                    data = {
+                        field: (firestore.Increment(value) if field in COUNTER_FIELDS else value)
+                        for field, value in deltas.items()
+                    }
+                    data["updated_at"] = now
+                    batch.set(shard_ref, data, merge=True)
+                batch.commit()
+                written += len(chunk)
+                for tenant_id, _ in {key for key, _ in chunk}:
+                    self.invalidate(tenant_id, "usage")
+            except Exception as e:
+                self.flush_failures += 1
+                logger.error("Telemetry: flush failed", error=str(e), tenants=len(chunk))
+                self._requeue(chunk)
+        logger.debug("Telemetry: flushed counters", shards_written=written)
+        return written
+
+    def _requeue(self, chunk) -> None:
+        with self._lock:
+            for key, deltas in chunk:
+                pending = self._pending[key]
+                for field, value in deltas.items():
+                    if field in COUNTER_FIELDS:
+                        pending[field] = pending.get(field, 0) + value
+                    else:
+                        pending.setdefault(field, value)
+
+    def pending_count(self) -> int:
+        """Total unflushed increments across tenants."""
+        with self._lock:
+            return sum(
+                v for deltas in self._pending.values()
+                for k, v in deltas.items() if k in COUNTER_FIELDS
             )
-            logger.debug("Telemetry: report tracked", tenant_id=tenant_id)
-        except Exception as e:
-            logger.error("Telemetry: failed to track report", error=str(e))
 
     # ── Read Methods ───────────────────────────────────────────────
 
+    def _cached(self, kind: str, tenant_id: str, loader):
+        """
+        Per-tenant TTL cache in front of Firestore reads so dashboard polls
+        cost at most one read pass per TELEMETRY_CACHE_TTL_S.
+        """
+        key = (kind, tenant_id)
+        now = time.monotonic()
+        hit = self._cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        value = loader()
+        self._cache[key] = (now + settings.TELEMETRY_CACHE_TTL_S, value)
+        return value
+
+    def invalidate(self, tenant_id: str, kind: str = None) -> None:
+        """Drop cached reads for a tenant (all kinds unless `kind` is given)."""
+        for cache_kind in ([kind] if kind else ["usage", "entity_count"]):
+            self._cache.pop((cache_kind, tenant_id), None)
+
     def get_usage_stats(self, tenant_id: str) -> dict:
         """
         Read the current month's usage stats for a tenant.
@@ -106,43 +193,108 @@ class TelemetryService:
         if not self.db:
             return self._empty_stats()
 
+        month = self._current_month_key()
         try:
-            doc = self._telemetry_ref(tenant_id).get()
-            if doc.exists:
-                data = doc.to_dict()
-                return {
-                    "sweeps_executed": data.get("sweeps_executed", 0),
-                    "alerts_sent": data.get("alerts_sent", 0),
-                    "reports_generated": data.get("reports_generated", 0),
-                    "last_sweep_at": (
-                        data["last_sweep_at"].isoformat()
-                        if data.get("last_sweep_at")
-                        else None
-                    ),
-                    "month": self._current_month_key(),
-                }
-            return self._empty_stats()
+            sources = list(self._cached(
+                "usage", tenant_id, lambda: self._read_counter_docs(tenant_id, month)
+            ))
+            with self._lock:
+                sources.append(dict(self._pending.get((tenant_id, month), {})))
+
+            if not any(sources):
+                return self._empty_stats()
+
+            stats = self._empty_stats()
+            last_sweep_at = None
+            for data in sources:
+                for field in COUNTER_FIELDS:
+                    stats[field] += data.get(field, 0) or 0
+                candidate = data.get("last_sweep_at")
+                if candidate and (last_sweep_at is None or candidate > last_sweep_at):
+                    last_sweep_at = candidate
+            stats["last_sweep_at"] = last_sweep_at.isoformat() if last_sweep_at else None
+            return stats
         except Exception as e:
             logger.error("Telemetry: failed to read stats", error=str(e))
             return self._empty_stats()
 
+    def _read_counter_docs(self, tenant_id: str, month: str) -> list[dict]:
+        ref = self._telemetry_ref(tenant_id, month)
+        # Legacy un-sharded totals live on the month document itself
+        doc = ref.get()
+        sources = [doc.to_dict()] if doc.exists else []
+        sources += [shard.to_dict() for shard in ref.collection("shards").stream()]
+        return sources
+
     def get_entity_count(self, tenant_id: str) -> int:
-        """Count monitored entities for this tenant."""
+        """Count monitored entities for this tenant (server-side count())."""
         if not self.db:
             return 0
         try:
-            col = (
-                self.db.collection("tenants")
-                .document(tenant_id)
-                .collection("monitored_entities")
+            return self._cached(
+                "entity_count", tenant_id, lambda: self._count_entities(tenant_id)
             )
-            # Use aggregation query if available, else count docs
-            docs = col.select([]).stream()
-            return sum(1 for _ in docs)
         except Exception as e:
             logger.error("Telemetry: failed to count entities", error=str(e))
             return 0
 
+    def _count_entities(self, tenant_id: str) -> int:
+        col = (
+            self.db.collection("tenants")
+            .document(tenant_id)
+            .collection("monitored_entities")
+        )
+        # Aggregation query: billed as one read per 1,000 index entries
+        # and no documents are transferred.
+        result = col.count(alias="entities").get()
+        return int(result[0][0].value)
+
+    # ── Prometheus / OpenMetrics exposition ────────────────────────
+
+    def render_metrics(
+        self, openmetrics: bool = False, extra_gauges: dict = None, extra_counters: dict = None
+    ) -> str:
+        """
+        Render per-tenant counters (cumulative since process start) in
+        Prometheus text format, or OpenMetrics when `openmetrics=True`.
+        `extra_gauges` and `extra_counters` map metric name -> (help, value);
+        counter names are given without the `_total` suffix.
+        """
+        with self._lock:
+            totals = dict(self._totals)
+        lines = []
+        for metric in COUNTER_FIELDS:
+            samples = [
+                (f'{{tenant_id="{_escape_label(tenant_id)}"}}', value)
+                for (tenant_id, m), value in sorted(totals.items())
+                if m == metric
+            ]
+            _render_counter(lines, f"sentinel_{metric}", _METRIC_HELP[metric], samples, openmetrics)
+
+        counters = {
+            "sentinel_telemetry_flush_failures": (
+                "Telemetry flushes that failed and were re-queued.", self.flush_failures
+            ),
+            **(extra_counters or {}),
+        }
+        for name, (help_text, value) in counters.items():
+            _render_counter(lines, name, help_text, [("", value)], openmetrics)
+
+        gauges = {
+            "sentinel_telemetry_pending_increments": (
+                "Increments buffered but not yet flushed.", self.pending_count()
+            ),
+            **(extra_gauges or {}),
+        }
+        for name, (help_text, value) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
     def _empty_stats(self) -> dict:
         return {
             "sweeps_executed": 0,
@@ -153,4 +305,17 @@ class TelemetryService:
         }
 
 
+def _render_counter(lines: list, name: str, help_text: str, samples: list, openmetrics: bool) -> None:
+    """Append one counter family; OpenMetrics names the family without `_total`."""
+    family = name if openmetrics else f"{name}_total"
+    lines.append(f"# HELP {family} {help_text}")
+    lines.append(f"# TYPE {family} counter")
+    for labels, value in samples:
+        lines.append(f"{name}_total{labels} {value}")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
 telemetry_service = TelemetryService()
@@ -1,11 +1,14 @@
+import os
 import sys
 from unittest.mock import MagicMock, patch
 
 # Global mock for weasyprint to prevent GTK errors on Windows
 sys.modules["weasyprint"] = MagicMock()
 
+# Mocked renders can't be pickled back from worker processes; render in threads
+os.environ.setdefault("PDF_RENDER_WORKERS", "-2")
+
 import pytest
-import os
 
 # Ensure src is in python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
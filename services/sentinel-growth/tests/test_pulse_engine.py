@@ -0,0 +1,176 @@
+import asyncio
+import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.services.pulse_engine import ALL_TENANTS, PulseEngine, TopSignals
+
+
+def _signal(score, tenant="tenant-a", hours_ago=1):
+    return {
+        "headline": f"Signal {score}",
+        "conviction_score": score,
+        "tenant_id": tenant,
+        "ingested_at": datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours_ago),
+    }
+
+
+class TestTopSignals:
+    def test_keeps_highest_conviction(self):
+        heap = TopSignals(capacity=3)
+        for i, score in enumerate([50, 90, 70, 80, 60]):
+            heap.push(f"s{i}", _signal(score))
+
+        assert [s["conviction_score"] for s in heap.top(3)] == [90, 80, 70]
+        assert len(heap) == 3
+
+    def test_expired_signals_excluded_and_pruned(self):
+        heap = TopSignals(capacity=2)
+        heap.push("old", _signal(99, hours_ago=30))
+        heap.push("new", _signal(60))
+
+        assert [s["id"] for s in heap.top(5)] == ["new"]
+
+        # At capacity, expired candidates are pruned before evicting live ones
+        heap.push("newer", _signal(50))
+        assert {s["id"] for s in heap.top(5)} == {"new", "newer"}
+
+    def test_duplicate_ids_ignored(self):
+        heap = TopSignals(capacity=5)
+        heap.push("s1", _signal(80))
+        heap.push("s1", _signal(80))
+        assert len(heap) == 1
+
+
+class TestPulseEngine:
+    @pytest.fixture
+    def engine(self, mock_firestore):
+        mock_firestore.return_value = MagicMock()
+        return PulseEngine()
+
+    def test_tenant_top_merges_global_signals(self, engine):
+        engine.record_signal("a1", _signal(70, "tenant-a"))
+        engine.record_signal("b1", _signal(95, "tenant-b"))
+        engine.record_signal("g1", _signal(85, "global"))
+
+        ids = [s["id"] for s in engine.top_signals("tenant-a")]
+        assert ids == ["g1", "a1"]
+        assert [s["id"] for s in engine.top_signals(ALL_TENANTS)][0] == "b1"
+
+    def _stream_signals(self, engine, signals, tenants=()):
+        """Serve `signals` from the auctions query, honouring tenant filters and limits."""
+        queries = []
+
+        def query(filters):
+            q = MagicMock()
+            q.where.side_effect = lambda field, op, value: query({**filters, field: value})
+            q.order_by.return_value = q
+
+            def limit(n):
+                queries.append((filters.get("tenant_id"), n))
+                tenant = filters.get("tenant_id")
+                docs = []
+                for signal_id, signal in signals:
+                    if tenant is None or signal["tenant_id"] == tenant:
+                        doc = MagicMock(id=signal_id)
+                        doc.to_dict.return_value = signal
+                        docs.append(doc)
+                docs.sort(key=lambda d: d.to_dict()["conviction_score"], reverse=True)
+                limited = MagicMock()
+                limited.stream.return_value = docs[:n]
+                return limited
+
+            q.limit.side_effect = limit
+            return q
+
+        tenants_col = MagicMock()
+        tenants_col.list_documents.return_value = [MagicMock(id=t) for t in tenants]
+        auctions = query({})
+        engine.db.collection.side_effect = lambda name: tenants_col if name == "tenants" else auctions
+        return queries
+
+    def test_generate_writes_per_tenant_pulses(self, engine):
+        engine.record_signal("a1", _signal(70, "tenant-a"))
+        engine.record_signal("b1", _signal(95, "tenant-b"))
+        batch = engine.db.batch.return_value
+
+        with patch("src.services.pulse_engine.slack_notifier") as mock_slack:
+            mock_slack.send_pulse_alert = AsyncMock()
+            pulse_id = asyncio.run(engine.generate_morning_pulse())
+
+        assert pulse_id is not None
+        # Global + tenant-a + tenant-b in one batch
+        assert batch.set.call_count == 3
+        batch.commit.assert_called_once()
+        mock_slack.send_pulse_alert.assert_awaited_once()
+
+    def test_generate_includes_signals_written_elsewhere(self, engine):
+        # a1 came through this process; b1 was written by batch ingest or
+        # another instance and only reaches the heaps through the query
+        engine.record_signal("a1", _signal(70, "tenant-a"))
+        self._stream_signals(engine, [("a1", _signal(70, "tenant-a")), ("b1", _signal(95, "tenant-b"))])
+        batch = engine.db.batch.return_value
+
+        with patch("src.services.pulse_engine.slack_notifier") as mock_slack:
+            mock_slack.send_pulse_alert = AsyncMock()
+            asyncio.run(engine.generate_morning_pulse())
+
+        pulses = {c.args[1]["tenant_id"]: c.args[1] for c in batch.set.call_args_list}
+        assert [s["id"] for s in pulses["global"]["signals"]] == ["b1", "a1"]
+        assert [s["id"] for s in pulses["tenant-b"]["signals"]] == ["b1"]
+
+    def test_tenant_outside_global_top_gets_full_pulse(self, engine):
+        # tenant-c is registered but never seen by this instance, and its
+        # signals all rank below the cross-tenant candidate limit
+        strong = [(f"b{i}", _signal(95, "tenant-b")) for i in range(3)]
+        weak = [(f"c{i}", _signal(40 + i, "tenant-c")) for i in range(3)]
+        queries = self._stream_signals(engine, strong + weak, tenants=["tenant-c"])
+        batch = engine.db.batch.return_value
+
+        with patch("src.services.pulse_engine.settings") as mock_settings, \
+                patch("src.services.pulse_engine.slack_notifier") as mock_slack:
+            mock_settings.PULSE_CANDIDATES = 3
+            mock_settings.PULSE_CACHE_TTL_S = 60
+            mock_slack.send_pulse_alert = AsyncMock()
+            asyncio.run(engine.generate_morning_pulse())
+
+        pulses = {c.args[1]["tenant_id"]: c.args[1] for c in batch.set.call_args_list}
+        assert [s["id"] for s in pulses["tenant-c"]["signals"]] == ["c2", "c1", "c0"]
+        assert ("tenant-c", engine.top_k) in queries
+        assert (None, 3) in queries
+
+    def test_generate_with_no_signals_returns_none(self, engine):
+        assert asyncio.run(engine.generate_morning_pulse()) is None
+        engine.db.batch.assert_not_called()
+
+    def test_latest_pulse_served_from_cache_after_generate(self, engine):
+        engine.record_signal("a1", _signal(70, "tenant-a"))
+        with patch("src.services.pulse_engine.slack_notifier") as mock_slack:
+            mock_slack.send_pulse_alert = AsyncMock()
+            asyncio.run(engine.generate_morning_pulse())
+
+        pulse = engine.get_latest_pulse("tenant-a")
+
+        assert pulse["tenant_id"] == "tenant-a"
+        assert pulse["signals"][0]["id"] == "a1"
+        engine.db.collection.return_value.order_by.assert_not_called()
+
+    def test_latest_pulse_read_once_per_ttl(self, engine):
+        pulses_col = engine.db.collection.return_value.document.return_value.collection.return_value
+        doc = MagicMock()
+        doc.to_dict.return_value = {"date": "2026-10-19", "tenant_id": "tenant-a"}
+        pulses_col.order_by.return_value.limit.return_value.stream.return_value = [doc]
+
+        for _ in range(3):
+            assert engine.get_latest_pulse("tenant-a")["date"] == "2026-10-19"
+        assert pulses_col.order_by.call_count == 1
+
+    def test_latest_pulse_falls_back_to_global(self, engine):
+        engine.db.collection.return_value.document.return_value.collection.return_value\
+            .order_by.return_value.limit.return_value.stream.return_value = []
+        global_doc = MagicMock()
+        global_doc.to_dict.return_value = {"date": "2026-10-19", "tenant_id": "global"}
+        engine.db.collection.return_value.order_by.return_value.limit.return_value.stream.return_value = [global_doc]
+
+        assert engine.get_latest_pulse("tenant-new")["tenant_id"] == "global"
@@ -5,6 +5,8 @@ Tests: extraction_rules, shadow_market, memo_service
 import sys
 import os
 import asyncio
+from unittest.mock import patch
+
 import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -278,3 +280,257 @@ class TestGeneratePortfolioRiskPdf:
         assert "STABLE" in html
         assert "IMPROVED" in html
         assert "3" in html  # entity count
+
+
+# ═══════════════════════════════════════════
+# TASK 4: PDF Render Pool & Caching
+# ═══════════════════════════════════════════
+
+class TestPdfRenderer:
+    """Validate the dedicated render pool's result cache and job sharing."""
+
+    def _make_renderer(self, **kwargs):
+        from src.services.pdf_factory import PdfRenderer
+        return PdfRenderer(workers=-2, **kwargs)
+
+    def test_identical_html_rendered_once(self):
+        renderer = self._make_renderer()
+        with patch("src.services.pdf_factory.render_pdf_sync", return_value=b"%PDF-a") as mock_render:
+            first = asyncio.run(renderer.render_html("<p>a</p>"))
+            second = asyncio.run(renderer.render_html("<p>a</p>"))
+
+        assert first == second == b"%PDF-a"
+        mock_render.assert_called_once()
+        assert renderer.stats()["hits"] == 1
+
+    def test_concurrent_identical_renders_share_job(self):
+        import time
+        renderer = self._make_renderer()
+
+        def slow_render(html):
+            time.sleep(0.05)
+            return b"%PDF-slow"
+
+        async def run():
+            return await asyncio.gather(*[renderer.render_html("<p>x</p>") for _ in range(4)])
+
+        with patch("src.services.pdf_factory.render_pdf_sync", side_effect=slow_render) as mock_render:
+            results = asyncio.run(run())
+
+        assert results == [b"%PDF-slow"] * 4
+        assert mock_render.call_count == 1
+        renderer.shutdown()
+
+    def test_result_cache_evicts_by_size(self):
+        renderer = self._make_renderer(cache_bytes=10)
+        with patch("src.services.pdf_factory.render_pdf_sync", side_effect=lambda html: html.encode()):
+            asyncio.run(renderer.render_html("aaaaaa"))
+            asyncio.run(renderer.render_html("bbbbbb"))
+
+        stats = renderer.stats()
+        assert stats["cached_results"] == 1
+        assert stats["cached_bytes"] == 6
+
+    def test_process_pool_renders_without_fork(self):
+        from src.services.pdf_factory import PdfRenderer
+
+        renderer = PdfRenderer(workers=1)
+        try:
+            pdf = asyncio.run(renderer.render_html("<p>process</p>", cache=False))
+            start_method = renderer._get_executor()._mp_context.get_start_method()
+        finally:
+            renderer.shutdown()
+
+        assert pdf.startswith(b"%PDF")
+        assert start_method in ("forkserver", "spawn")
+
+    def test_default_workers_follow_available_cpus(self):
+        from src.services.pdf_factory import PdfRenderer
+
+        with patch("src.services.pdf_factory.available_cpus", return_value=3):
+            assert PdfRenderer(workers=0).parallelism == 3
+
+    def test_available_cpus_honours_cgroup_quota(self):
+        from unittest.mock import mock_open
+        from src.services.pdf_factory import available_cpus
+
+        with patch("os.sched_getaffinity", return_value=set(range(8)), create=True), \
+                patch("builtins.open", mock_open(read_data="200000 100000\n")):
+            assert available_cpus() == 2
+        with patch("os.sched_getaffinity", return_value=set(range(8)), create=True), \
+                patch("builtins.open", mock_open(read_data="max 100000\n")):
+            assert available_cpus() == 8
+
+    def test_inline_template_compiled_once(self):
+        from src.services.memo_service import RISK_REPORT_TEMPLATE
+        from src.services.pdf_factory import compile_template
+
+        assert compile_template(RISK_REPORT_TEMPLATE) is compile_template(RISK_REPORT_TEMPLATE)
+
+
+# ═══════════════════════════════════════════
+# TASK 5: Chunked Risk Reports & Table Export
+# ═══════════════════════════════════════════
+
+def _blank_pdf(pages: int = 1) -> bytes:
+    import io
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    buf = io.BytesIO()
+    writer.write(buf)
+    return buf.getvalue()
+
+
+class TestChunkedRiskReport:
+    """Validate sectioned rendering, pypdf merge and entity table export."""
+
+    def _entities(self, n):
+        tiers = ["ELEVATED_RISK", "STABLE", "IMPROVED", "UNSCORED"]
+        return [
+            {
+                "company_name": f"Company {i}",
+                "company_number": f"{i:08d}",
+                "counterparty_type": "BORROWER",
+                "risk_tier": tiers[i % 4],
+                "max_conviction_score": i % 100,
+            }
+            for i in range(n)
+        ]
+
+    def test_sections_rendered_and_merged(self):
+        from src.services.memo_service import MemoService
+
+        rendered = []
+        parts = []
+
+        async def fake_render(html, cache=True):
+            rendered.append(html)
+            return _blank_pdf()
+
+        with patch("src.services.memo_service.pdf_renderer") as mock_renderer:
+            mock_renderer.parallelism = 2
+            mock_renderer.render_html.side_effect = fake_render
+            pages = asyncio.run(
+                MemoService().write_portfolio_risk_pdf(
+                    "port-big", self._entities(25), lambda fh: parts.append(fh.read()), chunk_size=10
+                )
+            )
+
+        # Summary + 3 table sections (10, 10, 5 rows) in one part
+        assert pages == [4]
+        assert len(parts) == 1 and parts[0].startswith(b"%PDF")
+        assert all(call.kwargs.get("cache") is False for call in mock_renderer.render_html.call_args_list)
+        summary = next(h for h in rendered if "Summary" in h and "<table>" not in h)
+        assert "7 elevated risk" in summary
+        assert any("Rows 21–25" in h and "<td>21</td>" in h for h in rendered)
+
+    def test_parts_are_section_bounded(self):
+        import io
+        from pypdf import PdfReader
+        from src.services.memo_service import MemoService
+
+        parts = []
+
+        async def fake_render(html, cache=True):
+            return _blank_pdf()
+
+        with patch("src.services.memo_service.pdf_renderer") as mock_renderer:
+            mock_renderer.parallelism = 2
+            mock_renderer.render_html.side_effect = fake_render
+            pages = asyncio.run(
+                MemoService().write_portfolio_risk_pdf(
+                    "port-big", self._entities(45), lambda fh: parts.append(fh.read()),
+                    chunk_size=10, part_sections=2,
+                )
+            )
+
+        # Summary + 5 table sections, two sections per part
+        assert pages == [2, 2, 2]
+        assert [len(PdfReader(io.BytesIO(p)).pages) for p in parts] == [2, 2, 2]
+
+    def test_large_book_is_not_returned_in_memory(self):
+        from src.services.memo_service import MemoService
+
+        with patch("src.services.memo_service.settings") as mock_settings:
+            mock_settings.RISK_REPORT_CHUNK_SIZE = 10
+            with pytest.raises(ValueError):
+                asyncio.run(MemoService().generate_portfolio_risk_pdf("port-big", self._entities(11)))
+
+    def test_entity_table_csv(self):
+        import csv
+        import io
+        from src.services.memo_service import write_entity_table, ENTITY_TABLE_COLUMNS
+
+        buf = io.BytesIO()
+        write_entity_table(self._entities(3), buf, "csv")
+        rows = list(csv.DictReader(io.StringIO(buf.getvalue().decode())))
+
+        assert len(rows) == 3
+        assert list(rows[0].keys()) == ENTITY_TABLE_COLUMNS
+        assert rows[2]["company_number"] == "00000002"
+
+    def test_entity_table_parquet_row_groups(self):
+        import io
+        pq = pytest.importorskip("pyarrow.parquet")
+        from src.services.memo_service import write_entity_table
+
+        buf = io.BytesIO()
+        write_entity_table(self._entities(25), buf, "parquet", row_group_size=10)
+        buf.seek(0)
+        parquet = pq.ParquetFile(buf)
+
+        assert parquet.metadata.num_rows == 25
+        assert parquet.metadata.num_row_groups == 3
+
+    def test_export_uploads_summary_and_table(self):
+        import io
+        from src.services.memo_service import MemoService
+
+        svc = MemoService()
+
+        async def fake_write(portfolio_id, entities, emit_part, **kwargs):
+            assert kwargs["include_table"] is False
+            emit_part(io.BytesIO(_blank_pdf()))
+            return [1]
+
+        with patch.object(svc, "write_portfolio_risk_pdf", side_effect=fake_write), \
+                patch("src.services.memo_service.storage_service") as mock_storage:
+            mock_storage.upload_stream_and_sign.side_effect = lambda f, name, ct: f"https://signed/{name}"
+            result = asyncio.run(svc.export_portfolio_risk_report("port-big", self._entities(5), "csv"))
+
+        assert result["summary_pdf_url"].endswith("/summary.pdf")
+        assert result["table_url"].endswith("/entities.csv")
+        assert "report_part_urls" not in result
+        assert mock_storage.upload_stream_and_sign.call_count == 2
+
+    def test_export_full_report_uploads_each_part(self):
+        from src.services.memo_service import MemoService
+
+        async def fake_render(html, cache=True):
+            return _blank_pdf()
+
+        with patch("src.services.memo_service.pdf_renderer") as mock_renderer, \
+                patch("src.services.memo_service.settings") as mock_settings, \
+                patch("src.services.memo_service.storage_service") as mock_storage:
+            mock_renderer.parallelism = 2
+            mock_renderer.render_html.side_effect = fake_render
+            mock_settings.RISK_REPORT_CHUNK_SIZE = 10
+            mock_settings.RISK_REPORT_PART_SECTIONS = 2
+            mock_storage.upload_stream_and_sign.side_effect = lambda f, name, ct: f"https://signed/{name}"
+            result = asyncio.run(
+                MemoService().export_portfolio_risk_report("port-big", self._entities(25), "csv", full_report=True)
+            )
+
+        assert [url.rsplit("/", 1)[1] for url in result["report_part_urls"]] == [
+            "report_part_001.pdf", "report_part_002.pdf",
+        ]
+        assert result["report_pages"] == 4
+
+    def test_export_rejects_unknown_format(self):
+        from src.services.memo_service import MemoService
+
+        with pytest.raises(ValueError):
+            asyncio.run(MemoService().export_portfolio_risk_report("p", [], "xlsx"))
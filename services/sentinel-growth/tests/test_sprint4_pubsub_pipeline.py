@@ -121,6 +121,72 @@ class TestPublishSignalEvent:
         assert payload["source_family"] == "GOV_REGISTRY"
         assert payload["signal_id"]  # Auto-generated UUID
 
+    def test_publish_uses_company_number_as_ordering_key(self):
+        """Events for one company share an ordering key; encoding is advertised."""
+        svc, mock_pub = self._make_service()
+        svc.publish_signal_event({"company_number": "SC654321"})
+
+        kwargs = mock_pub.publish.call_args[1]
+        assert kwargs["ordering_key"] == "SC654321"
+        assert kwargs["encoding"] == "json"
+
+    def test_failed_ordered_publish_resumes_key(self):
+        """A failed publish resumes its ordering key so later events still flow."""
+        svc, mock_pub = self._make_service()
+        svc.publish_signal_event({"company_number": "12345678"})
+
+        future = mock_pub.publish.return_value
+        future.result.side_effect = Exception("deadline exceeded")
+        callback = future.add_done_callback.call_args[0][0]
+        callback(future)
+
+        mock_pub.resume_publish.assert_called_once_with(svc.topic_path, "12345678")
+
+    def test_publish_avro_encoding(self):
+        """Avro-encoded events are smaller than JSON and carry the avro attribute."""
+        from src.services.signal_codec import build_signal_payload, encode_signal
+
+        svc, mock_pub = self._make_service()
+        svc.encoding = "avro"
+        svc.publish_signal_event({"signal_id": "sig-1", "company_number": "12345678"})
+
+        kwargs = mock_pub.publish.call_args[1]
+        assert kwargs["encoding"] == "avro"
+        # signal_id is the first field: zig-zag length (5 → 0x0A) then UTF-8 bytes
+        assert kwargs["data"].startswith(b"\x0asig-1")
+
+        payload = build_signal_payload({"signal_id": "sig-1", "company_number": "12345678"})
+        assert len(encode_signal(payload, "avro")) < len(encode_signal(payload, "json"))
+
+    def test_avro_round_trip(self):
+        """The pipeline's decoder reads back exactly what the publisher encodes."""
+        from src.services.signal_codec import build_signal_payload, decode_signal_avro, encode_signal_avro
+
+        payload = build_signal_payload({"company_number": "12345678", "conviction_score": -3, "region": "Süd"})
+        assert decode_signal_avro(encode_signal_avro(payload)) == payload
+        with pytest.raises(ValueError):
+            decode_signal_avro(encode_signal_avro(payload)[:-3])
+
+    def test_publish_backlog_full_is_dropped_without_blocking(self):
+        """Over the flow-control limit publish fails fast and the event is dropped, not raised."""
+        from google.cloud.pubsub_v1.publisher.exceptions import FlowControlLimitError
+        from google.cloud.pubsub_v1.types import LimitExceededBehavior
+
+        with patch("src.services.persistence.firestore.Client"), \
+             patch("src.services.persistence.pubsub_v1.PublisherClient") as mock_pub:
+            from src.services.persistence import PersistenceService
+            svc = PersistenceService()
+        options = mock_pub.call_args.kwargs["publisher_options"]
+        assert options.flow_control.limit_exceeded_behavior == LimitExceededBehavior.ERROR
+
+        future = MagicMock()
+        future.result.side_effect = FlowControlLimitError("full")
+        svc.publisher.publish.return_value = future
+        svc.publish_signal_event({"company_number": "12345678"})
+        future.add_done_callback.call_args[0][0](future)
+
+        svc.publisher.resume_publish.assert_not_called()
+
 
 # ═══════════════════════════════════════════
 # TASK 2: Beam Pipeline Transform Functions
@@ -278,3 +344,52 @@ class TestMapToBigQueryRow:
         for family in ["GOV_REGISTRY", "RSS_NEWS", "TALENT_FEED"]:
             row = map_to_bigquery_row({"source_family": family})
             assert row["source_family"] == family
+
+
+# ═══════════════════════════════════════════
+# TASK 3: Rolling Company Momentum
+# ═══════════════════════════════════════════
+# compute_momentum itself is tested with the pipeline in ic-origin-dataflow.
+
+
+class TestCompanyMomentum:
+    """Validate the batched momentum lookup and the dossier timeline."""
+
+    def test_get_momentum_uses_one_batched_read(self):
+        from src.api.signals import get_momentum
+
+        snap = MagicMock(id="12345678", exists=True)
+        snap.to_dict.return_value = {"signal_count_7d": 3}
+        missing = MagicMock(id="87654321", exists=False)
+        db = MagicMock()
+        db.get_all.return_value = [snap, missing]
+
+        result = get_momentum(db, ["12345678", "87654321", "12345678", None])
+
+        db.get_all.assert_called_once()
+        assert len(db.get_all.call_args[0][0]) == 2
+        assert result == {"12345678": {"signal_count_7d": 3}}
+
+    def test_get_momentum_skips_read_without_company_numbers(self):
+        from src.api.signals import get_momentum
+
+        db = MagicMock()
+        assert get_momentum(db, [None, ""]) == {}
+        db.get_all.assert_not_called()
+
+    def test_dossier_timeline_from_momentum_document(self):
+        from src.api.signals import momentum_timeline
+
+        timeline = momentum_timeline({
+            "risk_tier": "ELEVATED_RISK",
+            "last_signal_at": "2026-03-02T09:00:00+00:00",
+            "momentum_7_90": 4.5,
+            "signal_count_7d": 1, "mean_conviction_7d": 80.0, "elevated_transitions_7d": 1,
+            "signal_count_30d": 0,
+            "signal_count_90d": 3, "mean_conviction_90d": 70.0, "elevated_transitions_90d": 1,
+        })
+
+        assert [e["date"] for e in timeline] == ["02 Mar 2026", "Last 7 days", "Last 90 days"]
+        assert timeline[0]["headline"] == "Latest signal: ELEVATED_RISK"
+        assert timeline[2]["headline"] == "3 signals"
+        assert momentum_timeline(None) == []
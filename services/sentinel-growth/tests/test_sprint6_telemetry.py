@@ -1,6 +1,6 @@
 """
 Sprint 6 Validation Tests — Telemetry & Status Dashboard
-Tests: atomic increment tracking, usage stats retrieval, telemetry API endpoint
+Tests: buffered sharded counters, usage stats retrieval, telemetry API and metrics endpoints
 """
 import sys
 import os
@@ -37,53 +37,91 @@ class TestTelemetryService:
             .document.return_value
         )
 
+    def _get_mock_batch(self, mock_db):
+        return mock_db.batch.return_value
+
     # ── Sweep Tracking ────────────────────────────────────────
 
-    def test_track_sweep_calls_firestore_set(self):
+    def test_track_sweep_is_buffered_until_flush(self):
         svc, mock_db = self._make_service()
-        doc_ref = self._get_mock_doc_ref(mock_db)
 
+        svc.track_sweep_executed("tenant-A")
         svc.track_sweep_executed("tenant-A")
 
-        doc_ref.set.assert_called_once()
-        call_args = doc_ref.set.call_args
-        data = call_args[0][0]
-        assert "sweeps_executed" in data
+        mock_db.batch.assert_not_called()
+        assert svc.pending_count() == 2
+
+    def test_flush_writes_increment_to_shard_with_merge(self):
+        svc, mock_db = self._make_service()
+        batch = self._get_mock_batch(mock_db)
+
+        svc.track_sweep_executed("tenant-A")
+        svc.track_sweep_executed("tenant-A")
+        written = svc.flush()
+
+        assert written == 1
+        batch.set.assert_called_once()
+        batch.commit.assert_called_once()
+        call_args = batch.set.call_args
+        data = call_args[0][1]
+        assert data["sweeps_executed"].value == 2
         assert "last_sweep_at" in data
         # merge=True for atomic increment
         assert call_args[1].get("merge") is True
+        assert svc.pending_count() == 0
 
-    def test_track_sweep_scoped_to_tenant(self):
+    def test_track_sweep_scoped_to_tenant_shard(self):
         svc, mock_db = self._make_service()
         svc.track_sweep_executed("tenant-X")
+        svc.flush()
 
-        # Verify path: tenants -> tenant-X -> telemetry -> {month}
+        # Verify path: tenants -> tenant-X -> telemetry -> {month} -> shards -> {n}
         mock_db.collection.assert_called_with("tenants")
         mock_db.collection.return_value.document.assert_called_with("tenant-X")
         mock_db.collection.return_value.document.return_value.collection.assert_called_with("telemetry")
+        self._get_mock_doc_ref(mock_db).collection.assert_called_with("shards")
+        shard_id = self._get_mock_doc_ref(mock_db).collection.return_value.document.call_args[0][0]
+        assert 0 <= int(shard_id) < svc.num_shards
+
+    def test_flush_failure_requeues_counts(self):
+        svc, mock_db = self._make_service()
+        self._get_mock_batch(mock_db).commit.side_effect = Exception("unavailable")
+
+        svc.track_alert_sent("tenant-B")
+        assert svc.flush() == 0
+
+        assert svc.pending_count() == 1
+        assert svc.flush_failures == 1
+
+    def test_flush_nothing_pending_is_noop(self):
+        svc, mock_db = self._make_service()
+        assert svc.flush() == 0
+        mock_db.batch.assert_not_called()
 
     # ── Alert Tracking ────────────────────────────────────────
 
-    def test_track_alert_calls_firestore_set(self):
+    def test_track_alert_flushes_counter(self):
         svc, mock_db = self._make_service()
-        doc_ref = self._get_mock_doc_ref(mock_db)
+        batch = self._get_mock_batch(mock_db)
 
         svc.track_alert_sent("tenant-B")
+        svc.flush()
 
-        doc_ref.set.assert_called_once()
-        data = doc_ref.set.call_args[0][0]
+        batch.set.assert_called_once()
+        data = batch.set.call_args[0][1]
         assert "alerts_sent" in data
 
     # ── Report Tracking ───────────────────────────────────────
 
-    def test_track_report_calls_firestore_set(self):
+    def test_track_report_flushes_counter(self):
         svc, mock_db = self._make_service()
-        doc_ref = self._get_mock_doc_ref(mock_db)
+        batch = self._get_mock_batch(mock_db)
 
         svc.track_report_generated("tenant-C")
+        svc.flush()
 
-        doc_ref.set.assert_called_once()
-        data = doc_ref.set.call_args[0][0]
+        batch.set.assert_called_once()
+        data = batch.set.call_args[0][1]
         assert "reports_generated" in data
 
     # ── Usage Stats Reading ───────────────────────────────────
@@ -109,6 +147,26 @@ class TestTelemetryService:
         assert stats["reports_generated"] == 3
         assert stats["last_sweep_at"] is not None
 
+    def test_get_usage_stats_sums_shards_and_pending(self):
+        svc, mock_db = self._make_service()
+        doc_ref = self._get_mock_doc_ref(mock_db)
+        doc_ref.get.return_value = MagicMock(exists=False)
+
+        shards = []
+        for sweeps, alerts in [(3, 1), (4, 0)]:
+            shard = MagicMock()
+            shard.to_dict.return_value = {"sweeps_executed": sweeps, "alerts_sent": alerts}
+            shards.append(shard)
+        doc_ref.collection.return_value.stream.return_value = shards
+
+        svc.track_sweep_executed("tenant-A")  # unflushed
+        stats = svc.get_usage_stats("tenant-A")
+
+        assert stats["sweeps_executed"] == 8
+        assert stats["alerts_sent"] == 1
+        assert stats["reports_generated"] == 0
+        assert stats["last_sweep_at"] is not None
+
     def test_get_usage_stats_empty_tenant(self):
         svc, mock_db = self._make_service()
         doc_ref = self._get_mock_doc_ref(mock_db)
@@ -153,13 +211,56 @@ class TestTelemetryService:
             .collection.return_value
         )
 
-        # Mock stream returning 5 documents
-        mock_col.select.return_value.stream.return_value = [
-            MagicMock() for _ in range(5)
-        ]
+        # Server-side count() aggregation result
+        mock_col.count.return_value.get.return_value = [[MagicMock(value=5)]]
 
         count = svc.get_entity_count("tenant-A")
         assert count == 5
+        mock_col.select.assert_not_called()
+
+    def test_entity_count_cached_until_invalidated(self):
+        svc, mock_db = self._make_service()
+        count_query = (
+            mock_db.collection.return_value
+            .document.return_value
+            .collection.return_value
+            .count.return_value
+        )
+        count_query.get.return_value = [[MagicMock(value=5)]]
+
+        assert svc.get_entity_count("tenant-A") == 5
+        count_query.get.return_value = [[MagicMock(value=6)]]
+        assert svc.get_entity_count("tenant-A") == 5
+        assert count_query.get.call_count == 1
+
+        svc.invalidate("tenant-A", "entity_count")
+        assert svc.get_entity_count("tenant-A") == 6
+
+    def test_usage_stats_cached_between_polls(self):
+        svc, mock_db = self._make_service()
+        doc_ref = self._get_mock_doc_ref(mock_db)
+        doc_ref.get.return_value = MagicMock(exists=True, to_dict=lambda: {"sweeps_executed": 4})
+
+        for _ in range(5):
+            assert svc.get_usage_stats("tenant-A")["sweeps_executed"] == 4
+        assert doc_ref.get.call_count == 1
+
+        # Unflushed increments still show without another read
+        svc.track_sweep_executed("tenant-A")
+        assert svc.get_usage_stats("tenant-A")["sweeps_executed"] == 5
+        assert doc_ref.get.call_count == 1
+
+    def test_flush_invalidates_usage_cache(self):
+        svc, mock_db = self._make_service()
+        doc_ref = self._get_mock_doc_ref(mock_db)
+        doc_ref.get.return_value = MagicMock(exists=False)
+
+        svc.get_usage_stats("tenant-A")
+        svc.track_sweep_executed("tenant-A")
+        svc.flush()
+        svc.get_usage_stats("tenant-A")
+
+        assert doc_ref.get.call_count == 2
 
     def test_get_entity_count_no_db(self):
         with patch("src.services.telemetry_service.firestore.Client") as mock_fs:
@@ -182,6 +283,47 @@ class TestTelemetryService:
         svc.track_sweep_executed("tenant-Z")
         svc.track_alert_sent("tenant-Z")
         svc.track_report_generated("tenant-Z")
+        assert svc.flush() == 0
+
+    # ── Prometheus Exposition ─────────────────────────────────
+
+    def test_render_metrics_prometheus_format(self):
+        svc, _ = self._make_service()
+        svc.track_sweep_executed("tenant-A")
+        svc.track_alert_sent("tenant-B")
+        svc.flush()  # totals survive a flush
+
+        text = svc.render_metrics()
+
+        assert "# TYPE sentinel_sweeps_executed_total counter" in text
+        assert 'sentinel_sweeps_executed_total{tenant_id="tenant-A"} 1' in text
+        assert 'sentinel_alerts_sent_total{tenant_id="tenant-B"} 1' in text
+        assert "sentinel_telemetry_pending_increments 0" in text
+        assert "# EOF" not in text
+
+    def test_render_metrics_openmetrics_format(self):
+        svc, _ = self._make_service()
+        svc.track_report_generated("tenant-A")
+
+        text = svc.render_metrics(openmetrics=True, extra_gauges={"x_depth": ("Depth.", 3)})
+
+        assert "# TYPE sentinel_reports_generated counter" in text
+        assert 'sentinel_reports_generated_total{tenant_id="tenant-A"} 1' in text
+        assert "x_depth 3" in text
+        assert text.endswith("# EOF\n")
+
+    def test_render_metrics_extra_counters_get_total_suffix(self):
+        svc, _ = self._make_service()
+        counters = {"x_dropped": ("Dropped.", 4)}
+
+        prom = svc.render_metrics(extra_counters=counters)
+        om = svc.render_metrics(openmetrics=True, extra_counters=counters)
+
+        assert "# TYPE x_dropped_total counter" in prom
+        assert "x_dropped_total 4" in prom
+        assert "# TYPE x_dropped counter" in om
+        assert "x_dropped_total 4" in om
+        assert "sentinel_telemetry_flush_failures_total 0" in prom
 
 
 # ═══════════════════════════════════════════
@@ -275,3 +417,44 @@ class TestTelemetryAPI:
 
         response = raw_client.get("/api/v1/telemetry/status")
         assert response.status_code == 403 or response.status_code == 401
+
+    # ── Metrics Scrape Endpoint ───────────────────────────────
+
+    def test_metrics_disabled_without_token(self, client):
+        with patch("src.api.telemetry.settings") as mock_settings:
+            mock_settings.METRICS_SCRAPE_TOKEN = ""
+            response = client.get("/api/v1/telemetry/metrics")
+        assert response.status_code == 404
+
+    def test_metrics_rejects_wrong_token(self, client):
+        with patch("src.api.telemetry.settings") as mock_settings:
+            mock_settings.METRICS_SCRAPE_TOKEN = "scrape-secret"
+            response = client.get(
+                "/api/v1/telemetry/metrics", headers={"Authorization": "Bearer nope"}
+            )
+        assert response.status_code == 401
+
+    @patch("src.api.telemetry.telemetry_service")
+    def test_metrics_content_negotiation(self, mock_tele, client):
+        mock_tele.render_metrics.return_value = "# EOF\n"
+        headers = {"Authorization": "Bearer scrape-secret"}
+        with patch("src.api.telemetry.settings") as mock_settings:
+            mock_settings.METRICS_SCRAPE_TOKEN = "scrape-secret"
+            prom = client.get("/api/v1/telemetry/metrics", headers=headers)
+            om = client.get(
+                "/api/v1/telemetry/metrics",
+                headers={**headers, "Accept": "application/openmetrics-text; version=1.0.0"},
+            )
+
+        assert prom.status_code == 200
+        assert prom.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert om.headers["content-type"].startswith("application/openmetrics-text")
+        assert mock_tele.render_metrics.call_args_list[1][1]["openmetrics"] is True
+        gauges = mock_tele.render_metrics.call_args_list[0][1]["extra_gauges"]
+        counters = mock_tele.render_metrics.call_args_list[0][1]["extra_counters"]
+        assert "sentinel_audit_buffer_depth" in gauges
+        assert set(counters) == {
+            "sentinel_audit_buffer_enqueued", "sentinel_audit_buffer_dropped",
+            "sentinel_audit_buffer_flushed", "sentinel_audit_buffer_flush_failures",
+        }
+        assert not set(counters) & set(gauges)
@@ -262,6 +262,100 @@ class TestSystemicRiskService:
         assert result["ch_number"] == "any"
 
 
+class TestSystemicExposureIndex:
+    """Validate the batch-mode company_number → tenant exposure index."""
+
+    def _make_service(self, docs):
+        with patch("src.services.systemic_risk.firestore.Client") as mock_fs:
+            mock_db = MagicMock()
+            mock_fs.return_value = mock_db
+            from src.services.systemic_risk import SystemicRiskService
+            svc = SystemicRiskService()
+        mock_db.collection_group.return_value.select.return_value.stream.return_value = docs
+        return svc, mock_db
+
+    def _doc(self, tenant, ch_number, tier):
+        doc = MagicMock()
+        doc.id = ch_number
+        doc.to_dict.return_value = {"company_number": ch_number, "risk_tier": tier}
+        doc.reference.path = f"tenants/{tenant}/monitored_entities/{ch_number}"
+        return doc
+
+    def test_build_index_in_single_pass(self):
+        svc, mock_db = self._make_service([
+            self._doc("tenant-A", "111", "ELEVATED_RISK"),
+            self._doc("tenant-B", "111", "STABLE"),
+            self._doc("tenant-A", "222", "STABLE"),
+        ])
+        assert svc.build_exposure_index() == 2
+        assert svc.index_ready is True
+        mock_db.collection_group.assert_called_once_with("monitored_entities")
+
+    def test_lookup_queries_live_even_with_warm_index(self):
+        svc, mock_db = self._make_service([self._doc("tenant-A", "111", "ELEVATED_RISK")])
+        svc.build_exposure_index()
+        # tenant-B added the company on another instance after the index was built
+        mock_db.collection_group.return_value.where.return_value.stream.return_value = [
+            self._doc("tenant-A", "111", "ELEVATED_RISK"),
+            self._doc("tenant-B", "111", "STABLE"),
+        ]
+
+        result = svc.evaluate_systemic_exposure("111")
+        assert result["is_systemic"] is True
+        assert result["tenant_ids"] == ["tenant-A", "tenant-B"]
+
+    def test_compute_all_only_includes_elevated(self):
+        svc, _ = self._make_service([
+            self._doc("tenant-A", "111", "ELEVATED_RISK"),
+            self._doc("tenant-B", "111", "ELEVATED_RISK"),
+            self._doc("tenant-A", "222", "ELEVATED_RISK"),
+            self._doc("tenant-A", "333", "STABLE"),
+            self._doc("tenant-B", "333", "STABLE"),
+        ])
+        results = {r["ch_number"]: r for r in svc.compute_systemic_exposures()}
+        assert set(results) == {"111", "222"}
+        assert results["111"]["is_systemic"] is True
+        assert results["222"]["is_systemic"] is False
+
+    def test_incremental_record_and_forget(self):
+        svc, _ = self._make_service([self._doc("tenant-A", "111", "ELEVATED_RISK")])
+        svc.build_exposure_index()
+
+        svc.record_entity("tenant-B", "111", "ELEVATED_RISK")
+        assert svc.compute_systemic_exposures()[0]["is_systemic"] is True
+
+        svc.forget_entity("tenant-B", "111")
+        svc.forget_entity("tenant-A", "111")
+        assert svc.compute_systemic_exposures() == []
+
+    def test_publish_table_batches_writes(self):
+        svc, mock_db = self._make_service([
+            self._doc("tenant-A", "111", "ELEVATED_RISK"),
+            self._doc("tenant-B", "111", "ELEVATED_RISK"),
+        ])
+        assert svc.publish_systemic_exposure_table() == 1
+        mock_db.collection.assert_called_with("systemic_exposure")
+        mock_db.batch.return_value.commit.assert_called_once()
+
+    def test_publish_deletes_rows_from_earlier_snapshots(self):
+        svc, mock_db = self._make_service([
+            self._doc("tenant-A", "111", "ELEVATED_RISK"),
+            self._doc("tenant-B", "111", "ELEVATED_RISK"),
+        ])
+        stale = MagicMock()
+        table = mock_db.collection.return_value
+        table.where.return_value.stream.return_value = [stale]
+
+        svc.publish_systemic_exposure_table()
+
+        field, op, snapshot_date = table.where.call_args.args
+        assert (field, op) == ("snapshot_date", "<")
+        assert table.document.call_args_list[0].args == ("111",)
+        written = mock_db.batch.return_value.set.call_args.args[1]
+        assert written["snapshot_date"] == snapshot_date
+        mock_db.batch.return_value.delete.assert_called_once_with(stale.reference)
+
+
 # ═══════════════════════════════════════════
 # TASK 4: Graph API Tests
 # ═══════════════════════════════════════════
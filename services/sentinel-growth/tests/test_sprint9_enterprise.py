@@ -118,6 +118,99 @@ class TestAuditMiddlewareIntegration:
         assert response.status_code == 200
 
 
+class TestAuditEventBuffer:
+    """Validate the ring buffer, bounded body capture and deferred redaction."""
+
+    def _make_app(self, buffer, max_body_bytes=4096):
+        from fastapi import Request
+        from src.core.audit import AuditLogMiddleware
+        app = FastAPI()
+        app.add_middleware(AuditLogMiddleware, buffer=buffer, max_body_bytes=max_body_bytes)
+
+        @app.post("/test/create")
+        async def create_item(request: Request):
+            body = await request.body()
+            return {"received": len(body)}
+
+        return TestClient(app)
+
+    def test_event_buffered_with_status_and_redacted_body(self):
+        from src.core.audit import AuditEventBuffer, build_audit_event
+        buffer = AuditEventBuffer(capacity=10)
+        client = self._make_app(buffer)
+
+        response = client.post(
+            "/test/create?mode=fast",
+            json={"name": "test", "password": "hunter2"},
+            headers={"Authorization": "Bearer abc", "X-Forwarded-For": "1.2.3.4, 10.0.0.1"},
+        )
+
+        assert response.status_code == 200
+        assert len(buffer) == 1
+        event = build_audit_event(buffer._events[0])
+        assert event["action"] == "POST /test/create"
+        assert event["response_status"] == 200
+        assert event["ip_address"] == "1.2.3.4"
+        assert event["query_params"] == {"mode": "fast"}
+        assert event["request_body_redacted"]["password"] == "[REDACTED]"
+        assert event["token_fingerprint"] == hashlib.sha256(b"abc").hexdigest()[:12]
+
+    def test_large_body_captures_bounded_prefix_only(self):
+        from src.core.audit import AuditEventBuffer, build_audit_event
+        buffer = AuditEventBuffer(capacity=10)
+        client = self._make_app(buffer, max_body_bytes=64)
+        payload = '{"token": "sk_live_secret", "blob": "' + "x" * 10_000 + '"}'
+
+        response = client.post("/test/create", content=payload,
+                               headers={"content-type": "application/json"})
+
+        # The app still receives the full body
+        assert response.json()["received"] == len(payload)
+        body = build_audit_event(buffer._events[0])["request_body_redacted"]
+        assert body["_truncated"] is True
+        assert body["_raw_size_bytes"] == len(payload)
+        assert "sk_live_secret" not in body["_prefix"]
+        assert "[REDACTED]" in body["_prefix"]
+
+    def test_full_buffer_drops_oldest_and_counts(self):
+        from src.core.audit import AuditEventBuffer
+        buffer = AuditEventBuffer(capacity=2)
+        for i in range(5):
+            buffer.append((i,))
+
+        assert len(buffer) == 2
+        assert [e[0] for e in buffer._events] == [3, 4]
+        assert buffer.stats()["dropped"] == 3
+
+    def test_flush_delivers_batches_to_sink(self):
+        import asyncio
+        from src.core.audit import AuditEventBuffer
+        sink = MagicMock()
+        buffer = AuditEventBuffer(capacity=100, batch_size=2, sink=sink)
+        client = self._make_app(buffer)
+        for _ in range(3):
+            client.post("/test/create", json={"name": "x"})
+
+        delivered = asyncio.run(buffer.flush())
+
+        assert delivered == 3
+        assert [len(c[0][0]) for c in sink.write.call_args_list] == [2, 1]
+        assert buffer.stats()["flushed"] == 3
+        assert len(buffer) == 0
+
+    def test_sink_failure_is_counted_not_raised(self):
+        import asyncio
+        from src.core.audit import AuditEventBuffer
+        sink = MagicMock()
+        sink.write.side_effect = Exception("topic missing")
+        buffer = AuditEventBuffer(capacity=10, sink=sink)
+        buffer.append((0.0, 0.0, "POST", "/x", b"", b"", "ip", b"", "no_token", b"", 0, 200))
+
+        asyncio.run(buffer.flush())
+
+        assert buffer.stats()["flush_failures"] == 1
+
+
 # ═══════════════════════════════════════════
 # TASK 2: API Key Management Tests
 # ═══════════════════════════════════════════
@@ -0,0 +1,158 @@
+import datetime
+import os
+import sys
+import unittest
+from concurrent.futures import Future
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pyarrow as pa
+from google.api_core import exceptions as gapi_exceptions
+from google.cloud import bigquery
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import bq_writer
+from bq_writer import ArrowRowSerializer, BigQueryStorageWriter, ProtoRowSerializer
+
+SCHEMA = [
+    bigquery.SchemaField("crn", "STRING", mode="REQUIRED"),
+    bigquery.SchemaField("score", "FLOAT"),
+    bigquery.SchemaField("flags", "STRING", mode="REPEATED"),
+    bigquery.SchemaField("scored_at", "TIMESTAMP"),
+    bigquery.SchemaField("as_of", "DATE"),
+]
+ROW = {
+    "crn": "01234567",
+    "score": 0.75,
+    "flags": ["psc", "charge"],
+    "scored_at": "2026-01-02T03:04:05Z",
+    "as_of": datetime.date(2026, 1, 2),
+}
+
+
+class TestSerializers(unittest.TestCase):
+    def test_proto_rows_round_trip(self):
+        serializer = ProtoRowSerializer(SCHEMA)
+        request = serializer.rows([ROW, {"crn": "7", "score": None}])
+
+        rows = request.proto_rows.rows.serialized_rows
+        self.assertEqual(len(rows), 2)
+        message = serializer.message_cls.FromString(rows[0])
+        self.assertEqual(message.crn, "01234567")
+        self.assertEqual(list(message.flags), ["psc", "charge"])
+        expected = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+        self.assertEqual(message.scored_at, int(expected.timestamp()) * 1_000_000)
+        self.assertEqual(message.as_of, (datetime.date(2026, 1, 2) - datetime.date(1970, 1, 1)).days)
+        self.assertFalse(serializer.message_cls.FromString(rows[1]).HasField("score"))
+
+    def test_arrow_rows_round_trip(self):
+        serializer = ArrowRowSerializer(SCHEMA)
+        request = serializer.rows([ROW, {"crn": "7"}])
+
+        batch = pa.ipc.read_record_batch(
+            pa.py_buffer(request.arrow_rows.rows.serialized_record_batch), serializer.arrow_schema
+        )
+        self.assertEqual(request.arrow_rows.rows.row_count, 2)
+        self.assertEqual(batch.column("crn").to_pylist(), ["01234567", "7"])
+        self.assertEqual(batch.column("as_of").to_pylist(), [datetime.date(2026, 1, 2), None])
+        self.assertEqual(
+            batch.column("scored_at").to_pylist()[0],
+            datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_unsupported_type_rejected(self):
+        with self.assertRaises(ValueError):
+            ProtoRowSerializer([bigquery.SchemaField("geo", "GEOGRAPHY")])
+
+
+class FakeAppendRowsStream:
+    """Resolves each send() from a shared script of per-offset outcomes."""
+
+    opened = []
+
+    def __init__(self, write_client, template, script):
+        self.stream_name = template.write_stream
+        self.script = script
+        FakeAppendRowsStream.opened.append(self)
+        self.sent = []
+
+    def send(self, request):
+        self.sent.append(request.offset)
+        future = Future()
+        outcome = self.script.pop((self.stream_name, request.offset), None)
+        if outcome is None:
+            future.set_result(SimpleNamespace())
+        else:
+            future.set_exception(outcome)
+        return future
+
+    def close(self):
+        pass
+
+
+class TestCommitPath(unittest.TestCase):
+    def setUp(self):
+        FakeAppendRowsStream.opened = []
+        self.write_client = MagicMock()
+        self.write_client.create_write_stream.return_value = SimpleNamespace(name="streams/s1")
+        self.write_client.batch_commit_write_streams.return_value = SimpleNamespace(stream_errors=[])
+        self.writer = BigQueryStorageWriter(MagicMock(), write_client=self.write_client, batch_rows=2)
+        self.rows = [dict(ROW, crn=str(i)) for i in range(5)]
+
+    def _patch(self, script):
+        return patch.object(
+            bq_writer.writer, "AppendRowsStream",
+            lambda client, template: FakeAppendRowsStream(client, template, script),
+        )
+
+    def test_failed_append_retried_on_same_stream(self):
+        # Offset 2 fails transiently, so offset 4 is rejected too; the retry
+        # finds offset 2 already landed after all
+        script = {
+            ("streams/s1", 2): gapi_exceptions.ServiceUnavailable("unavailable"),
+            ("streams/s1", 4): gapi_exceptions.OutOfRange("offset beyond end"),
+        }
+        with self._patch(script):
+            self.writer.write_pending("p.d.t", SCHEMA, self.rows)
+
+        self.write_client.create_write_stream.assert_called_once()
+        self.assertEqual([s.stream_name for s in FakeAppendRowsStream.opened], ["streams/s1"] * 2)
+        self.assertEqual(FakeAppendRowsStream.opened[0].sent, [0, 2, 4])
+        self.assertEqual(FakeAppendRowsStream.opened[1].sent, [2, 4])
+        self.write_client.finalize_write_stream.assert_called_once_with(name="streams/s1")
+        commit = self.write_client.batch_commit_write_streams.call_args.args[0]
+        self.assertEqual(list(commit.write_streams), ["streams/s1"])
+
+    def test_resumed_stream_skips_rows_already_written(self):
+        script = {("streams/earlier", 0): gapi_exceptions.AlreadyExists("written")}
+        with self._patch(script):
+            name = self.writer.append_committed("p.d.t", SCHEMA, self.rows, stream_name="streams/earlier")
+
+        self.assertEqual(name, "streams/earlier")
+        self.write_client.create_write_stream.assert_not_called()
+
+    def test_persistent_failure_raises(self):
+        script = {}
+
+        class AlwaysFailing(FakeAppendRowsStream):
+            def send(self, request):
+                future = Future()
+                future.set_exception(gapi_exceptions.ServiceUnavailable("down"))
+                return future
+
+        with patch.object(bq_writer.writer, "AppendRowsStream", lambda c, t: AlwaysFailing(c, t, script)):
+            with self.assertRaises(gapi_exceptions.ServiceUnavailable):
+                self.writer.append_committed("p.d.t", SCHEMA, self.rows)
+        self.assertEqual(len(FakeAppendRowsStream.opened), bq_writer.APPEND_ATTEMPTS)
+        self.write_client.finalize_write_stream.assert_not_called()
+
+    def test_commit_errors_raise(self):
+        self.write_client.batch_commit_write_streams.return_value = SimpleNamespace(stream_errors=["boom"])
+        with self._patch({}):
+            with self.assertRaises(RuntimeError):
+                self.writer.write_pending("p.d.t", SCHEMA, self.rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from lean_graph import CompaniesHouseClient, CompaniesHouseError, LeanGraphBuilder, RateLimiter, director_key
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeSession:
+    """Answers CH requests from a path -> [response | exception, ...] script."""
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        path = url.split(".gov.uk", 1)[1]
+        self.calls.append(path)
+        outcome = self.script[path].pop(0) if len(self.script[path]) > 1 else self.script[path][0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, body = outcome
+        return SimpleNamespace(status_code=status, json=lambda: body)
+
+
+def _client(script):
+    ch = CompaniesHouseClient("key", RateLimiter(1000))
+    ch.session = FakeSession(script)
+    return ch
+
+
+def _director(name="Jane Doe", crn="01234567"):
+    return SimpleNamespace(crn=crn, canonical_name="Portfolio Co", director_name=name, dob_year=1970, dob_month=5)
+
+
+SEARCH_HIT = {"items": [{"date_of_birth": {"year": 1970, "month": 5}, "links": {"self": "/officers/OFF1/appointments"}}]}
+
+
+@patch("lean_graph.time.sleep", lambda s: None)
+class TestCompaniesHouseClient(unittest.TestCase):
+    def test_exhausted_rate_limit_raises(self):
+        ch = _client({"/search/officers": [(429, {})]})
+        with self.assertRaises(CompaniesHouseError):
+            ch.officer_id("Jane Doe", 1970, 5)
+        self.assertEqual(len(ch.session.calls), 3)
+
+    def test_rate_limit_then_success(self):
+        ch = _client({"/search/officers": [(429, {}), (200, SEARCH_HIT)]})
+        self.assertEqual(ch.officer_id("Jane Doe", 1970, 5), "OFF1")
+
+    def test_server_error_and_timeout_raise(self):
+        for outcome in ((500, {}), requests.Timeout("read timed out")):
+            ch = _client({"/search/officers": [outcome]})
+            with self.assertRaises(CompaniesHouseError):
+                ch.officer_id("Jane Doe", 1970, 5)
+
+    def test_not_found_is_an_empty_answer(self):
+        ch = _client({"/officers/OFF1/appointments": [(404, {})]})
+        self.assertEqual(ch.appointments("OFF1"), [])
+
+
+@patch("lean_graph.time.sleep", lambda s: None)
+class TestRefreshFailures(unittest.TestCase):
+    def test_failed_fetches_are_not_cached_and_links_are_protected(self):
+        ok, down, slow = _director("Ann Ok"), _director("Bob Down"), _director("Cat Slow", crn="07654321")
+        stale_entry = {
+            "director_key": director_key("Bob Down", 1970, 5),
+            "officer_id": "OFF2",
+            "officer_resolved_at": NOW - timedelta(days=1),
+            "appointments_json": '[{"company_number": "999", "company_status": "liquidation"}]',
+            "appointments_fetched_at": NOW - timedelta(days=8),
+        }
+        cache = {stale_entry["director_key"]: dict(stale_entry)}
+
+        ch = MagicMock()
+        ch.officer_id.side_effect = lambda name, *_: (
+            "OFF1" if name == "Ann Ok" else (_ for _ in ()).throw(requests.Timeout("timeout"))
+        )
+        ch.appointments.side_effect = lambda oid: (
+            [] if oid == "OFF1" else (_ for _ in ()).throw(CompaniesHouseError("HTTP 500"))
+        )
+        builder = LeanGraphBuilder(MagicMock(), ch, now=NOW)
+
+        refreshed, failed = builder.refresh([ok, down, slow], cache)
+
+        self.assertEqual(refreshed, {director_key("Ann Ok", 1970, 5)})
+        self.assertEqual(failed, {director_key("Bob Down", 1970, 5), director_key("Cat Slow", 1970, 5)})
+        # The stale entry survives untouched; nothing is cached for the new director
+        self.assertEqual(cache[stale_entry["director_key"]], stale_entry)
+        self.assertNotIn(director_key("Cat Slow", 1970, 5), cache)
+        # Links from the previous appointments are still rebuilt
+        links = builder.build_links([down], cache, portfolio_crns=set())
+        self.assertEqual([l["external_crn"] for l in links], ["999"])
+
+    def test_run_passes_failed_directors_to_merge(self):
+        bq = MagicMock()
+        bq.query.return_value.result.side_effect = [[_director("Bob Down")], [], None, None]
+        ch = MagicMock()
+        ch.officer_id.side_effect = CompaniesHouseError("HTTP 503")
+        builder = LeanGraphBuilder(bq, ch, now=NOW)
+
+        stats = builder.run(portfolio_crns=set())
+
+        self.assertEqual(stats["failed"], 1)
+        delete_call = bq.query.call_args_list[-1]
+        self.assertIn("NOT IN UNNEST(@protected)", delete_call.args[0])
+        params = delete_call.kwargs["job_config"].query_parameters
+        self.assertEqual(params[0].values, ["01234567|Bob Down"])
+
+
+if __name__ == "__main__":
+    unittest.main()